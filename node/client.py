@@ -1,7 +1,6 @@
 # node/client.py
 import asyncio
 from datetime import datetime, timedelta
-import httpx
 from httpx import HTTPStatusError, RemoteProtocolError
 import json
 from node.schemas import AgentRun, AgentRunInput
@@ -16,54 +15,35 @@ from contextlib import asynccontextmanager
 from node.server import grpc_server_pb2, grpc_server_pb2_grpc
 from google.protobuf.struct_pb2 import Struct
 from google.protobuf.json_format import MessageToDict
-from node.server.grpc_pool_manager import get_grpc_pool_instance
+from node.server.connection_pool import MultiplexedWebSocket, get_node_connection_pool
 from node.schemas import NodeConfigInput
 
 from node.utils import node_to_url
 
 logger = logging.getLogger(__name__)
 
-HTTP_TIMEOUT = 300
 
 
 class Node:
     def __init__(self, node_schema: NodeConfigInput):
         self.node_schema = node_schema
         self.node_url = node_to_url(node_schema)
-        self.communication_protocol = node_schema.communication_protocol
+        self.communication_protocol = getattr(node_schema, "communication_protocol", None) or node_schema.user_communication_protocol
         self.connections = {}
         self.access_token = None
 
     @asynccontextmanager
     async def get_stub(self):
-        pool = get_grpc_pool_instance()
-        channel = None
+        pool = get_node_connection_pool().grpc_pool()
         try:
-            channel = await pool.get_channel(self.node_url)
-            if channel is None:
-                logger.error(
-                    f"Failed to acquire channel for {self.node_url}. Channel is None."
-                )
-                raise ValueError(f"Failed to acquire channel for {self.node_url}.")
-            stub = grpc_server_pb2_grpc.GrpcServerStub(channel)
-            logger.info(f"GrpcServerStub created for node_url: {self.node_url}")
-            yield stub
+            # the channel is shared with other calls to the node, it is only released, never closed, here
+            async with pool.channel_context(self.node_url) as channel:
+                yield grpc_server_pb2_grpc.GrpcServerStub(channel)
         except Exception as e:
             logger.error(
-                f"Exception occurred while getting stub for {self.node_url}: {e}"
+                f"Exception occurred while using stub for {self.node_url}: {e}"
             )
             raise
-        finally:
-            if channel:
-                try:
-                    await pool.release_channel(self.node_url, channel)
-                    logger.info(
-                        f"Channel released back to pool for node_url: {self.node_url}"
-                    )
-                except Exception as e:
-                    logger.error(
-                        f"Exception occurred while releasing channel for {self.node_url}: {e}"
-                    )
 
     async def connect_ws(self, action: str):
         client_id = str(uuid.uuid4())
@@ -82,27 +62,21 @@ class Node:
             self.current_client_id = None
 
     async def send_receive_ws(self, data, action: str):
-        client_id = await self.connect_ws(action)
-
-        try:
-            message = json.dumps(data)
-            logger.debug(f"Sending message: {message}")
-            await self.connections[client_id].send(message)
-
-            response = await self.connections[client_id].recv()
-            logger.debug(f"Received response: {response}")
-            return json.loads(response)
-        finally:
-            await self.disconnect_ws(client_id)
+        # the websocket is shared with other calls to the node and stays open for the next one
+        websocket = await get_node_connection_pool().websocket(self.node_url, action)
+        logger.debug(f"Sending message: {data}")
+        response = await websocket.request(data)
+        logger.debug(f"Received response: {response}")
+        return response
 
     async def check_health(self):
         # only works for http and ws
         if self.communication_protocol == "http" or self.communication_protocol == "ws":
             try:
-                async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as client:
-                    response = await client.get(f"{self.node_url}/health")
-                    response.raise_for_status()
-                    return True
+                client = get_node_connection_pool().http_client(self.node_url)
+                response = await client.get("/health")
+                response.raise_for_status()
+                return True
             except Exception as e:
                 logger.error(f"Error checking health: {e}")
                 return False
@@ -157,21 +131,19 @@ class Node:
         logger.info("Running agent...")
         logger.debug(f"Node URL: {self.node_url}")
 
-        endpoint = self.node_url + "/agent/run"
-
         if isinstance(agent_run_input, dict):
             agent_run_input = AgentRunInput(**agent_run_input)
 
         try:
-            async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as client:
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.access_token}",
-                }
-                response = await client.post(
-                    endpoint, json=agent_run_input.model_dict(), headers=headers
-                )
-                response.raise_for_status()
+            client = get_node_connection_pool().http_client(self.node_url)
+            headers = {
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.access_token}",
+            }
+            response = await client.post(
+                "/agent/run", json=agent_run_input.model_dict(), headers=headers
+            )
+            response.raise_for_status()
             return AgentRun(**json.loads(response.text))
         except HTTPStatusError as e:
             logger.error(f"HTTP error occurred: {e}")
@@ -279,14 +251,13 @@ class Node:
             raise
 
     async def check_user_http(self, user_input: Dict[str, Any]) -> Dict[str, Any]:
-        endpoint = self.node_url + "/user/check"
         try:
-            async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as client:
-                headers = {
-                    "Content-Type": "application/json",
-                }
-                response = await client.post(endpoint, json=user_input, headers=headers)
-                response.raise_for_status()
+            client = get_node_connection_pool().http_client(self.node_url)
+            headers = {
+                "Content-Type": "application/json",
+            }
+            response = await client.post("/user/check", json=user_input, headers=headers)
+            response.raise_for_status()
             return json.loads(response.text)
         except HTTPStatusError as e:
             logger.error(f"HTTP error occurred: {e}")
@@ -330,14 +301,13 @@ class Node:
         """
         Register a user on a node
         """
-        endpoint = self.node_url + "/user/register"
         try:
-            async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as client:
-                headers = {
-                    "Content-Type": "application/json",
-                }
-                response = await client.post(endpoint, json=user_input, headers=headers)
-                response.raise_for_status()
+            client = get_node_connection_pool().http_client(self.node_url)
+            headers = {
+                "Content-Type": "application/json",
+            }
+            response = await client.post("/user/register", json=user_input, headers=headers)
+            response.raise_for_status()
             return json.loads(response.text)
         except HTTPStatusError as e:
             logger.error(f"HTTP error occurred: {e}")
@@ -378,11 +348,11 @@ class Node:
 
     async def check_agent_run_http(self, agent_run: AgentRun) -> AgentRun:
         try:
-            async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as client:
-                response = await client.post(
-                    f"{self.node_url}/agent/check", json=agent_run.model_dict()
-                )
-                response.raise_for_status()
+            client = get_node_connection_pool().http_client(self.node_url)
+            response = await client.post(
+                "/agent/check", json=agent_run.model_dict()
+            )
+            response.raise_for_status()
             return AgentRun(**json.loads(response.text))
         except HTTPStatusError as e:
             logger.error(f"HTTP error occurred: {e}")
@@ -392,27 +362,15 @@ class Node:
             logger.error(f"Full traceback: {traceback.format_exc()}")
 
     async def send_receive_multiple(self, data_list, action: str):
-        results = []
-
-        for data in data_list:
-            client_id = await self.connect_ws(action)
-
-            message = json.dumps(data)
-            logger.debug(f"Sending message: {message}")
-            await self.connections[client_id].send(message)
-
-            response = await self.connections[client_id].recv()
-            logger.debug(f"Received response: {response}")
-            results.append(json.loads(response))
-
-            await self.disconnect_ws(client_id)
-
-        return results
+        """Send every message over one websocket, the node answers them concurrently"""
+        websocket = await get_node_connection_pool().websocket(self.node_url, action)
+        return list(await asyncio.gather(*(websocket.request(data) for data in data_list)))
 
     async def __aenter__(self):
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        # pooled connections are shared with other Node clients, only the ones opened with connect_ws are closed
         for client_id in list(self.connections.keys()):
             await self.disconnect_ws(client_id)
 
@@ -426,12 +384,12 @@ class NodeIndirect:
         self.lock = asyncio.Lock()
         self.websocket = None
 
-    async def get_websocket(self):
+    async def get_websocket(self) -> MultiplexedWebSocket:
+        # the lock only guards connecting, the socket sends one request at a time until the
+        # relay has shown it echoes request ids, and multiplexes them after that
         async with self.lock:
             if self.websocket is None or self.websocket.closed:
-                full_url = f"{self.routing_url}/ws"
-                logger.info(f"Connecting to WebSocket: {full_url}")
-                self.websocket = await websockets.connect(full_url)
+                self.websocket = await MultiplexedWebSocket.connect(f"{self.routing_url}/ws")
             return self.websocket
 
     async def send_receive(self, data: Dict, action: str):
@@ -445,20 +403,12 @@ class NodeIndirect:
             "params": data,
         }
 
-        async with self.lock:
-            message_json = json.dumps(message)
-            logger.debug(f"Sending message: {message_json}")
-            await websocket.send(message_json)
-
-            response = await websocket.recv()
-            logger.debug(f"Received raw response: {response}")
-
-        if isinstance(response, str):
-            response_data = json.loads(response)
-            logger.debug(f"Received response: {response_data}")
-        else:
-            logger.error(f"Received non-string response: {response}")
-            raise Exception("Received non-string response")
+        logger.debug(f"Sending message: {message}")
+        response_data = await websocket.request(message)
+        logger.debug(f"Received response: {response_data}")
+        if not isinstance(response_data, dict):
+            logger.error(f"Received unexpected response: {response_data}")
+            raise Exception("Received unexpected response")
 
         return response_data["params"]
 
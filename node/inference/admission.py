@@ -0,0 +1,199 @@
+import asyncio
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+import heapq
+import itertools
+import json
+import logging
+import math
+import os
+import time
+from typing import Dict, List, Mapping, Optional
+
+from node.inference.metrics import inference_metrics
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+INFERENCE_ADMISSION_ENABLED = os.getenv("INFERENCE_ADMISSION_ENABLED", "true") == "true"
+INFERENCE_MAX_CONCURRENCY = int(os.getenv("INFERENCE_MAX_CONCURRENCY", "64"))
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", "256"))
+# requests waiting longer than this for a slot are rejected instead of running into LITELLM_HTTP_TIMEOUT
+INFERENCE_QUEUE_TIMEOUT = float(os.getenv("INFERENCE_QUEUE_TIMEOUT", "60"))
+# per-model overrides, e.g. {"NousResearch/Hermes-3-Llama-3.1-8B": {"max_concurrency": 32, "max_queue": 128}}
+INFERENCE_ADMISSION_CONFIG = json.loads(os.getenv("INFERENCE_ADMISSION_CONFIG") or "{}")
+# consumers whose requests are always treated as batch traffic
+INFERENCE_BATCH_CONSUMERS = {c.strip() for c in os.getenv("INFERENCE_BATCH_CONSUMERS", "").split(",") if c.strip()}
+
+PRIORITY_HEADER = "x-priority"
+CONSUMER_HEADER = "x-consumer-id"
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+queue_wait_histogram = inference_metrics.histogram(
+    "inference_queue_wait_seconds", "Time requests wait for a per-model concurrency slot", label_names=("model", "priority")
+)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, model: str, reason: str, retry_after: int):
+        super().__init__(f"Model {model} is overloaded: {reason}")
+        self.model = model
+        self.retry_after = retry_after
+
+
+def request_priority(headers: Mapping[str, str]) -> str:
+    """Priority class from the X-Priority header, or from the consumer (X-Consumer-Id), defaulting to interactive"""
+    priority = headers.get(PRIORITY_HEADER, "").strip().lower()
+    if priority in PRIORITIES:
+        return priority
+    if headers.get(CONSUMER_HEADER, "").strip() in INFERENCE_BATCH_CONSUMERS:
+        return "batch"
+    return "interactive"
+
+
+class ModelLimiter:
+    """Concurrency limit for one model with a bounded wait queue ordered by priority class, then arrival"""
+
+    def __init__(self, model: str, max_concurrency: int, max_queue: int):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiters: List = []
+        self.counter = itertools.count()
+        # EWMA of how long a request holds its slot, used for Retry-After
+        self.avg_service_time = 1.0
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0}
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, future in self.waiters if not future.done())
+
+    def retry_after(self) -> int:
+        backlog = self.queue_depth + self.active
+        return max(1, math.ceil(backlog * self.avg_service_time / self.max_concurrency))
+
+    async def acquire(self, priority: str = "interactive", timeout: float = INFERENCE_QUEUE_TIMEOUT):
+        start = time.monotonic()
+        if self.active < self.max_concurrency and not self.queue_depth:
+            self.active += 1
+            self.stats["admitted"] += 1
+            queue_wait_histogram.observe(0, model=self.model, priority=priority)
+            return
+
+        if self.queue_depth >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise AdmissionRejected(self.model, "queue is full", self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (PRIORITIES[priority], next(self.counter), future))
+        self.stats["queued"] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                self.stats["timed_out"] += 1
+                raise AdmissionRejected(self.model, f"no slot within {timeout}s", self.retry_after())
+            # the slot was handed over just as we timed out, keep it
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # we were given a slot but the caller went away, pass it on
+                self.release(0)
+            else:
+                future.cancel()
+            raise
+        self.stats["admitted"] += 1
+        queue_wait_histogram.observe(time.monotonic() - start, model=self.model, priority=priority)
+
+    def release(self, service_time: Optional[float] = None):
+        if service_time:
+            self.avg_service_time = 0.9 * self.avg_service_time + 0.1 * service_time
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                # hand the slot over directly, so active stays the same
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "active": self.active,
+            "queue_depth": self.queue_depth,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "avg_service_time": self.avg_service_time,
+        }
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrency: int = INFERENCE_MAX_CONCURRENCY,
+        max_queue: int = INFERENCE_MAX_QUEUE,
+        model_config: Optional[Dict[str, Dict]] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.model_config = model_config if model_config is not None else INFERENCE_ADMISSION_CONFIG
+        self.limiters: Dict[str, ModelLimiter] = {}
+
+    def limiter(self, model: str) -> ModelLimiter:
+        if model not in self.limiters:
+            config = self.model_config.get(model, {})
+            self.limiters[model] = ModelLimiter(
+                model,
+                config.get("max_concurrency", self.max_concurrency),
+                config.get("max_queue", self.max_queue),
+            )
+        return self.limiters[model]
+
+    async def acquire(self, model: str, priority: str = "interactive"):
+        """Wait for a slot for the model; returns a release callable to call exactly once when done"""
+        limiter = self.limiter(model)
+        await limiter.acquire(priority)
+        start = time.monotonic()
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                limiter.release(time.monotonic() - start)
+
+        return release
+
+    @asynccontextmanager
+    async def slot(self, model: str, priority: str = "interactive"):
+        release = await self.acquire(model, priority)
+        try:
+            yield
+        finally:
+            release()
+
+    def get_stats(self) -> Dict:
+        return {model: limiter.get_stats() for model, limiter in self.limiters.items()}
+
+
+_admission_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AdmissionController()
+    return _admission_controller
+
+
+def _limiter_gauge(field: str):
+    def collect():
+        if _admission_controller is None:
+            return []
+        return [({"model": model}, getattr(limiter, field)) for model, limiter in _admission_controller.limiters.items()]
+    return collect
+
+
+inference_metrics.gauge("inference_queue_depth", "Requests waiting for a per-model concurrency slot", _limiter_gauge("queue_depth"))
+inference_metrics.gauge("inference_active_requests", "Requests holding a per-model concurrency slot", _limiter_gauge("active"))
@@ -0,0 +1,271 @@
+import asyncio
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Set
+
+import httpx
+
+from node.inference.metrics import inference_metrics
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+LITELLM_HTTP_TIMEOUT = 60 * 5
+LITELLM_MASTER_KEY = os.environ.get("LITELLM_MASTER_KEY")
+LITELLM_URL = os.getenv("LITELLM_URL") or ("http://litellm:4000" if os.getenv("LAUNCH_DOCKER") == "true" else "http://localhost:4000")
+LITELLM_MAX_CONNECTIONS = int(os.getenv("LITELLM_MAX_CONNECTIONS", "200"))
+LITELLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LITELLM_MAX_KEEPALIVE_CONNECTIONS", "100"))
+LITELLM_KEEPALIVE_EXPIRY = float(os.getenv("LITELLM_KEEPALIVE_EXPIRY", "60"))
+
+# extra OpenAI-compatible backends (e.g. LiteLLM on another node or a vLLM replica), as JSON:
+# [{"url": "http://10.0.0.2:4000", "models": ["NousResearch/Hermes-3-Llama-3.1-8B"], "api_key": "sk-..."}]
+# backends without "models" serve every model. LITELLM_URL is always the first backend.
+INFERENCE_BACKENDS = json.loads(os.getenv("INFERENCE_BACKENDS") or "[]")
+# least_outstanding or ewma
+INFERENCE_BALANCER = os.getenv("INFERENCE_BALANCER", "least_outstanding")
+INFERENCE_HEALTH_INTERVAL = float(os.getenv("INFERENCE_HEALTH_INTERVAL", "10"))
+INFERENCE_EJECT_AFTER_FAILURES = int(os.getenv("INFERENCE_EJECT_AFTER_FAILURES", "3"))
+# send a second copy of a slow non-streaming request to another backend after this delay, 0 disables hedging
+INFERENCE_HEDGE_DELAY_MS = float(os.getenv("INFERENCE_HEDGE_DELAY_MS", "0"))
+HEALTH_PATH = "/health/liveliness"
+EWMA_ALPHA = 0.2
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class NoBackendAvailable(Exception):
+    pass
+
+
+class Backend:
+    def __init__(self, url: str, models: Optional[List[str]] = None, api_key: Optional[str] = None):
+        self.url = url.rstrip("/")
+        self.models: Optional[Set[str]] = set(models) if models else None
+        self.api_key = api_key or LITELLM_MASTER_KEY
+        self.client: Optional[httpx.AsyncClient] = None
+        self.outstanding = 0
+        self.ewma_latency: Optional[float] = None
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.stats = {"requests": 0, "failures": 0, "ejections": 0, "hedges_won": 0}
+
+    def get_client(self) -> httpx.AsyncClient:
+        """App-lifetime pooled client, so connections are reused across requests.
+
+        HTTP/2 is negotiated (via ALPN) when the h2 package is installed and the backend is served over TLS.
+        """
+        if self.client is None or self.client.is_closed:
+            self.client = httpx.AsyncClient(
+                base_url=self.url,
+                timeout=LITELLM_HTTP_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=LITELLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LITELLM_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=LITELLM_KEEPALIVE_EXPIRY,
+                ),
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                http2=HTTP2_AVAILABLE,
+            )
+        return self.client
+
+    def serves(self, model: Optional[str]) -> bool:
+        return self.models is None or model is None or model in self.models
+
+    def score(self, policy: str) -> float:
+        latency = self.ewma_latency if self.ewma_latency is not None else 0.0
+        if policy == "ewma":
+            # expected wait if requests queue behind the outstanding ones
+            return latency * (self.outstanding + 1)
+        return self.outstanding + latency / 1000
+
+    def record_success(self, latency: Optional[float] = None):
+        self.consecutive_failures = 0
+        if latency is not None:
+            self.ewma_latency = latency if self.ewma_latency is None else (1 - EWMA_ALPHA) * self.ewma_latency + EWMA_ALPHA * latency
+
+    def record_failure(self):
+        self.stats["failures"] += 1
+        self.consecutive_failures += 1
+        if self.healthy and self.consecutive_failures >= INFERENCE_EJECT_AFTER_FAILURES:
+            logger.warning(f"Ejecting inference backend {self.url} after {self.consecutive_failures} consecutive failures")
+            self.healthy = False
+            self.stats["ejections"] += 1
+
+    def get_stats(self) -> Dict:
+        return {
+            "url": self.url,
+            "models": sorted(self.models) if self.models else None,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "ewma_latency": self.ewma_latency,
+            **self.stats,
+        }
+
+
+class BackendRegistry:
+    """Routes inference requests across backends with least-outstanding or EWMA-latency balancing.
+
+    Backends failing INFERENCE_EJECT_AFTER_FAILURES times in a row (connection errors or 5xx) are
+    ejected until the periodic health check passes again.
+    """
+
+    def __init__(self, backends: List[Backend], policy: str = INFERENCE_BALANCER, hedge_delay_ms: float = INFERENCE_HEDGE_DELAY_MS):
+        self.backends = backends
+        self.policy = policy
+        self.hedge_delay_ms = hedge_delay_ms
+        self.health_task: Optional[asyncio.Task] = None
+
+    def pick(self, model: Optional[str] = None, exclude: Optional[List[Backend]] = None) -> Backend:
+        candidates = [b for b in self.backends if b.serves(model) and b not in (exclude or [])]
+        if not candidates:
+            raise NoBackendAvailable(f"No inference backend serves model {model}")
+        healthy = [b for b in candidates if b.healthy]
+        if not healthy:
+            if exclude:
+                raise NoBackendAvailable(f"No other healthy inference backend serves model {model}")
+            # everything is ejected, still try rather than fail outright
+            healthy = candidates
+        return min(healthy, key=lambda b: b.score(self.policy))
+
+    async def _send(self, backend: Backend, method: str, path: str, **kwargs) -> httpx.Response:
+        backend.outstanding += 1
+        backend.stats["requests"] += 1
+        start = time.monotonic()
+        try:
+            response = await backend.get_client().request(method, path, **kwargs)
+        except httpx.TransportError:
+            backend.record_failure()
+            raise
+        finally:
+            backend.outstanding -= 1
+        if response.status_code >= 500:
+            backend.record_failure()
+        else:
+            backend.record_success(time.monotonic() - start)
+        return response
+
+    async def request(self, model: Optional[str], method: str, path: str, hedge: bool = False, **kwargs) -> httpx.Response:
+        """Send a non-streaming request to the best backend, hedging to a second one if enabled and it is slow"""
+        primary = self.pick(model)
+        if not (hedge and self.hedge_delay_ms > 0):
+            return await self._send(primary, method, path, **kwargs)
+
+        first = asyncio.create_task(self._send(primary, method, path, **kwargs))
+        pending = {first}
+        try:
+            # a caller cancelled at any await below cancels the requests still in flight
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_delay_ms / 1000)
+            if done:
+                return first.result()
+            try:
+                secondary = self.pick(model, exclude=[primary])
+            except NoBackendAvailable:
+                return await first
+
+            logger.debug(f"Hedging {path} for {model} to {secondary.url}")
+            second = asyncio.create_task(self._send(secondary, method, path, **kwargs))
+            pending = {first, second}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result().status_code < 500:
+                        if task is second:
+                            secondary.stats["hedges_won"] += 1
+                        return task.result()
+            # both failed, surface the primary's outcome
+            return first.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @asynccontextmanager
+    async def stream(self, model: Optional[str], method: str, path: str, **kwargs):
+        """Open a streaming request on the best backend, counting it as outstanding until closed"""
+        backend = self.pick(model)
+        backend.outstanding += 1
+        backend.stats["requests"] += 1
+        start = time.monotonic()
+        try:
+            async with backend.get_client().stream(method, path, **kwargs) as response:
+                if response.status_code >= 500:
+                    backend.record_failure()
+                else:
+                    # time to response headers, stream length depends on the completion
+                    backend.record_success(time.monotonic() - start)
+                yield response
+        except httpx.TransportError:
+            backend.record_failure()
+            raise
+        finally:
+            backend.outstanding -= 1
+
+    async def check_health(self):
+        for backend in self.backends:
+            try:
+                response = await backend.get_client().get(HEALTH_PATH, timeout=5)
+                ok = response.status_code < 500
+            except httpx.HTTPError:
+                ok = False
+            if ok and not backend.healthy:
+                logger.info(f"Inference backend {backend.url} is healthy again")
+                backend.healthy = True
+                backend.consecutive_failures = 0
+            elif not ok and backend.healthy:
+                backend.record_failure()
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(INFERENCE_HEALTH_INTERVAL)
+            try:
+                await self.check_health()
+            except Exception as e:
+                logger.error(f"Inference backend health check failed: {e}")
+
+    def start_health_checks(self):
+        # a single backend has nowhere to fail over to, so only check when routing between several
+        if len(self.backends) > 1 and self.health_task is None:
+            self.health_task = asyncio.get_running_loop().create_task(self._health_loop())
+
+    async def close(self):
+        if self.health_task is not None:
+            self.health_task.cancel()
+            self.health_task = None
+        for backend in self.backends:
+            if backend.client is not None:
+                await backend.client.aclose()
+                backend.client = None
+
+    def get_stats(self) -> Dict:
+        return {"policy": self.policy, "hedge_delay_ms": self.hedge_delay_ms, "backends": [b.get_stats() for b in self.backends]}
+
+
+_backend_registry: Optional[BackendRegistry] = None
+
+
+def get_backend_registry() -> BackendRegistry:
+    global _backend_registry
+    if _backend_registry is None:
+        backends = [Backend(LITELLM_URL)]
+        backends.extend(Backend(b["url"], b.get("models"), b.get("api_key")) for b in INFERENCE_BACKENDS)
+        _backend_registry = BackendRegistry(backends)
+    return _backend_registry
+
+
+def _backend_gauge(field: str):
+    def collect():
+        if _backend_registry is None:
+            return []
+        return [({"backend": b.url}, float(getattr(b, field))) for b in _backend_registry.backends]
+    return collect
+
+
+inference_metrics.gauge("inference_backend_outstanding", "Requests in flight to each inference backend", _backend_gauge("outstanding"))
+inference_metrics.gauge("inference_backend_healthy", "Whether each inference backend is in rotation", _backend_gauge("healthy"))
@@ -0,0 +1,184 @@
+import asyncio
+from dataclasses import dataclass, field
+from dotenv import load_dotenv
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from node.inference.metrics import inference_metrics
+from node.metrics import SIZE_BUCKETS
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+EMBEDDING_BATCHING_ENABLED = os.getenv("EMBEDDING_BATCHING_ENABLED", "true") == "true"
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64"))
+# per-model overrides, e.g. {"jinaai/jina-embeddings-v2-base-en": {"window_ms": 10, "max_batch": 256}}
+EMBEDDING_BATCH_CONFIG = json.loads(os.getenv("EMBEDDING_BATCH_CONFIG") or "{}")
+
+batch_size_histogram = inference_metrics.histogram(
+    "embedding_batch_size", "Inputs per upstream embeddings call", SIZE_BUCKETS, ("model",)
+)
+batch_requests_histogram = inference_metrics.histogram(
+    "embedding_batch_requests", "Coalesced requests per upstream embeddings call", SIZE_BUCKETS, ("model",)
+)
+queue_delay_histogram = inference_metrics.histogram(
+    "embedding_queue_delay_seconds", "Time embedding requests wait for their batch to be sent", label_names=("model",)
+)
+
+Fetch = Callable[[List[str]], Awaitable[Dict]]
+
+
+def rejects_input(error: BaseException) -> bool:
+    """Whether an upstream error is a 4xx that may be caused by one input of a batch.
+
+    429 is about the load rather than the inputs, sending the members one by one would only add to it.
+    """
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return isinstance(status_code, int) and 400 <= status_code < 500 and status_code != 429
+
+
+@dataclass
+class PendingEmbedding:
+    texts: List[str]
+    fetch: Fetch
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class BatchQueue:
+    items: List[PendingEmbedding] = field(default_factory=list)
+    size: int = 0
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent embedding requests for the same model into one upstream call.
+
+    Requests are collected per (model, dimensions) until the window elapses or the batch reaches
+    its max size, sent upstream together, and each caller gets back its own slice of the result.
+    When upstream rejects a batch with a 4xx, its requests are sent again one by one so only the
+    request with the offending input fails.
+    """
+
+    def __init__(
+        self,
+        window_ms: float = EMBEDDING_BATCH_WINDOW_MS,
+        max_batch: int = EMBEDDING_BATCH_MAX_SIZE,
+        model_config: Optional[Dict[str, Dict]] = None,
+    ):
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self.model_config = model_config if model_config is not None else EMBEDDING_BATCH_CONFIG
+        self.queues: Dict[Tuple[str, Optional[int]], BatchQueue] = {}
+        self.tasks: Set[asyncio.Task] = set()
+
+    def _config(self, model: str) -> Tuple[float, int]:
+        config = self.model_config.get(model, {})
+        return config.get("window_ms", self.window_ms), config.get("max_batch", self.max_batch)
+
+    async def embed(self, model: str, texts: List[str], fetch: Fetch, dimensions: Optional[int] = None) -> Dict:
+        """Embed texts as part of the next batch for the model.
+
+        ``fetch`` is used if this request opens a new batch, so all requests sharing a key must be
+        interchangeable apart from their inputs. It is also used to send this request on its own
+        when upstream rejects its batch.
+        """
+        window_ms, max_batch = self._config(model)
+        if window_ms <= 0 or len(texts) >= max_batch:
+            batch_size_histogram.observe(len(texts), model=model)
+            batch_requests_histogram.observe(1, model=model)
+            queue_delay_histogram.observe(0, model=model)
+            return await fetch(texts)
+
+        key = (model, dimensions)
+        queue = self.queues.get(key)
+        if queue is not None and queue.size + len(texts) > max_batch:
+            self._flush(key)
+            queue = None
+        if queue is None:
+            queue = self.queues[key] = BatchQueue()
+            queue.timer = asyncio.get_running_loop().call_later(window_ms / 1000, self._flush, key)
+
+        item = PendingEmbedding(texts=texts, fetch=fetch, future=asyncio.get_running_loop().create_future())
+        queue.items.append(item)
+        queue.size += len(texts)
+        if queue.size >= max_batch:
+            self._flush(key)
+        return await item.future
+
+    def _flush(self, key: Tuple[str, Optional[int]]):
+        queue = self.queues.pop(key, None)
+        if queue is None:
+            return
+        if queue.timer is not None:
+            queue.timer.cancel()
+        task = asyncio.get_running_loop().create_task(self._send(key[0], queue))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _send(self, model: str, queue: BatchQueue):
+        now = time.monotonic()
+        for item in queue.items:
+            queue_delay_histogram.observe(now - item.enqueued_at, model=model)
+        batch_size_histogram.observe(queue.size, model=model)
+        batch_requests_histogram.observe(len(queue.items), model=model)
+
+        texts = [text for item in queue.items for text in item.texts]
+        try:
+            response = await queue.items[0].fetch(texts)
+            data = sorted(response["data"], key=lambda entry: entry["index"])
+            if len(data) != len(texts):
+                raise ValueError(f"Expected {len(texts)} embeddings from upstream, got {len(data)}")
+        except BaseException as e:
+            if len(queue.items) > 1 and rejects_input(e):
+                logger.warning(f"Upstream rejected a batch of {len(queue.items)} {model} embedding requests ({e}), sending them one by one")
+                await asyncio.gather(*(self._send_alone(item) for item in queue.items))
+                return
+            for item in queue.items:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        prompt_tokens = (response.get("usage") or {}).get("prompt_tokens", 0) or 0
+        total_chars = sum(len(text) for text in texts) or 1
+        offset = 0
+        for item in queue.items:
+            item_data = data[offset:offset + len(item.texts)]
+            offset += len(item.texts)
+            # usage is reported for the whole batch, so split it between callers by input length
+            tokens = round(prompt_tokens * sum(len(text) for text in item.texts) / total_chars)
+            if not item.future.done():
+                item.future.set_result({
+                    **response,
+                    "data": [{**entry, "index": i} for i, entry in enumerate(item_data)],
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+                })
+
+    async def _send_alone(self, item: PendingEmbedding):
+        try:
+            response = await item.fetch(item.texts)
+        except BaseException as e:
+            if not item.future.done():
+                item.future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        if not item.future.done():
+            item.future.set_result(response)
+
+
+_embedding_batcher: Optional[EmbeddingBatcher] = None
+
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    global _embedding_batcher
+    if _embedding_batcher is None:
+        _embedding_batcher = EmbeddingBatcher()
+    return _embedding_batcher
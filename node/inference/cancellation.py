@@ -0,0 +1,78 @@
+import asyncio
+from dotenv import load_dotenv
+import logging
+import os
+from typing import Awaitable, Optional
+
+import httpx
+from starlette.requests import Request
+
+from node.inference.metrics import inference_metrics
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+# abort the upstream request when the caller disconnects; false lets generation run to completion
+# (the previous behaviour), which is only useful to measure how many tokens that wastes
+INFERENCE_CANCEL_ON_DISCONNECT = os.getenv("INFERENCE_CANCEL_ON_DISCONNECT", "true") == "true"
+
+disconnects_counter = inference_metrics.counter(
+    "inference_client_disconnects_total", "Inference requests whose caller went away before the response finished", ("model", "action")
+)
+wasted_tokens_counter = inference_metrics.counter(
+    "inference_wasted_tokens_total", "Completion tokens generated upstream after the caller went away", ("model",)
+)
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+async def wait_for_disconnect(request: Request):
+    """Return once the client has disconnected; the request body must already have been read"""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+def record_disconnect(model: Optional[str], wasted_tokens: int, cancelled: bool):
+    action = "cancelled" if cancelled else "completed"
+    logger.info(f"Caller disconnected from {model} request, upstream {action}, {wasted_tokens} tokens wasted")
+    disconnects_counter.inc(model=model, action=action)
+    wasted_tokens_counter.inc(wasted_tokens, model=model)
+
+
+async def run_until_disconnect(request: Request, model: Optional[str], upstream: Awaitable[httpx.Response]) -> httpx.Response:
+    """Await a non-streaming upstream request, aborting it if the caller disconnects first.
+
+    Closing the upstream connection is what makes vLLM abort the generation. Raises ClientDisconnected
+    when the caller is gone, since there is no one left to send the response to.
+    """
+    task = asyncio.ensure_future(upstream)
+    disconnect = asyncio.ensure_future(wait_for_disconnect(request))
+    try:
+        await asyncio.wait({task, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        if not disconnect.done():
+            disconnect.cancel()
+
+    if task.done():
+        return task.result()
+    if INFERENCE_CANCEL_ON_DISCONNECT:
+        task.cancel()
+        record_disconnect(model, 0, cancelled=True)
+        raise ClientDisconnected()
+
+    response = await task
+    usage = {}
+    if response.status_code == 200:
+        try:
+            usage = response.json().get("usage") or {}
+        except ValueError:
+            pass
+    record_disconnect(model, usage.get("completion_tokens", 0) or 0, cancelled=False)
+    raise ClientDisconnected()
@@ -0,0 +1,173 @@
+from collections import OrderedDict
+from dotenv import load_dotenv
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterator, List, Mapping, Optional
+
+from node.inference.sse import DONE, SSEDecoder, encode_sse_event
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+# opt-in: exact-match cache of deterministic (temperature=0) chat completions
+COMPLETION_CACHE_ENABLED = os.getenv("COMPLETION_CACHE_ENABLED", "false") == "true"
+COMPLETION_CACHE_TTL = int(os.getenv("COMPLETION_CACHE_TTL", "600"))
+COMPLETION_CACHE_SIZE = int(os.getenv("COMPLETION_CACHE_SIZE", "1000"))
+COMPLETION_CACHE_BYPASS_HEADER = "x-cache-bypass"
+
+# request fields that change the transport, not the completion
+NON_SEMANTIC_FIELDS = ("stream", "stream_options")
+
+
+def is_deterministic(payload: Dict) -> bool:
+    """Only greedy decoding of a single choice returns the same completion for the same request"""
+    return payload.get("temperature") == 0 and payload.get("n") in (None, 1)
+
+
+def should_bypass(headers: Mapping[str, str]) -> bool:
+    if headers.get(COMPLETION_CACHE_BYPASS_HEADER, "").lower() in ("1", "true"):
+        return True
+    cache_control = headers.get("cache-control", "").lower()
+    return "no-cache" in cache_control or "no-store" in cache_control
+
+
+def completion_cache_key(payload: Dict) -> str:
+    normalized = {key: value for key, value in payload.items() if key not in NON_SEMANTIC_FIELDS and value is not None}
+    # temperature 0 makes these irrelevant, so they should not split the cache
+    normalized.pop("top_p", None)
+    normalized.pop("seed", None)
+    encoded = json.dumps(normalized, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def completion_to_sse(completion: Dict, include_usage: bool = False) -> Iterator[bytes]:
+    """Replay a cached chat.completion as the chunk events a streaming request would have received"""
+    base = {
+        "id": completion.get("id"),
+        "object": "chat.completion.chunk",
+        "created": completion.get("created", int(time.time())),
+        "model": completion.get("model"),
+    }
+    for choice in completion.get("choices", []):
+        message = choice.get("message") or {}
+        delta = {"role": message.get("role", "assistant")}
+        if message.get("content") is not None:
+            delta["content"] = message["content"]
+        if message.get("tool_calls"):
+            delta["tool_calls"] = [{"index": i, **tool_call} for i, tool_call in enumerate(message["tool_calls"])]
+        yield encode_sse_event({**base, "choices": [{"index": choice.get("index", 0), "delta": delta, "finish_reason": None}]})
+        yield encode_sse_event({**base, "choices": [{"index": choice.get("index", 0), "delta": {}, "finish_reason": choice.get("finish_reason")}]})
+    if include_usage and completion.get("usage"):
+        yield encode_sse_event({**base, "choices": [], "usage": completion["usage"]})
+    yield encode_sse_event(DONE)
+
+
+class CompletionCache:
+    """In-memory exact-match cache of chat completion bodies with a TTL and an LRU size bound"""
+
+    def __init__(self, max_entries: int = COMPLETION_CACHE_SIZE, ttl: int = COMPLETION_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "uncacheable": 0, "stores": 0, "expired": 0}
+
+    def get(self, key: str) -> Optional[Dict]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        expires_at, completion = entry
+        if time.monotonic() >= expires_at:
+            del self.entries[key]
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return completion
+
+    def put(self, key: str, completion: Dict):
+        self.entries[key] = (time.monotonic() + self.ttl, completion)
+        self.entries.move_to_end(key)
+        self.stats["stores"] += 1
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        stats["entries"] = len(self.entries)
+        return stats
+
+
+class StreamRecorder:
+    """Rebuilds a chat.completion from a passing SSE stream and caches it once the stream finishes"""
+
+    def __init__(self, cache: CompletionCache, key: str):
+        self.cache = cache
+        self.key = key
+        self.decoder = SSEDecoder()
+        self.meta: Dict = {}
+        self.choices: Dict[int, Dict] = {}
+        self.usage = None
+        self.done = False
+        self.cacheable = True
+
+    def feed(self, chunk: bytes):
+        if not self.cacheable:
+            return
+        for event in self.decoder.feed(chunk):
+            if event == DONE:
+                self.done = True
+                continue
+            if not isinstance(event, dict) or "error" in event:
+                self.cacheable = False
+                return
+            for field in ("id", "created", "model", "system_fingerprint"):
+                if field in event:
+                    self.meta.setdefault(field, event[field])
+            if event.get("usage"):
+                self.usage = event["usage"]
+            for choice in event.get("choices") or []:
+                delta = choice.get("delta") or {}
+                if delta.get("tool_calls") or delta.get("function_call"):
+                    # tool call deltas are not reassembled, those completions are only cached when not streamed
+                    self.cacheable = False
+                    return
+                state = self.choices.setdefault(choice.get("index", 0), {"role": "assistant", "content": [], "finish_reason": None})
+                if delta.get("role"):
+                    state["role"] = delta["role"]
+                if delta.get("content"):
+                    state["content"].append(delta["content"])
+                if choice.get("finish_reason"):
+                    state["finish_reason"] = choice["finish_reason"]
+
+    def close(self, completed: bool):
+        if not (completed and self.done and self.cacheable and self.choices):
+            return
+        choices: List[Dict] = [
+            {
+                "index": index,
+                "message": {"role": state["role"], "content": "".join(state["content"])},
+                "finish_reason": state["finish_reason"],
+            }
+            for index, state in sorted(self.choices.items())
+        ]
+        completion = {**self.meta, "object": "chat.completion", "choices": choices}
+        if self.usage:
+            completion["usage"] = self.usage
+        self.cache.put(self.key, completion)
+
+
+_completion_cache: Optional[CompletionCache] = None
+
+
+def get_completion_cache() -> CompletionCache:
+    global _completion_cache
+    if _completion_cache is None:
+        _completion_cache = CompletionCache()
+    return _completion_cache
@@ -0,0 +1,679 @@
+"""
+Incremental tool call parsing shared by the tool parser plugins.
+
+The parsers are fed the generated text as it arrives and keep their state between
+calls, so every character is scanned exactly once and nothing is re-parsed. There are
+no regexes, so there is nothing to backtrack on adversarial output.
+
+vLLM loads each plugin from its file path, so the plugins import this module from their
+own directory. Only stream_delta_message needs vLLM, and it imports it when called, which
+keeps the parsers testable on their own.
+"""
+import ast
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# deeper nesting than this in an argument value is rejected instead of recursing on it
+MAX_NESTING = 64
+
+_CLOSING = {")": "(", "]": "[", "}": "{"}
+
+# escapes that decode to a fixed string; anything else (\x, \u, octal, ...) is decoded
+# when the value is complete instead of while it streams
+PYTHON_ESCAPES = {
+    "\\": "\\", "'": "'", '"': '"', "n": "\n", "t": "\t", "r": "\r",
+    "a": "\a", "b": "\b", "f": "\f", "v": "\v", "\n": "",
+}
+JSON_ESCAPES = {"\\": "\\", '"': '"', "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class ToolCallSyntaxError(Exception):
+    pass
+
+
+@dataclass
+class ToolCallDelta:
+    index: int
+    # only set on the first delta of a call
+    name: Optional[str] = None
+    arguments: str = ""
+
+
+@dataclass
+class ParsedToolCall:
+    name: str
+    arguments: Dict[str, Any] = field(default_factory=dict)
+    complete: bool = False
+
+    @property
+    def arguments_json(self) -> str:
+        return json.dumps(self.arguments, ensure_ascii=False)
+
+
+def _is_identifier_start(char: str) -> bool:
+    return char.isalpha() or char == "_"
+
+
+def _is_identifier_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+def _json_string_body(text: str) -> str:
+    return json.dumps(text, ensure_ascii=False)[1:-1]
+
+
+class IncrementalToolCallParser:
+    """
+    Base for parsers that turn generated text into tool call deltas as it streams.
+
+    Subclasses implement _feed_char. Arguments of a call are streamed as JSON
+    fragments whose concatenation is exactly ParsedToolCall.arguments_json: the
+    opening brace and each key/value pair are emitted as soon as the value is
+    complete, and the closing brace when the call ends. String values are streamed
+    while they are still being generated.
+
+    Text that is not part of a tool call is collected with _emit_content and
+    handed out by take_content.
+    """
+
+    def __init__(self):
+        self.tool_calls: List[ParsedToolCall] = []
+        self.failed = False
+        self.error: Optional[str] = None
+        self.done = False
+        # how much of the full generated text has been fed, for feed_text
+        self.cursor = 0
+        # index of the character being parsed within the full generated text
+        self.position = 0
+        # where the text not streamed as content starts, handed over as content on failure
+        self.withheld_from = 0
+        self.value: Optional[PythonValueScanner] = None
+        self._deltas: List[ToolCallDelta] = []
+        self._fragments: List[List[str]] = []
+        self._content: List[str] = []
+        self._streamed_string: Optional[List[str]] = None
+
+    def feed(self, text: str) -> List[ToolCallDelta]:
+        """Parse the next piece of generated text, returning the tool call deltas it completes"""
+        if self.failed:
+            return []
+        self._deltas = []
+        self._fragments = []
+        try:
+            for char in text:
+                self._feed_char(char)
+                self.position += 1
+            if self._streamed_string is not None:
+                self._stream_string_argument()
+        except (ToolCallSyntaxError, RecursionError, MemoryError) as e:
+            self.failed = True
+            self.error = str(e) or type(e).__name__
+            return []
+        for delta, fragments in zip(self._deltas, self._fragments):
+            delta.arguments = "".join(fragments)
+        return self._deltas
+
+    def feed_text(self, current_text: str) -> List[ToolCallDelta]:
+        """Parse whatever of the full generated text has not been seen yet"""
+        new_text = current_text[self.cursor:]
+        self.cursor = len(current_text)
+        return self.feed(new_text)
+
+    def take_content(self) -> str:
+        """Text outside of tool calls parsed since the last call"""
+        content = "".join(self._content)
+        self._content = []
+        return content
+
+    def finish(self) -> bool:
+        """Mark the end of generation; returns whether the whole output was valid tool calls"""
+        if not self.failed and not self.done:
+            self.failed = True
+            self.error = "output ended inside a tool call"
+        return not self.failed
+
+    def _feed_char(self, char: str):
+        raise NotImplementedError
+
+    def _fail(self, message: str):
+        raise ToolCallSyntaxError(message)
+
+    def _emit_content(self, text: str):
+        self._content.append(text)
+
+    def _open_call(self, name: str):
+        self.tool_calls.append(ParsedToolCall(name=name))
+        self._deltas.append(ToolCallDelta(index=len(self.tool_calls) - 1, name=name))
+        self._fragments.append([])
+
+    def _emit_arguments(self, text: str):
+        index = len(self.tool_calls) - 1
+        if not self._deltas or self._deltas[-1].index != index:
+            self._deltas.append(ToolCallDelta(index=index))
+            self._fragments.append([])
+        self._fragments[-1].append(text)
+
+    def _argument_prefix(self, key: str) -> str:
+        call = self.tool_calls[-1]
+        if key in call.arguments:
+            self._fail(f"duplicate argument {key} of {call.name}")
+        prefix = ", " if call.arguments else "{"
+        return f"{prefix}{json.dumps(key, ensure_ascii=False)}: "
+
+    def _add_argument(self, key: str, value: Any):
+        call = self.tool_calls[-1]
+        try:
+            encoded = json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError):
+            self._fail(f"argument {key} of {call.name} is not JSON serializable")
+        self._emit_arguments(self._argument_prefix(key) + encoded)
+        call.arguments[key] = value
+
+    def _start_string_argument(self, key: str):
+        self._emit_arguments(self._argument_prefix(key) + '"')
+        self._streamed_string = []
+
+    def _stream_string_argument(self):
+        decoded = self.value.decoded
+        if decoded:
+            text = "".join(decoded)
+            decoded.clear()
+            self._streamed_string.append(text)
+            self._emit_arguments(_json_string_body(text))
+
+    def _finish_string_argument(self, key: str, value: Any):
+        self._stream_string_argument()
+        streamed = "".join(self._streamed_string)
+        self._streamed_string = None
+        # e.g. 'a' 'b' is fine, but 'a' * 2 is not a string we can keep streaming
+        if not isinstance(value, str) or not value.startswith(streamed):
+            self._fail(f"argument {key} of {self.tool_calls[-1].name} is not the string it started as")
+        self._emit_arguments(_json_string_body(value[len(streamed):]) + '"')
+        self.tool_calls[-1].arguments[key] = value
+
+    def _feed_argument_value(self, key: str, char: str) -> bool:
+        """Feed a character of the value of argument key; returns False when the character ends it"""
+        scanner = self.value
+        if scanner.feed(char):
+            if self._streamed_string is None and scanner.string_state in ("streaming", "held"):
+                self._start_string_argument(key)
+            return True
+        value = scanner.value()
+        if self._streamed_string is not None:
+            self._finish_string_argument(key, value)
+        else:
+            self._add_argument(key, value)
+        return False
+
+    def _close_call(self):
+        call = self.tool_calls[-1]
+        call.complete = True
+        self._emit_arguments("}" if call.arguments else "{}")
+
+
+class PythonValueScanner:
+    """
+    Collects the source of one Python literal, tracking brackets and quotes so the end
+    of the value is found in a single pass. The literal is evaluated once it is complete.
+
+    When the value starts with a string literal, its decoded characters are collected in
+    decoded as they arrive so they can be streamed before the value is complete.
+    """
+    QUOTES = "'\""
+    ESCAPES = PYTHON_ESCAPES
+
+    def __init__(self, evaluate: Optional[Callable[[str], Any]] = None):
+        self.chars: List[str] = []
+        self.stack: List[str] = []
+        self.quote: Optional[str] = None
+        self.escaped = False
+        if evaluate is not None:
+            self.evaluate = evaluate
+        # undecided until the first character, then streaming while the leading string
+        # literal can be decoded as it arrives, held after it, and none for other values
+        self.string_state = "undecided"
+        self.decoded: List[str] = []
+
+    def feed(self, char: str) -> bool:
+        """Add a character; returns False (without adding it) when it ends the value at top level"""
+        if self.quote is not None:
+            self.chars.append(char)
+            if self.escaped:
+                self.escaped = False
+                if self.string_state == "streaming":
+                    decoded = self.ESCAPES.get(char)
+                    if decoded is None:
+                        self.string_state = "held"
+                    else:
+                        self.decoded.append(decoded)
+            elif char == "\\":
+                self.escaped = True
+            elif char == self.quote:
+                self.quote = None
+                if self.string_state == "streaming":
+                    self.string_state = "held"
+            elif self.string_state == "streaming":
+                self.decoded.append(char)
+            return True
+        if self.string_state == "undecided" and not char.isspace():
+            self.string_state = "streaming" if char in self.QUOTES else "none"
+        if char in self.QUOTES:
+            self.quote = char
+        elif char in "([{":
+            if len(self.stack) >= MAX_NESTING:
+                raise ToolCallSyntaxError("argument value is nested too deeply")
+            self.stack.append(char)
+        elif char in _CLOSING:
+            if not self.stack:
+                return False
+            if self.stack.pop() != _CLOSING[char]:
+                raise ToolCallSyntaxError("mismatched brackets in argument value")
+        elif char == "," and not self.stack:
+            return False
+        self.chars.append(char)
+        return True
+
+    @staticmethod
+    def evaluate(source: str) -> Any:
+        return ast.literal_eval(source)
+
+    def value(self) -> Any:
+        source = "".join(self.chars).strip()
+        if not source:
+            raise ToolCallSyntaxError("missing argument value")
+        try:
+            return self.evaluate(source)
+        except (ValueError, SyntaxError, TypeError) as e:
+            raise ToolCallSyntaxError(f"argument value is not a literal: {e}")
+        except Exception as e:
+            # custom evaluators walk the AST themselves and raise whatever they like
+            raise ToolCallSyntaxError(f"unsupported argument value: {e}")
+
+
+class JSONValueScanner(PythonValueScanner):
+    """Collects the source of one JSON value the same way"""
+    QUOTES = '"'
+    ESCAPES = JSON_ESCAPES
+
+    @staticmethod
+    def evaluate(source: str) -> Any:
+        return json.loads(source)
+
+    def value(self) -> Any:
+        try:
+            return super().value()
+        except json.JSONDecodeError as e:
+            raise ToolCallSyntaxError(f"argument value is not valid JSON: {e}")
+
+
+class MarkerMatcher:
+    """
+    Finds a fixed marker such as a special token in streamed text, holding back only a
+    partial match at the end of what has been seen instead of re-scanning.
+    """
+
+    def __init__(self, marker: str):
+        self.marker = marker
+        self.matched = 0
+
+    def feed(self, char: str) -> Tuple[str, bool]:
+        """Add a character; returns the text that is certainly not part of the marker and whether it completed"""
+        if char == self.marker[self.matched]:
+            self.matched += 1
+            if self.matched == len(self.marker):
+                self.matched = 0
+                return "", True
+            return "", False
+        if not self.matched:
+            return char, False
+        # keep the longest tail of the held text that could still start the marker
+        held = self.marker[:self.matched] + char
+        for start in range(1, len(held) + 1):
+            if self.marker.startswith(held[start:]):
+                self.matched = len(held) - start
+                return held[:start], False
+        return held, False
+
+    def pending(self) -> str:
+        return self.marker[:self.matched]
+
+
+class PythonicToolCallParser(IncrementalToolCallParser):
+    """
+    Parses a Python list of calls with keyword arguments, e.g.
+    [get_weather(city='Paris', days=3), get_time(tz="CET")]
+
+    Subclasses change what surrounds the calls by overriding _feed_outside_call,
+    which sees the characters in the start, expect_call and after_call states.
+    """
+    # whether function names may be dotted, like module.function
+    dotted_names = False
+
+    def __init__(self, evaluate: Optional[Callable[[str], Any]] = None):
+        super().__init__()
+        self.state = "start"
+        self.name: List[str] = []
+        self.argument = ""
+        self.evaluate = evaluate
+
+    def _feed_char(self, char: str):
+        state = self.state
+        if state == "value":
+            if self._feed_argument_value(self.argument, char):
+                return
+            if char not in ",)":
+                self._fail(f"unexpected {char!r} after argument {self.argument}")
+            if char == ",":
+                self.state = "expect_argument"
+            else:
+                self._close_call()
+                self.state = "after_call"
+            return
+
+        if state in ("name", "argument_name"):
+            if _is_identifier_char(char) or (char == "." and state == "name" and self.dotted_names):
+                self.name.append(char)
+                return
+            state = self.state = "after_" + state
+        if char.isspace() and state in ("after_name", "expect_argument", "after_argument_name"):
+            return
+
+        if state == "after_name":
+            if char != "(":
+                self._fail(f"expected '(' after {''.join(self.name)}, got {char!r}")
+            if self.name[-1] == ".":
+                self._fail(f"invalid function name {''.join(self.name)}")
+            self._open_call("".join(self.name))
+            self.state = "expect_argument"
+        elif state == "expect_argument":
+            if char == ")":
+                self._close_call()
+                self.state = "after_call"
+            elif _is_identifier_start(char):
+                self.name = [char]
+                self.state = "argument_name"
+            else:
+                self._fail(f"expected a keyword argument, got {char!r}")
+        elif state == "after_argument_name":
+            if char != "=":
+                self._fail(f"expected '=' after {''.join(self.name)}, got {char!r}")
+            self.argument = "".join(self.name)
+            self.value = PythonValueScanner(self.evaluate)
+            self.state = "value"
+        else:
+            self._feed_outside_call(state, char)
+
+    def _start_call(self, char: str):
+        if not _is_identifier_start(char):
+            self._fail(f"expected a function name, got {char!r}")
+        self.name = [char]
+        self.state = "name"
+
+    def _feed_outside_call(self, state: str, char: str):
+        if char.isspace():
+            return
+        if state == "start":
+            if char != "[":
+                self._fail("tool calls must be a list")
+            self.state = "expect_call"
+        elif state == "expect_call":
+            if char == "]" and self.tool_calls:
+                self.state = "done"
+                self.done = True
+            else:
+                self._start_call(char)
+        elif state == "after_call":
+            if char == ",":
+                self.state = "expect_call"
+            elif char == "]":
+                self.state = "done"
+                self.done = True
+            else:
+                self._fail(f"expected ',' or ']' after a call, got {char!r}")
+        elif state == "done":
+            self._fail("text after the tool call list")
+
+
+class MiniCPMToolCallParser(PythonicToolCallParser):
+    """
+    Parses MiniCPM3 output: an optional <|thought_start|>...<|thought_end|> section, then
+    text with blocks of calls between <|tool_call_start|> and <|tool_call_end|>. A block
+    holds calls one per line, optionally fenced as ```python, with dotted names, e.g.
+
+        <|tool_call_start|>```python
+        weather.get(city='Paris')
+        get_time(tz=CET)
+        ```<|tool_call_end|>
+
+    Thoughts are dropped and the text around the blocks is content. Argument values are
+    evaluated with evaluate, which the plugin sets to the looser AST resolver MiniCPM
+    relies on (bare names are strings there).
+    """
+    THOUGHT_START = "<|thought_start|>"
+    THOUGHT_END = "<|thought_end|>"
+    TOOL_CALL_START = "<|tool_call_start|>"
+    TOOL_CALL_END = "<|tool_call_end|>"
+    dotted_names = True
+
+    def __init__(self, evaluate: Optional[Callable[[str], Any]] = None):
+        super().__init__(evaluate)
+        self.state = "thought_start"
+        self.marker = MarkerMatcher(self.THOUGHT_START)
+
+    def finish(self) -> bool:
+        if not self.failed and self.state not in ("thought_start", "thought", "text"):
+            self.failed = True
+            self.error = "output ended inside a tool call block"
+        if not self.failed:
+            self._emit_content(self.marker.pending())
+            self.marker.matched = 0
+        return not self.failed
+
+    def _enter_text(self):
+        self.state = "text"
+        self.marker = MarkerMatcher(self.TOOL_CALL_START)
+
+    def _feed_outside_call(self, state: str, char: str):
+        if state == "text":
+            text, found = self.marker.feed(char)
+            if text:
+                self._emit_content(text)
+            if found:
+                self.withheld_from = self.position - len(self.TOOL_CALL_START) + 1
+                self.state = "block_start"
+        elif state == "thought_start":
+            text, found = self.marker.feed(char)
+            if found:
+                self.state = "thought"
+                self.marker = MarkerMatcher(self.THOUGHT_END)
+            elif text:
+                # no thought section, so this is the start of the text
+                self._enter_text()
+                for released in text:
+                    self._feed_outside_call("text", released)
+        elif state == "thought":
+            if self.marker.feed(char)[1]:
+                self._enter_text()
+        elif state == "end_marker":
+            text, found = self.marker.feed(char)
+            if text:
+                self._fail(f"expected {self.TOOL_CALL_END}")
+            if found:
+                self._enter_text()
+        elif state == "fence_open":
+            # the language tag after the opening backticks runs to the end of the line
+            if char == "\n":
+                self.state = "expect_call"
+        elif state == "block_start" and char == "`":
+            self.state = "fence_open"
+        elif char.isspace() or char == ";":
+            if state == "after_call":
+                self.state = "expect_call"
+        elif char == "`":
+            self.state = "fence_close"
+        elif char == "<":
+            self.marker = MarkerMatcher(self.TOOL_CALL_END)
+            self.marker.feed(char)
+            self.state = "end_marker"
+        elif state in ("block_start", "expect_call"):
+            self._start_call(char)
+        else:
+            self._fail(f"unexpected {char!r} after a call")
+
+
+class Llama3XMLToolCallParser(IncrementalToolCallParser):
+    """
+    Parses calls in the Llama 3.1 / functionary format, with JSON arguments, between text:
+
+        Let me check. <function=get_weather>{"city": "Paris"}</function>
+    """
+    FUNCTION_START = "<function="
+    FUNCTION_END = "</function>"
+
+    def __init__(self):
+        super().__init__()
+        self.state = "text"
+        self.marker = MarkerMatcher(self.FUNCTION_START)
+        self.name: List[str] = []
+        self.key: List[str] = []
+        self.argument = ""
+        self.escaped = False
+
+    def finish(self) -> bool:
+        if not self.failed and self.state != "text":
+            self.failed = True
+            self.error = "output ended inside a tool call"
+        if not self.failed:
+            self._emit_content(self.marker.pending())
+            self.marker.matched = 0
+        return not self.failed
+
+    def _feed_char(self, char: str):
+        state = self.state
+        if state == "text":
+            text, found = self.marker.feed(char)
+            if text:
+                self._emit_content(text)
+            if found:
+                self.withheld_from = self.position - len(self.FUNCTION_START) + 1
+                self.name = []
+                self.state = "name"
+        elif state == "value":
+            if self._feed_argument_value(self.argument, char):
+                return
+            if char == ",":
+                self.state = "expect_key"
+            elif char == "}":
+                self._close_call()
+                self.state = "expect_end"
+            else:
+                self._fail(f"unexpected {char!r} after an argument value")
+        elif state == "key":
+            self.key.append(char)
+            if self.escaped:
+                self.escaped = False
+            elif char == "\\":
+                self.escaped = True
+            elif char == '"':
+                self.state = "after_key"
+        elif state == "name":
+            if char != ">":
+                self.name.append(char)
+                return
+            name = "".join(self.name).strip()
+            if not name:
+                self._fail("missing function name")
+            self._open_call(name)
+            self.state = "expect_object"
+        elif state == "end_marker":
+            text, found = self.marker.feed(char)
+            if text:
+                self._fail(f"expected {self.FUNCTION_END}")
+            if found:
+                self.state = "text"
+                self.marker = MarkerMatcher(self.FUNCTION_START)
+        elif char.isspace():
+            return
+        elif state == "expect_object":
+            if char != "{":
+                self._fail(f"arguments of {self.tool_calls[-1].name} must be a JSON object")
+            self.state = "expect_key"
+        elif state == "expect_key":
+            if char == "}" and not self.tool_calls[-1].arguments:
+                self._close_call()
+                self.state = "expect_end"
+            elif char == '"':
+                self.key = [char]
+                self.state = "key"
+            else:
+                self._fail(f"expected an argument name, got {char!r}")
+        elif state == "after_key":
+            if char != ":":
+                self._fail(f"expected ':' after argument name, got {char!r}")
+            self.argument = json.loads("".join(self.key))
+            self.value = JSONValueScanner()
+            self.state = "value"
+        elif state == "expect_end":
+            if char != "<":
+                self._fail(f"expected {self.FUNCTION_END}, got {char!r}")
+            self.marker = MarkerMatcher(self.FUNCTION_END)
+            self.marker.feed(char)
+            self.state = "end_marker"
+
+
+def stream_delta_message(tool_parser, parser: IncrementalToolCallParser, current_text: str):
+    """
+    Feed the unseen part of current_text to the incremental parser and turn its content
+    and tool call deltas into a vLLM DeltaMessage, keeping the state serving_chat.py
+    inspects in sync. When parsing fails before any tool call was streamed, the text is
+    handed over as content and tool_parser.streaming_content is set so the plugin
+    streams the rest as content too.
+    """
+    from vllm.entrypoints.openai.protocol import DeltaMessage
+
+    deltas = parser.feed_text(current_text)
+    content = parser.take_content()
+    if parser.failed:
+        if not parser.tool_calls:
+            # nothing was streamed as a tool call yet, so hand the text over as content
+            tool_parser.streaming_content = True
+            return DeltaMessage(content=content + current_text[parser.withheld_from:])
+        return DeltaMessage(content=content) if content else None
+
+    tool_deltas = [_to_delta_tool_call(tool_parser, delta) for delta in deltas]
+    # serving_chat.py compares prev_tool_call_arr with streamed_args_for_tool
+    # when the stream finishes and sends whatever arguments were not streamed,
+    # and sets finish_reason to tool_calls when prev_tool_call_arr is not empty.
+    tool_parser.prev_tool_call_arr = [{
+        "name": call.name,
+        "arguments": call.arguments
+    } for call in parser.tool_calls]
+    tool_parser.current_tool_id = len(parser.tool_calls) - 1
+
+    if tool_deltas or content:
+        return DeltaMessage(content=content or None, tool_calls=tool_deltas)
+    if parser.done:
+        # Return an empty DeltaMessage once the tool calls are all done
+        # so that finish_reason gets set.
+        return DeltaMessage(content="")
+    return None
+
+
+def _to_delta_tool_call(tool_parser, delta: ToolCallDelta):
+    from vllm.entrypoints.openai.protocol import DeltaFunctionCall, DeltaToolCall
+    from vllm.utils import random_uuid
+
+    streamed: List[str] = tool_parser.streamed_args_for_tool
+    while len(streamed) <= delta.index:
+        streamed.append("")
+    streamed[delta.index] += delta.arguments
+    if delta.name is not None:
+        return DeltaToolCall(id=f"chatcmpl-tool-{random_uuid()}",
+                             type="function",
+                             index=delta.index,
+                             function=DeltaFunctionCall(
+                                 name=delta.name,
+                                 arguments=delta.arguments))
+    return DeltaToolCall(index=delta.index,
+                         function=DeltaFunctionCall(arguments=delta.arguments))
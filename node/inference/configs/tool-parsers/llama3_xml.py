@@ -1,9 +1,8 @@
-import json
-import re
-from typing import Any, Sequence, Tuple, Union
+import os
+import sys
+from typing import Sequence, Union
 from vllm.entrypoints.openai.protocol import (ChatCompletionRequest,
-                                              DeltaFunctionCall, DeltaMessage,
-                                              DeltaToolCall,
+                                              DeltaMessage,
                                               ExtractedToolCallInformation,
                                               FunctionCall, ToolCall)
 from vllm.entrypoints.openai.tool_parsers.abstract_tool_parser import (
@@ -11,24 +10,37 @@ from vllm.entrypoints.openai.tool_parsers.abstract_tool_parser import (
 from vllm.logger import init_logger
 from vllm.transformers_utils.tokenizer import AnyTokenizer
 
+# vLLM loads plugins by file path, so the shared parser module is imported from next to this file
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from incremental_tool_parser import (Llama3XMLToolCallParser,  # noqa: E402
+                                     stream_delta_message)
+
 logger = init_logger(__name__)
 
 
 @ToolParserManager.register_module("functionary_31")
 class Functionary32ToolParser(ToolParser):
+    """
+    Tool call parser for <function=name>{...}</function> calls with JSON arguments.
+
+    Streaming parses each delta once, keeping state between deltas: text outside
+    the calls is streamed as content and each argument as it is generated.
+    """
 
     def __init__(self, tokenizer: AnyTokenizer):
         super().__init__(tokenizer)
-        logger.warn("A streaming tool parser has not been implemented for functionary 3.2. Expect regular text "
-                    "completions for streaming requests.")
+        self.parser = Llama3XMLToolCallParser()
+        self.streaming_content = False
 
     def extract_tool_calls(
             self, model_output: str,
             request: ChatCompletionRequest) -> ExtractedToolCallInformation:
 
-        # if one or more function calls are present, handle them
-        matches = re.findall(r"<function=([^>]+)>(.*?)</function>", model_output)
-        if len(matches) == 0:
+        parser = Llama3XMLToolCallParser()
+        parser.feed(model_output)
+        if not parser.finish() or not parser.tool_calls:
+            if parser.failed:
+                logger.debug("Treating output as text: %s", parser.error)
             return ExtractedToolCallInformation(
                 tools_called=False,
                 tool_calls=[],
@@ -40,14 +52,14 @@ class Functionary32ToolParser(ToolParser):
                 ToolCall(
                     type="function",
                     function=FunctionCall(
-                        name=match[0],
-                        arguments=match[1]
+                        name=call.name,
+                        arguments=call.arguments_json
                     )
-                ) for match in matches
-            ]
+                ) for call in parser.tool_calls
+            ],
+            content=parser.take_content().strip() or None
         )
 
-
     def extract_tool_calls_streaming(
             self,
             previous_text: str,
@@ -58,4 +70,10 @@ class Functionary32ToolParser(ToolParser):
             delta_token_ids: Sequence[int],
             request: ChatCompletionRequest,
     ) -> Union[DeltaMessage, None]:
-        return DeltaMessage(content=delta_text)
\ No newline at end of file
+        if self.streaming_content:
+            return DeltaMessage(content=delta_text)
+        failed = self.parser.failed
+        delta = stream_delta_message(self, self.parser, current_text)
+        if self.parser.failed and not failed:
+            logger.debug("Stopped parsing tool calls: %s", self.parser.error)
+        return delta
@@ -1,21 +1,26 @@
 import ast
 import json
 import keyword
-import re
+import os
+import sys
 import traceback
-from typing import Dict, List, Sequence, Union
+from typing import Any, List, Sequence, Union
 
 from transformers import PreTrainedTokenizerBase
 
 from vllm.entrypoints.openai.protocol import (ChatCompletionRequest,
-                                              DeltaFunctionCall, DeltaMessage,
-                                              DeltaToolCall,
+                                              DeltaMessage,
                                               ExtractedToolCallInformation,
                                               FunctionCall, ToolCall)
 from vllm.entrypoints.openai.tool_parsers.abstract_tool_parser import (
     ToolParser, ToolParserManager)
 from vllm.logger import init_logger
 
+# vLLM loads plugins by file path, so the shared parser module is imported from next to this file
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from incremental_tool_parser import (MiniCPMToolCallParser,  # noqa: E402
+                                     stream_delta_message)
+
 logger = init_logger(__name__)
 
 
@@ -26,6 +31,10 @@ class MiniCPMToolParser(ToolParser):
     examples/tool_chat_template_minicpm3.jinja template.
 
     Used when --enable-auto-tool-choice --tool-call-parser minicpm are all set
+
+    Streaming parses each delta once, keeping state between deltas: text around
+    the tool call block is streamed as content and each argument as it is
+    generated.
     """
 
     def __init__(self, tokenizer: PreTrainedTokenizerBase):
@@ -35,6 +44,8 @@ class MiniCPMToolParser(ToolParser):
         self.tool_call_start_token = "<|tool_call_start|>"
         self.tool_call_end_token = "<|tool_call_end|>"
         self.stop_token_ids = [2, 73440]
+        self.parser = MiniCPMToolCallParser(evaluate=resolve_source)
+        self.streaming_content = False
 
     def extract_tool_calls(
             self, model_output: str,
@@ -82,68 +93,13 @@ class MiniCPMToolParser(ToolParser):
         request: ChatCompletionRequest,
     ) -> Union[DeltaMessage, None]:
         # if no tools are provided, we don't need to parse tool calls
-        if not request.tools:
+        if not request.tools or self.streaming_content:
             return DeltaMessage(content=delta_text)
-        if self.thought_end_token not in current_text:
-            return None
-        useful_text = current_text.split(self.thought_end_token)[1]
-        if (current_token_ids[-1]
-                in self.stop_token_ids):  # case 3: stream generation ended
-            msg = fc2dict(current_text)
-            if ("tool_calls" in msg and msg["tool_calls"] is not None
-                    and len(msg["tool_calls"]) > 0):
-                self.prev_tool_call_arr = msg["tool_calls"]
-                self.streamed_args_for_tool = ["" for tc in msg["tool_calls"]]
-                delta_message = DeltaMessage(
-                    role="assistant",
-                    content=msg.get("content", None),
-                )
-                return delta_message
-            else:
-                return DeltaMessage(content=msg.get("content", None))
-        elif (self.tool_call_start_token in useful_text
-              and self.tool_call_end_token
-              in useful_text):  # case 2: tool call ended
-            return None
-        elif (self.tool_call_start_token
-              in useful_text):  # case 1: tool call started
-            # Extract function name and arguments, handling nested parentheses
-            pattern = r"(\w+)\(((?:[^()]*|\([^()]*\))*)\)"
-            matches = re.finditer(pattern, useful_text)
-            tool_calls: List[Dict] = []
-            delta = None
-            for idx, match in enumerate(matches):
-                if self.current_tool_id < idx:
-                    self.current_tool_id = idx
-                    func_name = match.group(1)
-                    func_args = match.group(2)
-                    tool_call_string = f"{func_name}({func_args})\n"
-
-                    parsed = ast.parse(tool_call_string)
-                    for elem in parsed.body:
-                        assert isinstance(elem.value, ast.Call)  # type: ignore
-                        calls = resolve_ast_call(elem.value)  # type: ignore
-
-                        for func_name, func_args in calls.items():
-                            this_call = {
-                                "name":
-                                func_name,
-                                "arguments":
-                                json.dumps(func_args, ensure_ascii=False),
-                            }
-                        delta = DeltaMessage(tool_calls=[
-                            DeltaToolCall(
-                                index=self.current_tool_id,
-                                function=DeltaFunctionCall(
-                                    **this_call).model_dump(exclude_none=True),
-                            )
-                        ])
-            self.prev_tool_call_arr = tool_calls
-            self.streamed_args_for_tool = ["" for x in tool_calls]
-            self.current_tool_name_sent = True
-            return delta
-        else:
-            return None
+        failed = self.parser.failed
+        delta = stream_delta_message(self, self.parser, current_text)
+        if self.parser.failed and not failed:
+            logger.debug("Stopped parsing tool calls: %s", self.parser.error)
+        return delta
 
 
 def fc2dict(
@@ -217,6 +173,11 @@ def fc2dict(
         }
 
 
+def resolve_source(source: str) -> Any:
+    """Evaluate one argument value the way fc2dict does, for the streaming parser"""
+    return resolve_ast_by_type(ast.parse(source, mode="eval").body)
+
+
 # from ShishirPatil/gorilla
 def resolve_ast_call(elem):
     # Handle nested attributes for deeply nested module paths
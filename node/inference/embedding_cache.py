@@ -0,0 +1,200 @@
+import asyncio
+from collections import OrderedDict
+from dotenv import load_dotenv
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true") == "true"
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "20000"))
+# persist embeddings in the local pgvector database so they survive restarts and are shared between servers
+EMBEDDING_CACHE_PERSIST = os.getenv("EMBEDDING_CACHE_PERSIST", "true") == "true"
+EMBEDDING_CACHE_TABLE = "embedding_cache"
+# after a database error the persistent tier is skipped for this long instead of slowing every request
+DB_RETRY_INTERVAL = 60
+
+# (embedding, estimated prompt tokens of the input)
+CacheEntry = Tuple[List[float], int]
+
+
+def embedding_cache_key(model: str, text: str, dimensions: Optional[int] = None) -> str:
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{model}:{dimensions or ''}:{digest}"
+
+
+class PgEmbeddingStore:
+    """Persistent embedding cache tier in the local pgvector database (blocking, run in a thread).
+
+    The table is the EmbeddingCacheEntry model, created by init_db.
+    """
+
+    def __init__(self):
+        # imported lazily so the inference router does not need the database unless persistence is on
+        from node.storage.db.db import LocalDBPostgres
+        self.db = LocalDBPostgres()
+
+    def get_many(self, keys: List[str]) -> Dict[str, CacheEntry]:
+        from sqlalchemy import bindparam, text
+        query = text(
+            f"SELECT key, embedding::text, prompt_tokens FROM {EMBEDDING_CACHE_TABLE} WHERE key IN :keys"
+        ).bindparams(bindparam("keys", expanding=True))
+        with self.db.session() as db:
+            rows = db.execute(query, {"keys": keys}).fetchall()
+        return {row[0]: (json.loads(row[1]), row[2]) for row in rows}
+
+    def put_many(self, rows: List[Dict]):
+        from sqlalchemy import text
+        query = text(f"""
+            INSERT INTO {EMBEDDING_CACHE_TABLE} (key, model, dimensions, embedding, prompt_tokens)
+            VALUES (:key, :model, :dimensions, CAST(:embedding AS vector), :prompt_tokens)
+            ON CONFLICT (key) DO NOTHING
+        """)
+        with self.db.session() as db:
+            db.execute(query, [{**row, "embedding": json.dumps(row["embedding"])} for row in rows])
+
+
+class EmbeddingCache:
+    """Two-tier (in-memory LRU + pgvector) cache of embeddings keyed by (model, dimensions, input hash).
+
+    ``embed`` collapses duplicate inputs within a request, only sends inputs missing from both
+    tiers upstream, and reassembles an OpenAI-style response in the original input order.
+    """
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE, store: Optional[PgEmbeddingStore] = None):
+        self.max_entries = max_entries
+        self.store = store
+        self.memory: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.store_disabled_until = 0.0
+        self.stats = {
+            "requests": 0,
+            "inputs": 0,
+            "duplicate_inputs": 0,
+            "memory_hits": 0,
+            "db_hits": 0,
+            "misses": 0,
+            "saved_tokens": 0,
+            "upstream_tokens": 0,
+        }
+
+    def _memory_get(self, key: str) -> Optional[CacheEntry]:
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+        return entry
+
+    def _memory_put(self, key: str, entry: CacheEntry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _store_available(self) -> bool:
+        return self.store is not None and time.monotonic() >= self.store_disabled_until
+
+    async def _store_call(self, func, *args):
+        try:
+            return await asyncio.to_thread(func, *args)
+        except Exception as e:
+            logger.warning(f"Embedding cache database tier unavailable, skipping it for {DB_RETRY_INTERVAL}s: {e}")
+            self.store_disabled_until = time.monotonic() + DB_RETRY_INTERVAL
+            return None
+
+    async def embed(
+        self,
+        model: str,
+        inputs: List[str],
+        fetch: Callable[[List[str]], Awaitable[Dict]],
+        dimensions: Optional[int] = None,
+    ) -> Dict:
+        """Embed inputs, calling ``fetch(texts)`` (an upstream /embeddings call returning the parsed body) for misses"""
+        self.stats["requests"] += 1
+        self.stats["inputs"] += len(inputs)
+
+        keys = [embedding_cache_key(model, text, dimensions) for text in inputs]
+        unique: Dict[str, str] = {}
+        for key, text in zip(keys, inputs):
+            unique.setdefault(key, text)
+        self.stats["duplicate_inputs"] += len(keys) - len(unique)
+
+        found: Dict[str, CacheEntry] = {}
+        for key in unique:
+            entry = self._memory_get(key)
+            if entry is not None:
+                found[key] = entry
+        self.stats["memory_hits"] += len(found)
+
+        missing = [key for key in unique if key not in found]
+        if missing and self._store_available():
+            stored = await self._store_call(self.store.get_many, missing) or {}
+            for key, entry in stored.items():
+                self._memory_put(key, entry)
+            found.update(stored)
+            self.stats["db_hits"] += len(stored)
+            missing = [key for key in missing if key not in found]
+
+        self.stats["saved_tokens"] += sum(found[key][1] for key in found)
+        upstream_model = model
+        prompt_tokens = 0
+        if missing:
+            self.stats["misses"] += len(missing)
+            miss_texts = [unique[key] for key in missing]
+            response = await fetch(miss_texts)
+            upstream_model = response.get("model", model)
+            prompt_tokens = (response.get("usage") or {}).get("prompt_tokens", 0) or 0
+            self.stats["upstream_tokens"] += prompt_tokens
+
+            embeddings = [item["embedding"] for item in sorted(response["data"], key=lambda item: item["index"])]
+            if len(embeddings) != len(missing):
+                raise ValueError(f"Expected {len(missing)} embeddings from upstream, got {len(embeddings)}")
+
+            # usage is only reported per request, so attribute tokens to inputs by length
+            total_chars = sum(len(text) for text in miss_texts) or 1
+            new_rows = []
+            for key, text, embedding in zip(missing, miss_texts, embeddings):
+                tokens = round(prompt_tokens * len(text) / total_chars)
+                found[key] = (embedding, tokens)
+                self._memory_put(key, found[key])
+                new_rows.append({
+                    "key": key,
+                    "model": model,
+                    "dimensions": dimensions,
+                    "embedding": embedding,
+                    "prompt_tokens": tokens,
+                })
+            if self._store_available():
+                await self._store_call(self.store.put_many, new_rows)
+
+        return {
+            "object": "list",
+            "data": [
+                {"object": "embedding", "index": i, "embedding": found[key][0]}
+                for i, key in enumerate(keys)
+            ],
+            "model": upstream_model,
+            "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+        }
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        hits = stats["memory_hits"] + stats["db_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_ratio"] = hits / lookups if lookups else 0.0
+        stats["memory_entries"] = len(self.memory)
+        stats["persistent"] = self.store is not None
+        return stats
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(store=PgEmbeddingStore() if EMBEDDING_CACHE_PERSIST else None)
+    return _embedding_cache
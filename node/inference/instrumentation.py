@@ -0,0 +1,139 @@
+from dotenv import load_dotenv
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, Mapping, Optional, Set
+
+from node.inference.admission import CONSUMER_HEADER
+from node.inference.metrics import inference_metrics
+from node.inference.sse import DONE, SSEDecoder, count_delta_tokens
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+# X-Consumer-Id is set by callers, so only this many distinct consumers get their own metric
+# series, later ones and malformed ids are counted as "other"
+INFERENCE_METRICS_MAX_CONSUMERS = int(os.getenv("INFERENCE_METRICS_MAX_CONSUMERS", "100"))
+CONSUMER_LABEL_PATTERN = re.compile(r"[A-Za-z0-9:._@/-]{1,128}")
+
+TOKEN_BUCKETS = (1, 4, 16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+TOKENS_PER_SECOND_BUCKETS = (1, 5, 10, 20, 40, 60, 80, 120, 160, 240, 320, 640, 1280)
+LABELS = ("model", "consumer")
+
+ttft_histogram = inference_metrics.histogram(
+    "inference_time_to_first_token_seconds", "Time from the request reaching the proxy to the first streamed token", label_names=LABELS
+)
+inter_token_histogram = inference_metrics.histogram(
+    "inference_inter_token_seconds", "Time between consecutive streamed tokens", label_names=LABELS
+)
+e2e_histogram = inference_metrics.histogram(
+    "inference_request_seconds", "Time from the request reaching the proxy to the end of the response", label_names=LABELS
+)
+prompt_tokens_histogram = inference_metrics.histogram(
+    "inference_prompt_tokens", "Prompt tokens per request", TOKEN_BUCKETS, LABELS
+)
+completion_tokens_histogram = inference_metrics.histogram(
+    "inference_completion_tokens", "Completion tokens per request", TOKEN_BUCKETS, LABELS
+)
+tokens_per_second_histogram = inference_metrics.histogram(
+    "inference_output_tokens_per_second", "Completion tokens per second after the first token", TOKENS_PER_SECOND_BUCKETS, LABELS
+)
+
+
+labelled_consumers: Set[str] = set()
+labelled_consumers_lock = threading.Lock()
+
+
+def request_consumer(headers: Mapping[str, str]) -> str:
+    """The consumer label of a request: its X-Consumer-Id, "anonymous" without one, or "other" past the cap"""
+    consumer = headers.get(CONSUMER_HEADER, "").strip()
+    if not consumer:
+        return "anonymous"
+    if not CONSUMER_LABEL_PATTERN.fullmatch(consumer):
+        return "other"
+    with labelled_consumers_lock:
+        if consumer in labelled_consumers:
+            return consumer
+        if len(labelled_consumers) >= INFERENCE_METRICS_MAX_CONSUMERS:
+            return "other"
+        labelled_consumers.add(consumer)
+    return consumer
+
+
+def record_usage(model: str, consumer: str, usage: Optional[Dict], start: float):
+    """Record a finished non-streaming request from its usage block"""
+    e2e_histogram.observe(time.monotonic() - start, model=model, consumer=consumer)
+    if not usage:
+        return
+    if usage.get("prompt_tokens") is not None:
+        prompt_tokens_histogram.observe(usage["prompt_tokens"], model=model, consumer=consumer)
+    if usage.get("completion_tokens") is not None:
+        completion_tokens_histogram.observe(usage["completion_tokens"], model=model, consumer=consumer)
+
+
+class StreamMetrics:
+    """Stream observer recording TTFT, inter-token latency and token counts as SSE chunks pass through.
+
+    Events are decoded as they arrive, only an incomplete trailing line is held back.
+    """
+
+    def __init__(self, model: str, consumer: str, start: float):
+        self.model = model
+        self.consumer = consumer
+        self.start = start
+        self.decoder = SSEDecoder()
+        self.first_token_at: Optional[float] = None
+        self.last_token_at: Optional[float] = None
+        self.tokens = 0
+        self.usage: Optional[Dict] = None
+
+    def feed(self, chunk: bytes):
+        now = time.monotonic()
+        for event in self.decoder.feed(chunk):
+            if event == DONE or not isinstance(event, dict):
+                continue
+            if event.get("usage"):
+                self.usage = event["usage"]
+            tokens = count_delta_tokens(event)
+            if not tokens:
+                continue
+            if self.first_token_at is None:
+                self.first_token_at = now
+                ttft_histogram.observe(now - self.start, model=self.model, consumer=self.consumer)
+            else:
+                inter_token_histogram.observe(now - self.last_token_at, model=self.model, consumer=self.consumer)
+            self.last_token_at = now
+            self.tokens += tokens
+
+    def close(self, completed: bool):
+        if not completed:
+            return
+        usage = self.usage or {}
+        # vLLM streams a token per event, so the event count stands in when the caller didn't ask for usage
+        completion_tokens = usage.get("completion_tokens") or self.tokens
+        record_usage(self.model, self.consumer, {**usage, "completion_tokens": completion_tokens}, self.start)
+        if self.first_token_at is not None and self.last_token_at > self.first_token_at and completion_tokens > 1:
+            rate = (completion_tokens - 1) / (self.last_token_at - self.first_token_at)
+            tokens_per_second_histogram.observe(rate, model=self.model, consumer=self.consumer)
+
+
+def model_summary(model: str) -> Dict:
+    """Latency and token summary of a model across consumers, for the /inference/models response"""
+    return {
+        "time_to_first_token_seconds": ttft_histogram.summary(model=model),
+        "inter_token_seconds": inter_token_histogram.summary(model=model),
+        "request_seconds": e2e_histogram.summary(model=model),
+        "prompt_tokens": prompt_tokens_histogram.summary(model=model),
+        "completion_tokens": completion_tokens_histogram.summary(model=model),
+        "output_tokens_per_second": tokens_per_second_histogram.summary(model=model),
+    }
+
+
+def add_model_summaries(models: Dict) -> Dict:
+    """Add a ``metrics`` summary to each entry of an OpenAI-style model list"""
+    for entry in models.get("data") or []:
+        if isinstance(entry, dict) and entry.get("id"):
+            entry["metrics"] = model_summary(entry["id"])
+    return models
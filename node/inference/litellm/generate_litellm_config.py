@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
+from dataclasses import dataclass
+import json
 import logging
 import os
 from pathlib import Path
+import re
 import sys
 import subprocess
 from typing import Dict, List, Optional
@@ -10,32 +13,47 @@ sys.path.append(str(root_dir))
 
 logger = logging.getLogger(__name__)
 
-LAUNCH_DOCKER = os.getenv("LAUNCH_DOCKER").lower() == "true"
+LAUNCH_DOCKER = (os.getenv("LAUNCH_DOCKER") or "false").lower() == "true"
 LLM_BACKEND = os.getenv("LLM_BACKEND")
 OPENAI_MODELS = os.getenv("OPENAI_MODELS")
 OLLAMA_MODELS = os.getenv("OLLAMA_MODELS")
 VLLM_MODELS = os.getenv("VLLM_MODELS")
+# optional JSON file adding or overriding entries of MODEL_MEMORY_REQUIREMENTS, e.g.
+# {"org/model": {"memory_gib": 40, "tensor_parallel_size": 1}} or {"org/model": {"weights_gib": 15, "kv_kib_per_token": 128}}
+VLLM_MODEL_MANIFEST = os.getenv("VLLM_MODEL_MANIFEST")
+# "pack" co-locates models on as few GPUs as possible, "spread" only shares a GPU once every GPU is in use
+VLLM_GPU_ALLOCATION = os.getenv("VLLM_GPU_ALLOCATION", "pack")
+COMPOSE_DIR = root_dir / "node" / "compose-files" / "vllm-models"
 
-MODEL_DEVICE_REQUIREMENTS = {
-    "NousResearch/Hermes-3-Llama-3.1-8B": 1,
-    "Qwen/Qwen2.5-7B-Instruct": 1,
-    "meta-llama/Llama-3.1-8B-Instruct": 1,
-    "Team-ACE/ToolACE-8B": 1,
-    "ibm-granite/granite-3.1-8b-instruct": 1,
-    "internlm/internlm2_5-7b-chat": 1,
-    "meetkai/functionary-small-v3.1": 1,
-    "jinaai/jina-embeddings-v2-base-en": 1,
-    "katanemo/Arch-Function-7B": 1,
-    "deepseek-ai/DeepSeek-R1-Distill-Qwen-32B": 2,
-    "microsoft/phi-4": 1,
-    "mistralai/Mistral-Small-24B-Instruct-2501": 2,
-    "Qwen/QwQ-32B-Preview": 2,
-    "NousResearch/DeepHermes-3-Llama-3-8B-Preview": 1
+# bf16 weights and the KV cache per token of context (2 * layers * kv_heads * head_dim * 2 bytes)
+MODEL_MEMORY_REQUIREMENTS = {
+    "NousResearch/Hermes-3-Llama-3.1-8B": {"weights_gib": 15, "kv_kib_per_token": 128},
+    "Qwen/Qwen2.5-7B-Instruct": {"weights_gib": 14.2, "kv_kib_per_token": 56},
+    "meta-llama/Llama-3.1-8B-Instruct": {"weights_gib": 15, "kv_kib_per_token": 128},
+    "Team-ACE/ToolACE-8B": {"weights_gib": 15, "kv_kib_per_token": 128},
+    "ibm-granite/granite-3.1-8b-instruct": {"weights_gib": 15.2, "kv_kib_per_token": 160},
+    "internlm/internlm2_5-7b-chat": {"weights_gib": 14.5, "kv_kib_per_token": 128},
+    "meetkai/functionary-small-v3.1": {"weights_gib": 15, "kv_kib_per_token": 128},
+    "jinaai/jina-embeddings-v2-base-en": {"memory_gib": 2},
+    "katanemo/Arch-Function-7B": {"weights_gib": 14.2, "kv_kib_per_token": 56},
+    "deepseek-ai/DeepSeek-R1-Distill-Qwen-32B": {"weights_gib": 61, "kv_kib_per_token": 256},
+    "microsoft/phi-4": {"weights_gib": 27.3, "kv_kib_per_token": 200},
+    "mistralai/Mistral-Small-24B-Instruct-2501": {"weights_gib": 44, "kv_kib_per_token": 160},
+    "Qwen/QwQ-32B-Preview": {"weights_gib": 61, "kv_kib_per_token": 256},
+    "NousResearch/DeepHermes-3-Llama-3-8B-Preview": {"weights_gib": 15, "kv_kib_per_token": 128},
 }
+# CUDA context, activations and CUDA graphs of each vLLM instance on each of its GPUs
+INSTANCE_OVERHEAD_GIB = 3
+# fraction of a GPU handed to vLLM when it has the GPU to itself, or shared by all instances on a GPU
+DEDICATED_GPU_MEMORY_UTILIZATION = 0.98
+SHARED_GPU_MEMORY_UTILIZATION = 0.95
+DEFAULT_MAX_MODEL_LEN = 32768
+# used when nvidia-smi is unavailable
+FALLBACK_GPU_COUNT = 8
+FALLBACK_GPU_MEMORY_GIB = 80
 
 if VLLM_MODELS:
-    VLLM_MODELS = VLLM_MODELS.split(",")
-    VLLM_MODELS = {model.strip(): MODEL_DEVICE_REQUIREMENTS[model.strip()] for model in VLLM_MODELS}
+    VLLM_MODELS = [model.strip() for model in VLLM_MODELS.split(",") if model.strip()]
 
 logger.info(f"LAUNCH_DOCKER: {LAUNCH_DOCKER}")
 logger.info(f"LLM_BACKEND: {LLM_BACKEND}")
@@ -173,56 +191,165 @@ def get_vllm_models() -> List[str]:
     """Get VLLM models from config."""
     if not VLLM_MODELS:
         return []
-    return list(VLLM_MODELS.keys())
+    return list(VLLM_MODELS)
 
-def get_gpu_var_name(model_name: str) -> str:
+def get_gpu_var_name(model_name: str, prefix: str = "GPU_ID") -> str:
     """Generate standardized GPU ID variable name from model name."""
     # Get the part after the last slash
     base_name = model_name.split('/')[-1]
     # Convert to lowercase and replace special chars with underscores
     normalized = base_name.lower().replace('-', '_').replace('.', '_')
-    return f"GPU_ID_{normalized}"
+    return f"{prefix}_{normalized}"
 
-def count_available_gpus() -> int:
-    """Count available GPUs using nvidia-smi."""
+class GPUAllocationError(Exception):
+    pass
+
+@dataclass
+class GPU:
+    index: int
+    memory_gib: float
+
+@dataclass
+class ModelRequirement:
+    model: str
+    memory_gib_per_gpu: float
+    tensor_parallel_size: int = 1
+    # only vLLM takes --gpu-memory-utilization, other servers (e.g. TEI for embeddings) just need the room
+    vllm: bool = True
+
+def get_gpu_inventory() -> List[GPU]:
+    """List GPUs and their memory using nvidia-smi."""
     try:
         result = subprocess.run(
-            ["nvidia-smi", "--query-gpu=index", "--format=csv,noheader"],
+            ["nvidia-smi", "--query-gpu=index,memory.total", "--format=csv,noheader,nounits"],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             check=True,
             text=True
         )
-        gpu_list = [gpu for gpu in result.stdout.strip().split("\n") if gpu.strip()]
-        logger.info(f"Found {len(gpu_list)} GPUs")
-        return len(gpu_list)
+        gpus = []
+        for line in result.stdout.strip().split("\n"):
+            if line.strip():
+                index, memory_mib = line.split(",")
+                gpus.append(GPU(index=int(index), memory_gib=float(memory_mib) / 1024))
+        logger.info(f"Found {len(gpus)} GPUs")
+        return gpus
     except Exception as e:
         logger.error(f"Warning: Could not detect GPUs via nvidia-smi: {e}")
         # Fallback to a default value
-        return 8
-    
-def allocate_gpus(model_map):
+        return [GPU(index=i, memory_gib=FALLBACK_GPU_MEMORY_GIB) for i in range(FALLBACK_GPU_COUNT)]
+
+def parse_compose_args(model: str, compose_dir: Path = COMPOSE_DIR) -> Dict:
+    """Read the serving args of a model from its compose file (without a YAML dependency)."""
+    compose_file = compose_dir / f"{model.split('/')[-1]}.yml"
+    if not compose_file.exists():
+        return {}
+    text = compose_file.read_text()
+    args = {"vllm": '"vllm", "serve"' in text}
+    for flag, key in (("--tensor-parallel-size", "tensor_parallel_size"), ("--max-model-len", "max_model_len")):
+        match = re.search(rf'"{flag}",\s*"(\d+)"', text)
+        if match:
+            args[key] = int(match.group(1))
+    return args
+
+def load_model_requirements(models: List[str], compose_dir: Path = COMPOSE_DIR, manifest: Optional[Dict] = None) -> List[ModelRequirement]:
+    """Per-GPU memory and tensor parallel size of each model, from its compose file and the memory manifest."""
+    if manifest is None:
+        manifest = {}
+        if VLLM_MODEL_MANIFEST:
+            with open(VLLM_MODEL_MANIFEST) as f:
+                manifest = json.load(f)
+    requirements = []
+    for model in models:
+        spec = {**MODEL_MEMORY_REQUIREMENTS.get(model, {}), **manifest.get(model, {})}
+        if not spec:
+            raise GPUAllocationError(f"No memory requirements known for {model}, add it to VLLM_MODEL_MANIFEST")
+        compose_args = parse_compose_args(model, compose_dir)
+        tensor_parallel_size = spec.get("tensor_parallel_size", compose_args.get("tensor_parallel_size", 1))
+        if "memory_gib" in spec:
+            memory_gib = spec["memory_gib"]
+        else:
+            max_model_len = compose_args.get("max_model_len", DEFAULT_MAX_MODEL_LEN)
+            # vLLM refuses to start without room for the KV cache of at least one max-length sequence
+            memory_gib = spec["weights_gib"] + spec["kv_kib_per_token"] * max_model_len / (1024 * 1024)
+        requirements.append(ModelRequirement(
+            model=model,
+            memory_gib_per_gpu=memory_gib / tensor_parallel_size + INSTANCE_OVERHEAD_GIB,
+            tensor_parallel_size=tensor_parallel_size,
+            vllm=compose_args.get("vllm", "memory_gib" not in spec),
+        ))
+    return requirements
+
+def plan_gpu_allocation(requirements: List[ModelRequirement], gpus: List[GPU], strategy: str = VLLM_GPU_ALLOCATION) -> Dict[str, Dict]:
     """
-    Allocate GPUs based on model requirements.
-    Returns a space-separated string of GPU assignments for docker compose.
+    Place models onto GPUs by memory, largest first.
+    "pack" puts each model on the GPUs with the least room that still fits it (best fit decreasing),
+    "spread" on the GPUs with the most room (worst fit), so GPUs are only shared once all are in use.
+    Returns {model: {"gpus": [...], "gpu_memory_utilization": float, or None for non-vLLM servers}}.
     """
-    available_gpus = count_available_gpus()
-    total_required = sum(model_map.values())
+    free = {gpu.index: gpu.memory_gib * SHARED_GPU_MEMORY_UTILIZATION for gpu in gpus}
+    capacity = {gpu.index: gpu.memory_gib for gpu in gpus}
+    tenants: Dict[int, List[ModelRequirement]] = {gpu.index: [] for gpu in gpus}
+    placement: Dict[str, List[int]] = {}
 
-    if total_required > available_gpus:
-        logger.error(
-            f"Error: Insufficient GPUs available. The system has {available_gpus} GPUs, "
-            f"but the selected models require a total of {total_required} GPUs.",
-        )
+    ordered = sorted(requirements, key=lambda r: (r.tensor_parallel_size, r.memory_gib_per_gpu), reverse=True)
+    for requirement in ordered:
+        candidates = [index for index in free if free[index] >= requirement.memory_gib_per_gpu]
+        if len(candidates) < requirement.tensor_parallel_size:
+            raise GPUAllocationError(
+                f"Cannot place {requirement.model}: needs {requirement.tensor_parallel_size} GPU(s) with "
+                f"{requirement.memory_gib_per_gpu:.1f} GiB free, only {len(candidates)} have room"
+            )
+        candidates.sort(key=lambda index: (free[index], index), reverse=strategy == "spread")
+        chosen = sorted(candidates[:requirement.tensor_parallel_size])
+        for index in chosen:
+            free[index] -= requirement.memory_gib_per_gpu
+            tenants[index].append(requirement)
+        placement[requirement.model] = chosen
+
+    plan = {}
+    for requirement in requirements:
+        if not requirement.vllm:
+            plan[requirement.model] = {"gpus": placement[requirement.model], "gpu_memory_utilization": None}
+            continue
+        shares = []
+        for index in placement[requirement.model]:
+            if len(tenants[index]) == 1:
+                shares.append(DEDICATED_GPU_MEMORY_UTILIZATION)
+                continue
+            # hand out the usable memory of a shared GPU in proportion to what each tenant needs,
+            # so the spare room goes to the KV caches; other servers only keep what they need
+            vllm_need = sum(t.memory_gib_per_gpu for t in tenants[index] if t.vllm)
+            other_need = sum(t.memory_gib_per_gpu for t in tenants[index] if not t.vllm)
+            usable = capacity[index] * SHARED_GPU_MEMORY_UTILIZATION - other_need
+            shares.append(usable * requirement.memory_gib_per_gpu / vllm_need / capacity[index])
+        plan[requirement.model] = {
+            "gpus": placement[requirement.model],
+            # tensor parallel ranks get the same budget, so the tightest GPU decides
+            "gpu_memory_utilization": round(min(shares), 2),
+        }
+    return plan
+
+def allocate_gpus(models: List[str], gpus: Optional[List[GPU]] = None, compose_dir: Path = COMPOSE_DIR, manifest: Optional[Dict] = None) -> str:
+    """
+    Allocate GPUs based on model memory requirements.
+    Returns a space-separated string of GPU and memory utilization assignments for docker compose.
+    """
+    if gpus is None:
+        gpus = get_gpu_inventory()
+    try:
+        plan = plan_gpu_allocation(load_model_requirements(models, compose_dir, manifest), gpus)
+    except GPUAllocationError as e:
+        logger.error(f"Error: Insufficient GPU memory available. {e}")
         sys.exit(1)
 
-    current_gpu = 0
     gpu_assignments = []
-    for model, gpu_count in model_map.items():
-        gpu_var_name = get_gpu_var_name(model)
-        gpu_list = ",".join(str(i) for i in range(current_gpu, current_gpu + gpu_count))
-        gpu_assignments.append(f"{gpu_var_name}={gpu_list}")
-        current_gpu += gpu_count
+    for model, allocation in plan.items():
+        logger.info(f"{model}: GPUs {allocation['gpus']}, gpu_memory_utilization {allocation['gpu_memory_utilization']}")
+        gpu_list = ",".join(str(i) for i in allocation["gpus"])
+        gpu_assignments.append(f"{get_gpu_var_name(model)}={gpu_list}")
+        if allocation["gpu_memory_utilization"] is not None:
+            gpu_assignments.append(f"{get_gpu_var_name(model, 'GPU_MEM_UTIL')}={allocation['gpu_memory_utilization']}")
 
     return " ".join(gpu_assignments)
 
@@ -249,7 +376,7 @@ def main():
         sys.exit(1)
 
     if LLM_BACKEND == "vllm":
-        gpu_assignments = allocate_gpus(VLLM_MODELS)
+        gpu_assignments = allocate_gpus(get_vllm_models())
         with open('gpu_assignments.txt', 'w') as f:
             f.write(gpu_assignments)
 
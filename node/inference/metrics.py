@@ -0,0 +1,4 @@
+from node.metrics import MetricsRegistry
+
+# metrics of the inference proxy, exposed at /inference/metrics
+inference_metrics = MetricsRegistry()
@@ -1,163 +1,449 @@
 # inference/litellm/server.py
+import asyncio
+import json
 import logging
+import time
 import traceback
-from typing import Optional
+from typing import Callable, List, Optional
 import os
 import httpx
 from dotenv import load_dotenv
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from node.inference.admission import (
+    INFERENCE_ADMISSION_ENABLED,
+    AdmissionRejected,
+    get_admission_controller,
+    request_priority,
+)
+from node.inference.backends import NoBackendAvailable, get_backend_registry
+from node.inference.completion_cache import (
+    COMPLETION_CACHE_ENABLED,
+    StreamRecorder,
+    completion_cache_key,
+    completion_to_sse,
+    get_completion_cache,
+    is_deterministic,
+    should_bypass,
+)
+from node.inference.batching import EMBEDDING_BATCHING_ENABLED, get_embedding_batcher
+from node.inference.cancellation import (
+    INFERENCE_CANCEL_ON_DISCONNECT,
+    ClientDisconnected,
+    record_disconnect,
+    run_until_disconnect,
+)
+from node.inference.embedding_cache import EMBEDDING_CACHE_ENABLED, get_embedding_cache
+from node.inference.instrumentation import StreamMetrics, add_model_summaries, record_usage, request_consumer
+from node.inference.metrics import inference_metrics
+from node.inference.sse import SSEDecoder, count_delta_tokens
 from node.schemas import ChatCompletionRequest, CompletionRequest, EmbeddingsRequest
 
+logger = logging.getLogger(__name__)
 load_dotenv()
 
 # Group all endpoints under "inference" in the Swagger docs
 router = APIRouter(prefix="/inference", tags=["inference"])
 
-LITELLM_HTTP_TIMEOUT = 60 * 5
-LITELLM_MASTER_KEY = os.environ.get("LITELLM_MASTER_KEY")
-if not LITELLM_MASTER_KEY:
+if not os.environ.get("LITELLM_MASTER_KEY"):
     raise Exception("Missing LITELLM_MASTER_KEY for authentication")
-LITELLM_URL = "http://litellm:4000" if os.getenv("LAUNCH_DOCKER") == "true" else "http://localhost:4000"
+# response bodies are only logged at DEBUG, and truncated to this many bytes
+LOG_BODY_LIMIT = 1000
+
+
+@router.on_event("startup")
+async def start_backend_health_checks():
+    get_backend_registry().start_health_checks()
+
+
+@router.on_event("shutdown")
+async def close_backends():
+    await get_backend_registry().close()
+
+
+def _log_response(name: str, response: httpx.Response):
+    if logger.isEnabledFor(logging.DEBUG):
+        body = response.content[:LOG_BODY_LIMIT].decode("utf-8", errors="replace")
+        logger.debug(f"LiteLLM {name} response ({response.status_code}, {len(response.content)} bytes): {body}")
+
+
+def _passthrough(response: httpx.Response) -> Response:
+    """Return the LiteLLM response body as-is, without parsing and re-serializing it"""
+    return Response(
+        content=response.content,
+        status_code=response.status_code,
+        media_type=response.headers.get("content-type", "application/json"),
+    )
+
+
+async def _post_litellm(
+    request: Request,
+    name: str,
+    path: str,
+    payload: dict,
+    hedge: bool = False,
+    start: Optional[float] = None,
+) -> Response:
+    """POST to LiteLLM and pass the response through, recording usage metrics when start is given"""
+    model = payload.get("model")
+    response = await run_until_disconnect(
+        request, model, get_backend_registry().request(model, "POST", path, hedge=hedge, json=payload)
+    )
+    _log_response(name, response)
+    if start is not None and response.status_code == 200:
+        record_usage(model, request_consumer(request.headers), response.json().get("usage"), start)
+    return _passthrough(response)
+
+
+class UpstreamError(Exception):
+    """Raised when LiteLLM returns an error status, so the response can be passed through to the caller"""
+
+    def __init__(self, response: httpx.Response):
+        super().__init__(f"LiteLLM returned {response.status_code}")
+        self.response = response
+
+
+class ProxyStreamingResponse(StreamingResponse):
+    """StreamingResponse that aborts the upstream stream as soon as the caller disconnects.
+
+    on_close callbacks run however the response ends, even if streaming never starts.
+    """
+
+    def __init__(self, *args, on_close: Optional[List[Callable[[], None]]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_close = on_close or []
+        self.disconnected = False
+
+    async def __call__(self, scope, receive, send):
+        streaming_task = asyncio.current_task()
+        finished = False
+        cancelled = False
+
+        async def listen_for_disconnect():
+            nonlocal cancelled
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            if finished:
+                return
+            self.disconnected = True
+            if INFERENCE_CANCEL_ON_DISCONNECT:
+                # interrupts the wait for the next upstream chunk, so closing doesn't wait for one
+                cancelled = True
+                streaming_task.cancel()
+
+        listener = asyncio.create_task(listen_for_disconnect())
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            async for chunk in self.body_iterator:
+                if self.disconnected:
+                    # only reached when cancelling is disabled, the upstream is drained with no one to send to
+                    continue
+                if not isinstance(chunk, (bytes, memoryview)):
+                    chunk = chunk.encode(self.charset)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            finished = True
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        except asyncio.CancelledError:
+            if not cancelled:
+                raise
+            streaming_task.uncancel()
+        finally:
+            finished = True
+            listener.cancel()
+            # closes the upstream stream if it did not finish, which is what makes vLLM abort the generation
+            await self.body_iterator.aclose()
+            for callback in self.on_close:
+                callback()
+
+        if self.background is not None:
+            await self.background()
+
+
+async def _admit(model: str, priority: str) -> Callable[[], None]:
+    """Wait for a concurrency slot for the model, returning the callable that releases it"""
+    if not INFERENCE_ADMISSION_ENABLED:
+        return lambda: None
+    return await get_admission_controller().acquire(model, priority)
+
+
+def _reject(e: AdmissionRejected) -> JSONResponse:
+    logger.warning(f"Rejecting inference request: {e}")
+    return JSONResponse(
+        status_code=429,
+        content={"error": {"message": str(e), "type": "rate_limit_error", "code": 429}},
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+def _stream_litellm(
+    path: str,
+    payload: dict,
+    observers: Optional[List] = None,
+    headers: Optional[dict] = None,
+    on_close: Optional[List[Callable[[], None]]] = None,
+) -> StreamingResponse:
+    """Stream the raw LiteLLM output, letting observers (with feed(chunk) and close(completed)) see each chunk"""
+    observers = observers or []
+    model = payload.get("model")
+
+    async def stream_generator():
+        completed = False
+        wasted_tokens = 0
+        wasted_decoder = None
+        try:
+            async with get_backend_registry().stream(model, "POST", path, json=payload) as upstream:
+                async for chunk in upstream.aiter_bytes():
+                    if response.disconnected:
+                        # only parse what the caller never sees, so counting costs nothing on the normal path
+                        wasted_decoder = wasted_decoder or SSEDecoder()
+                        wasted_tokens += sum(count_delta_tokens(event) for event in wasted_decoder.feed(chunk))
+                    for observer in observers:
+                        observer.feed(chunk)
+                    # Stream raw output from LiteLLM
+                    yield chunk
+                completed = upstream.status_code == 200
+        finally:
+            for observer in observers:
+                observer.close(completed)
+            if response.disconnected:
+                record_disconnect(model, wasted_tokens, cancelled=not completed)
+
+    response = ProxyStreamingResponse(
+        stream_generator(),
+        media_type="text/event-stream",
+        headers=headers,
+        on_close=on_close,
+    )
+    return response
 
 
 @router.get("/models", summary="List Models")
 async def models_endpoint(return_wildcard_routes: Optional[bool] = Query(False, alias="return_wildcard_routes")):
-    logging.info("Received models list request")
+    logger.info("Received models list request")
     try:
         params = {"return_wildcard_routes": return_wildcard_routes}
-        async with httpx.AsyncClient(timeout=LITELLM_HTTP_TIMEOUT) as client:
-            response = await client.get(
-                f"{LITELLM_URL}/models",
-                params=params,
-                headers={"Authorization": f"Bearer {LITELLM_MASTER_KEY}"}
-            )
-            logging.info(f"LiteLLM models response: {response.json()}")
-            return response.json()
+        response = await get_backend_registry().request(None, "GET", "/models", params=params)
+        _log_response("models", response)
+        if response.status_code != 200:
+            return _passthrough(response)
+        return add_model_summaries(response.json())
+    except NoBackendAvailable as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=503, detail=str(e))
     except httpx.ReadTimeout:
-        logging.error("Request to LiteLLM timed out")
+        logger.error("Request to LiteLLM timed out")
         raise HTTPException(status_code=504, detail="Request to LiteLLM timed out")
     except Exception as e:
-        logging.error(f"Error in models endpoint: {str(e)}")
-        logging.error(f"Full traceback: {traceback.format_exc()}")
+        logger.error(f"Error in models endpoint: {str(e)}")
+        logger.error(f"Full traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/chat/completions", summary="Chat Completion")
 async def chat_completions_endpoint(
+    request: Request,
     request_body: ChatCompletionRequest,
     model: str = Query(None, description="Model")
 ):
-    logging.info("Received chat completions request")
+    logger.info("Received chat completions request")
+    start = time.monotonic()
     payload = request_body.model_dump(exclude_none=True)
     if model:
         payload["model"] = model
+    stream = payload.get("stream", False)
 
     try:
-        if payload.get("stream", False):
-            async def stream_generator():
-                async with httpx.AsyncClient(timeout=LITELLM_HTTP_TIMEOUT) as client:
-                    async with client.stream(
-                        "POST",
-                        f"{LITELLM_URL}/chat/completions",
-                        json=payload,
-                        headers={"Authorization": f"Bearer {LITELLM_MASTER_KEY}"}
-                    ) as response:
-                        async for chunk in response.aiter_bytes():
-                            # Stream raw output from LiteLLM
-                            yield chunk
-
-            return StreamingResponse(
-                stream_generator(),
-                media_type="text/event-stream"
-            )
+        cache_key = None
+        if COMPLETION_CACHE_ENABLED:
+            cache = get_completion_cache()
+            if should_bypass(request.headers):
+                cache.stats["bypassed"] += 1
+            elif not is_deterministic(payload):
+                cache.stats["uncacheable"] += 1
+            else:
+                cache_key = completion_cache_key(payload)
+                completion = cache.get(cache_key)
+                if completion is not None:
+                    logger.debug(f"Completion cache hit for {cache_key}")
+                    if stream:
+                        include_usage = bool((payload.get("stream_options") or {}).get("include_usage"))
+                        return StreamingResponse(
+                            completion_to_sse(completion, include_usage=include_usage),
+                            media_type="text/event-stream",
+                            headers={"X-Cache": "HIT"},
+                        )
+                    return Response(content=json.dumps(completion), media_type="application/json", headers={"X-Cache": "HIT"})
 
-        async with httpx.AsyncClient(timeout=LITELLM_HTTP_TIMEOUT) as client:
-            response = await client.post(
-                f"{LITELLM_URL}/chat/completions",
-                json=payload,
-                headers={"Authorization": f"Bearer {LITELLM_MASTER_KEY}"}
+        release = await _admit(payload["model"], request_priority(request.headers))
+        if stream:
+            observers = [StreamMetrics(payload["model"], request_consumer(request.headers), start)]
+            if cache_key:
+                observers.append(StreamRecorder(get_completion_cache(), cache_key))
+            return _stream_litellm("/chat/completions", payload, observers=observers, on_close=[release])
+
+        try:
+            response = await run_until_disconnect(
+                request,
+                payload["model"],
+                get_backend_registry().request(payload["model"], "POST", "/chat/completions", hedge=True, json=payload),
             )
-            logging.info(f"LiteLLM response: {response.json()}")
-            return response.json()
+        finally:
+            release()
+        _log_response("chat completions", response)
+        if response.status_code == 200:
+            completion = response.json()
+            record_usage(payload["model"], request_consumer(request.headers), completion.get("usage"), start)
+            if cache_key:
+                get_completion_cache().put(cache_key, completion)
+        return _passthrough(response)
 
+    except AdmissionRejected as e:
+        return _reject(e)
+    except ClientDisconnected:
+        return Response(status_code=499)
+    except NoBackendAvailable as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=503, detail=str(e))
     except httpx.ReadTimeout:
-        logging.error("Request to LiteLLM timed out")
+        logger.error("Request to LiteLLM timed out")
         raise HTTPException(status_code=504, detail="Request to LiteLLM timed out")
     except Exception as e:
-        logging.error(f"Error in chat completions endpoint: {str(e)}")
-        logging.error(f"Full traceback: {traceback.format_exc()}")
+        logger.error(f"Error in chat completions endpoint: {str(e)}")
+        logger.error(f"Full traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/completions", summary="Completion")
 async def completions_endpoint(
+    request: Request,
     request_body: CompletionRequest,
     model: str = Query(None, description="Model")
 ):
-    logging.info("Received completions request")
+    logger.info("Received completions request")
+    start = time.monotonic()
     payload = request_body.model_dump(exclude_none=True)
     if model:
         payload["model"] = model
 
     try:
+        release = await _admit(payload["model"], request_priority(request.headers))
         if payload.get("stream", False):
-            async def stream_generator():
-                async with httpx.AsyncClient(timeout=LITELLM_HTTP_TIMEOUT) as client:
-                    async with client.stream(
-                        "POST",
-                        f"{LITELLM_URL}/completions",
-                        json=payload,
-                        headers={"Authorization": f"Bearer {LITELLM_MASTER_KEY}"}
-                    ) as response:
-                        async for chunk in response.aiter_bytes():
-                            yield chunk
-
-            return StreamingResponse(
-                stream_generator(),
-                media_type="text/event-stream"
-            )
+            observers = [StreamMetrics(payload["model"], request_consumer(request.headers), start)]
+            return _stream_litellm("/completions", payload, observers=observers, on_close=[release])
 
-        async with httpx.AsyncClient(timeout=LITELLM_HTTP_TIMEOUT) as client:
-            response = await client.post(
-                f"{LITELLM_URL}/completions",
-                json=payload,
-                headers={"Authorization": f"Bearer {LITELLM_MASTER_KEY}"}
-            )
-            logging.info(f"LiteLLM completions response: {response.json()}")
-            return response.json()
+        try:
+            return await _post_litellm(request, "completions", "/completions", payload, hedge=True, start=start)
+        finally:
+            release()
 
+    except AdmissionRejected as e:
+        return _reject(e)
+    except ClientDisconnected:
+        return Response(status_code=499)
+    except NoBackendAvailable as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=503, detail=str(e))
     except httpx.ReadTimeout:
-        logging.error("Request to LiteLLM timed out")
+        logger.error("Request to LiteLLM timed out")
         raise HTTPException(status_code=504, detail="Request to LiteLLM timed out")
     except Exception as e:
-        logging.error(f"Error in completions endpoint: {str(e)}")
-        logging.error(f"Full traceback: {traceback.format_exc()}")
+        logger.error(f"Error in completions endpoint: {str(e)}")
+        logger.error(f"Full traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/embeddings", summary="Embeddings")
 async def embeddings_endpoint(
+    request: Request,
     request_body: EmbeddingsRequest,
     model: Optional[str] = Query(None, description="Model")
 ):
-    logging.info("Received embeddings request")
+    logger.info("Received embeddings request")
     payload = request_body.model_dump(exclude_none=True)
     if model is not None:
         payload["model"] = model
+    priority = request_priority(request.headers)
     try:
-        async with httpx.AsyncClient(timeout=LITELLM_HTTP_TIMEOUT) as client:
-            response = await client.post(
-                f"{LITELLM_URL}/embeddings",
-                json=payload,
-                headers={"Authorization": f"Bearer {LITELLM_MASTER_KEY}"}
-            )
-            logging.info(f"LiteLLM embeddings response: {response.json()}")
+        if not EMBEDDING_CACHE_ENABLED and not EMBEDDING_BATCHING_ENABLED:
+            release = await _admit(payload["model"], priority)
+            try:
+                return await _post_litellm(request, "embeddings", "/embeddings", payload, hedge=True)
+            finally:
+                release()
+
+        async def fetch_upstream(texts):
+            # admission applies to upstream calls, so cache hits and coalesced requests don't take slots
+            release = await _admit(payload["model"], priority)
+            try:
+                response = await get_backend_registry().request(
+                    payload["model"], "POST", "/embeddings", hedge=True, json={**payload, "input": texts}
+                )
+            finally:
+                release()
+            _log_response("embeddings", response)
+            if response.is_error:
+                raise UpstreamError(response)
             return response.json()
+
+        async def fetch(texts):
+            if EMBEDDING_BATCHING_ENABLED:
+                return await get_embedding_batcher().embed(
+                    payload["model"], texts, fetch_upstream, dimensions=payload.get("dimensions")
+                )
+            return await fetch_upstream(texts)
+
+        inputs = [payload["input"]] if isinstance(payload["input"], str) else payload["input"]
+        if not EMBEDDING_CACHE_ENABLED:
+            return await fetch(inputs)
+        return await get_embedding_cache().embed(
+            payload["model"], inputs, fetch, dimensions=payload.get("dimensions")
+        )
+    except UpstreamError as e:
+        return _passthrough(e.response)
+    except AdmissionRejected as e:
+        return _reject(e)
+    except ClientDisconnected:
+        return Response(status_code=499)
+    except NoBackendAvailable as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=503, detail=str(e))
     except httpx.ReadTimeout:
-        logging.error("Request to LiteLLM timed out")
+        logger.error("Request to LiteLLM timed out")
         raise HTTPException(status_code=504, detail="Request to LiteLLM timed out")
     except Exception as e:
-        logging.error(f"Error in embeddings endpoint: {str(e)}")
-        logging.error(f"Full traceback: {traceback.format_exc()}")
+        logger.error(f"Error in embeddings endpoint: {str(e)}")
+        logger.error(f"Full traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/embeddings/cache/stats", summary="Embedding Cache Stats")
+async def embedding_cache_stats_endpoint():
+    """Hit ratio and saved prompt tokens of the embedding cache"""
+    return get_embedding_cache().get_stats()
+
+
+@router.get("/chat/completions/cache/stats", summary="Completion Cache Stats")
+async def completion_cache_stats_endpoint():
+    """Hit ratio and size of the deterministic chat completion cache"""
+    return {"enabled": COMPLETION_CACHE_ENABLED, **get_completion_cache().get_stats()}
+
+
+@router.get("/metrics", summary="Inference Metrics")
+async def metrics_endpoint(format: str = Query("json", description="json or prometheus")):
+    """Histograms, counters and gauges collected by the inference proxy, including TTFT,
+    inter-token latency and token counts per model and consumer"""
+    if format == "prometheus":
+        return PlainTextResponse(inference_metrics.render_prometheus())
+    return inference_metrics.snapshot()
+
+
+@router.get("/admission/stats", summary="Admission Control Stats")
+async def admission_stats_endpoint():
+    """Per-model active requests, queue depth and rejections of the inference admission control"""
+    return {"enabled": INFERENCE_ADMISSION_ENABLED, "models": get_admission_controller().get_stats()}
+
+
+@router.get("/backends/stats", summary="Inference Backend Stats")
+async def backend_stats_endpoint():
+    """Health, outstanding requests and latency of each inference backend"""
+    return get_backend_registry().get_stats()
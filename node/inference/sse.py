@@ -0,0 +1,57 @@
+import json
+import logging
+from typing import Any, List
+
+logger = logging.getLogger(__name__)
+
+DONE = "[DONE]"
+
+
+class SSEDecoder:
+    """Incremental decoder for the ``data:`` events of an OpenAI-style SSE stream.
+
+    Chunks can be fed as they arrive from upstream; only an incomplete trailing line is
+    buffered, so parsing never holds on to the stream.
+    """
+
+    def __init__(self):
+        self.buffer = b""
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """Return the events completed by this chunk, as parsed JSON or ``DONE``"""
+        self.buffer += chunk
+        if b"\n" not in self.buffer:
+            return []
+        *lines, self.buffer = self.buffer.split(b"\n")
+        events = []
+        for line in lines:
+            line = line.strip()
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == DONE.encode():
+                events.append(DONE)
+                continue
+            try:
+                events.append(json.loads(data))
+            except ValueError:
+                logger.debug(f"Skipping undecodable SSE data: {data[:200]!r}")
+        return events
+
+
+def encode_sse_event(data: Any) -> bytes:
+    if data == DONE:
+        return f"data: {DONE}\n\n".encode()
+    return f"data: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+def count_delta_tokens(event: Any) -> int:
+    """Tokens carried by a streamed chunk, counting one per non-empty choice delta as vLLM streams a token per event"""
+    if not isinstance(event, dict):
+        return 0
+    count = 0
+    for choice in event.get("choices") or []:
+        delta = choice.get("delta") or {}
+        if delta.get("content") or delta.get("tool_calls") or choice.get("text"):
+            count += 1
+    return count
@@ -0,0 +1,179 @@
+"""In-process metric primitives shared by the node's components, rendered as JSON or Prometheus text"""
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, in the shape of a Prometheus histogram"""
+
+    def __init__(self, name: str, description: str, buckets: Sequence[float], label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self.label_names = tuple(label_names)
+        self.series: Dict[Tuple, Dict] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def _merged(self, labels: Dict) -> Dict:
+        """Sum of the series matching the given labels, labels that are left out match any value"""
+        match = {self.label_names.index(name): str(value) for name, value in labels.items()}
+        merged = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+        with self.lock:
+            for key, series in self.series.items():
+                if all(key[i] == value for i, value in match.items()):
+                    merged["counts"] = [a + b for a, b in zip(merged["counts"], series["counts"])]
+                    merged["sum"] += series["sum"]
+                    merged["count"] += series["count"]
+        return merged
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Estimate a quantile from the buckets (upper bound of the bucket containing it)"""
+        series = self._merged(labels)
+        if not series["count"]:
+            return None
+        target = q * series["count"]
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), series["counts"]):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+    def summary(self, **labels) -> Dict:
+        """Count, mean and estimated p50/p95 over the series matching the given labels"""
+        series = self._merged(labels)
+        return {
+            "count": series["count"],
+            "mean": series["sum"] / series["count"] if series["count"] else None,
+            "p50": self.quantile(0.5, **labels),
+            "p95": self.quantile(0.95, **labels),
+        }
+
+    def snapshot(self) -> Dict:
+        series = []
+        with self.lock:
+            for key, values in self.series.items():
+                cumulative, buckets = 0, {}
+                for bound, count in zip(self.buckets + (float("inf"),), values["counts"]):
+                    cumulative += count
+                    buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+                series.append({
+                    "labels": dict(zip(self.label_names, key)),
+                    "count": values["count"],
+                    "sum": values["sum"],
+                    "buckets": buckets,
+                })
+        return {"description": self.description, "type": "histogram", "series": series}
+
+    def render_prometheus(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for series in self.snapshot()["series"]:
+            labels = [f'{name}="{value}"' for name, value in series["labels"].items()]
+            for bound, count in series["buckets"].items():
+                bucket_labels = ",".join(labels + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {count}")
+            label_str = f"{{{','.join(labels)}}}" if labels else ""
+            lines.append(f"{self.name}_sum{label_str} {series['sum']}")
+            lines.append(f"{self.name}_count{label_str} {series['count']}")
+        return lines
+
+
+class Counter:
+    """Monotonically increasing count with labels"""
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.values: Dict[Tuple, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, value: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def get(self, **labels) -> float:
+        return self.values.get(tuple(str(labels.get(name, "")) for name in self.label_names), 0)
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            series = [{"labels": dict(zip(self.label_names, key)), "value": value} for key, value in self.values.items()]
+        return {"description": self.description, "type": "counter", "series": series}
+
+    def render_prometheus(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for series in self.snapshot()["series"]:
+            labels = ",".join(f'{name}="{value}"' for name, value in series["labels"].items())
+            label_str = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}{label_str} {series['value']}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose current values are read from a callback returning (labels, value) pairs"""
+
+    def __init__(self, name: str, description: str, callback: Callable[[], List[Tuple[Dict, float]]]):
+        self.name = name
+        self.description = description
+        self.callback = callback
+
+    def snapshot(self) -> Dict:
+        series = [{"labels": labels, "value": value} for labels, value in self.callback()]
+        return {"description": self.description, "type": "gauge", "series": series}
+
+    def render_prometheus(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge"]
+        for series in self.snapshot()["series"]:
+            labels = ",".join(f'{name}="{value}"' for name, value in series["labels"].items())
+            label_str = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}{label_str} {series['value']}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, Counter] = {}
+        self.gauges: Dict[str, Gauge] = {}
+
+    def histogram(self, name: str, description: str, buckets: Sequence[float] = LATENCY_BUCKETS, label_names: Sequence[str] = ()) -> Histogram:
+        if name not in self.histograms:
+            self.histograms[name] = Histogram(name, description, buckets, label_names)
+        return self.histograms[name]
+
+    def counter(self, name: str, description: str, label_names: Sequence[str] = ()) -> Counter:
+        if name not in self.counters:
+            self.counters[name] = Counter(name, description, label_names)
+        return self.counters[name]
+
+    def gauge(self, name: str, description: str, callback: Callable[[], List[Tuple[Dict, float]]]) -> Gauge:
+        self.gauges[name] = Gauge(name, description, callback)
+        return self.gauges[name]
+
+    def snapshot(self) -> Dict:
+        metrics = {name: histogram.snapshot() for name, histogram in self.histograms.items()}
+        metrics.update({name: counter.snapshot() for name, counter in self.counters.items()})
+        metrics.update({name: gauge.snapshot() for name, gauge in self.gauges.items()})
+        return metrics
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in list(self.histograms.values()) + list(self.counters.values()) + list(self.gauges.values()):
+            lines.extend(metric.render_prometheus())
+        return "\n".join(lines) + "\n"
+
@@ -37,7 +37,8 @@ from node.schemas import (
     OrchestratorDeployment,
     OrchestratorRun
 )
-from node.worker.utils import download_from_ipfs, unzip_file
+from node.worker.utils import unzip_file
+from node.storage.cid_cache import fetch_ipfs
 from node.utils import get_node_config
 from node.storage.hub.hub import list_modules, list_nodes
 
@@ -247,9 +248,9 @@ async def download_persona_from_ipfs(persona_url: str, personas_base_dir: Path):
             shutil.rmtree(persona_dir)
             logger.debug(f"Removed existing persona directory: {persona_dir}")
 
-        persona_temp_zip_path = download_from_ipfs(persona_ipfs_hash, personas_base_dir)
-        unzip_file(persona_temp_zip_path, persona_dir)
-        os.remove(persona_temp_zip_path)
+        # the archive stays in the CID cache so reinstalls don't hit IPFS again
+        persona_zip_path = fetch_ipfs(persona_ipfs_hash)
+        unzip_file(persona_zip_path, persona_dir)
         logger.info(f"Successfully installed persona: {persona_folder_name}")
         return persona_dir
     except Exception as e:
@@ -288,9 +289,8 @@ def install_module_from_ipfs(module_name: str, module_version: str, module_sourc
     logger.debug(f"Module path exists: {modules_source_dir.exists()}")
     try:
         module_ipfs_hash = module_source_url.split("ipfs://")[1]
-        module_temp_zip_path = download_from_ipfs(module_ipfs_hash, MODULES_SOURCE_DIR)
-        unzip_file(module_temp_zip_path, modules_source_dir)
-        os.remove(module_temp_zip_path)
+        module_zip_path = fetch_ipfs(module_ipfs_hash)
+        unzip_file(module_zip_path, modules_source_dir)
 
         # remove the .venv directory
         venv_dir = modules_source_dir / ".venv"
@@ -67,6 +67,10 @@ class ModuleExecutionType(str, Enum):
     package = "package"
     docker = "docker"
 
+class ModuleExecutionMode(str, Enum):
+    queued = "queued"
+    inline = "inline"
+
 class Module(BaseModel):
     id: str
     name: str
@@ -89,6 +93,7 @@ class ToolConfig(BaseModel):
     config_name: Optional[str] = None
     config_schema: Optional[str] = None
     llm_config: Optional[LLMConfig] = None
+    execution_mode: Optional[ModuleExecutionMode] = None
 
 class OrchestratorConfig(BaseModel):
     config_name: Optional[str] = "orchestrator_config"
@@ -123,6 +128,7 @@ class KBConfig(BaseModel):
 class MemoryConfig(BaseModel):
     config_name: Optional[str] = None
     storage_config: Optional[StorageConfig] = None
+    execution_mode: Optional[ModuleExecutionMode] = None
 
     def model_dict(self):
         if isinstance(self.storage_config, StorageConfig):
@@ -470,6 +476,16 @@ class MemoryRun(BaseModel):
             model_dict['inputs'] = inputs
         return model_dict
 
+class ModuleRunBatchInput(BaseModel):
+    consumer_id: str
+    deployment: Dict
+    inputs: List[Optional[Dict]]
+    signature: str
+
+class ModuleRunBatch(BaseModel):
+    module_type: str
+    run_ids: List[str]
+
 class ChatMessage(BaseModel):
     role: str
     content: str
@@ -501,6 +517,7 @@ class CompletionRequest(BaseModel):
 class EmbeddingsRequest(BaseModel):
     model: str
     input: Union[str, List[str]]
+    dimensions: Optional[int] = None
     
 class SecretInput(BaseModel):
     user_id: str
@@ -0,0 +1,142 @@
+# compression.py
+from dotenv import load_dotenv
+import gzip
+import logging
+import os
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# response bodies smaller than this are sent uncompressed, compressing them costs more than it saves
+HTTP_COMPRESSION_MIN_SIZE = int(os.getenv("HTTP_COMPRESSION_MIN_SIZE", 1024))
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+# already compressed or streamed bodies are passed through
+UNCOMPRESSED_TYPES = ("image/", "video/", "audio/", "text/event-stream", "application/zip", "application/gzip")
+
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+def default_response_class():
+    """orjson renders run records several times faster than json.dumps, the output is the same JSON"""
+    return ORJSONResponse if ORJSON_AVAILABLE else JSONResponse
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """zstd if the client takes it and zstandard is installed, else gzip, else None"""
+    accepted = accepted_encodings(accept_encoding)
+    if ZSTD_AVAILABLE and "zstd" in accepted:
+        return "zstd"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    Compresses response bodies of at least minimum_size with the best encoding in the
+    request's Accept-Encoding. Clients that don't send the header, or only accept
+    identity, get the body unchanged. Streamed responses, partial content and bodies sent
+    with pathsend or zerocopysend are passed through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = HTTP_COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def pass_through(message):
+            nonlocal start, passthrough
+            passthrough = True
+            if start is not None:
+                await send(start)
+                start = None
+            await send(message)
+
+        async def send_compressed(message):
+            nonlocal start
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                # pathsend, zerocopysend and other extensions carry the body outside the message
+                await pass_through(message)
+                return
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+            content_type = headers.get("content-type", "")
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or content_type.startswith(UNCOMPRESSED_TYPES)
+                # ranges address bytes of the identity body
+                or start["status"] == 206
+                or "content-range" in headers
+            ):
+                await pass_through(message)
+                return
+            compressed = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # the encoded body isn't byte-identical to the one a strong ETag validates
+                headers["ETag"] = f"W/{etag}"
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
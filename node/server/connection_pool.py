@@ -0,0 +1,225 @@
+# connection_pool.py
+import asyncio
+from collections import defaultdict
+from dotenv import load_dotenv
+import httpx
+import json
+import logging
+import os
+import uuid
+from typing import Any, Dict
+import websockets
+
+from node.server.grpc_pool_manager import GlobalGrpcPool, get_grpc_pool_instance
+from node.server.payloads import MSGPACK, MSGPACK_AVAILABLE, MSGPACK_SUBPROTOCOL, PayloadEncodingError, decode_payload, encode_payload
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = 300
+# keep-alive connections per target node, shared by every Node client in the process
+NODE_HTTP_MAX_CONNECTIONS = int(os.getenv("NODE_HTTP_MAX_CONNECTIONS", 100))
+NODE_HTTP_MAX_KEEPALIVE = int(os.getenv("NODE_HTTP_MAX_KEEPALIVE", 20))
+KEEPALIVE_EXPIRY = 60.0
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def http_origin(url: str) -> str:
+    """Scheme and host of a node URL, a ws node answers plain HTTP on the same port"""
+    scheme, _, rest = url.partition("://")
+    scheme = {"ws": "http", "wss": "https"}.get(scheme, scheme)
+    return f"{scheme}://{rest.split('/', 1)[0]}"
+
+
+class MultiplexedWebSocket:
+    """
+    One long-lived websocket carrying the requests of many callers.
+
+    Every request is tagged with a request_id and its reply is matched by the id it
+    carries back, so the node can answer requests concurrently and out of order. Until
+    the peer has sent back a reply carrying an id, requests go one at a time: a reply
+    without an id, from a node or relay that predates request ids, belongs to the one
+    request in flight, even if the peer would answer concurrent requests out of order.
+
+    The msgpack subprotocol is offered when connecting, and requests go as msgpack
+    binary frames if the peer accepts it and as JSON text otherwise.
+    """
+
+    def __init__(self, websocket, url: str):
+        self.websocket = websocket
+        self.url = url
+        self.binary = websocket.subprotocol == MSGPACK_SUBPROTOCOL
+        # request_id -> future, in send order
+        self.pending: Dict[str, asyncio.Future] = {}
+        self.echoes_request_ids = False
+        self.serial = asyncio.Lock()
+        self.reader = asyncio.create_task(self.read())
+
+    @classmethod
+    async def connect(cls, url: str) -> "MultiplexedWebSocket":
+        logger.info(f"Connecting to WebSocket: {url}")
+        subprotocols = [MSGPACK_SUBPROTOCOL] if MSGPACK_AVAILABLE else None
+        return cls(await websockets.connect(url, max_size=None, subprotocols=subprotocols), url)
+
+    @property
+    def closed(self) -> bool:
+        return self.websocket.closed or self.reader.done()
+
+    def _resolve(self, message):
+        try:
+            response = decode_payload(message, MSGPACK) if isinstance(message, bytes) else json.loads(message)
+        except (json.JSONDecodeError, PayloadEncodingError):
+            logger.warning(f"Dropping undecodable message from {self.url}")
+            return
+        request_id = response.pop("request_id", None) if isinstance(response, dict) else None
+        if request_id is None:
+            request_id = next(iter(self.pending), None)
+        else:
+            self.echoes_request_ids = True
+        future = self.pending.pop(request_id, None)
+        if future is None:
+            logger.warning(f"Dropping unexpected message from {self.url}")
+        elif not future.done():
+            future.set_result(response)
+
+    async def read(self):
+        try:
+            async for message in self.websocket:
+                self._resolve(message)
+        except Exception as e:
+            logger.warning(f"WebSocket to {self.url} failed: {e}")
+        finally:
+            pending, self.pending = self.pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f"WebSocket to {self.url} closed before replying"))
+
+    def encode(self, data: Dict[str, Any]):
+        if self.binary:
+            return encode_payload(data, MSGPACK)
+        return json.dumps(data)
+
+    async def request(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.echoes_request_ids:
+            async with self.serial:
+                if not self.echoes_request_ids:
+                    return await self._request(data)
+        return await self._request(data)
+
+    async def _request(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        if self.closed:
+            # e.g. a request that waited for its turn while the socket closed
+            raise ConnectionError(f"WebSocket to {self.url} is closed")
+        request_id = str(uuid.uuid4())
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            await self.websocket.send(self.encode({**data, "request_id": request_id}))
+        except Exception:
+            self.pending.pop(request_id, None)
+            raise
+        # a caller that gives up leaves its cancelled future in place until the reply arrives
+        return await future
+
+    async def close(self):
+        await self.websocket.close()
+        await self.reader
+
+
+class LoopConnections:
+    """Connections created on one event loop, they can't be used from another"""
+
+    def __init__(self):
+        self.http_clients: Dict[str, httpx.AsyncClient] = {}
+        self.websockets: Dict[str, MultiplexedWebSocket] = {}
+        self.websocket_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+
+class NodeConnectionPool:
+    """
+    Connections to other nodes shared by every Node client in the process: a keep-alive
+    HTTP client per node, a multiplexed websocket per node and action, and the gRPC pool.
+    """
+
+    def __init__(self):
+        self.loops: Dict[asyncio.AbstractEventLoop, LoopConnections] = {}
+
+    def _connections(self) -> LoopConnections:
+        loop = asyncio.get_running_loop()
+        connections = self.loops.get(loop)
+        if connections is None:
+            for old_loop in [old_loop for old_loop in self.loops if old_loop.is_closed()]:
+                del self.loops[old_loop]
+            connections = self.loops[loop] = LoopConnections()
+        return connections
+
+    def http_client(self, node_url: str) -> httpx.AsyncClient:
+        """Client for the node with its origin as base URL, so requests take a path"""
+        origin = http_origin(node_url)
+        connections = self._connections()
+        client = connections.http_clients.get(origin)
+        if client is None or client.is_closed:
+            client = connections.http_clients[origin] = httpx.AsyncClient(
+                base_url=origin,
+                timeout=HTTP_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=NODE_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=NODE_HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+                http2=HTTP2_AVAILABLE,
+            )
+        return client
+
+    async def websocket(self, node_url: str, action: str) -> MultiplexedWebSocket:
+        key = f"{node_url}/ws/{action}"
+        connections = self._connections()
+        socket = connections.websockets.get(key)
+        if socket is None or socket.closed:
+            async with connections.websocket_locks[key]:
+                socket = connections.websockets.get(key)
+                if socket is None or socket.closed:
+                    socket = await MultiplexedWebSocket.connect(f"{key}/{uuid.uuid4()}")
+                    connections.websockets[key] = socket
+        return socket
+
+    def grpc_pool(self) -> GlobalGrpcPool:
+        return get_grpc_pool_instance()
+
+    async def close(self):
+        """Close the connections of the running event loop"""
+        connections = self.loops.pop(asyncio.get_running_loop(), None)
+        if connections is None:
+            return
+        results = await asyncio.gather(
+            *(client.aclose() for client in connections.http_clients.values()),
+            *(socket.close() for socket in connections.websockets.values()),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Error closing node connection: {result}")
+
+
+# Singleton accessor functions
+_pool_instance = None
+
+
+def get_node_connection_pool() -> NodeConnectionPool:
+    global _pool_instance
+    if _pool_instance is None:
+        _pool_instance = NodeConnectionPool()
+    return _pool_instance
+
+
+async def close_node_connection_pool():
+    global _pool_instance
+    if _pool_instance:
+        await _pool_instance.close()
+        _pool_instance = None
@@ -3,148 +3,219 @@ import asyncio
 import grpc
 from grpc.aio import insecure_channel
 from contextlib import asynccontextmanager
-from collections import defaultdict
-import traceback
+from dotenv import load_dotenv
 import logging
+import os
+import time
+from typing import Dict, List
+
+from node.metrics import LATENCY_BUCKETS, Histogram
+
+load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# channels kept open per target; each one multiplexes concurrent RPCs over its own HTTP/2 connection
+GRPC_CHANNELS_PER_TARGET = int(os.getenv("GRPC_CHANNELS_PER_TARGET", 4))
+# a channel gets this long to connect before it can be evicted for being in TRANSIENT_FAILURE
+MIN_CHANNEL_AGE = 5.0
+# RPCs still running on an evicted channel get this long to finish before it's closed
+EVICTION_GRACE = 30.0
+UNHEALTHY_STATES = (grpc.ChannelConnectivity.TRANSIENT_FAILURE, grpc.ChannelConnectivity.SHUTDOWN)
+
+
+class PooledChannel:
+    def __init__(self, target: str, options):
+        self.channel = insecure_channel(target, options=options)
+        self.created = time.monotonic()
+        self.outstanding = 0
+        self.evicted = False
+
+    def state(self) -> grpc.ChannelConnectivity:
+        return self.channel.get_state(try_to_connect=False)
+
+
+class TargetChannels:
+    """The channels of one target, all created on the event loop they belong to"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.channels: List[PooledChannel] = []
+
 
 class GlobalGrpcPool:
-    def __init__(self, max_channels=50, buffer_size=5, channel_options=None):
-        self._initialized = False
-        self.max_channels = max_channels
-        self.buffer_size = buffer_size
-        # Use separate queue per target
-        self.available_queues = defaultdict(lambda: asyncio.Queue(maxsize=self.buffer_size))
-        self.semaphore = asyncio.Semaphore(self.max_channels - self.buffer_size)
-        self.channel_options = channel_options or [
+    """
+    Small fixed set of channels per target, shared by concurrent RPCs.
+
+    A gRPC channel carries many concurrent streams, so channels are not checked out
+    exclusively: each call takes the channel with the fewest outstanding RPCs, and a new
+    channel is only opened while every existing one is busy and the target has fewer than
+    channels_per_target. Channels found in TRANSIENT_FAILURE are replaced, and in-flight
+    RPCs, call latency and evictions are tracked per target.
+    """
+
+    def __init__(self, channels_per_target: int = GRPC_CHANNELS_PER_TARGET, channel_options=None):
+        self.channels_per_target = max(1, channels_per_target)
+        self.channel_options = list(channel_options or [
             ("grpc.max_send_message_length", 100 * 1024 * 1024),  # 100 MB
             ("grpc.max_receive_message_length", 100 * 1024 * 1024),  # 100 MB
-            ("grpc.keepalive_timeout_ms", 3600000),  # 1 hour
+            ("grpc.keepalive_time_ms", 60 * 60 * 1000),  # 1 hour
             ("grpc.keepalive_timeout_ms", 50 * 1000),  # 50 seconds
             ("grpc.http2.max_pings_without_data", 0),
             ("grpc.http2.min_time_between_pings_ms", 10 * 1000),  # 10 seconds
             ("grpc.max_connection_idle_ms", 60 * 60 * 1000),  # 1 hour
             ("grpc.max_connection_age_ms", 2 * 60 * 60 * 1000),  # 2 hours
-        ]
-        self.channel_stats = defaultdict(lambda: {"acquired": 0, "released": 0, "total_channels": 0})
-        self._initialized = True
-        logger.info(
-            f"GlobalGrpcPool initialized with max_channels={self.max_channels} and buffer_size={self.buffer_size}"
-        )
+        ])
+        # without a local subchannel pool, channels with the same target and options share one connection
+        self.channel_options.append(("grpc.use_local_subchannel_pool", 1))
+        self.targets: Dict[str, TargetChannels] = {}
+        # id of every handed out channel -> its PooledChannel, evicted ones stay until their RPCs finish
+        self.pooled: Dict[int, PooledChannel] = {}
+        self.channel_stats: Dict[str, Dict[str, int]] = {}
+        self.latency = Histogram("grpc_client_call_seconds", "Duration of gRPC calls made through the pool", LATENCY_BUCKETS, ("target",))
+        self.closing = set()
+        logger.info(f"GlobalGrpcPool initialized with channels_per_target={self.channels_per_target}")
+
+    def _target(self, target: str) -> TargetChannels:
+        loop = asyncio.get_running_loop()
+        entry = self.targets.get(target)
+        if target not in self.channel_stats:
+            self.channel_stats[target] = {"requests": 0, "failures": 0, "in_flight": 0, "channels_created": 0, "evictions": 0}
+        if entry is None or entry.loop is not loop:
+            # aio channels only work on the loop that created them, callers on a new loop get new channels
+            if entry is not None:
+                for pooled in entry.channels:
+                    self.pooled.pop(id(pooled.channel), None)
+                    self.channel_stats[target]["in_flight"] -= pooled.outstanding
+                logger.info(f"Event loop changed, opening new channels for {target}")
+            entry = self.targets[target] = TargetChannels(loop)
+        return entry
+
+    def _open(self, target: str, entry: TargetChannels) -> PooledChannel:
+        pooled = PooledChannel(target, self.channel_options)
+        entry.channels.append(pooled)
+        self.pooled[id(pooled.channel)] = pooled
+        self.channel_stats[target]["channels_created"] += 1
+        logger.info(f"New channel created for {target} ({len(entry.channels)}/{self.channels_per_target})")
+        return pooled
+
+    def evict_unhealthy(self, target: str):
+        entry = self.targets.get(target)
+        if entry is None or entry.loop is not asyncio.get_running_loop():
+            return
+        now = time.monotonic()
+        for pooled in list(entry.channels):
+            if now - pooled.created < MIN_CHANNEL_AGE:
+                continue
+            state = pooled.state()
+            if state in UNHEALTHY_STATES:
+                logger.warning(f"Evicting channel for {target} in state {state.name}")
+                entry.channels.remove(pooled)
+                self.channel_stats[target]["evictions"] += 1
+                self._retire(target, pooled)
+
+    def _retire(self, target: str, pooled: PooledChannel):
+        pooled.evicted = True
+        if pooled.outstanding == 0:
+            self.pooled.pop(id(pooled.channel), None)
+        task = asyncio.create_task(self._close_channel(target, pooled.channel, EVICTION_GRACE))
+        self.closing.add(task)
+        task.add_done_callback(self.closing.discard)
 
     async def get_channel(self, target: str):
-        await self.semaphore.acquire()
-        try:
-            # Get queue specific to this target
-            target_queue = self.available_queues[target]
-            
-            if not target_queue.empty():
-                channel = await target_queue.get()
-                logger.info(f"Reusing channel from buffer for {target}")
-            else:
-                channel = insecure_channel(target, options=self.channel_options)
-                self.channel_stats[target]["total_channels"] += 1
-                logger.info(f"New channel created for {target}")
-            
-            self.channel_stats[target]["acquired"] += 1
-            return channel
-        except Exception as e:
-            logger.error(f"Error acquiring channel for {target}: {e}")
-            self.semaphore.release()
-            raise
+        """The least loaded channel for the target, release it with release_channel when the call is done"""
+        entry = self._target(target)
+        self.evict_unhealthy(target)
+        pooled = min(entry.channels, key=lambda channel: channel.outstanding, default=None)
+        if pooled is None or (pooled.outstanding > 0 and len(entry.channels) < self.channels_per_target):
+            pooled = self._open(target, entry)
+        pooled.outstanding += 1
+        stats = self.channel_stats[target]
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        return pooled.channel
 
     async def release_channel(self, target: str, channel):
-        if channel is None:
-            self.semaphore.release()
+        pooled = self.pooled.get(id(channel))
+        if pooled is None:
+            # handed out on a loop that has since been replaced
             return
+        pooled.outstanding -= 1
+        self.channel_stats[target]["in_flight"] -= 1
+        if pooled.evicted and pooled.outstanding == 0:
+            self.pooled.pop(id(channel), None)
 
+    @asynccontextmanager
+    async def channel_context(self, target: str):
+        channel = await self.get_channel(target)
+        start = time.monotonic()
         try:
-            connectivity = channel.get_state(True)
-            if connectivity == grpc.ChannelConnectivity.SHUTDOWN:
-                logger.warning(f"Channel for {target} is shutdown")
-                self.channel_stats[target]["total_channels"] -= 1
-                self.channel_stats[target]["released"] += 1
-                self.semaphore.release()
-                return
-
-            target_queue = self.available_queues[target]
-            try:
-                target_queue.put_nowait(channel)
-                self.channel_stats[target]["released"] += 1
-                logger.info(f"Channel released back to buffer for {target}")
-            except asyncio.QueueFull:
-                await channel.close()
-                self.channel_stats[target]["total_channels"] -= 1
-                self.channel_stats[target]["released"] += 1
+            yield channel
+        except Exception:
+            self.channel_stats[target]["failures"] += 1
+            raise
         finally:
-            self.semaphore.release()
+            self.latency.observe(time.monotonic() - start, target=target)
+            await self.release_channel(target, channel)
 
     async def close_all(self):
         """Safely close all gRPC channels in the pool."""
         logger.info("Closing all channels in the pool.")
-        try:
-            # Create list of cleanup tasks
-            cleanup_tasks = []
-            
-            # Iterate through all queues in the defaultdict
-            for target, queue in self.available_queues.items():
-                while not queue.empty():
-                    try:
-                        channel = await asyncio.wait_for(queue.get(), timeout=5.0)
-                        if channel:
-                            # Create task for closing channel
-                            cleanup_tasks.append(
-                                asyncio.create_task(self._close_channel(target, channel))
-                            )
-                    except asyncio.TimeoutError:
-                        logger.warning(f"Timeout while getting channel from queue for {target}")
-                    except Exception as e:
-                        logger.error(f"Error getting channel from queue for {target}: {e}")
-
-            # Wait for all cleanup tasks to complete
-            if cleanup_tasks:
-                await asyncio.gather(*cleanup_tasks, return_exceptions=True)
-                
-            # Clear the queues
-            self.available_queues.clear()
-            
-            logger.info("All buffered channels have been closed.")
-        except Exception as e:
-            logger.error(f"Error during pool cleanup: {e}")
-            raise
-
-    async def _close_channel(self, target: str, channel):
+        loop = asyncio.get_running_loop()
+        cleanup_tasks = [
+            self._close_channel(target, pooled.channel)
+            for target, entry in self.targets.items() if entry.loop is loop
+            for pooled in entry.channels
+        ]
+        if cleanup_tasks:
+            await asyncio.gather(*cleanup_tasks, return_exceptions=True)
+        if self.closing:
+            await asyncio.gather(*self.closing, return_exceptions=True)
+        self.targets.clear()
+        self.pooled.clear()
+        logger.info("All channels have been closed.")
+
+    async def _close_channel(self, target: str, channel, grace: float = None):
         """Helper method to safely close a single channel."""
         try:
-            await channel.close()
-            self.channel_stats[target]["total_channels"] -= 1
-            self.channel_stats[target]["released"] += 1
+            await channel.close(grace)
             logger.debug(f"Successfully closed channel for {target}")
         except Exception as e:
             logger.error(f"Error closing channel for {target}: {e}")
 
+    def stats(self) -> Dict[str, Dict]:
+        """Calls, in-flight RPCs, evictions, channel states and call latency per target, served by the
+        node at /grpc/pool_stats and logged periodically by monitor_pool"""
+        result = {}
+        for target, counts in self.channel_stats.items():
+            entry = self.targets.get(target)
+            result[target] = {
+                **counts,
+                "channels": [
+                    {"state": pooled.state().name, "in_flight": pooled.outstanding}
+                    for pooled in (entry.channels if entry else [])
+                ],
+                "latency_seconds": self.latency.summary(target=target),
+            }
+        return result
+
     def print_stats(self):
-        for target, stats in self.channel_stats.items():
+        for target, stats in self.stats().items():
+            latency = stats["latency_seconds"]
             logger.info(
-                f"Stats for {target}: Acquired={stats['acquired']}, Released={stats['released']}, Total Channels={stats['total_channels']}"
+                f"Stats for {target}: Requests={stats['requests']}, In flight={stats['in_flight']}, "
+                f"Failures={stats['failures']}, Channels={len(stats['channels'])}, Evictions={stats['evictions']}, "
+                f"Latency p50={latency['p50']} p95={latency['p95']}"
             )
 
-    @asynccontextmanager
-    async def channel_context(self, target: str):
-        channel = await self.get_channel(target)
-        try:
-            yield channel
-        finally:
-            await self.release_channel(target, channel)
-
     async def monitor_pool(self, interval: int = 60):
         """
-        Periodically logs the pool statistics.
+        Periodically evicts unhealthy channels and logs the pool statistics.
         """
         while True:
             await asyncio.sleep(interval)
+            for target in list(self.targets):
+                self.evict_unhealthy(target)
             self.print_stats()
 
 
@@ -153,13 +224,12 @@ _pool_instance = None
 
 
 def get_grpc_pool_instance(
-    max_channels=50, buffer_size=5, channel_options=None
+    channels_per_target=GRPC_CHANNELS_PER_TARGET, channel_options=None
 ) -> GlobalGrpcPool:
     global _pool_instance
     if _pool_instance is None:
         _pool_instance = GlobalGrpcPool(
-            max_channels=max_channels,
-            buffer_size=buffer_size,
+            channels_per_target=channels_per_target,
             channel_options=channel_options,
         )
         logger.info("GlobalGrpcPool instance created.")
@@ -7,13 +7,15 @@ import traceback
 from datetime import datetime
 from pathlib import Path
 from google.protobuf.empty_pb2 import Empty
-from google.protobuf.json_format import MessageToDict
 from grpc import ServicerContext
 import os
-from typing import Dict, Any, Union
+from typing import Dict, Any, List, Optional, Set, Tuple, Union
+from celery import Signature
+from collections import defaultdict
 from google.protobuf import struct_pb2
 from node.storage.db.db import LocalDBPostgres
 from node.user import register_user, check_user
+from node.worker.dispatcher import get_dispatcher, close_dispatcher
 from node.worker.docker_worker import execute_docker_agent
 from node.worker.package_worker import (
     run_agent,
@@ -23,6 +25,7 @@ from node.worker.package_worker import (
     run_kb
 )
 from node.server import grpc_server_pb2, grpc_server_pb2_grpc
+from node.server.payloads import encode_payload, payload_encoding, run_input_from_proto
 from node.schemas import (
     AgentDeployment,
     MemoryDeployment,
@@ -46,6 +49,382 @@ MODULES_SOURCE_DIR = root_dir / os.getenv("MODULES_SOURCE_DIR")
 
 logger = logging.getLogger(__name__)
 
+# RunModules flow control: runs in flight per stream before it stops reading requests,
+# and how many queued requests are inserted and enqueued together
+RUN_MODULES_MAX_IN_FLIGHT = int(os.getenv("RUN_MODULES_MAX_IN_FLIGHT", 64))
+RUN_MODULES_BATCH_SIZE = int(os.getenv("RUN_MODULES_BATCH_SIZE", 32))
+RUN_MODULES_BATCH_WAIT_MS = float(os.getenv("RUN_MODULES_BATCH_WAIT_MS", 5))
+RUN_MODULES_POLL_INTERVAL = 0.5
+
+MODULE_CONFIGS = {
+    "agent": {
+        "input_class": AgentRunInput,
+        "run_type": "agent",
+        "deployment_schema": AgentDeployment,
+        "db_create": lambda db, input: db.create_agent_run(input),
+        "db_list": lambda db, id: db.list_agent_runs(id),
+        "worker": run_agent,
+        "docker_support": True,
+        "deployment_class": grpc_server_pb2.AgentDeployment
+    },
+    "memory": {
+        "input_class": MemoryRunInput,
+        "run_type": "memory",
+        "deployment_schema": MemoryDeployment,
+        "db_create": lambda db, input: db.create_memory_run(input),
+        "db_list": lambda db, id: db.list_memory_runs(id),
+        "worker": run_memory,
+        "docker_support": False,
+        "deployment_class": grpc_server_pb2.BaseDeployment
+    },
+    "tool": {
+        "input_class": ToolRunInput,
+        "run_type": "tool",
+        "deployment_schema": ToolDeployment,
+        "db_create": lambda db, input: db.create_tool_run(input),
+        "db_list": lambda db, id: db.list_tool_runs(id),
+        "worker": run_tool,
+        "docker_support": False,
+        "deployment_class": grpc_server_pb2.ToolDeployment
+    },
+    "environment": {
+        "input_class": EnvironmentRunInput,
+        "run_type": "environment",
+        "deployment_schema": EnvironmentDeployment,
+        "db_create": lambda db, input: db.create_environment_run(input),
+        "db_list": lambda db, id: db.list_environment_runs(id),
+        "worker": run_environment,
+        "docker_support": False,
+        "deployment_class": grpc_server_pb2.BaseDeployment
+    },
+    "kb": {
+        "input_class": KBRunInput,
+        "run_type": "knowledge_base",
+        "deployment_schema": KBDeployment,
+        "db_create": lambda db, input: db.create_kb_run(input),
+        "db_list": lambda db, id: db.list_kb_runs(id),
+        "worker": run_kb,
+        "docker_support": False,
+        "deployment_class": grpc_server_pb2.BaseDeployment
+    }
+}
+
+
+def get_module_config(module_type: str) -> Dict[str, Any]:
+    if module_type not in MODULE_CONFIGS:
+        raise ValueError(f"Invalid module type: {module_type}")
+    return MODULE_CONFIGS[module_type]
+
+
+def request_to_run_input(request):
+    """Convert a ModuleRunRequest to the run input of its module type"""
+    config = get_module_config(request.module_type)
+    return run_input_from_proto(request, config["input_class"], config["deployment_schema"])
+
+
+def module_task_signature(module_type: str, run_input, module_run_data: Dict[str, Any]) -> Signature:
+    """The Celery task that executes a created run, as a signature for the dispatcher"""
+    config = get_module_config(module_type)
+    if isinstance(run_input.deployment.module, dict):
+        execution_type = run_input.deployment.module["execution_type"]
+    else:
+        execution_type = run_input.deployment.module.execution_type
+
+    if execution_type == ModuleExecutionType.package or execution_type == "package":
+        return config["worker"].s(module_run_data)
+    elif execution_type == ModuleExecutionType.docker or execution_type == "docker":
+        if config["docker_support"]:
+            return execute_docker_agent.s(module_run_data)
+        raise Exception(f"Docker execution not supported for {module_type}")
+    raise Exception(f"Invalid {module_type} run type")
+
+
+def module_run_to_proto(module_type: str, updated_run: Dict[str, Any], encoding: Optional[str] = None) -> grpc_server_pb2.ModuleRun:
+    """
+    Build the final ModuleRun message of a run read back from the database. With an
+    encoding, inputs and results are sent serialized in the payload fields.
+    """
+    config = get_module_config(module_type)
+    if isinstance(updated_run, dict):
+        updated_run.pop("_sa_instance_state", None)
+    else:
+        updated_run = updated_run.__dict__
+        updated_run.pop("_sa_instance_state", None)
+
+    for time_field in ['created_time', 'start_processing_time', 'completed_time']:
+        if time_field in updated_run and isinstance(updated_run[time_field], datetime):
+            updated_run[time_field] = updated_run[time_field].isoformat()
+
+    deployment_data = updated_run.get("deployment", {})
+    DeploymentClass = config["deployment_class"]
+
+    if 'node' in deployment_data:
+        node_data = deployment_data['node']
+        if 'id' in node_data:
+            node = grpc_server_pb2.NodeConfig(**node_data)
+        else:
+            node = grpc_server_pb2.NodeConfigInput(**node_data)
+
+        module_data = deployment_data.get("module", {})
+        if not isinstance(module_data, dict):
+            module_data = module_data.__dict__
+        module = grpc_server_pb2.Module(**module_data)
+
+        config_data = deployment_data.get("config", {})
+        if isinstance(config_data, dict):
+            config_struct = struct_pb2.Struct()
+            config_struct.update(config_data)
+        else:
+            config_struct = config_data
+
+        deployment = DeploymentClass(
+            name=deployment_data.get("name", ""),
+            module=module,
+            config=config_struct,
+            initialized=deployment_data.get("initialized", False)
+        )
+
+        if isinstance(node, grpc_server_pb2.NodeConfig):
+            deployment.node_config.CopyFrom(node)
+        else:
+            deployment.node_input.CopyFrom(node)
+
+    final_response = grpc_server_pb2.ModuleRun()
+
+    # Set basic fields
+    final_response.module_type = str(module_type)
+    final_response.consumer_id = str(updated_run.get("consumer_id", ""))
+    final_response.status = str(updated_run.get("status", "completed"))
+    final_response.error = bool(updated_run.get("error", False))
+    final_response.id = str(updated_run.get("id", ""))
+
+    if encoding:
+        final_response.payload_encoding = encoding
+        final_response.inputs_payload = encode_payload(updated_run.get('inputs') or {}, encoding)
+        final_response.results_payload = encode_payload(updated_run.get('results') or [], encoding)
+    else:
+        final_response.inputs.update(updated_run.get('inputs') or {})
+        # Extend list fields
+        if updated_run.get("results"):
+            final_response.results.extend([str(r) for r in updated_run.get("results", [])])
+
+    # Set optional string fields
+    if updated_run.get("error_message"):
+        final_response.error_message = str(updated_run.get("error_message"))
+    if updated_run.get("created_time"):
+        final_response.created_time = str(updated_run.get("created_time"))
+    if updated_run.get("start_processing_time"):
+        final_response.start_processing_time = str(updated_run.get("start_processing_time"))
+    if updated_run.get("completed_time"):
+        final_response.completed_time = str(updated_run.get("completed_time"))
+    if updated_run.get("duration") is not None:
+        final_response.duration = float(updated_run.get("duration", 0.0))
+
+    # Set deployment
+    if module_type == "agent":
+        final_response.agent_deployment.CopyFrom(deployment)
+    elif module_type == "tool":
+        final_response.tool_deployment.CopyFrom(deployment)
+    elif module_type == "memory":
+        final_response.memory_deployment.CopyFrom(deployment)
+    elif module_type == "kb":
+        final_response.kb_deployment.CopyFrom(deployment)
+    elif module_type == "environment":
+        final_response.environment_deployment.CopyFrom(deployment)
+
+    return final_response
+
+
+class RunModulesStream:
+    """
+    State of one RunModules call.
+
+    Requests are read while fewer than RUN_MODULES_MAX_IN_FLIGHT of the stream's runs
+    are unfinished, so a caller that sends faster than runs complete is held back by
+    gRPC flow control. Whatever has queued up is taken as a batch of at most
+    RUN_MODULES_BATCH_SIZE requests: their runs are inserted with one multi-row insert
+    per module type and submitted to the dispatcher together. Unfinished runs are
+    polled together, and the finished ones of each poll are read back in one query per
+    module type. Every request gets a final update, an error one if its batch failed.
+    """
+
+    def __init__(self, request_iterator):
+        self.request_iterator = request_iterator
+        self.in_flight = asyncio.Semaphore(RUN_MODULES_MAX_IN_FLIGHT)
+        self.intake: asyncio.Queue = asyncio.Queue()
+        self.outbox: asyncio.Queue = asyncio.Queue()
+        # run id -> (request, module type, AsyncResult, reply payload encoding)
+        self.running: Dict[str, Tuple[Any, str, Any, Optional[str]]] = {}
+        # id() of the batch's requests that got their error update or whose run is being polled
+        self.answered: Set[int] = set()
+        self.reading = True
+
+    async def updates(self):
+        tasks = [asyncio.create_task(self.read_requests()), asyncio.create_task(self.submit_batches())]
+        tasks.append(asyncio.create_task(self.poll_runs()))
+        try:
+            while True:
+                update = await self.outbox.get()
+                if update is None:
+                    return
+                yield update
+        finally:
+            # the caller went away or the stream is done; runs already queued keep going
+            for task in tasks:
+                task.cancel()
+
+    async def read_requests(self):
+        try:
+            async for request in self.request_iterator:
+                await self.in_flight.acquire()
+                self.intake.put_nowait(request)
+        except Exception as e:
+            logger.error(f"Error reading RunModules requests: {e}")
+        finally:
+            self.intake.put_nowait(None)
+
+    async def submit_batches(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                batch = [await self.intake.get()]
+                deadline = loop.time() + RUN_MODULES_BATCH_WAIT_MS / 1000
+                while batch[-1] is not None and len(batch) < RUN_MODULES_BATCH_SIZE:
+                    if not self.intake.empty():
+                        batch.append(self.intake.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.intake.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                requests = [request for request in batch if request is not None]
+                if requests:
+                    await self.submit_batch(requests)
+                if batch[-1] is None:
+                    return
+        finally:
+            self.reading = False
+
+    async def submit_batch(self, requests: List):
+        """Submit a batch, answering its requests that didn't get an update with an error if it fails"""
+        self.answered.clear()
+        try:
+            await self.submit(requests)
+        except Exception as e:
+            logger.error(f"Error submitting RunModules batch: {e}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            for request in requests:
+                if id(request) not in self.answered:
+                    self.fail(request, request.module_type, e, request.consumer_id)
+
+    def fail(self, request, module_type: str, error: Exception, consumer_id: str = ""):
+        request_id = request.request_id
+        self.answered.add(id(request))
+        logger.error(f"Error running {module_type} module for request {request_id}: {error}")
+        self.outbox.put_nowait(grpc_server_pb2.ModuleRun(
+            module_type=module_type,
+            status="error",
+            error=True,
+            error_message=str(error),
+            consumer_id=consumer_id,
+            id="",
+            results=[],
+            request_id=request_id
+        ))
+        self.in_flight.release()
+
+    async def submit(self, requests: List):
+        # module type -> [(request, run input, reply payload encoding)]
+        by_type: Dict[str, List[Tuple[Any, Any, Optional[str]]]] = defaultdict(list)
+        for request in requests:
+            try:
+                run_input = request_to_run_input(request)
+                by_type[request.module_type].append((request, run_input, payload_encoding(request)))
+            except Exception as e:
+                self.fail(request, request.module_type, e, request.consumer_id)
+
+        signatures, submitted = [], []
+        for module_type, entries in by_type.items():
+            config = get_module_config(module_type)
+            try:
+                async with LocalDBPostgres() as db:
+                    module_runs = await db.create_module_runs([run_input for _, run_input, _ in entries], config["run_type"])
+            except Exception as e:
+                for request, run_input, _ in entries:
+                    self.fail(request, module_type, e, run_input.consumer_id)
+                continue
+
+            for (request, run_input, encoding), module_run in zip(entries, module_runs):
+                module_run_data = module_run.model_dump()
+                try:
+                    signatures.append(module_task_signature(module_type, run_input, module_run_data))
+                except Exception as e:
+                    self.fail(request, module_type, e, module_run_data['consumer_id'])
+                    continue
+                submitted.append((request, module_type, module_run_data, encoding))
+                self.outbox.put_nowait(grpc_server_pb2.ModuleRun(
+                    module_type=module_type,
+                    status="started",
+                    error=False,
+                    id=module_run_data['id'],
+                    consumer_id=module_run_data['consumer_id'],
+                    request_id=request.request_id
+                ))
+
+        if not signatures:
+            return
+        try:
+            results = await get_dispatcher().submit_many(signatures)
+        except Exception as e:
+            for request, module_type, module_run_data, _ in submitted:
+                self.fail(request, module_type, e, module_run_data['consumer_id'])
+            return
+        logger.info(f"RunModules enqueued {len(signatures)} runs")
+        for (request, module_type, module_run_data, encoding), result in zip(submitted, results):
+            self.running[module_run_data['id']] = (request, module_type, result, encoding)
+            self.answered.add(id(request))
+
+    async def poll_runs(self):
+        try:
+            while self.reading or self.running:
+                await asyncio.sleep(RUN_MODULES_POLL_INTERVAL)
+                finished = [run_id for run_id, (_, _, result, _) in self.running.items() if result.ready()]
+                if finished:
+                    await self.emit_finished(finished)
+        except Exception as e:
+            logger.error(f"Error polling RunModules runs: {e}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+        finally:
+            self.outbox.put_nowait(None)
+
+    async def emit_finished(self, run_ids: List[str]):
+        by_type: Dict[str, List[str]] = defaultdict(list)
+        for run_id in run_ids:
+            by_type[self.running[run_id][1]].append(run_id)
+
+        for module_type, ids in by_type.items():
+            try:
+                async with LocalDBPostgres() as db:
+                    runs = {run["id"]: run for run in await db.get_module_runs(get_module_config(module_type)["run_type"], ids)}
+            except Exception as e:
+                logger.error(f"Error reading finished {module_type} runs: {e}")
+                runs = {}
+            for run_id in ids:
+                request, _, _, encoding = self.running.pop(run_id)
+                if run_id not in runs:
+                    self.fail(request, module_type, Exception(f"{module_type} run {run_id} not found"))
+                    continue
+                try:
+                    update = module_run_to_proto(module_type, runs[run_id], encoding)
+                    update.request_id = request.request_id
+                    self.outbox.put_nowait(update)
+                    self.in_flight.release()
+                except Exception as e:
+                    self.fail(request, module_type, e, runs[run_id].get("consumer_id", ""))
+
 class GrpcServerServicer(grpc_server_pb2_grpc.GrpcServerServicer):
     async def CheckUser(self, request, context):
         logger.info(f"Checking user: {request.public_key}")
@@ -112,66 +491,9 @@ class GrpcServerServicer(grpc_server_pb2_grpc.GrpcServerServicer):
     async def RunModule(self, request, context):
         try:
             module_type = request.module_type
-            module_configs = {
-                "agent": {
-                    "input_class": AgentRunInput,
-                    "db_create": lambda db, input: db.create_agent_run(input),
-                    "db_list": lambda db, id: db.list_agent_runs(id),
-                    "worker": run_agent,
-                    "docker_support": True,
-                    "deployment_class": grpc_server_pb2.AgentDeployment
-                },
-                "memory": {
-                    "input_class": MemoryRunInput,
-                    "db_create": lambda db, input: db.create_memory_run(input),
-                    "db_list": lambda db, id: db.list_memory_runs(id),
-                    "worker": run_memory,
-                    "docker_support": False,
-                    "deployment_class": grpc_server_pb2.BaseDeployment
-                },
-                "tool": {
-                    "input_class": ToolRunInput,
-                    "db_create": lambda db, input: db.create_tool_run(input),
-                    "db_list": lambda db, id: db.list_tool_runs(id),
-                    "worker": run_tool,
-                    "docker_support": False,
-                    "deployment_class": grpc_server_pb2.ToolDeployment
-                },
-                "environment": {
-                    "input_class": EnvironmentRunInput,
-                    "db_create": lambda db, input: db.create_environment_run(input),
-                    "db_list": lambda db, id: db.list_environment_runs(id),
-                    "worker": run_environment,
-                    "docker_support": False,
-                    "deployment_class": grpc_server_pb2.BaseDeployment
-                },
-                "kb": {
-                    "input_class": KBRunInput,
-                    "db_create": lambda db, input: db.create_kb_run(input),
-                    "db_list": lambda db, id: db.list_kb_runs(id),
-                    "worker": run_kb,
-                    "docker_support": False,
-                    "deployment_class": grpc_server_pb2.BaseDeployment
-                }
-            }
-
-            if module_type not in module_configs:
-                raise ValueError(f"Invalid module type: {module_type}")
-
-            config = module_configs[module_type]
-            request_dict = MessageToDict(request, preserving_proto_field_name=True)
-
-            deployment_field = f"{module_type}_deployment"
-            if deployment_field in request_dict:
-                deployment = request_dict[deployment_field]
-                if 'node_input' in deployment:
-                    deployment['node'] = deployment.pop('node_input')
-                elif 'node_config' in deployment:
-                    deployment['node'] = deployment.pop('node_config')
-                request_dict['deployment'] = deployment
-
-            run_input = config["input_class"](**request_dict)
-            run_input.inputs = request_dict.get('inputs', {})
+            config = get_module_config(module_type)
+            encoding = payload_encoding(request)
+            run_input = request_to_run_input(request)
 
             logger.debug(f"Run input: {run_input}")
 
@@ -191,20 +513,7 @@ class GrpcServerServicer(grpc_server_pb2_grpc.GrpcServerServicer):
                 consumer_id=module_run_data['consumer_id']
             )
 
-            if isinstance(run_input.deployment.module, dict):
-                execution_type = run_input.deployment.module["execution_type"]
-            else:
-                execution_type = run_input.deployment.module.execution_type
-
-            if execution_type == ModuleExecutionType.package or execution_type == "package":
-                task = config["worker"].delay(module_run_data)
-            elif execution_type == ModuleExecutionType.docker or execution_type == "docker":
-                if config["docker_support"]:
-                    task = execute_docker_agent.delay(module_run_data)
-                else:
-                    raise Exception(f"Docker execution not supported for {module_type}")
-            else:
-                raise Exception(f"Invalid {module_type} run type")
+            task = await get_dispatcher().submit(module_task_signature(module_type, run_input, module_run_data))
 
             while not task.ready():
                 yield grpc_server_pb2.ModuleRun(
@@ -222,92 +531,7 @@ class GrpcServerServicer(grpc_server_pb2_grpc.GrpcServerServicer):
                 if isinstance(updated_run, list):
                     updated_run = updated_run[0]
 
-            if isinstance(updated_run, dict):
-                updated_run.pop("_sa_instance_state", None)
-            else:
-                updated_run = updated_run.__dict__
-                updated_run.pop("_sa_instance_state", None)
-
-            for time_field in ['created_time', 'start_processing_time', 'completed_time']:
-                if time_field in updated_run and isinstance(updated_run[time_field], datetime):
-                    updated_run[time_field] = updated_run[time_field].isoformat()
-
-            inputs = struct_pb2.Struct()
-            inputs.update(updated_run.get('inputs', {}))
-
-            deployment_data = updated_run.get("deployment", {})
-            DeploymentClass = config["deployment_class"]
-
-            if 'node' in deployment_data:
-                node_data = deployment_data['node']
-                if 'id' in node_data:
-                    node = grpc_server_pb2.NodeConfig(**node_data)
-                else:
-                    node = grpc_server_pb2.NodeConfigInput(**node_data)
-                
-                module_data = deployment_data.get("module", {})
-                if not isinstance(module_data, dict):
-                    module_data = module_data.__dict__
-                module = grpc_server_pb2.Module(**module_data)
-                
-                config_data = deployment_data.get("config", {})
-                if isinstance(config_data, dict):
-                    config_struct = struct_pb2.Struct()
-                    config_struct.update(config_data)
-                else:
-                    config_struct = config_data
-
-                deployment = DeploymentClass(
-                    name=deployment_data.get("name", ""),
-                    module=module,
-                    config=config_struct,
-                    initialized=deployment_data.get("initialized", False)
-                )
-                
-                if isinstance(node, grpc_server_pb2.NodeConfig):
-                    deployment.node_config.CopyFrom(node)
-                else:
-                    deployment.node_input.CopyFrom(node)
-
-            final_response = grpc_server_pb2.ModuleRun()
-
-            # Set basic fields
-            final_response.module_type = str(module_type)
-            final_response.consumer_id = str(updated_run.get("consumer_id", ""))
-            final_response.inputs.CopyFrom(inputs)
-            final_response.status = str(updated_run.get("status", "completed"))
-            final_response.error = bool(updated_run.get("error", False))
-            final_response.id = str(updated_run.get("id", ""))
-
-            # Extend list fields
-            if updated_run.get("results"):
-                final_response.results.extend([str(r) for r in updated_run.get("results", [])])
-
-            # Set optional string fields
-            if updated_run.get("error_message"):
-                final_response.error_message = str(updated_run.get("error_message"))
-            if updated_run.get("created_time"):
-                final_response.created_time = str(updated_run.get("created_time"))
-            if updated_run.get("start_processing_time"):
-                final_response.start_processing_time = str(updated_run.get("start_processing_time"))
-            if updated_run.get("completed_time"):
-                final_response.completed_time = str(updated_run.get("completed_time"))
-            if updated_run.get("duration") is not None:
-                final_response.duration = float(updated_run.get("duration", 0.0))
-
-            # Set deployment
-            if module_type == "agent":
-                final_response.agent_deployment.CopyFrom(deployment)
-            elif module_type == "tool":
-                final_response.tool_deployment.CopyFrom(deployment)
-            elif module_type == "memory":
-                final_response.memory_deployment.CopyFrom(deployment)
-            elif module_type == "kb":
-                final_response.kb_deployment.CopyFrom(deployment)
-            elif module_type == "environment":
-                final_response.environment_deployment.CopyFrom(deployment)
-
-            yield final_response
+            yield module_run_to_proto(module_type, updated_run, encoding)
 
         except Exception as e:
             logger.error(f"Error running {module_type} module: {e}")
@@ -317,11 +541,21 @@ class GrpcServerServicer(grpc_server_pb2_grpc.GrpcServerServicer):
                 status="error",
                 error=True,
                 error_message=str(e),
-                consumer_id=request_dict.get('consumer_id', ''),
+                consumer_id=request.consumer_id,
                 id="",
                 results=[]
             )
 
+    async def RunModules(self, request_iterator, context):
+        """
+        Run a stream of module runs. Requests are inserted and enqueued in batches and
+        every update is tagged with the request_id of its request. Updates stream back
+        in completion order, not request order.
+        """
+        stream = RunModulesStream(request_iterator)
+        async for update in stream.updates():
+            yield update
+
     async def CheckModuleRun(self, request, context):
         try:
             module_type = request.module_type
@@ -390,6 +624,8 @@ class GrpcServer:
             ("grpc.http2.min_time_between_pings_ms", 30 * 60 * 1000),  # 30 minutes
             ("grpc.max_connection_idle_ms", 60 * 60 * 1000),   # 1 hour
             ("grpc.max_connection_age_ms", 2 * 60 * 60 * 1000),  # 2 hours
+            # lets the worker processes of a multi-process server all bind the port
+            ("grpc.so_reuseport", 1),
         ]
 
         self.server = grpc.aio.server(options=options)
@@ -403,6 +639,7 @@ class GrpcServer:
         logger.info("Starting graceful shutdown...")
 
         await self.server.stop(timeout)
+        await close_dispatcher()
         self.shutdown_event.set()
         logger.info("Graceful shutdown complete.")
 
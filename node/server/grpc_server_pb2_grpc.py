@@ -60,6 +60,11 @@ class GrpcServerStub(object):
                 request_serializer=grpc__server__pb2.ModuleRunRequest.SerializeToString,
                 response_deserializer=grpc__server__pb2.ModuleRun.FromString,
                 _registered_method=True)
+        self.RunModules = channel.stream_stream(
+                '/agent.GrpcServer/RunModules',
+                request_serializer=grpc__server__pb2.ModuleRunRequest.SerializeToString,
+                response_deserializer=grpc__server__pb2.ModuleRun.FromString,
+                _registered_method=True)
         self.CheckModuleRun = channel.unary_unary(
                 '/agent.GrpcServer/CheckModuleRun',
                 request_serializer=grpc__server__pb2.ModuleRunCheck.SerializeToString,
@@ -100,6 +105,12 @@ class GrpcServerServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def RunModules(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def CheckModuleRun(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -134,6 +145,11 @@ def add_GrpcServerServicer_to_server(servicer, server):
                     request_deserializer=grpc__server__pb2.ModuleRunRequest.FromString,
                     response_serializer=grpc__server__pb2.ModuleRun.SerializeToString,
             ),
+            'RunModules': grpc.stream_stream_rpc_method_handler(
+                    servicer.RunModules,
+                    request_deserializer=grpc__server__pb2.ModuleRunRequest.FromString,
+                    response_serializer=grpc__server__pb2.ModuleRun.SerializeToString,
+            ),
             'CheckModuleRun': grpc.unary_unary_rpc_method_handler(
                     servicer.CheckModuleRun,
                     request_deserializer=grpc__server__pb2.ModuleRunCheck.FromString,
@@ -285,6 +301,33 @@ class GrpcServer(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def RunModules(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/agent.GrpcServer/RunModules',
+            grpc__server__pb2.ModuleRunRequest.SerializeToString,
+            grpc__server__pb2.ModuleRun.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def CheckModuleRun(request,
             target,
@@ -1,7 +1,9 @@
 import asyncio
 import httpx
 import logging
+import socket
 import traceback
+import uuid
 from datetime import datetime
 from typing import Union, Any, Dict, List, Optional
 import uvicorn
@@ -39,17 +41,24 @@ from node.schemas import (
     KBRun,
     ModuleExecutionType,
     ToolDeployment,
-    SecretInput
+    SecretInput,
+    ModuleRunBatchInput,
+    ModuleRunBatch,
 )
 from node.storage.db.db import LocalDBPostgres
 from node.storage.hub.hub import HubDBSurreal
 from node.user import check_user, register_user, get_user_public_key, verify_signature
+from node.worker.dispatcher import get_dispatcher, close_dispatcher
 from node.worker.docker_worker import execute_docker_agent
-from node.worker.package_worker import run_agent, run_tool, run_environment, run_orchestrator, run_kb, run_memory
+from node.worker.package_worker import run_agent, run_tool, run_environment, run_orchestrator, run_kb, run_memory, run_inline
 from node.client import Node as NodeClient
 from node.storage.server import router as storage_router
 from node.inference.server import router as inference_router
 from node.secret import Secret
+from node.server.compression import CompressionMiddleware, default_response_class
+from node.server.run_batch import RUN_BATCH_MAX_SIZE, batch_rows, submit_run_batch
+from node.server.inline_runs import INLINE_RUN_TIMEOUT, close_inline_pool, failed_run, get_inline_pool, inline_requested
+from node.server.grpc_pool_manager import get_grpc_pool_instance
 
 logger = logging.getLogger(__name__)
 load_dotenv()
@@ -73,7 +82,7 @@ class HTTPServer:
         self.host = host
         self.port = port
 
-        self.app = FastAPI()
+        self.app = FastAPI(default_response_class=default_response_class())
         router = APIRouter()
         self.server = None
         self.should_exit = False
@@ -83,6 +92,8 @@ class HTTPServer:
         async def shutdown_event():
             logger.info("Received shutdown signal from FastAPI")
             self.should_exit = True
+            await close_dispatcher()
+            close_inline_pool()
             # Add a short delay to allow the signal to propagate
             await asyncio.sleep(1)
         
@@ -281,6 +292,28 @@ class HTTPServer:
             """
             return await self.memory_check(memory_run)
 
+        @router.post("/{module_type}/run_batch")
+        async def module_run_batch_endpoint(module_type: str, batch_input: ModuleRunBatchInput, secrets: List[SecretInput] = []) -> ModuleRunBatch:
+            """
+            Run a module once for each of a list of inputs
+            :param module_type: agent, tool, orchestrator, environment, kb or memory
+            :param batch_input: Deployment, consumer and the inputs of every run
+            :param secrets: Optional list of secrets to pass to the module
+            :return: Ids of the created runs, in input order
+            """
+            return await self.run_module_batch(module_type, batch_input, secrets)
+
+        @router.get("/modules/dispatch_stats")
+        async def module_dispatch_stats_endpoint(window: float = Query(3600, description="seconds of runs to aggregate")):
+            """Cold start rate, affinity hit rate and queue wait of the module runs started recently, per module."""
+            async with LocalDBPostgres() as db:
+                return await db.get_module_dispatch_stats(window)
+
+        @router.get("/grpc/pool_stats")
+        async def grpc_pool_stats_endpoint():
+            """In-flight calls, failures, channel states and call latency of this server's gRPC channels to other nodes, per target."""
+            return get_grpc_pool_instance().stats()
+
         # User endpoints
         @router.post("/user/check")
         async def user_check_endpoint(user_input: dict):
@@ -353,6 +386,7 @@ class HTTPServer:
             allow_methods=["*"],
             allow_headers=["*"],
         )
+        self.app.add_middleware(CompressionMiddleware)
 
     async def register_user_on_worker_nodes(self, module_run: Union[AgentRun, OrchestratorRun]):
         """
@@ -464,6 +498,12 @@ class HTTPServer:
                 decrypted_value = secret.decrypt_with_aes(record.secret_value, base64.b64decode(os.getenv("AES_SECRET")))
                 user_env_data[record.key_name] = decrypted_value
 
+            if inline_requested(module_run_input.deployment):
+                module_run_data = await self.run_module_inline(module_run_input, create_func, user_env_data)
+                if module_run_data is not None:
+                    return module_run_data
+                logger.info(f"Inline run pool is busy, queueing {module_type} run")
+
             # Create module run record in DB
             async with LocalDBPostgres() as db:
                 module_run = await create_func(db)(module_run_input)
@@ -478,24 +518,24 @@ class HTTPServer:
             # Execute the task based on module type
             if module_run_input.deployment.module.execution_type == ModuleExecutionType.package:
                 if module_type == "agent":
-                    _ = run_agent.delay(module_run_data, user_env_data)
+                    _ = await get_dispatcher().submit(run_agent.s(module_run_data, user_env_data), track=False)
                 elif module_type == "tool":
-                    _ = run_tool.delay(module_run_data, user_env_data)
+                    _ = await get_dispatcher().submit(run_tool.s(module_run_data, user_env_data), track=False)
                 elif module_type == "orchestrator":
-                    _ = run_orchestrator.delay(module_run_data, user_env_data)
+                    _ = await get_dispatcher().submit(run_orchestrator.s(module_run_data, user_env_data), track=False)
                 elif module_type == "environment":
-                    _ = run_environment.delay(module_run_data, user_env_data)
+                    _ = await get_dispatcher().submit(run_environment.s(module_run_data, user_env_data), track=False)
                 elif module_type == "kb":
-                    _ = run_kb.delay(module_run_data, user_env_data)
+                    _ = await get_dispatcher().submit(run_kb.s(module_run_data, user_env_data), track=False)
                 elif module_type == "memory":
-                    _ = run_memory.delay(module_run_data, user_env_data)                   
+                    _ = await get_dispatcher().submit(run_memory.s(module_run_data, user_env_data), track=False)
             elif module_run_input.deployment.module.execution_type == ModuleExecutionType.docker and module_type == "agent":
                 # validate docker params
                 try:
                     _ = DockerParams(**module_run_data["inputs"])
                 except Exception as e:
                     raise HTTPException(status_code=400, detail=f"Invalid docker params: {str(e)}")
-                _ = execute_docker_agent.delay(module_run_data)
+                _ = await get_dispatcher().submit(execute_docker_agent.s(module_run_data), track=False)
             else:
                 raise HTTPException(status_code=400, detail=f"Invalid {module_type} run type")
 
@@ -513,6 +553,130 @@ class HTTPServer:
                 status_code=500, detail=f"Failed to run module: {module_run_input}"
             )
 
+    async def run_module_inline(
+        self,
+        module_run_input: Union[MemoryRunInput, ToolRunInput],
+        create_func,
+        user_env_data: Dict = {}
+    ) -> Optional[Dict]:
+        """
+        Run a tool or memory run in the server's inline pool and insert its record once it finished
+        :return: The finished run, or None when the pool is busy
+        """
+        # as for queued runs, before the module can call other nodes
+        await self.register_user_on_worker_nodes(module_run_input)
+
+        module_run_data = {**module_run_input.model_dict(), "id": str(uuid.uuid4()), "status": "pending"}
+        try:
+            finished_run = await get_inline_pool(run_inline).run(module_run_data, user_env_data)
+        except asyncio.TimeoutError:
+            finished_run = failed_run(module_run_data, f"Inline run timed out after {INLINE_RUN_TIMEOUT} seconds")
+        except Exception as e:
+            logger.error(f"Inline run failed: {str(e)}")
+            finished_run = failed_run(module_run_data, f"Inline run failed: {str(e)}")
+        if finished_run is None:
+            return None
+
+        async with LocalDBPostgres() as db:
+            module_run = await create_func(db)(finished_run)
+            if not module_run:
+                raise HTTPException(status_code=500, detail="Failed to create inline run")
+        return module_run.model_dump()
+
+    async def run_module_batch(
+        self,
+        module_type: str,
+        batch_input: ModuleRunBatchInput,
+        secrets: List[SecretInput] = []
+    ) -> ModuleRunBatch:
+        """
+        Create and dispatch one run of a deployment per input, verifying the consumer once.
+        Runs of inline deployments are queued too, the response doesn't wait for them.
+        :return: Ids of the created runs
+        """
+        batch_types = {
+            "agent": (AgentRunInput, AgentDeployment, "agent", run_agent),
+            "tool": (ToolRunInput, ToolDeployment, "tool", run_tool),
+            "orchestrator": (OrchestratorRunInput, OrchestratorDeployment, "orchestrator", run_orchestrator),
+            "environment": (EnvironmentRunInput, EnvironmentDeployment, "environment", run_environment),
+            "kb": (KBRunInput, KBDeployment, "knowledge_base", run_kb),
+            "memory": (MemoryRunInput, MemoryDeployment, "memory", run_memory),
+        }
+        if module_type not in batch_types:
+            raise HTTPException(status_code=400, detail=f"Invalid module type: {module_type}")
+        if not batch_input.inputs:
+            raise HTTPException(status_code=400, detail="No run inputs")
+        if len(batch_input.inputs) > RUN_BATCH_MAX_SIZE:
+            raise HTTPException(status_code=400, detail=f"At most {RUN_BATCH_MAX_SIZE} runs per batch")
+        input_class, deployment_class, run_type, worker = batch_types[module_type]
+
+        try:
+            deployment = deployment_class(**batch_input.deployment)
+            if not deployment.initialized:
+                deployment = await self.create_module(deployment)
+
+            logger.info(f"Received request to run a batch of {len(batch_input.inputs)} {module_type} runs")
+
+            user_public_key = await get_user_public_key(batch_input.consumer_id)
+
+            if not verify_signature(batch_input.consumer_id, batch_input.signature, user_public_key):
+                raise HTTPException(status_code=401, detail="Unauthorized: Invalid signature")
+
+            user_env_data = {}
+            secret = Secret()
+
+            for record in secrets:
+                decrypted_value = secret.decrypt_with_aes(record.secret_value, base64.b64decode(os.getenv("AES_SECRET")))
+                user_env_data[record.key_name] = decrypted_value
+
+            if isinstance(deployment.module, dict):
+                execution_type = deployment.module.get("execution_type", ModuleExecutionType.package)
+            else:
+                execution_type = deployment.module.execution_type
+
+            if execution_type == ModuleExecutionType.package:
+                def task_signature(module_run_data):
+                    return worker.s(module_run_data, user_env_data)
+            elif execution_type == ModuleExecutionType.docker and module_type == "agent":
+                # validate docker params
+                for run_inputs in batch_input.inputs:
+                    try:
+                        _ = DockerParams(**run_inputs)
+                    except Exception as e:
+                        raise HTTPException(status_code=400, detail=f"Invalid docker params: {str(e)}")
+                def task_signature(module_run_data):
+                    return execute_docker_agent.s(module_run_data)
+            else:
+                raise HTTPException(status_code=400, detail=f"Invalid {module_type} run type")
+
+            run_template = input_class(
+                consumer_id=batch_input.consumer_id,
+                deployment=deployment,
+                signature=batch_input.signature,
+            ).model_dict()
+
+            async with LocalDBPostgres() as db:
+                run_ids = await submit_run_batch(
+                    db,
+                    get_dispatcher(),
+                    run_type,
+                    batch_rows(run_template, batch_input.inputs),
+                    task_signature,
+                )
+
+            return ModuleRunBatch(module_type=module_type, run_ids=run_ids)
+
+        except HTTPException as e:
+            logger.error(f"Error: {str(e.detail)}")
+            raise e
+
+        except Exception as e:
+            logger.error(f"Failed to run module batch: {str(e)}")
+            logger.error(f"Full traceback: {traceback.format_exc()}")
+            raise HTTPException(
+                status_code=500, detail=f"Failed to run {module_type} batch"
+            )
+
     async def agent_create(self, agent_deployment: AgentDeployment) -> AgentDeployment:
         agent_deployment.module['module_type'] = "agent"
         return await self.create_module(agent_deployment)
@@ -658,7 +822,7 @@ class HTTPServer:
             await self.server.shutdown()
             logger.info("HTTP server stopped")
 
-    async def launch_server(self):
+    async def launch_server(self, sockets: Optional[List[socket.socket]] = None):
         logger.info(f"Launching HTTP server on 0.0.0.0:{self.port}...")
         config = uvicorn.Config(
             self.app,
@@ -674,6 +838,6 @@ class HTTPServer:
         self.server = uvicorn.Server(config)
         self._started = True
         try:
-            await self.server.serve()
+            await self.server.serve(sockets=sockets)
         finally:
             self._started = False
\ No newline at end of file
@@ -0,0 +1,166 @@
+"""Inline execution of lightweight tool and memory runs.
+
+A tool or memory deployment whose config sets execution_mode to "inline", in the module's
+configs/deployment.json or in the config of the run request, skips the task queue: the run
+executes in a small pool of warm processes owned by the server, and /tool/run or /memory/run
+responds with the finished run. The run record is inserted once, after the run finished,
+instead of being created, dispatched and updated at every status change.
+
+Each server process keeps INLINE_RUN_WORKERS spawned processes, so module runs changing the
+working directory and environment don't affect the server, and installed modules stay warm
+between runs. When all of them are busy a run goes through the task queue as usual. A run
+taking longer than INLINE_RUN_TIMEOUT seconds is recorded as failed, its process stays
+occupied until the module returns. When a module kills its process, the run fails and the pool
+is replaced by a new one.
+"""
+import asyncio
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from dotenv import load_dotenv
+import importlib
+import logging
+import multiprocessing
+import os
+import pytz
+from typing import Any, Callable, Dict, Optional
+
+from node.schemas import ModuleExecutionMode, ModuleExecutionType
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# warm processes per server process running inline runs, 0 sends every run through the task queue
+INLINE_RUN_WORKERS = int(os.getenv("INLINE_RUN_WORKERS", 2))
+INLINE_RUN_TIMEOUT = float(os.getenv("INLINE_RUN_TIMEOUT", 30))
+INLINE_MODULE_TYPES = ("tool", "memory")
+
+
+def _get(value: Any, key: str) -> Any:
+    if isinstance(value, dict):
+        return value.get(key)
+    return getattr(value, key, None)
+
+
+def inline_requested(deployment: Any) -> bool:
+    """Whether a package tool or memory deployment opted in to inline execution"""
+    module = _get(deployment, "module")
+    if _get(module, "module_type") not in INLINE_MODULE_TYPES:
+        return False
+    if _get(module, "execution_type") not in (None, ModuleExecutionType.package):
+        return False
+    return _get(_get(deployment, "config"), "execution_mode") == ModuleExecutionMode.inline
+
+
+def failed_run(module_run: Dict, error_message: str) -> Dict:
+    """module_run marked as failed by the server, when the pool couldn't return it"""
+    return {
+        **module_run,
+        "status": "error",
+        "error": True,
+        "error_message": error_message,
+        "completed_time": datetime.now(pytz.utc).isoformat(),
+        "duration": 0,
+    }
+
+
+class InlineRunPool:
+    """A bounded pool of warm processes running module runs for the server.
+
+    target is the function the processes call with the run and the user's environment, it
+    returns the finished run. Its module is imported when a process starts, so the first run
+    doesn't pay for the imports.
+    """
+
+    def __init__(
+        self,
+        target: Callable[[Dict, Dict], Dict],
+        workers: int = INLINE_RUN_WORKERS,
+        timeout: float = INLINE_RUN_TIMEOUT,
+        executor_factory: Optional[Callable[[], Executor]] = None,
+    ):
+        self.target = target
+        self.workers = workers
+        self.timeout = timeout
+        self.executor_factory = executor_factory or self._process_pool
+        self.executor: Optional[Executor] = None
+        self.in_flight = 0
+
+    def _process_pool(self) -> Executor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=importlib.import_module,
+            initargs=(self.target.__module__,),
+        )
+
+    def start(self):
+        if self.executor is None and self.workers > 0:
+            self.executor = self.executor_factory()
+            # start the processes now rather than on the first runs
+            for _ in range(self.workers):
+                self.executor.submit(os.getpid)
+            logger.info(f"Inline run pool started with {self.workers} workers")
+
+    def _release(self, future: Future):
+        self.in_flight -= 1
+
+    def _restart(self, executor: Executor):
+        """Replace a pool whose process died, e.g. a module crashed the interpreter"""
+        if self.executor is not executor:
+            # another run already restarted it
+            return
+        logger.error("Inline run pool is broken, restarting it")
+        executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = None
+        self.start()
+
+    async def run(self, module_run: Dict, user_env_data: Dict = {}) -> Optional[Dict]:
+        """The finished run, or None when every worker is busy and the run should be queued.
+
+        Raises asyncio.TimeoutError when the run didn't finish within the timeout, and
+        BrokenProcessPool when its process died, the pool is restarted for the next runs.
+        """
+        if self.in_flight >= self.workers:
+            return None
+        self.start()
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self.executor, self.target, module_run, user_env_data)
+        except BrokenProcessPool:
+            # a process died after its last run returned
+            self._restart(self.executor)
+            future = loop.run_in_executor(self.executor, self.target, module_run, user_env_data)
+        executor = self.executor
+        # the worker stays occupied until the target returns, even after the caller timed out
+        self.in_flight += 1
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except BrokenProcessPool:
+            # the process died during this run
+            self._restart(executor)
+            raise
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+# Singleton accessor functions
+_inline_pool = None
+
+
+def get_inline_pool(target: Callable[[Dict, Dict], Dict]) -> InlineRunPool:
+    global _inline_pool
+    if _inline_pool is None:
+        _inline_pool = InlineRunPool(target)
+    return _inline_pool
+
+
+def close_inline_pool():
+    global _inline_pool
+    if _inline_pool:
+        _inline_pool.close()
+        _inline_pool = None
@@ -0,0 +1,168 @@
+from datetime import datetime
+import json
+from typing import Any, Dict, Optional
+
+from google.protobuf import struct_pb2
+from google.protobuf.descriptor import FieldDescriptor
+from google.protobuf.json_format import MessageToDict
+
+from node.schemas import (
+    DataGenerationConfig,
+    EnvironmentDeployment,
+    KBDeployment,
+    NodeConfig,
+    NodeConfigInput,
+    ToolDeployment,
+)
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+JSON = "json"
+MSGPACK = "msgpack"
+# websocket subprotocol a client offers when it can send and read msgpack binary frames
+MSGPACK_SUBPROTOCOL = "naptha.msgpack"
+
+
+class PayloadEncodingError(ValueError):
+    pass
+
+
+def check_encoding(encoding: str) -> str:
+    if encoding == JSON:
+        return encoding
+    if encoding == MSGPACK:
+        if not MSGPACK_AVAILABLE:
+            raise PayloadEncodingError("msgpack payloads need the msgpack package installed on the node")
+        return encoding
+    raise PayloadEncodingError(f"Unsupported payload encoding: {encoding}")
+
+
+def encode_default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_payload(value: Any, encoding: str = JSON) -> bytes:
+    """Serialize inputs or results for a bytes payload field or a websocket frame"""
+    if check_encoding(encoding) == MSGPACK:
+        # datetimes and other non msgpack types become strings like on the JSON path
+        return msgpack.packb(value, default=encode_default)
+    return json.dumps(value, default=encode_default, separators=(",", ":")).encode()
+
+
+def decode_payload(data: bytes, encoding: str = JSON) -> Any:
+    try:
+        if check_encoding(encoding) == MSGPACK:
+            return msgpack.unpackb(data)
+        return json.loads(data)
+    except PayloadEncodingError:
+        raise
+    except Exception as e:
+        raise PayloadEncodingError(f"Invalid {encoding} payload: {e}") from e
+
+
+def struct_value(value: struct_pb2.Value) -> Any:
+    kind = value.WhichOneof("kind")
+    if kind == "struct_value":
+        return struct_to_dict(value.struct_value)
+    if kind == "list_value":
+        return [struct_value(item) for item in value.list_value.values]
+    if kind == "null_value" or kind is None:
+        return None
+    return getattr(value, kind)
+
+
+def struct_to_dict(struct: struct_pb2.Struct) -> Dict[str, Any]:
+    """Struct to plain Python values, without the JSON round trip of MessageToDict.
+
+    Numbers stay doubles as the Struct stores them, which is what payload fields avoid.
+    """
+    return {key: struct_value(value) for key, value in struct.fields.items()}
+
+
+# repeated sub-deployments of an AgentDeployment message and the schemas they map to
+SUB_DEPLOYMENT_SCHEMAS = {
+    "tool_deployments": ToolDeployment,
+    "kb_deployments": KBDeployment,
+    "environment_deployments": EnvironmentDeployment,
+}
+
+
+def message_fields(message) -> Dict[str, Any]:
+    """
+    The set fields of a message as keyword arguments for its pydantic schema.
+
+    Like MessageToDict, fields left at their proto3 default are omitted so the schema
+    defaults apply, but values keep their Python types instead of going through JSON.
+    """
+    fields = {}
+    for field, value in message.ListFields():
+        if field.message_type is None:
+            fields[field.name] = list(value) if field.label == FieldDescriptor.LABEL_REPEATED else value
+        elif field.message_type.full_name == "google.protobuf.Struct":
+            fields[field.name] = struct_to_dict(value)
+        elif field.label == FieldDescriptor.LABEL_REPEATED:
+            fields[field.name] = [message_fields(item) for item in value]
+        else:
+            fields[field.name] = message_fields(value)
+    return fields
+
+
+def deployment_from_proto(schema, message):
+    """Build a deployment schema straight from its deployment message"""
+    fields = {}
+    if message.name:
+        fields["name"] = message.name
+    if message.initialized:
+        fields["initialized"] = True
+    node_field = message.WhichOneof("node")
+    if node_field == "node_config":
+        fields["node"] = NodeConfig(**message_fields(message.node_config))
+    elif node_field == "node_input":
+        fields["node"] = NodeConfigInput(**message_fields(message.node_input))
+    if message.HasField("module"):
+        # the Struct path also left the module a dict
+        fields["module"] = message_fields(message.module)
+    if message.HasField("config"):
+        fields["config"] = struct_to_dict(message.config)
+    if "data_generation_config" in schema.model_fields and message.HasField("data_generation_config"):
+        fields["data_generation_config"] = DataGenerationConfig(**message_fields(message.data_generation_config))
+    for field_name, sub_schema in SUB_DEPLOYMENT_SCHEMAS.items():
+        if field_name in schema.model_fields and hasattr(message, field_name) and len(getattr(message, field_name)):
+            fields[field_name] = [deployment_from_proto(sub_schema, sub) for sub in getattr(message, field_name)]
+    return schema(**fields)
+
+
+def payload_encoding(request) -> Optional[str]:
+    """Encoding of a ModuleRunRequest's payload fields, None when it uses the inputs Struct and string results"""
+    if request.HasField("payload_encoding"):
+        return check_encoding(request.payload_encoding)
+    if request.inputs_payload:
+        return JSON
+    return None
+
+
+def run_input_from_proto(request, input_class, deployment_schema):
+    """Build a run input from a ModuleRunRequest without converting the whole request to a dict"""
+    fields = {"consumer_id": request.consumer_id}
+    deployment_field = f"{request.module_type}_deployment"
+    if request.WhichOneof("deployment") == deployment_field:
+        fields["deployment"] = deployment_from_proto(deployment_schema, getattr(request, deployment_field))
+    if request.orchestrator_runs:
+        fields["orchestrator_runs"] = [
+            MessageToDict(run, preserving_proto_field_name=True) for run in request.orchestrator_runs
+        ]
+    if request.HasField("signature"):
+        fields["signature"] = request.signature
+
+    run_input = input_class(**fields)
+    if request.inputs_payload:
+        run_input.inputs = decode_payload(request.inputs_payload, payload_encoding(request))
+    else:
+        run_input.inputs = struct_to_dict(request.inputs)
+    return run_input
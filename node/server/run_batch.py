@@ -0,0 +1,38 @@
+"""Submission of many runs of one deployment in a single request.
+
+/{module_type}/run_batch verifies the consumer once, inserts the rows of all runs with one
+multi-row insert and hands their tasks to the dispatcher together, a Celery group or one
+batch of the Postgres queue. It responds with the run ids without waiting for the runs,
+their status is read with the /{module_type}/check endpoints.
+"""
+from dotenv import load_dotenv
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+from celery.canvas import Signature
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+RUN_BATCH_MAX_SIZE = int(os.getenv("RUN_BATCH_MAX_SIZE", 10000))
+
+
+def batch_rows(run_template: Dict[str, Any], inputs: List[Optional[Dict]]) -> List[Dict[str, Any]]:
+    """Run rows differing only in their inputs, the deployment is serialized once for all of them"""
+    return [{**run_template, "inputs": run_inputs} for run_inputs in inputs]
+
+
+async def submit_run_batch(
+    db,
+    dispatcher,
+    run_type: str,
+    rows: List[Dict[str, Any]],
+    task_signature: Callable[[Dict[str, Any]], Signature],
+) -> List[str]:
+    """Insert the runs and dispatch their tasks, the ids of the created runs in input order"""
+    module_runs = await db.create_module_runs(rows, run_type)
+    runs_data = [module_run.model_dump() for module_run in module_runs]
+    await dispatcher.submit_many([task_signature(module_run_data) for module_run_data in runs_data], track=False)
+    logger.info(f"Submitted a batch of {len(runs_data)} {run_type} runs")
+    return [module_run_data["id"] for module_run_data in runs_data]
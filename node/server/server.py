@@ -10,6 +10,7 @@ from node.storage.hub.hub import HubDBSurreal
 from node.server.http_server import HTTPServer
 from node.server.ws_server import WebSocketServer
 from node.server.grpc_server import GrpcServer
+from node.server.workers import SO_REUSEPORT_AVAILABLE, WorkerSupervisor, default_workers, reuseport_socket
 from node.utils import get_logger, get_node_config
 from node.secret import Secret
 
@@ -22,7 +23,7 @@ PARENT_DIR = FILE_PATH.parent
 
 
 class NodeServer:
-    def __init__(self, communication_protocol: str, port: int):
+    def __init__(self, communication_protocol: str, port: int, supervised: bool = False):
         self.node_config = get_node_config()
         self.node_id = self.node_config.id.split(":")[1]
         # Store initial config values
@@ -30,6 +31,8 @@ class NodeServer:
         self.server: Optional[HTTPServer | WebSocketServer | GrpcServer] = None
         self.communication_protocol = communication_protocol
         self.port = port
+        # a worker process of a multi-process server, its supervisor registers the node and handles shutdown
+        self.supervised = supervised
         self.hub = HubDBSurreal()
         self.shutdown_event = asyncio.Event()
 
@@ -95,6 +98,9 @@ class NodeServer:
         else:
             ip = self.ip
 
+        # supervised workers each bind their own SO_REUSEPORT socket on the shared port
+        sockets = [reuseport_socket(self.port)] if self.supervised and self.communication_protocol != "grpc" else None
+
         if self.communication_protocol == "http":
             logger.info(f"Starting HTTP server on port {self.port}...")
             self.server = HTTPServer(ip, self.port)
@@ -102,13 +108,14 @@ class NodeServer:
             self.server.app.state.node_server = self
             
             # Add shutdown event handler
-            @self.server.app.on_event("shutdown")
-            async def shutdown_event():
-                logger.info("FastAPI shutdown event triggered")
-                try:
-                    await self.graceful_shutdown()
-                except Exception as e:
-                    logger.error(f"Error during shutdown: {e}")
+            if not self.supervised:
+                @self.server.app.on_event("shutdown")
+                async def shutdown_event():
+                    logger.info("FastAPI shutdown event triggered")
+                    try:
+                        await self.graceful_shutdown()
+                    except Exception as e:
+                        logger.error(f"Error during shutdown: {e}")
 
         elif self.communication_protocol in ["ws", "wss"]:
             logger.info(f"Starting WebSocket server on port {self.port}...")
@@ -127,7 +134,10 @@ class NodeServer:
         else:
             raise ValueError(f"Invalid server type: {self.communication_protocol}")
 
-        await self.server.launch_server()
+        if sockets is None:
+            await self.server.launch_server()
+        else:
+            await self.server.launch_server(sockets=sockets)
 
     async def unregister_node(self):
         """Unregister the node from the hub - only HTTP server does this"""
@@ -253,6 +263,52 @@ async def run_server(communication_protocol: str, port: int):
         if not node_server.shutdown_event.is_set():
             await node_server.graceful_shutdown()
 
+async def run_worker(communication_protocol: str, port: int):
+    """A worker process of a multi-process server, it serves until SIGTERM and then drains"""
+    node_server = NodeServer(communication_protocol, port, supervised=True)
+    await node_server.start_server()
+
+
+def worker_main(communication_protocol: str, port: int, index: int):
+    logger.info(f"{communication_protocol} worker {index} starting on port {port} (pid {os.getpid()})")
+    asyncio.run(run_worker(communication_protocol, port))
+
+
+def run_supervisor(communication_protocol: str, port: int, workers: int):
+    """Registers the node once, runs the workers until a signal, drains them and unregisters"""
+    node_server = NodeServer(communication_protocol, port, supervised=True)
+    register = REGISTER_NODE_WITH_HUB == "true" and communication_protocol == "http"
+    if register:
+        if node_server.node_config.ip == "localhost":
+            logger.error("Unable to register a localhost server with the hub")
+            raise Exception("Cannot register node on hub with NODE_IP localhost. Either change REGISTER_NODE_WITH_HUB to false, or set NODE_IP to your public IP address or domain name in config.py.")
+        asyncio.run(node_server.register_node())
+        logger.info("Node registered with hub")
+    else:
+        logger.info("Skipping registration of node with hub")
+
+    supervisor = WorkerSupervisor(worker_main, (communication_protocol, port), workers, name=f"{communication_protocol}-{port}")
+
+    def signal_handler(sig, frame):
+        logger.info(f"Received exit signal {signal.Signals(sig).name}...")
+        supervisor.stopping.set()
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, signal_handler)
+
+    try:
+        supervisor.start()
+        supervisor.monitor()
+    finally:
+        supervisor.stop()
+        if register:
+            try:
+                asyncio.run(asyncio.wait_for(node_server.unregister_node(), timeout=20.0))
+                logger.info("Node unregistration completed successfully")
+            except Exception as e:
+                logger.error(f"Failed to unregister node during shutdown: {e}")
+
+
 if __name__ == "__main__":
     import argparse
 
@@ -270,8 +326,15 @@ if __name__ == "__main__":
         required=True,
         help="Port to run the server on"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes sharing the port, defaults to HTTP_SERVER_WORKERS or NODE_SERVER_WORKERS"
+    )
     
     args = parser.parse_args()
+    workers = args.workers if args.workers is not None else default_workers(args.communication_protocol)
 
     server_private_key_path = os.path.join(os.path.dirname(__file__), '../../private_key.pem')
     server_public_key_path = os.path.join(os.path.dirname(__file__), '../../public_key.pem')
@@ -281,7 +344,18 @@ if __name__ == "__main__":
     secret.check_and_generate_keys()
     secret.check_and_generate_aes_secret()
 
-    asyncio.run(run_server(
-        communication_protocol=args.communication_protocol,
-        port=args.port
-    ))
\ No newline at end of file
+    if workers > 1 and not SO_REUSEPORT_AVAILABLE:
+        logger.warning("SO_REUSEPORT is not available on this platform, running a single server process")
+        workers = 1
+
+    if workers > 1:
+        run_supervisor(
+            communication_protocol=args.communication_protocol,
+            port=args.port,
+            workers=workers
+        )
+    else:
+        asyncio.run(run_server(
+            communication_protocol=args.communication_protocol,
+            port=args.port
+        ))
\ No newline at end of file
@@ -0,0 +1,116 @@
+# workers.py
+from dotenv import load_dotenv
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# processes serving the user port (http) and each node communication port (ws, grpc)
+HTTP_SERVER_WORKERS = int(os.getenv("HTTP_SERVER_WORKERS", 1))
+NODE_SERVER_WORKERS = int(os.getenv("NODE_SERVER_WORKERS", 1))
+# how long workers get to finish in-flight requests after SIGTERM before they're killed,
+# longer than the servers' own graceful shutdown timeouts
+WORKER_DRAIN_TIMEOUT = float(os.getenv("WORKER_DRAIN_TIMEOUT", 40))
+# a worker that dies sooner than this after starting isn't restarted, it would only die again
+MIN_WORKER_UPTIME = 5.0
+SO_REUSEPORT_AVAILABLE = hasattr(socket, "SO_REUSEPORT")
+
+
+def default_workers(communication_protocol: str) -> int:
+    return HTTP_SERVER_WORKERS if communication_protocol == "http" else NODE_SERVER_WORKERS
+
+
+def reuseport_socket(port: int, host: str = "0.0.0.0", backlog: int = 4096) -> socket.socket:
+    """
+    Listening socket with SO_REUSEPORT set, every worker binds its own on the same port
+    and the kernel spreads incoming connections across them.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+class WorkerSupervisor:
+    """
+    Runs count copies of target(*args, index) in spawned processes and keeps them running.
+
+    Workers share nothing: each one opens its own listening socket, database and broker
+    connections. stop() sends SIGTERM so the workers stop accepting connections and finish
+    what they're serving, and kills the ones still running after drain_timeout. A worker
+    that exits on its own is restarted unless it died right after starting.
+    """
+
+    def __init__(self, target: Callable, args: Tuple, count: int, drain_timeout: float = WORKER_DRAIN_TIMEOUT, name: str = "worker"):
+        self.target = target
+        self.args = args
+        self.count = max(1, count)
+        self.drain_timeout = drain_timeout
+        self.name = name
+        self.context = multiprocessing.get_context("spawn")
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * self.count
+        self.started: List[float] = [0.0] * self.count
+        self.stopping = threading.Event()
+
+    def _spawn(self, index: int):
+        process = self.context.Process(target=self.target, args=(*self.args, index), name=f"{self.name}-{index}", daemon=False)
+        process.start()
+        self.processes[index] = process
+        self.started[index] = time.monotonic()
+        logger.info(f"Started {process.name} (pid {process.pid})")
+
+    def start(self):
+        for index in range(self.count):
+            self._spawn(index)
+
+    def alive(self) -> int:
+        return sum(1 for process in self.processes if process is not None and process.is_alive())
+
+    def check(self) -> bool:
+        """Restart workers that exited, False once none are left to run"""
+        for index, process in enumerate(self.processes):
+            if process is None or process.is_alive() or self.stopping.is_set():
+                continue
+            process.join()
+            if time.monotonic() - self.started[index] < MIN_WORKER_UPTIME:
+                logger.error(f"{process.name} exited with code {process.exitcode} right after starting, not restarting it")
+                self.processes[index] = None
+                continue
+            logger.warning(f"{process.name} exited with code {process.exitcode}, restarting it")
+            self._spawn(index)
+        return any(process is not None for process in self.processes)
+
+    def monitor(self, interval: float = 1.0):
+        """Block until stop() is called or every worker is gone"""
+        while not self.stopping.wait(interval):
+            if not self.check():
+                logger.error(f"No {self.name} processes left running")
+                return
+
+    def stop(self):
+        self.stopping.set()
+        running = [process for process in self.processes if process is not None and process.is_alive()]
+        logger.info(f"Draining {len(running)} {self.name} processes...")
+        for process in running:
+            try:
+                os.kill(process.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.drain_timeout
+        for process in running:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"{process.name} still running after {self.drain_timeout}s, killing it")
+                process.kill()
+                process.join()
+        logger.info(f"All {self.name} processes stopped")
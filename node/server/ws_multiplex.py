@@ -0,0 +1,122 @@
+# ws_multiplex.py
+import asyncio
+from dotenv import load_dotenv
+from fastapi import WebSocket, WebSocketDisconnect
+import json
+import logging
+import os
+import traceback
+from typing import Any, Awaitable, Callable, Dict, Optional, Type
+
+from node.server.payloads import MSGPACK, MSGPACK_AVAILABLE, MSGPACK_SUBPROTOCOL, PayloadEncodingError, decode_payload, encode_payload
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# messages carrying a request_id that one connection processes at once, reading pauses at the limit
+WS_MAX_IN_FLIGHT_PER_CONNECTION = int(os.getenv("WS_MAX_IN_FLIGHT_PER_CONNECTION", 256))
+
+
+def negotiate_subprotocol(websocket: WebSocket) -> Optional[str]:
+    """The msgpack subprotocol if the client offers it, accept the connection with it"""
+    if MSGPACK_AVAILABLE and MSGPACK_SUBPROTOCOL in websocket.scope.get("subprotocols", []):
+        return MSGPACK_SUBPROTOCOL
+    return None
+
+
+class MultiplexedConnection:
+    """
+    Serves the messages of one websocket connection.
+
+    A message carrying a request_id is processed concurrently with the others, at most
+    max_in_flight at a time, and its reply carries the same request_id
+    and is sent as soon as it is ready, so replies can arrive out of order. A message
+    without a request_id is answered before the next message is read, as before.
+
+    Text frames carry JSON and binary frames carry msgpack, each reply is sent in the
+    same encoding as its request.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        name: str,
+        handle: Callable[[Any], Awaitable[Dict]],
+        encoder: Type[json.JSONEncoder] = json.JSONEncoder,
+        max_in_flight: int = WS_MAX_IN_FLIGHT_PER_CONNECTION,
+    ):
+        self.websocket = websocket
+        self.name = name
+        self.handle = handle
+        self.encoder = encoder
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.send_lock = asyncio.Lock()
+        self.tasks = set()
+
+    async def send(self, response: Dict, binary: bool = False):
+        if binary:
+            message = encode_payload(response, MSGPACK)
+            async with self.send_lock:
+                await self.websocket.send_bytes(message)
+            return
+        message = json.dumps(response, cls=self.encoder)
+        async with self.send_lock:
+            await self.websocket.send_text(message)
+
+    async def receive(self):
+        """The next frame's data and whether it was binary"""
+        message = await self.websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        if message.get("bytes") is not None:
+            return decode_payload(message["bytes"], MSGPACK), True
+        return json.loads(message["text"]), False
+
+    async def respond(self, data) -> Dict:
+        try:
+            return await self.handle(data)
+        except Exception as e:
+            logger.error(f"Error processing request on {self.name}: {str(e)}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            return {"status": "error", "message": str(e)}
+
+    async def run(self, request_id, data, binary: bool):
+        try:
+            response = await self.respond(data)
+            await self.send({"request_id": request_id, **response}, binary)
+        except Exception as e:
+            logger.error(f"Error sending reply to {request_id} on {self.name}: {str(e)}")
+        finally:
+            self.in_flight.release()
+
+    async def serve(self):
+        try:
+            while True:
+                try:
+                    data, binary = await self.receive()
+                except json.JSONDecodeError:
+                    logger.error("Invalid JSON received")
+                    await self.send({"status": "error", "message": "Invalid JSON"})
+                    continue
+                except PayloadEncodingError as e:
+                    logger.error(str(e))
+                    await self.send({"status": "error", "message": str(e)}, binary=MSGPACK_AVAILABLE)
+                    continue
+
+                request_id = data.pop("request_id", None) if isinstance(data, dict) else None
+                if request_id is None:
+                    await self.send(await self.respond(data), binary)
+                    continue
+
+                # not reading while the connection is at its limit holds the client back
+                await self.in_flight.acquire()
+                task = asyncio.create_task(self.run(request_id, data, binary))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+        except WebSocketDisconnect:
+            logger.warning(f"Client {self.name} disconnected.")
+        finally:
+            # runs already enqueued keep going, only waiting for them stops
+            for task in self.tasks:
+                task.cancel()
@@ -3,11 +3,12 @@ import os
 import json
 import asyncio
 import uvicorn
+import socket
 import websockets
 from datetime import datetime
 import traceback
 import logging
-from typing import Dict, Any, Union
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
 from pathlib import Path
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
@@ -23,6 +24,7 @@ from node.schemas import (
 )
 from node.storage.db.db import LocalDBPostgres
 from node.user import register_user, check_user
+from node.worker.dispatcher import get_dispatcher, close_dispatcher
 from node.worker.docker_worker import execute_docker_agent
 from node.worker.package_worker import (
     run_agent,
@@ -34,6 +36,7 @@ from node.worker.package_worker import (
 
 )
 from node.module_manager import setup_module_deployment
+from node.server.ws_multiplex import MultiplexedConnection, negotiate_subprotocol
 
 logger = logging.getLogger(__name__)
 load_dotenv()
@@ -47,7 +50,7 @@ class ConnectionManager:
         self.active_connections: Dict[str, Dict[str, WebSocket]] = {}
 
     async def connect(self, websocket: WebSocket, client_id: str, task: str):
-        await websocket.accept()
+        await websocket.accept(subprotocol=negotiate_subprotocol(websocket))
         if client_id not in self.active_connections:
             self.active_connections[client_id] = {}
         self.active_connections[client_id][task] = websocket
@@ -245,45 +248,23 @@ class WebSocketServer:
             logger.error(f"Full traceback: {traceback.format_exc()}")
             raise HTTPException(status_code=500, detail=str(e))
 
-    async def run_module_endpoint(self, websocket: WebSocket, module_type: str, client_id: str):
-        await self.manager.connect(websocket, client_id, f"run_{module_type}")
+    async def serve_connection(self, websocket: WebSocket, client_id: str, task: str, handle: Callable[[Any], Awaitable[Dict]]):
+        await self.manager.connect(websocket, client_id, task)
         try:
-            while True:
-                try:
-                    data = await websocket.receive_json()
-                    logger.info(f"Endpoint: run_{module_type} :: Received data: {data}")
-
-                    result = await self.run_module(module_type, data, client_id)
-                    logger.info(f"Endpoint: run_{module_type} :: Sending result: {result}")
-                    await self.manager.send_message(result, client_id, f"run_{module_type}")
-
-                except WebSocketDisconnect:
-                    logger.warning(f"Client {client_id} disconnected.")
-                    self.manager.disconnect(client_id, f"run_{module_type}")
-                    break
-
-                except json.JSONDecodeError:
-                    logger.error("Invalid JSON received")
-                    await self.manager.send_message(
-                        json.dumps({"status": "error", "message": "Invalid JSON"}),
-                        client_id,
-                        f"run_{module_type}",
-                    )
+            await MultiplexedConnection(websocket, f"{client_id}_{task}", handle, encoder=DateTimeEncoder).serve()
+        finally:
+            self.manager.disconnect(client_id, task)
 
-                except Exception as e:
-                    logger.error(f"Error processing request: {str(e)}")
-                    logger.error(f"Traceback: {traceback.format_exc()}")
-                    await self.manager.send_message(
-                        json.dumps({"status": "error", "message": str(e)}),
-                        client_id,
-                        f"run_{module_type}",
-                    )
+    async def run_module_endpoint(self, websocket: WebSocket, module_type: str, client_id: str):
+        async def handle(data):
+            logger.info(f"Endpoint: run_{module_type} :: Received data: {data}")
+            result = await self.run_module(module_type, data, client_id)
+            logger.info(f"Endpoint: run_{module_type} :: Sending result: {result}")
+            return result
 
-        except WebSocketDisconnect:
-            logger.warning(f"Client {client_id} disconnected (outer).")
-            self.manager.disconnect(client_id, f"run_{module_type}")
+        await self.serve_connection(websocket, client_id, f"run_{module_type}", handle)
 
-    async def run_module(self, module_type: str, data: dict, client_id: str) -> str:
+    async def run_module(self, module_type: str, data: dict, client_id: str) -> Dict[str, Any]:
         try:
             # Map module types to their corresponding input and run classes
             module_configs = {
@@ -356,9 +337,9 @@ class WebSocketServer:
                 execution_type = module_run.deployment.module.execution_type
 
             if execution_type == ModuleExecutionType.package or execution_type == 'package':
-                task = config["worker"].delay(module_run_data)
+                task = await get_dispatcher().submit(config["worker"].s(module_run_data))
             elif execution_type == ModuleExecutionType.docker or execution_type == 'docker':
-                task = execute_docker_agent.delay(module_run_data)
+                task = await get_dispatcher().submit(execute_docker_agent.s(module_run_data))
             else:
                 raise HTTPException(status_code=400, detail=f"Invalid {module_type} run type")
 
@@ -383,47 +364,29 @@ class WebSocketServer:
                 if time_field in updated_run and isinstance(updated_run[time_field], datetime):
                     updated_run[time_field] = updated_run[time_field].isoformat()
 
-            return json.dumps(
-                {"status": "success", "data": updated_run}, cls=DateTimeEncoder
-            )
+            return {"status": "success", "data": updated_run}
         except Exception as e:
             logger.error(f"Failed to run {module_type} module: {str(e)}")
             logger.error(f"Traceback: {traceback.format_exc()}")
-            return json.dumps({"status": "error", "message": str(e)})
+            return {"status": "error", "message": str(e)}
         
     async def check_user_endpoint(self, websocket: WebSocket, client_id: str):
-        await self.manager.connect(websocket, client_id, "check_user")
-        try:
-            while True:
-                data = await websocket.receive_text()
-                result = await self.check_user(data)
-                await self.manager.send_message(result, client_id, "check_user")
-        except WebSocketDisconnect:
-            self.manager.disconnect(client_id, "check_user")
+        await self.serve_connection(websocket, client_id, "check_user", self.check_user)
 
-    async def check_user(self, data: str) -> str:
-        data = json.loads(data)
+    async def check_user(self, data: Dict) -> Dict:
         _, response = await check_user(data)
         if '_sa_instance_state' in response:
             response.pop('_sa_instance_state')
-        return json.dumps(response)
+        return response
 
     async def register_user_endpoint(self, websocket: WebSocket, client_id: str):
-        await self.manager.connect(websocket, client_id, "register_user")
-        try:
-            while True:
-                data = await websocket.receive_text()
-                result = await self.register_user(data)
-                await self.manager.send_message(result, client_id, "register_user")
-        except WebSocketDisconnect:
-            self.manager.disconnect(client_id, "register_user")
+        await self.serve_connection(websocket, client_id, "register_user", self.register_user)
 
-    async def register_user(self, data: str) -> str:
-        data = json.loads(data)
+    async def register_user(self, data: Dict) -> Dict:
         _, response = await register_user(data)
         if '_sa_instance_state' in response:
             response.pop('_sa_instance_state')
-        return json.dumps(response)
+        return response
 
     async def graceful_shutdown(self):
         """Fast and efficient WebSocket server shutdown"""
@@ -459,6 +422,8 @@ class WebSocketServer:
                 finally:
                     self._started = False
 
+            await close_dispatcher()
+
             # 4. Clean up temp files without waiting
             if self.temp_files:
                 for filepath in list(self.temp_files.values()):
@@ -474,7 +439,7 @@ class WebSocketServer:
         finally:
             logger.info("WebSocket server shutdown complete")
 
-    async def launch_server(self):
+    async def launch_server(self, sockets: Optional[List[socket.socket]] = None):
         """Start the WebSocket server"""
         config = uvicorn.Config(
             self.app,
@@ -490,6 +455,6 @@ class WebSocketServer:
         self.server = uvicorn.Server(config)
         self._started = True
         try:
-            await self.server.serve()
+            await self.server.serve(sockets=sockets)
         finally:
             self._started = False
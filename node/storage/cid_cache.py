@@ -0,0 +1,439 @@
+from contextlib import contextmanager
+from dotenv import load_dotenv
+import fcntl
+import json
+import logging
+import os
+from pathlib import Path
+import shutil
+import time
+from typing import Callable, Dict, Optional
+import uuid
+import zipfile
+
+import ipfshttpclient
+
+from node.storage.utils import to_multiaddr
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+IPFS_GATEWAY_URL = os.getenv("IPFS_GATEWAY_URL")
+
+file_path = Path(__file__).resolve()
+root_dir = file_path.parent.parent.parent
+CID_CACHE_DIR = root_dir / os.getenv("CID_CACHE_DIR", "node/storage/cid_cache")
+CID_CACHE_MAX_GB = float(os.getenv("CID_CACHE_MAX_GB", "20"))
+# entries accessed more recently than this are never evicted, so that a reader
+# that has just been handed a path does not lose it to a concurrent eviction
+CID_CACHE_MIN_AGE = int(os.getenv("CID_CACHE_MIN_AGE", "300"))
+# references older than this are treated as leaked by a crashed run
+CID_CACHE_REF_TTL = int(os.getenv("CID_CACHE_REF_TTL", str(24 * 60 * 60)))
+CID_CACHE_LOCK_TIMEOUT = 60 * 10
+
+STATS_KEYS = ("hits", "misses", "bytes_saved", "bytes_fetched", "evictions", "bytes_evicted")
+
+
+class CacheLockTimeout(Exception):
+    pass
+
+
+def _path_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _link_or_copy(src: str, dst: str):
+    """Hardlink a file, copying it when the destination is on another filesystem"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _make_read_only(path: Path):
+    """Drop write permissions on the files of an entry, directories stay writable so checkouts can add to them"""
+    paths = [path] if path.is_file() else [Path(root) / name for root, _, files in os.walk(path) for name in files]
+    for file_path in paths:
+        mode = file_path.stat().st_mode
+        file_path.chmod(mode & ~0o222)
+
+
+def _remove_path(path: Path):
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path, ignore_errors=True)
+    elif path.exists() or path.is_symlink():
+        path.unlink()
+
+
+class CIDCache:
+    """Node-wide content-addressed cache for immutable IPFS content.
+
+    Entries are keyed by CID (optionally suffixed with a variant such as ``zip`` or
+    ``input`` for deterministic derivatives of the same CID) and live under
+    ``objects/``. Population is atomic (staged under ``tmp/`` then renamed) and
+    single-flight across processes via per-key ``flock`` locks. Active runs hold
+    references under ``refs/`` which protect entries from LRU eviction. Cached files
+    are read-only, runs that may modify their inputs get a hardlinked copy of an
+    entry under ``runs/`` instead of the shared path.
+    """
+
+    def __init__(self, root: Optional[Path] = None, max_bytes: Optional[int] = None):
+        self.root = Path(root or CID_CACHE_DIR)
+        self.max_bytes = int(max_bytes if max_bytes is not None else CID_CACHE_MAX_GB * 1024 ** 3)
+        self.objects_dir = self.root / "objects"
+        self.meta_dir = self.root / "meta"
+        self.refs_dir = self.root / "refs"
+        self.locks_dir = self.root / "locks"
+        self.tmp_dir = self.root / "tmp"
+        self.runs_dir = self.root / "runs"
+        for directory in (self.objects_dir, self.meta_dir, self.refs_dir, self.locks_dir, self.tmp_dir, self.runs_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(cid: str, variant: Optional[str] = None) -> str:
+        if not cid or "/" in cid or cid.startswith("."):
+            raise ValueError(f"Invalid CID: {cid}")
+        return f"{cid}.{variant}" if variant else cid
+
+    @contextmanager
+    def _lock(self, name: str, timeout: float = CID_CACHE_LOCK_TIMEOUT, blocking: bool = True):
+        lock_fd = open(self.locks_dir / f"{name}.lock", "w")
+        try:
+            start_time = time.time()
+            while True:
+                try:
+                    fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if not blocking:
+                        yield False
+                        return
+                    if time.time() - start_time > timeout:
+                        raise CacheLockTimeout(f"Failed to acquire cache lock {name} after {timeout} seconds")
+                    time.sleep(0.1)
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        finally:
+            lock_fd.close()
+
+    def _touch(self, key: str):
+        meta_path = self.meta_dir / key
+        try:
+            os.utime(meta_path, None)
+        except FileNotFoundError:
+            pass
+
+    def _entry_size(self, key: str) -> int:
+        try:
+            return int((self.meta_dir / key).read_text() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _record(self, **deltas: int):
+        """Accumulate counters in a shared stats file so all worker processes report together"""
+        with self._lock(".stats"):
+            stats_path = self.root / "stats.json"
+            try:
+                stats = json.loads(stats_path.read_text())
+            except (FileNotFoundError, ValueError):
+                stats = {}
+            for key, value in deltas.items():
+                stats[key] = stats.get(key, 0) + value
+            tmp_path = self.tmp_dir / f"stats.{uuid.uuid4().hex}"
+            tmp_path.write_text(json.dumps(stats))
+            os.replace(tmp_path, stats_path)
+
+    def get(self, cid: str, variant: Optional[str] = None) -> Optional[Path]:
+        """Return the cached path for a CID if present, without populating it"""
+        key = self.make_key(cid, variant)
+        path = self.objects_dir / key
+        if path.exists() and (self.meta_dir / key).exists():
+            self._touch(key)
+            return path
+        return None
+
+    def fetch(self, cid: str, populate: Callable[[Path], None], variant: Optional[str] = None) -> Path:
+        """Return the cached path for a CID, populating it with ``populate(dest)`` on a miss.
+
+        ``populate`` must create ``dest`` (as a file or a directory). Concurrent callers in
+        any process block on the same key so the content is only fetched once.
+        """
+        key = self.make_key(cid, variant)
+        path = self.get(cid, variant)
+        if path is not None:
+            size = self._entry_size(key)
+            logger.info(f"CID cache hit for {key} ({size} bytes)")
+            self._record(hits=1, bytes_saved=size)
+            return path
+
+        with self._lock(key):
+            # another process may have populated the entry while we waited for the lock
+            path = self.get(cid, variant)
+            if path is not None:
+                size = self._entry_size(key)
+                logger.info(f"CID cache hit for {key} after waiting on populate ({size} bytes)")
+                self._record(hits=1, bytes_saved=size)
+                return path
+
+            logger.info(f"CID cache miss for {key}")
+            staging_path = self.tmp_dir / f"{key}.{uuid.uuid4().hex}"
+            try:
+                populate(staging_path)
+                if not staging_path.exists():
+                    raise RuntimeError(f"Populating {key} did not create any content")
+                size = _path_size(staging_path)
+                _make_read_only(staging_path)
+                path = self.objects_dir / key
+                if path.exists():
+                    # leftover from an interrupted populate without metadata
+                    _remove_path(path)
+                os.rename(staging_path, path)
+                (self.meta_dir / key).write_text(str(size))
+            finally:
+                if staging_path.exists():
+                    _remove_path(staging_path)
+
+        self._record(misses=1, bytes_fetched=size)
+        self.evict()
+        return path
+
+    def acquire(self, key: str, owner: str):
+        """Reference an entry on behalf of an owner (e.g. a module run id) to protect it from eviction"""
+        ref_dir = self.refs_dir / key
+        ref_dir.mkdir(parents=True, exist_ok=True)
+        (ref_dir / owner.replace("/", "_")).touch()
+
+    def release(self, key: str, owner: str):
+        ref_dir = self.refs_dir / key
+        try:
+            (ref_dir / owner.replace("/", "_")).unlink()
+        except FileNotFoundError:
+            pass
+        try:
+            ref_dir.rmdir()
+        except OSError:
+            pass
+
+    def checkout(self, key: str, owner: str) -> Path:
+        """Give an owner its own copy of an entry under ``runs/``, hardlinked where possible.
+
+        Files, directories and renames in the copy don't touch the cached entry. Linked files
+        share their content with the cache and stay read-only. The copy is removed by
+        ``release_owner(owner)``.
+        """
+        source = self.objects_dir / key
+        if not source.exists():
+            raise FileNotFoundError(f"{key} is not in the CID cache")
+        owner_dir = self.runs_dir / owner.replace("/", "_")
+        path = owner_dir / key
+        if path.exists():
+            return path
+        owner_dir.mkdir(parents=True, exist_ok=True)
+        staging_path = owner_dir / f".{key}.{uuid.uuid4().hex}"
+        try:
+            if source.is_dir():
+                shutil.copytree(source, staging_path, symlinks=True, copy_function=_link_or_copy)
+            else:
+                _link_or_copy(str(source), str(staging_path))
+            os.rename(staging_path, path)
+        finally:
+            if staging_path.exists():
+                _remove_path(staging_path)
+        return path
+
+    def release_owner(self, owner: str):
+        """Drop every reference and checkout held by an owner"""
+        owner = owner.replace("/", "_")
+        for ref_dir in self.refs_dir.iterdir():
+            ref_path = ref_dir / owner
+            if ref_path.exists():
+                self.release(ref_dir.name, owner)
+        _remove_path(self.runs_dir / owner)
+
+    def _drop_stale_checkouts(self):
+        now = time.time()
+        for owner_dir in self.runs_dir.iterdir():
+            try:
+                if now - owner_dir.stat().st_mtime > CID_CACHE_REF_TTL:
+                    logger.warning(f"Dropping stale CID cache checkout {owner_dir.name}")
+                    _remove_path(owner_dir)
+            except FileNotFoundError:
+                pass
+
+    def _is_referenced(self, key: str) -> bool:
+        ref_dir = self.refs_dir / key
+        if not ref_dir.exists():
+            return False
+        now = time.time()
+        referenced = False
+        for ref_path in ref_dir.iterdir():
+            try:
+                if now - ref_path.stat().st_mtime > CID_CACHE_REF_TTL:
+                    logger.warning(f"Dropping stale CID cache reference {key}/{ref_path.name}")
+                    ref_path.unlink()
+                else:
+                    referenced = True
+            except FileNotFoundError:
+                pass
+        return referenced
+
+    @contextmanager
+    def pinned(self, cid: str, populate: Callable[[Path], None], variant: Optional[str] = None):
+        """Fetch an entry and keep it referenced for the duration of the context"""
+        owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+        key = self.make_key(cid, variant)
+        self.acquire(key, owner)
+        try:
+            yield self.fetch(cid, populate, variant)
+        finally:
+            self.release(key, owner)
+
+    def usage(self) -> int:
+        return sum(self._entry_size(meta.name) for meta in self.meta_dir.iterdir())
+
+    def evict(self):
+        """Evict least recently used, unreferenced entries until the cache fits in max_bytes"""
+        with self._lock(".evict", blocking=False) as acquired:
+            if not acquired:
+                return
+            self._drop_stale_checkouts()
+            entries = []
+            for meta in self.meta_dir.iterdir():
+                try:
+                    entries.append((meta.stat().st_mtime, meta.name, self._entry_size(meta.name)))
+                except FileNotFoundError:
+                    pass
+            total = sum(size for _, _, size in entries)
+            if total <= self.max_bytes:
+                return
+
+            now = time.time()
+            evicted, bytes_evicted = 0, 0
+            for last_access, key, size in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if now - last_access < CID_CACHE_MIN_AGE or self._is_referenced(key):
+                    continue
+                with self._lock(key, blocking=False) as key_acquired:
+                    if not key_acquired:
+                        continue
+                    (self.meta_dir / key).unlink(missing_ok=True)
+                    _remove_path(self.objects_dir / key)
+                total -= size
+                evicted += 1
+                bytes_evicted += size
+                logger.info(f"Evicted {key} ({size} bytes) from CID cache")
+
+        if evicted:
+            self._record(evictions=evicted, bytes_evicted=bytes_evicted)
+        if total > self.max_bytes:
+            logger.warning(f"CID cache is over budget ({total}/{self.max_bytes} bytes) but remaining entries are in use")
+
+    def stats(self) -> Dict:
+        try:
+            stats = json.loads((self.root / "stats.json").read_text())
+        except (FileNotFoundError, ValueError):
+            stats = {}
+        stats = {key: stats.get(key, 0) for key in STATS_KEYS}
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        stats["entries"] = sum(1 for _ in self.meta_dir.iterdir())
+        stats["size_bytes"] = self.usage()
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+_cache_instance = None
+
+
+def get_cid_cache() -> CIDCache:
+    global _cache_instance
+    if _cache_instance is None:
+        _cache_instance = CIDCache()
+    return _cache_instance
+
+
+def _download_ipfs(cid: str, dest: Path):
+    """Download a CID from IPFS to dest (file or directory)"""
+    client = ipfshttpclient.connect(to_multiaddr(IPFS_GATEWAY_URL), timeout=60*5)
+    download_dir = dest.parent / f"{dest.name}.download"
+    download_dir.mkdir(parents=True)
+    try:
+        client.get(cid, target=str(download_dir))
+        os.rename(download_dir / cid, dest)
+    finally:
+        shutil.rmtree(download_dir, ignore_errors=True)
+
+
+def fetch_ipfs(cid: str) -> Path:
+    """Get the raw IPFS object for a CID through the cache"""
+    return get_cid_cache().fetch(cid, lambda dest: _download_ipfs(cid, dest))
+
+
+def fetch_ipfs_zip(cid: str) -> Path:
+    """Get a zip archive of an IPFS directory through the cache"""
+    raw_path = fetch_ipfs(cid)
+
+    def populate(dest: Path):
+        with zipfile.ZipFile(dest, "w", zipfile.ZIP_DEFLATED) as zf:
+            for root, _, files in os.walk(raw_path):
+                for file in files:
+                    full_path = os.path.join(root, file)
+                    zf.write(full_path, os.path.relpath(full_path, raw_path))
+
+    return get_cid_cache().fetch(cid, populate, variant="zip")
+
+
+def fetch_ipfs_input(cid: str, owner: Optional[str] = None) -> Path:
+    """Get a module input directory for a CID through the cache.
+
+    Zip archives are extracted, directories are used as-is and single files are placed
+    in a directory of their own. When an owner is given the entry is referenced until
+    ``release_ipfs_inputs(owner)`` is called. Cached inputs are shared between runs and
+    must be treated as read-only.
+    """
+    cache = get_cid_cache()
+    raw_path = fetch_ipfs(cid)
+    if raw_path.is_dir():
+        key = cache.make_key(cid)
+        path = raw_path
+    else:
+        def populate(dest: Path):
+            dest.mkdir()
+            if zipfile.is_zipfile(raw_path):
+                with zipfile.ZipFile(raw_path, "r") as zip_ref:
+                    zip_ref.extractall(dest)
+            else:
+                shutil.copy2(raw_path, dest / cid)
+
+        key = cache.make_key(cid, "input")
+        path = cache.fetch(cid, populate, variant="input")
+
+    if owner:
+        cache.acquire(key, owner)
+    return path
+
+
+def checkout_ipfs_input(cid: str, owner: str) -> Path:
+    """Get a module input directory for a CID that the run owns and may modify.
+
+    The directory is a hardlinked copy of the cached input, removed by
+    ``release_ipfs_inputs(owner)``.
+    """
+    path = fetch_ipfs_input(cid, owner=owner)
+    return get_cid_cache().checkout(path.name, owner)
+
+
+def release_ipfs_inputs(owner: str):
+    get_cid_cache().release_owner(owner)
@@ -9,9 +9,10 @@ from sqlalchemy.exc import OperationalError, SQLAlchemyError
 from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.pool import QueuePool
 import threading
+import uuid
 from typing import Dict, List, Optional, Union, Any
 
-from node.storage.db.models import AgentRun, MemoryRun, OrchestratorRun, EnvironmentRun, User, KBRun, ToolRun
+from node.storage.db.models import AgentRun, MemoryRun, OrchestratorRun, EnvironmentRun, User, KBRun, ToolRun, QueuedTask
 from node.schemas import (
     AgentRun as AgentRunSchema,
     MemoryRunInput,
@@ -32,6 +33,10 @@ logger = logging.getLogger(__name__)
 
 LOCAL_DB_POSTGRES_HOST = "pgvector" if os.getenv("LAUNCH_DOCKER") == "true" else "localhost"
 
+# NOTIFY channels of the task queue: the queue name when tasks become available, the task id when one finishes
+TASK_QUEUE_CHANNEL = "naptha_tasks"
+TASK_DONE_CHANNEL = "naptha_task_done"
+
 class DatabasePool:
     _instance = None
     _lock = threading.Lock()
@@ -187,6 +192,33 @@ class LocalDBPostgres:
             logger.error(f"Failed to create {run_type} run: {str(e)}")
             raise
 
+    async def create_module_runs(self, run_inputs: List[Union[Dict, Any]], run_type: str) -> List[Union[AgentRunSchema, MemoryRunSchema, OrchestratorRunSchema, EnvironmentRunSchema, ToolRunSchema]]:
+        """Insert many runs of one type in a single transaction"""
+        model_map = {
+            'agent': (AgentRun, AgentRunSchema),
+            'memory': (MemoryRun, MemoryRunSchema),
+            'orchestrator': (OrchestratorRun, OrchestratorRunSchema),
+            'environment': (EnvironmentRun, EnvironmentRunSchema),
+            'knowledge_base': (KBRun, KBRunSchema),
+            'tool': (ToolRun, ToolRunSchema)
+        }
+
+        try:
+            Model, Schema = model_map[run_type]
+            with self.session() as db:
+                runs = [
+                    Model(**run_input.model_dict()) if hasattr(run_input, 'model_dict') else Model(**run_input)
+                    for run_input in run_inputs
+                ]
+                db.add_all(runs)
+                # all column defaults are set client side, so the flush is one multi-row insert without a refresh
+                db.flush()
+                logger.info(f"Created {len(runs)} {run_type} runs")
+                return [Schema(**run.__dict__) for run in runs]
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to create {run_type} runs: {str(e)}")
+            raise
+
     async def create_agent_run(self, agent_run_input: Union[AgentRunInput, Dict]) -> AgentRunSchema:
         return await self.create_module_run(agent_run_input, 'agent')
     
@@ -282,6 +314,25 @@ class LocalDBPostgres:
                     raise
                 await asyncio.sleep(retry_delay)
 
+    async def get_module_runs(self, run_type: str, run_ids: List[str]) -> List[Dict]:
+        """Fetch many runs of one type in one query; runs that don't exist are left out"""
+        model_map = {
+            'agent': AgentRun,
+            'memory': MemoryRun,
+            'orchestrator': OrchestratorRun,
+            'environment': EnvironmentRun,
+            'knowledge_base': KBRun,
+            'tool': ToolRun
+        }
+
+        try:
+            Model = model_map[run_type]
+            with self.session() as db:
+                return [run.__dict__ for run in db.query(Model).filter(Model.id.in_(run_ids)).all()]
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to get {run_type} runs: {str(e)}")
+            raise
+
     async def list_agent_runs(self, agent_run_id=None) -> Union[Dict, List[Dict], None]:
         return await self.list_module_runs('agent', agent_run_id)
     
@@ -729,6 +780,237 @@ class LocalDBPostgres:
             raise
 
 
+    async def enqueue_tasks(self, tasks: List[Dict], max_attempts: int = 3) -> List[str]:
+        """Insert tasks into the queue table in one statement and wake the workers listening on their queues"""
+        try:
+            with self.session() as db:
+                rows = [
+                    {
+                        "id": str(uuid.uuid4()),
+                        "queue": task.get("queue", "default"),
+                        "task": task["task"],
+                        "args": json.dumps(task.get("args", []), default=str),
+                        "kwargs": json.dumps(task.get("kwargs", {}), default=str),
+                        "max_attempts": max_attempts,
+                    }
+                    for task in tasks
+                ]
+                if not rows:
+                    return []
+                db.execute(text("""
+                    INSERT INTO task_queue (id, queue, task, args, kwargs, status, attempts, max_attempts, available_time, enqueued_time)
+                    VALUES (:id, :queue, :task, CAST(:args AS JSONB), CAST(:kwargs AS JSONB), 'queued', 0, :max_attempts, now(), clock_timestamp())
+                """), rows)
+                # notifications are delivered on commit, after the rows are visible
+                for queue in {row["queue"] for row in rows}:
+                    db.execute(text("SELECT pg_notify(:channel, :queue)"), {"channel": TASK_QUEUE_CHANNEL, "queue": queue})
+                return [row["id"] for row in rows]
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to enqueue {len(tasks)} tasks: {str(e)}")
+            raise
+
+    async def claim_tasks(self, worker_id: str, queues: List[str], limit: int, visibility_timeout: float) -> List[Dict]:
+        """Lock up to limit available tasks for worker_id until the visibility timeout expires.
+
+        Tasks whose lease expired (their worker died or hung) are available again, unless they used
+        their last attempt, in which case they are marked failed. SKIP LOCKED lets concurrent workers
+        claim different rows without waiting on each other.
+        """
+        try:
+            with self.session() as db:
+                expired = db.execute(text("""
+                    UPDATE task_queue
+                    SET status = 'failed', error_message = 'Visibility timeout expired on the last attempt',
+                        completed_time = clock_timestamp(), locked_by = NULL, locked_until = NULL
+                    WHERE id IN (
+                        SELECT id FROM task_queue
+                        WHERE queue = ANY(:queues) AND status = 'running'
+                          AND locked_until < now() AND attempts >= max_attempts
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id
+                """), {"queues": queues}).scalars().all()
+                for task_id in expired:
+                    db.execute(text("SELECT pg_notify(:channel, :id)"), {"channel": TASK_DONE_CHANNEL, "id": task_id})
+
+                claimed = db.execute(text("""
+                    UPDATE task_queue
+                    SET status = 'running', attempts = attempts + 1, locked_by = :worker_id,
+                        locked_until = now() + make_interval(secs => :visibility_timeout),
+                        started_time = clock_timestamp()
+                    WHERE id IN (
+                        SELECT id FROM task_queue
+                        WHERE queue = ANY(:queues)
+                          AND ((status = 'queued' AND available_time <= now())
+                            OR (status = 'running' AND locked_until < now()))
+                        ORDER BY enqueued_time
+                        LIMIT :limit
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, queue, task, args, kwargs, attempts, max_attempts, enqueued_time, started_time,
+                        EXTRACT(EPOCH FROM clock_timestamp() - enqueued_time) AS queue_wait
+                """), {"worker_id": worker_id, "queues": queues, "limit": limit, "visibility_timeout": visibility_timeout})
+                # RETURNING doesn't keep the subquery's order
+                return sorted((dict(row) for row in claimed.mappings().all()), key=lambda row: row["enqueued_time"])
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to claim tasks: {str(e)}")
+            raise
+
+    async def steal_tasks(self, worker_id: str, queue_prefix: str, limit: int, visibility_timeout: float, min_wait: float) -> List[Dict]:
+        """Claim tasks of any queue named queue_prefix* that were available for at least min_wait seconds,
+        for a worker whose own queues are empty"""
+        try:
+            with self.session() as db:
+                claimed = db.execute(text("""
+                    UPDATE task_queue
+                    SET status = 'running', attempts = attempts + 1, locked_by = :worker_id,
+                        locked_until = now() + make_interval(secs => :visibility_timeout),
+                        started_time = clock_timestamp()
+                    WHERE id IN (
+                        SELECT id FROM task_queue
+                        WHERE queue LIKE :pattern
+                          AND ((status = 'queued' AND available_time <= now() - make_interval(secs => :min_wait))
+                            OR (status = 'running' AND locked_until < now() AND attempts < max_attempts))
+                        ORDER BY enqueued_time
+                        LIMIT :limit
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, queue, task, args, kwargs, attempts, max_attempts, enqueued_time, started_time,
+                        EXTRACT(EPOCH FROM clock_timestamp() - enqueued_time) AS queue_wait
+                """), {
+                    "worker_id": worker_id,
+                    "pattern": f"{queue_prefix}%",
+                    "limit": limit,
+                    "visibility_timeout": visibility_timeout,
+                    "min_wait": min_wait,
+                })
+                # RETURNING doesn't keep the subquery's order
+                return sorted((dict(row) for row in claimed.mappings().all()), key=lambda row: row["enqueued_time"])
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to steal tasks: {str(e)}")
+            raise
+
+    async def extend_task_leases(self, worker_id: str, task_ids: List[str], visibility_timeout: float) -> int:
+        """Push back the visibility timeout of tasks that worker_id is still running"""
+        try:
+            with self.session() as db:
+                result = db.execute(text("""
+                    UPDATE task_queue SET locked_until = now() + make_interval(secs => :visibility_timeout)
+                    WHERE id = ANY(:ids) AND locked_by = :worker_id AND status = 'running'
+                """), {"ids": task_ids, "worker_id": worker_id, "visibility_timeout": visibility_timeout})
+                return result.rowcount
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to extend task leases: {str(e)}")
+            raise
+
+    async def complete_task(self, worker_id: str, task_id: str, result: Any = None) -> bool:
+        try:
+            with self.session() as db:
+                updated = db.execute(text("""
+                    UPDATE task_queue
+                    SET status = 'completed', result = CAST(:result AS JSONB), completed_time = clock_timestamp(),
+                        locked_by = NULL, locked_until = NULL
+                    WHERE id = :id AND locked_by = :worker_id
+                """), {"id": task_id, "worker_id": worker_id, "result": json.dumps(result, default=str)})
+                db.execute(text("SELECT pg_notify(:channel, :id)"), {"channel": TASK_DONE_CHANNEL, "id": task_id})
+                return updated.rowcount > 0
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to complete task {task_id}: {str(e)}")
+            raise
+
+    async def fail_task(self, worker_id: str, task_id: str, error_message: str, retry_delay: float) -> Optional[str]:
+        """Requeue a failed task with exponential backoff, or mark it failed on its last attempt; returns the new status"""
+        try:
+            with self.session() as db:
+                row = db.execute(text("""
+                    UPDATE task_queue
+                    SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                        available_time = now() + make_interval(secs => :retry_delay * power(2, attempts - 1)),
+                        completed_time = CASE WHEN attempts < max_attempts THEN NULL ELSE clock_timestamp() END,
+                        error_message = :error_message, locked_by = NULL, locked_until = NULL
+                    WHERE id = :id AND locked_by = :worker_id
+                    RETURNING status, queue
+                """), {"id": task_id, "worker_id": worker_id, "error_message": error_message, "retry_delay": retry_delay}).mappings().first()
+                if row is None:
+                    return None
+                if row["status"] == "failed":
+                    db.execute(text("SELECT pg_notify(:channel, :id)"), {"channel": TASK_DONE_CHANNEL, "id": task_id})
+                else:
+                    db.execute(text("SELECT pg_notify(:channel, :queue)"), {"channel": TASK_QUEUE_CHANNEL, "queue": row["queue"]})
+                return row["status"]
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to record failure of task {task_id}: {str(e)}")
+            raise
+
+    async def get_tasks(self, task_ids: List[str]) -> List[Dict]:
+        try:
+            with self.session() as db:
+                return [task.__dict__ for task in db.query(QueuedTask).filter(QueuedTask.id.in_(task_ids)).all()]
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to get tasks: {str(e)}")
+            raise
+
+    async def record_module_dispatch(self, stats: Dict) -> None:
+        try:
+            with self.session() as db:
+                db.execute(text("""
+                    INSERT INTO module_dispatches (run_id, module_name, module_type, queue, affine, cold_start, queue_wait, worker, recorded_time)
+                    VALUES (:run_id, :module_name, :module_type, :queue, :affine, :cold_start, :queue_wait, :worker, now())
+                    ON CONFLICT (run_id) DO NOTHING
+                """), stats)
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to record dispatch of run {stats.get('run_id')}: {str(e)}")
+            raise
+
+    async def prune_module_dispatches(self, older_than: float) -> int:
+        """Delete the dispatch records of runs started more than older_than seconds ago"""
+        try:
+            with self.session() as db:
+                result = db.execute(text("""
+                    DELETE FROM module_dispatches
+                    WHERE recorded_time < now() - make_interval(secs => :older_than)
+                """), {"older_than": older_than})
+                return result.rowcount
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to prune module dispatches: {str(e)}")
+            raise
+
+    async def get_module_dispatch_stats(self, window: float) -> List[Dict]:
+        """Per module: runs started in the last window seconds, the share that were cold starts or
+        taken from the module's own affinity queue, and their queue wait"""
+        try:
+            with self.session() as db:
+                rows = db.execute(text("""
+                    SELECT module_name, count(*) AS runs,
+                        avg(cold_start::int) AS cold_start_rate,
+                        avg(affine::int) AS affine_rate,
+                        avg(queue_wait) AS mean_queue_wait,
+                        percentile_cont(0.5) WITHIN GROUP (ORDER BY queue_wait) AS p50_queue_wait,
+                        percentile_cont(0.95) WITHIN GROUP (ORDER BY queue_wait) AS p95_queue_wait
+                    FROM module_dispatches
+                    WHERE recorded_time >= now() - make_interval(secs => :window)
+                    GROUP BY module_name
+                    ORDER BY runs DESC
+                """), {"window": window})
+                return [dict(row) for row in rows.mappings().all()]
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to get module dispatch stats: {str(e)}")
+            raise
+
+    def listen(self, *channels: str):
+        """A dedicated autocommit psycopg2 connection LISTENing on channels, poll() it and read its notifies"""
+        connection = self.pool.engine.raw_connection()
+        dbapi_connection = connection.dbapi_connection
+        # keep the connection out of the pool, it stays subscribed for its whole life
+        connection.detach()
+        # end the transaction the checkout check began, autocommit can't be set inside one
+        dbapi_connection.rollback()
+        dbapi_connection.autocommit = True
+        with dbapi_connection.cursor() as cursor:
+            for channel in channels:
+                cursor.execute(f"LISTEN {channel}")
+        return dbapi_connection
+
     async def check_connection_health(self) -> bool:
         try:
             with self.session() as session:
@@ -5,7 +5,7 @@ import os
 from pathlib import Path
 from alembic import command
 from alembic.config import Config
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from node.storage.db.models import Base
 
 load_dotenv()
@@ -23,6 +23,10 @@ def init_db():
     # Create the SQLAlchemy engine
     engine = create_engine(LOCAL_DB_URL)
 
+    # models with vector columns need the pgvector extension
+    with engine.begin() as connection:
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+
     # Create an Alembic configuration object
     alembic_cfg = Config(alembic_ini_path)
     
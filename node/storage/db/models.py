@@ -1,10 +1,19 @@
-from sqlalchemy import Column, String, JSON, ARRAY, Boolean, DateTime, Integer, ForeignKey
+from sqlalchemy import Column, String, JSON, ARRAY, Boolean, DateTime, Integer, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from sqlalchemy.types import UserDefinedType
 import uuid
 
 Base = declarative_base()
 
+class Vector(UserDefinedType):
+    """pgvector column of any dimension, init_db creates the vector extension before the tables"""
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        return "vector"
+
 class User(Base):
     __tablename__ = 'users'
 
@@ -132,6 +141,53 @@ class ToolRun(Base):
 
     consumer = relationship("User", back_populates="tool_runs")
 
+class QueuedTask(Base):
+    __tablename__ = 'task_queue'
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    queue = Column(String, nullable=False, default="default")
+    task = Column(String, nullable=False)
+    args = Column(JSONB, default=[])
+    kwargs = Column(JSONB, default={})
+    status = Column(String, default="queued")
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    available_time = Column(DateTime)
+    locked_by = Column(String)
+    locked_until = Column(DateTime)
+    enqueued_time = Column(DateTime)
+    started_time = Column(DateTime)
+    completed_time = Column(DateTime)
+    result = Column(JSONB)
+    error_message = Column(String)
+
+    __table_args__ = (
+        Index('ix_task_queue_claim', 'queue', 'status', 'enqueued_time'),
+    )
+
+class ModuleDispatch(Base):
+    __tablename__ = 'module_dispatches'
+
+    run_id = Column(String, primary_key=True)
+    module_name = Column(String, nullable=False)
+    module_type = Column(String)
+    queue = Column(String)
+    affine = Column(Boolean, default=False)
+    cold_start = Column(Boolean, default=False)
+    queue_wait = Column(Float)
+    worker = Column(String)
+    recorded_time = Column(DateTime, index=True)
+
+class EmbeddingCacheEntry(Base):
+    __tablename__ = 'embedding_cache'
+
+    key = Column(String, primary_key=True)
+    model = Column(String, nullable=False)
+    dimensions = Column(Integer)
+    embedding = Column(Vector, nullable=False)
+    prompt_tokens = Column(Integer, nullable=False, default=0, server_default="0")
+    created_time = Column(DateTime, nullable=False, server_default=func.now())
+
 User.agent_runs = relationship("AgentRun", order_by=AgentRun.id, back_populates="consumer")
 User.memory_runs = relationship("MemoryRun", back_populates="consumer")
 User.orchestrator_runs = relationship("OrchestratorRun", back_populates="consumer")
@@ -0,0 +1,214 @@
+import os
+import stat
+from typing import List, Mapping, Optional, Tuple
+import uuid
+
+import anyio
+from starlette.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+# more ranges than this in one request are served as the full file (RFC 9110 allows ignoring Range)
+MAX_RANGES = 32
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range_header(range_header: Optional[str], size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a ``Range`` header into a list of inclusive (start, end) byte ranges.
+
+    Returns None if the header is absent or malformed, in which case the full content
+    should be served. Raises RangeNotSatisfiable if none of the ranges overlap the content.
+    """
+    if not range_header:
+        return None
+    unit, _, range_set = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not range_set.strip():
+        return None
+
+    specs = range_set.split(",")
+    if len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        start_str, sep, end_str = spec.strip().partition("-")
+        start_str, end_str = start_str.strip(), end_str.strip()
+        if not sep or not (start_str.isdigit() or start_str == "") or not (end_str.isdigit() or end_str == ""):
+            return None
+        if start_str == "":
+            # suffix range: the last N bytes
+            if end_str == "":
+                return None
+            length = int(end_str)
+            if length == 0:
+                continue
+            ranges.append((max(size - length, 0), size - 1))
+        else:
+            start = int(start_str)
+            if end_str and int(end_str) < start:
+                return None
+            if start >= size:
+                continue
+            end = int(end_str) if end_str else size - 1
+            ranges.append((start, min(end, size - 1)))
+
+    if not ranges or size == 0:
+        raise RangeNotSatisfiable(f"bytes */{size}")
+    return ranges
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # weak comparison, as required for If-None-Match
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+
+class RangeFileResponse(FileResponse):
+    """FileResponse with conditional (ETag) and single/multi-range support.
+
+    Full-file responses go through FileResponse, which uses ``http.response.pathsend`` when the
+    server supports it. Single ranges use ``http.response.zerocopysend`` (sendfile) when available
+    and otherwise stream the requested window in chunks, so files are never loaded into memory.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        request_headers: Mapping[str, str],
+        media_type: Optional[str] = None,
+        filename: Optional[str] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        etag: Optional[str] = None,
+        immutable: bool = False,
+    ) -> None:
+        stat_result = os.stat(path)
+        if not stat.S_ISREG(stat_result.st_mode):
+            raise FileNotFoundError(f"File at path {path} is not a file")
+        headers = dict(headers or {})
+        if etag:
+            headers["etag"] = etag
+        if immutable:
+            headers["cache-control"] = "public, max-age=31536000, immutable"
+        super().__init__(
+            path=path,
+            headers=headers,
+            media_type=media_type or "application/octet-stream",
+            filename=filename,
+            stat_result=stat_result,
+        )
+        self.headers["accept-ranges"] = "bytes"
+        self.size = stat_result.st_size
+        self.ranges: Optional[List[Tuple[int, int]]] = None
+        self.boundary = None
+
+        etag = self.headers["etag"]
+        if _etag_matches(request_headers.get("if-none-match"), etag):
+            self._set_not_modified()
+            return
+
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if range_header and if_range and if_range.strip() != etag:
+            # the client's cached representation is stale, send the whole file
+            range_header = None
+
+        try:
+            self.ranges = parse_range_header(range_header, self.size)
+        except RangeNotSatisfiable as e:
+            self.status_code = 416
+            self.headers["content-range"] = str(e)
+            self.headers["content-length"] = "0"
+            return
+
+        if not self.ranges:
+            return
+        self.status_code = 206
+        if len(self.ranges) == 1:
+            start, end = self.ranges[0]
+            self.headers["content-range"] = f"bytes {start}-{end}/{self.size}"
+            self.headers["content-length"] = str(end - start + 1)
+        else:
+            self.boundary = uuid.uuid4().hex
+            self.headers["content-type"] = f"multipart/byteranges; boundary={self.boundary}"
+            self.headers["content-length"] = str(sum(
+                len(part_header) + end - start + 1 for part_header, start, end in self._multipart_parts()
+            ) + len(self._multipart_trailer()))
+
+    def _set_not_modified(self):
+        self.status_code = 304
+        for header in ("content-length", "content-type", "content-disposition"):
+            if header in self.headers:
+                del self.headers[header]
+
+    def _multipart_parts(self) -> List[Tuple[bytes, int, int]]:
+        parts = []
+        for i, (start, end) in enumerate(self.ranges):
+            part_header = (
+                ("\r\n" if i else "")
+                + f"--{self.boundary}\r\n"
+                + f"Content-Type: {self.media_type}\r\n"
+                + f"Content-Range: bytes {start}-{end}/{self.size}\r\n\r\n"
+            ).encode("latin-1")
+            parts.append((part_header, start, end))
+        return parts
+
+    def _multipart_trailer(self) -> bytes:
+        return f"\r\n--{self.boundary}--\r\n".encode("latin-1")
+
+    async def _send_window(self, file, start: int, end: int, send: Send, last: bool):
+        await file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await file.read(min(self.chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            await send({
+                "type": "http.response.body",
+                "body": chunk,
+                "more_body": not (last and remaining <= 0),
+            })
+        if last and remaining > 0:
+            # file shrank underneath us, terminate the response anyway
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.status_code == 200:
+            await super().__call__(scope, receive, send)
+            return
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.status_code in (304, 416) or scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if len(self.ranges) == 1 and "http.response.zerocopysend" in extensions:
+            start, end = self.ranges[0]
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.fileno(),
+                    "offset": start,
+                    "count": end - start + 1,
+                    "more_body": False,
+                })
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            if len(self.ranges) == 1:
+                start, end = self.ranges[0]
+                await self._send_window(file, start, end, send, last=True)
+            else:
+                for part_header, start, end in self._multipart_parts():
+                    await send({"type": "http.response.body", "body": part_header, "more_body": True})
+                    await self._send_window(file, start, end, send, last=False)
+                await send({"type": "http.response.body", "body": self._multipart_trailer(), "more_body": False})
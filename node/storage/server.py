@@ -1,15 +1,16 @@
-from fastapi import APIRouter, HTTPException, Body, Query, Path, File, UploadFile, Response, Form   
+from fastapi import APIRouter, HTTPException, Body, Query, Path, File, UploadFile, Request, Form   
 from typing import Optional, Dict, Any, Union, List
 import logging
 import json
 import traceback
-from fastapi.responses import FileResponse
 from pydantic import ValidationError
 from node.storage.storage_provider import (
     DatabaseStorageProvider,
     FilesystemStorageProvider,
     IPFSStorageProvider
 )
+from node.storage.cid_cache import get_cid_cache
+from node.storage.range_response import RangeFileResponse
 from node.storage.schemas import StorageLocation, StorageType, DatabaseReadOptions, IPFSOptions
 
 logger = logging.getLogger(__name__)
@@ -55,6 +56,7 @@ async def create_storage_object(
 
 @router.get("/{storage_type}/read/{path:path}")
 async def read_storage_object(
+    request: Request,
     storage_type: StorageType,
     path: str = Path(..., description="Storage path/identifier"),
     options: Optional[str] = Query(None, description="JSON string of options"),
@@ -82,19 +84,13 @@ async def read_storage_object(
             
         elif storage_type == StorageType.FILESYSTEM:
             result = await storage_provider.read(location, None)
-            if isinstance(result.data, dict) and "path" in result.data:
-                return FileResponse(
-                    path=result.data["path"],
-                    media_type=result.data.get("media_type", "application/octet-stream"),
-                    filename=result.data.get("filename"),
-                    headers=result.data.get("headers", {})
-                )
-            else:
-                return Response(
-                    content=result.data,
-                    media_type="application/octet-stream",
-                    headers={"Content-Disposition": f"attachment; filename={path.split('/')[-1]}"}
-                )
+            return RangeFileResponse(
+                path=result.data["path"],
+                request_headers=request.headers,
+                media_type=result.data.get("media_type", "application/octet-stream"),
+                filename=result.data.get("filename"),
+                headers=result.data.get("headers", {})
+            )
                 
         elif storage_type == StorageType.IPFS:
             try:
@@ -107,23 +103,15 @@ async def read_storage_object(
                 
             result = await storage_provider.read(location, ipfs_options.dict())
             
-            # Handle both file and directory responses
-            if result.data.get("is_directory"):
-                return Response(
-                    content=result.data["content"],
-                    media_type="application/zip",
-                    headers={
-                        "Content-Disposition": f"attachment; filename={result.data['filename']}"
-                    }
-                )
-            else:
-                return Response(
-                    content=result.data["content"],
-                    media_type=result.data.get("media_type", "application/octet-stream"),
-                    headers={
-                        "Content-Disposition": f"attachment; filename={result.data['filename']}"
-                    }
-                )
+            # Both files and zipped directories are immutable for a given CID, so the CID is a strong ETag
+            return RangeFileResponse(
+                path=result.data["path"],
+                request_headers=request.headers,
+                media_type=result.data.get("media_type", "application/octet-stream"),
+                filename=result.data["filename"],
+                etag=f'"{result.data["cid"]}"',
+                immutable=True,
+            )
             
     except FileNotFoundError:
         raise HTTPException(404, "File or directory not found")
@@ -257,4 +245,14 @@ async def update_storage_object(
         options = {"condition": condition_dict} if condition_dict else None
         return await storage_provider.update(location, request_data, options)
     else:
-        raise HTTPException(400, "Update currently only supports database storage")
\ No newline at end of file
+        raise HTTPException(400, "Update currently only supports database storage")
+
+
+@router.get("/cache/stats")
+async def get_cid_cache_stats():
+    """Get hit/miss and size statistics of the node CID cache for IPFS content"""
+    try:
+        return get_cid_cache().stats()
+    except Exception as e:
+        logger.error(f"CID cache stats error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
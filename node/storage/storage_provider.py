@@ -9,9 +9,9 @@ import shutil
 import requests
 import tempfile
 import logging
-from io import BytesIO
 from typing import Any, Dict, Union, BinaryIO, List
 
+from node.storage.cid_cache import fetch_ipfs, fetch_ipfs_zip
 from node.storage.db.db import LocalDBPostgres
 from node.storage.schemas import StorageLocation, StorageObject, StorageType, DatabaseReadOptions, IPFSOptions, StorageMetadata
 from node.storage.utils import zip_directory, get_api_url, to_multiaddr
@@ -249,13 +249,18 @@ class FilesystemStorageProvider(StorageProvider):
                     }
                 )
         
-        # Handle single file reads
-        else:
-            data = path.read_bytes()
+        # Handle single file reads, served from disk by the router instead of loaded into memory
+        elif path.is_file():
             return StorageObject(
-                location=location,  # Changed from positional to keyword arg
-                data=data
+                location=location,
+                data={
+                    "path": str(path),
+                    "media_type": "application/octet-stream",
+                    "filename": path.name,
+                }
             )
+        else:
+            raise FileNotFoundError(f"File not found: {path}")
 
     async def delete(self, location: StorageLocation, options: Dict[str, Any] = None) -> bool:
         """Delete a file or directory from filesystem storage
@@ -481,7 +486,6 @@ class IPFSStorageProvider(StorageProvider):
             options = options or IPFSOptions()
 
         try:
-            client = await self._get_client()
             hash_or_name = location.path.split('/')[-1]
             if options.resolve_ipns:
                 force_resolve = options.resolve_ipns
@@ -494,41 +498,29 @@ class IPFSStorageProvider(StorageProvider):
             else:
                 ipfs_hash = hash_or_name
 
-            # Get content from IPFS
-            temp_dir = tempfile.mkdtemp()
-            client.get(ipfs_hash, target=temp_dir)
-            file_path = os.path.join(temp_dir, ipfs_hash)
-
-            if os.path.isdir(file_path):
-                # Handle directory by creating zip
-                zip_buffer = BytesIO()
-                with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-                    for root, _, files in os.walk(file_path):
-                        for file in files:
-                            full_path = os.path.join(root, file)
-                            relative_path = os.path.relpath(full_path, file_path)
-                            zf.write(full_path, relative_path)
-                
+            # Get content from IPFS through the node CID cache, the router streams it from the cached path
+            file_path = fetch_ipfs(ipfs_hash)
+
+            if file_path.is_dir():
+                # Directories are served as a zip archive, which is cached alongside the raw content
                 return StorageObject(
                     location=location,
                     data={
-                        "content": zip_buffer.getvalue(),
+                        "path": str(fetch_ipfs_zip(ipfs_hash)),
+                        "cid": ipfs_hash,
                         "media_type": "application/zip",
                         "filename": f"{ipfs_hash}.zip",
                         "is_directory": True
                     }
                 )
             else:
-                # Handle single file
-                with open(file_path, 'rb') as f:
-                    content = f.read()
-                
                 return StorageObject(
                     location=location,
                     data={
-                        "content": content,
+                        "path": str(file_path),
+                        "cid": ipfs_hash,
                         "media_type": "application/octet-stream",
-                        "filename": os.path.basename(file_path),
+                        "filename": ipfs_hash,
                         "is_directory": False
                     }
                 )
@@ -536,11 +528,6 @@ class IPFSStorageProvider(StorageProvider):
         except Exception as e:
             logger.error(f"Error reading from IPFS: {e}")
             raise
-        finally:
-            # Cleanup
-            if 'temp_dir' in locals():
-                import shutil
-                shutil.rmtree(temp_dir)
 
     async def _publish_to_ipns(self, ipfs_hash: str) -> str:
         """Publish new IPNS record"""
@@ -0,0 +1,114 @@
+"""Module-affinity routing of package module runs.
+
+A worker that has already installed and verified a module runs it much faster than one that
+hasn't. With MODULE_AFFINITY=true the dispatchers send each package run to one of
+MODULE_AFFINITY_QUEUES queues picked by a hash of its module name, and workers consume the
+queues of the modules they have warm in addition to the shared queue. Runs that no affine
+worker takes within MODULE_AFFINITY_STEAL_AFTER seconds are taken by any worker:
+
+- celery: affinity queues are declared with a message TTL and the shared queue as their dead
+  letter queue, so RabbitMQ moves unclaimed runs to the shared queue
+- postgres: idle queue workers claim runs from any queue once they waited that long
+
+With MODULE_AFFINITY or MODULE_DISPATCH_STATS on, every package run records whether it was a
+cold start and how long it waited in its queue, see LocalDBPostgres.get_module_dispatch_stats.
+Records are kept for MODULE_DISPATCH_STATS_RETENTION seconds.
+"""
+from dotenv import load_dotenv
+import os
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional
+
+from kombu import Queue
+
+load_dotenv()
+
+MODULE_AFFINITY = os.getenv("MODULE_AFFINITY", "false") == "true"
+MODULE_AFFINITY_QUEUES = int(os.getenv("MODULE_AFFINITY_QUEUES", 16))
+MODULE_AFFINITY_STEAL_AFTER = float(os.getenv("MODULE_AFFINITY_STEAL_AFTER", 1.0))
+MODULE_DISPATCH_STATS = os.getenv("MODULE_DISPATCH_STATS", "false") == "true"
+MODULE_DISPATCH_STATS_RETENTION = float(os.getenv("MODULE_DISPATCH_STATS_RETENTION", 24 * 60 * 60))
+# how often a worker process deletes the dispatch records past the retention
+DISPATCH_STATS_PRUNE_INTERVAL = 60.0
+AFFINITY_QUEUE_PREFIX = "module-"
+
+# tasks that install and import the module of their run in the worker process
+AFFINITY_TASKS = {
+    f"node.worker.package_worker.{name}"
+    for name in ("run_agent", "run_memory", "run_tool", "run_orchestrator", "run_environment", "run_kb")
+}
+
+
+def run_module_name(task_name: str, args: Iterable[Any]) -> Optional[str]:
+    """Name of the module a package run task executes, None for other tasks"""
+    if task_name not in AFFINITY_TASKS:
+        return None
+    args = list(args)
+    if not args or not isinstance(args[0], dict):
+        return None
+    module = (args[0].get("deployment") or {}).get("module") or {}
+    return module.get("name") if isinstance(module, dict) else getattr(module, "name", None)
+
+
+def affinity_queue(module_name: str) -> str:
+    # crc32 rather than hash(), which differs between processes
+    return f"{AFFINITY_QUEUE_PREFIX}{zlib.crc32(module_name.encode()) % MODULE_AFFINITY_QUEUES}"
+
+
+def is_affinity_queue(queue: Optional[str]) -> bool:
+    return bool(queue) and queue.startswith(AFFINITY_QUEUE_PREFIX)
+
+
+def warm_queues(module_names: Iterable[str]) -> List[str]:
+    """The affinity queues a worker with these modules warm consumes, in a stable order"""
+    return sorted({affinity_queue(name) for name in module_names})
+
+
+def celery_affinity_queue(name: str, shared_queue: str) -> Queue:
+    """An affinity queue whose runs move to the shared queue when nobody took them in time.
+
+    Publishers and consumers must declare it with the same arguments, RabbitMQ rejects a
+    redeclaration with different ones.
+    """
+    return Queue(
+        name,
+        routing_key=name,
+        queue_arguments={
+            "x-message-ttl": int(MODULE_AFFINITY_STEAL_AFTER * 1000),
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": shared_queue,
+        },
+    )
+
+
+def dispatch_stats(module_name: str, module_type: str, run_id: str, cold_start: bool,
+                   queue: Optional[str], enqueued_at: Optional[float], started_at: float, worker: str) -> Dict[str, Any]:
+    """The record of one package run start, queue_wait is None when the enqueue time is unknown"""
+    return {
+        "run_id": run_id,
+        "module_name": module_name,
+        "module_type": module_type,
+        "queue": queue,
+        "affine": bool(queue) and queue == affinity_queue(module_name),
+        "cold_start": cold_start,
+        "queue_wait": max(0.0, started_at - enqueued_at) if enqueued_at else None,
+        "worker": worker,
+    }
+
+
+def dispatch_stats_enabled() -> bool:
+    return MODULE_AFFINITY or MODULE_DISPATCH_STATS
+
+
+_last_prune = None
+
+
+async def record_dispatch_stats(db, stats: Dict[str, Any]) -> None:
+    """Insert the record of a run start, and delete the expired records once per prune interval"""
+    global _last_prune
+    await db.record_module_dispatch(stats)
+    now = time.monotonic()
+    if _last_prune is None or now - _last_prune >= DISPATCH_STATS_PRUNE_INTERVAL:
+        _last_prune = now
+        await db.prune_module_dispatches(MODULE_DISPATCH_STATS_RETENTION)
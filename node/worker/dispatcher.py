@@ -0,0 +1,216 @@
+"""Dispatchers handing module runs to the workers.
+
+The servers build a Celery signature for each run and submit it through get_dispatcher(). The
+engine is picked with TASK_QUEUE_ENGINE:
+
+- celery: the signature is sent to RabbitMQ with apply_async (or as one group for batches)
+- postgres: the signature's task name and arguments are inserted in the task_queue table, where
+  `python -m node.worker.queue_worker` processes claim them with FOR UPDATE SKIP LOCKED
+
+Both return handles with a non blocking ready(), which is all the servers poll. Callers that
+never poll submit with track=False, so the postgres engine doesn't keep their completions. Package
+runs are routed to module-affinity queues when MODULE_AFFINITY is on, see node.worker.affinity.
+"""
+import asyncio
+from dotenv import load_dotenv
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Set, Union
+
+from celery import group
+from celery.canvas import Signature
+
+from node.storage.db.db import LocalDBPostgres, TASK_DONE_CHANNEL
+from node.worker.affinity import MODULE_AFFINITY, affinity_queue, celery_affinity_queue, run_module_name
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+TASK_QUEUE_ENGINE = os.getenv("TASK_QUEUE_ENGINE", "celery")
+TASK_QUEUE_MAX_ATTEMPTS = int(os.getenv("TASK_QUEUE_MAX_ATTEMPTS", 3))
+# seconds between status queries for submitted tasks, in case a completion notification was missed
+TASK_QUEUE_RECONCILE_INTERVAL = float(os.getenv("TASK_QUEUE_RECONCILE_INTERVAL", 5))
+# seconds a completion is kept for a handle that may still poll it, e.g. of a stream that was cancelled
+TASK_QUEUE_FINISHED_TTL = float(os.getenv("TASK_QUEUE_FINISHED_TTL", 600))
+DEFAULT_QUEUE = "default"
+FINISHED_STATUSES = ("completed", "failed")
+
+
+def task_row(signature: Signature, queue: str = DEFAULT_QUEUE) -> Dict[str, Any]:
+    """The queue table row for a Celery signature"""
+    return {
+        "task": signature.task,
+        "args": list(signature.args),
+        "kwargs": dict(signature.kwargs),
+        "queue": queue,
+    }
+
+
+class CeleryDispatcher:
+    def options(self, signature: Signature) -> Dict[str, Any]:
+        """Publish options of a signature: its enqueue time for the worker and its affinity queue"""
+        options = {"headers": {"enqueued_at": time.time()}}
+        module_name = run_module_name(signature.task, signature.args) if MODULE_AFFINITY else None
+        if module_name:
+            options["queue"] = celery_affinity_queue(affinity_queue(module_name), signature.app.conf.task_default_queue)
+        return options
+
+    async def submit(self, signature: Signature, track: bool = True):
+        return signature.apply_async(**self.options(signature))
+
+    async def submit_many(self, signatures: List[Signature], track: bool = True) -> List:
+        if not signatures:
+            return []
+        return group([signature.set(**self.options(signature)) for signature in signatures]).apply_async().results
+
+    async def close(self):
+        pass
+
+
+class QueuedTaskHandle:
+    """A task submitted to the Postgres queue, ready() once its worker completed it or gave up"""
+
+    def __init__(self, dispatcher: "PostgresDispatcher", task_id: str):
+        self.dispatcher = dispatcher
+        self.id = task_id
+        self.finished = False
+
+    def ready(self) -> bool:
+        if not self.finished:
+            self.finished = self.dispatcher.pop_finished(self.id)
+        return self.finished
+
+
+class PostgresDispatcher:
+    """Submits tasks to the task_queue table and tracks their completion.
+
+    Completions arrive as NOTIFY on TASK_DONE_CHANNEL, read from a dedicated LISTEN connection
+    registered with the event loop. A reconcile loop queries the status of tasks still pending,
+    which covers notifications sent while the listener was reconnecting.
+    """
+
+    def __init__(self, db=None, max_attempts: int = TASK_QUEUE_MAX_ATTEMPTS):
+        self.db = db if db is not None else LocalDBPostgres()
+        self.max_attempts = max_attempts
+        self.pending: Set[str] = set()
+        # task id -> loop time it finished at, until its handle polled it or it expired
+        self.finished: Dict[str, float] = {}
+        self.listener = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.reconciler: Optional[asyncio.Task] = None
+
+    def queue_for(self, signature: Signature) -> str:
+        module_name = run_module_name(signature.task, signature.args) if MODULE_AFFINITY else None
+        return affinity_queue(module_name) if module_name else DEFAULT_QUEUE
+
+    async def submit(self, signature: Signature, track: bool = True) -> Union[QueuedTaskHandle, str]:
+        return (await self.submit_many([signature], track))[0]
+
+    async def submit_many(self, signatures: List[Signature], track: bool = True) -> List[Union[QueuedTaskHandle, str]]:
+        """Handles of the enqueued tasks, or only their ids without track"""
+        if not signatures:
+            return []
+        task_ids = await self.db.enqueue_tasks(
+            [task_row(signature, self.queue_for(signature)) for signature in signatures],
+            max_attempts=self.max_attempts,
+        )
+        if not track:
+            return task_ids
+        self.start()
+        self.pending.update(task_ids)
+        return [QueuedTaskHandle(self, task_id) for task_id in task_ids]
+
+    def mark_finished(self, task_ids):
+        now = time.monotonic()
+        for task_id in task_ids:
+            if task_id in self.pending:
+                self.pending.discard(task_id)
+                self.finished[task_id] = now
+
+    def pop_finished(self, task_id: str) -> bool:
+        return self.finished.pop(task_id, None) is not None
+
+    def expire_finished(self):
+        """Forget completions no handle polled within TASK_QUEUE_FINISHED_TTL"""
+        cutoff = time.monotonic() - TASK_QUEUE_FINISHED_TTL
+        for task_id in [task_id for task_id, finished_at in self.finished.items() if finished_at < cutoff]:
+            del self.finished[task_id]
+
+    def start(self):
+        """Listen for completions and start reconciling on the running loop, once per loop"""
+        loop = asyncio.get_running_loop()
+        if self.loop is loop and self.listener is not None:
+            return
+        self.stop_listening()
+        self.loop = loop
+        self.listener = self.db.listen(TASK_DONE_CHANNEL)
+        loop.add_reader(self.listener.fileno(), self.read_notifications)
+        if self.reconciler is None or self.reconciler.done():
+            self.reconciler = loop.create_task(self.reconcile())
+
+    def read_notifications(self):
+        try:
+            self.listener.poll()
+        except Exception as e:
+            logger.error(f"Task completion listener failed, reconnecting on the next submit: {e}")
+            self.stop_listening()
+            return
+        self.mark_finished([notification.payload for notification in self.listener.notifies])
+        self.listener.notifies.clear()
+
+    async def reconcile(self):
+        while True:
+            await asyncio.sleep(TASK_QUEUE_RECONCILE_INTERVAL)
+            self.expire_finished()
+            if not self.pending:
+                continue
+            try:
+                tasks = await self.db.get_tasks(list(self.pending))
+                self.mark_finished([task["id"] for task in tasks if task["status"] in FINISHED_STATUSES])
+            except Exception as e:
+                logger.error(f"Failed to reconcile queued tasks: {e}")
+
+    def stop_listening(self):
+        if self.listener is None:
+            return
+        try:
+            self.loop.remove_reader(self.listener.fileno())
+        except Exception:
+            pass
+        try:
+            self.listener.close()
+        except Exception:
+            pass
+        self.listener = None
+
+    async def close(self):
+        self.stop_listening()
+        if self.reconciler is not None:
+            self.reconciler.cancel()
+            self.reconciler = None
+
+
+DISPATCHERS = {
+    "celery": CeleryDispatcher,
+    "postgres": PostgresDispatcher,
+}
+
+# Singleton accessor functions
+_dispatcher_instance = None
+
+
+def get_dispatcher():
+    global _dispatcher_instance
+    if _dispatcher_instance is None:
+        if TASK_QUEUE_ENGINE not in DISPATCHERS:
+            raise ValueError(f"Unknown TASK_QUEUE_ENGINE {TASK_QUEUE_ENGINE}, expected one of {list(DISPATCHERS)}")
+        _dispatcher_instance = DISPATCHERS[TASK_QUEUE_ENGINE]()
+    return _dispatcher_instance
+
+
+async def close_dispatcher():
+    global _dispatcher_instance
+    if _dispatcher_instance:
+        await _dispatcher_instance.close()
+        _dispatcher_instance = None
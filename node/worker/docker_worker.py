@@ -1,6 +1,5 @@
 import os
 from dotenv import load_dotenv
-import asyncio
 import time
 from typing import Dict, Optional
 from datetime import datetime
@@ -11,6 +10,8 @@ from docker.models.containers import Container
 from docker.errors import ContainerError, ImageNotFound, APIError
 from node.schemas import DockerParams, AgentRun
 from node.utils import get_logger
+from node.storage.cid_cache import release_ipfs_inputs
+from node.worker.event_loop import run_async
 from node.worker.main import app
 from node.worker.utils import (
     handle_ipfs_input,
@@ -31,6 +32,7 @@ def prepare_volume_directory(
     agent_run_id: Optional[str] = None,
     input_dir: Optional[str] = None,
     input_ipfs_hash: Optional[str] = None,
+    owner: Optional[str] = None,
 ) -> Dict:
     """Prepare a volume directory"""
     if input_dir and input_ipfs_hash:
@@ -41,7 +43,7 @@ def prepare_volume_directory(
             raise ValueError(f"Input directory {input_dir} does not exist")
         return {local_path: {"bind": bind_path, "mode": mode}}
     elif input_ipfs_hash:
-        local_path = handle_ipfs_input(input_ipfs_hash)
+        local_path = handle_ipfs_input(input_ipfs_hash, owner=owner)
         return {local_path: {"bind": bind_path, "mode": mode}}
     elif agent_run_id:
         local_path = f"{base_dir}/{agent_run_id}"
@@ -60,7 +62,7 @@ def monitor_container_logs(
     for line in container.logs(stream=True, follow=True):
         output += line.strip().decode("utf-8") + "\n"
         agent_run.status = "running"
-        asyncio.run(update_db_with_status_sync(module_run=agent_run))
+        run_async(update_db_with_status_sync(module_run=agent_run))
 
     if save_location == "node":
         out_msg = {"output": str(output), "node_storage_path": agent_run.id}
@@ -77,7 +79,7 @@ def monitor_container_logs(
     agent_run.error = False
     agent_run.error_message = ""
     agent_run.completed_time = datetime.now(pytz.utc).isoformat()
-    asyncio.run(update_db_with_status_sync(module_run=agent_run))
+    run_async(update_db_with_status_sync(module_run=agent_run))
     time.sleep(5)
 
     return output
@@ -108,6 +110,7 @@ def run_container_agent(agent_run: AgentRun = None, **kwargs) -> None:
             mode="ro",
             input_dir=agent_run.inputs.input_dir,
             input_ipfs_hash=agent_run.inputs.input_ipfs_hash,
+            owner=agent_run.id,
         )
         volumes.update(inp_vol)
 
@@ -177,7 +180,7 @@ def run_container_agent(agent_run: AgentRun = None, **kwargs) -> None:
         agent_run.error_message = str(e) + error_details
         agent_run.completed_time = datetime.now(pytz.utc).isoformat()
 
-        asyncio.run(
+        run_async(
             update_db_with_status_sync(
                 module_run=agent_run,
             )
@@ -201,7 +204,7 @@ def run_container_agent(agent_run: AgentRun = None, **kwargs) -> None:
         agent_run.completed_time = datetime.now(pytz.utc).isoformat()
 
         # Update the agent run status to error
-        asyncio.run(
+        run_async(
             update_db_with_status_sync(
                 module_run=agent_run,
             )
@@ -227,7 +230,7 @@ def execute_docker_agent(self, agent_run: Dict) -> None:
         agent_run.start_processing_time = datetime.now(pytz.utc).isoformat()
 
         # Update the agent run status to processing
-        asyncio.run(
+        run_async(
             update_db_with_status_sync(
                 module_run=agent_run,
             )
@@ -242,5 +245,7 @@ def execute_docker_agent(self, agent_run: Dict) -> None:
             error_details = traceback.format_exc()
             logger.error(f"Full traceback: {error_details}")
     finally:
+        if isinstance(agent_run, AgentRun):
+            release_ipfs_inputs(agent_run.id)
         # Force cleanup of channels
         app.backend.cleanup()
\ No newline at end of file
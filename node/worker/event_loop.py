@@ -0,0 +1,203 @@
+"""Event loops the worker tasks run their coroutines on.
+
+WORKER_EVENT_LOOP selects how a worker process runs the async part of its tasks:
+
+- per_task: every task drives the thread's event loop with run_until_complete until its
+  coroutine is done, so one process runs one module at a time
+- shared: one event loop per process runs forever in a daemon thread. Tasks submit their
+  coroutine to it with run_coroutine_threadsafe and block on the result, and at most
+  WORKER_ASYNC_CONCURRENCY of them run at once. Connections, clients and the gRPC pool stay
+  bound to that loop across tasks. Start the Celery worker with the threads pool so several
+  tasks wait on the loop at the same time:
+
+      celery -A node.worker.main.app worker -P threads -c 32
+"""
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+import logging
+import os
+import threading
+from typing import Any, Callable, ContextManager, Coroutine, Hashable, Optional
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+WORKER_EVENT_LOOP = os.getenv("WORKER_EVENT_LOOP", "per_task")
+WORKER_ASYNC_CONCURRENCY = int(os.getenv("WORKER_ASYNC_CONCURRENCY", 16))
+
+
+class WorkerEventLoop:
+    """A long-lived event loop in a daemon thread, shared by the tasks of one worker process.
+
+    The thread is started on first use in the process that uses it, a forked pool child
+    starts its own rather than inheriting a loop whose thread didn't survive the fork.
+    """
+
+    def __init__(self, concurrency: int = WORKER_ASYNC_CONCURRENCY):
+        self.concurrency = max(1, concurrency)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.limit: Optional[asyncio.Semaphore] = None
+        self.pid: Optional[int] = None
+        self.lock = threading.Lock()
+        self.in_flight = 0
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        with self.lock:
+            if self.loop is not None and self.pid == os.getpid() and self.thread.is_alive():
+                return self.loop
+            self.pid = os.getpid()
+            self.loop = asyncio.new_event_loop()
+            self.limit = asyncio.Semaphore(self.concurrency)
+            ready = threading.Event()
+            self.thread = threading.Thread(target=self._run, args=(self.loop, ready), name="worker-event-loop", daemon=True)
+            self.thread.start()
+            ready.wait()
+            logger.info(f"Worker event loop started in process {self.pid} running up to {self.concurrency} coroutines at once")
+            return self.loop
+
+    @staticmethod
+    def _run(loop: asyncio.AbstractEventLoop, ready: threading.Event):
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        loop.run_forever()
+
+    async def _limited(self, coro: Coroutine) -> Any:
+        async with self.limit:
+            self.in_flight += 1
+            try:
+                return await coro
+            finally:
+                self.in_flight -= 1
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run coro on the loop within the concurrency limit and wait for its result"""
+        loop = self.start()
+        future = asyncio.run_coroutine_threadsafe(self._limited(coro), loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def spawn(self, coro: Coroutine):
+        """Run a background coroutine on the loop, outside the concurrency limit"""
+        return asyncio.run_coroutine_threadsafe(coro, self.start())
+
+    def stop(self, timeout: float = 10.0):
+        with self.lock:
+            loop, thread = self.loop, self.thread
+            self.loop = self.thread = None
+        if loop is None or self.pid != os.getpid():
+            return
+
+        async def cancel_tasks():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await loop.shutdown_asyncgens()
+
+        try:
+            asyncio.run_coroutine_threadsafe(cancel_tasks(), loop).result(timeout)
+        except Exception as e:
+            logger.error(f"Error cancelling worker event loop tasks: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not loop.is_running():
+            loop.close()
+        logger.info(f"Worker event loop of process {self.pid} stopped")
+
+
+class ProcessContextGate:
+    """Shares process-wide state among the coroutines that need the same version of it.
+
+    Module runs change the working directory, sys.path and os.environ while they execute.
+    Runs with the same key (module and environment) can share one setup: the first one enters
+    the context and the last one leaves it. A run with another key waits until the current
+    holders are done. Waiters are admitted in arrival order, so a steady stream of runs of one
+    module can't starve another.
+    """
+
+    def __init__(self):
+        self.key: Optional[Hashable] = None
+        self.holders = 0
+        self.context: Optional[ContextManager] = None
+        self.waiting: deque = deque()
+        self.condition: Optional[asyncio.Condition] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            # per_task workers may drive a new loop after the previous one closed
+            self.loop = loop
+            self.condition = asyncio.Condition()
+        return self.condition
+
+    def _admissible(self, key: Hashable) -> bool:
+        return self.holders == 0 or self.key == key
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable, context_factory: Callable[[], ContextManager]):
+        condition = self._condition()
+        async with condition:
+            if self.waiting or not self._admissible(key):
+                ticket = object()
+                self.waiting.append(ticket)
+                try:
+                    await condition.wait_for(lambda: self.waiting[0] is ticket and self._admissible(key))
+                finally:
+                    self.waiting.remove(ticket)
+                    condition.notify_all()
+            if self.holders == 0:
+                context = context_factory()
+                context.__enter__()
+                self.key, self.context = key, context
+            self.holders += 1
+        try:
+            yield
+        finally:
+            async with condition:
+                self.holders -= 1
+                if self.holders == 0:
+                    context, self.key, self.context = self.context, None, None
+                    try:
+                        context.__exit__(None, None, None)
+                    finally:
+                        condition.notify_all()
+
+
+# Singleton accessor functions
+_worker_loop = None
+
+
+def get_worker_loop() -> WorkerEventLoop:
+    global _worker_loop
+    if _worker_loop is None:
+        _worker_loop = WorkerEventLoop()
+    return _worker_loop
+
+
+def close_worker_loop():
+    global _worker_loop
+    if _worker_loop:
+        _worker_loop.stop()
+        _worker_loop = None
+
+
+def run_async(coro: Coroutine) -> Any:
+    """Run a task's coroutine to completion in the WORKER_EVENT_LOOP mode"""
+    if WORKER_EVENT_LOOP == "shared":
+        return get_worker_loop().run(coro)
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        # threads other than the main one start without an event loop
+        loop = None
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+    return loop.run_until_complete(coro)
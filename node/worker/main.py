@@ -6,7 +6,9 @@ import os
 import asyncio
 import traceback
 import resource
-from node.server.grpc_pool_manager import get_grpc_pool_instance, close_grpc_pool
+from node.server.grpc_pool_manager import GRPC_CHANNELS_PER_TARGET, get_grpc_pool_instance, close_grpc_pool
+from node.worker.affinity import MODULE_AFFINITY
+from node.worker.event_loop import WORKER_ASYNC_CONCURRENCY, WORKER_EVENT_LOOP, close_worker_loop, get_worker_loop
 import psutil
 
 logger = get_logger(__name__)
@@ -56,14 +58,12 @@ RMQ_PASSWORD = os.environ.get("RMQ_PASSWORD")
 RMQ_HOST = "rabbitmq" if os.getenv("LAUNCH_DOCKER") == "true" else "localhost"
 BROKER_URL = f"amqp://{RMQ_USER}:{RMQ_PASSWORD}@{RMQ_HOST}:5672/"
 BACKEND_URL = f"rpc://{RMQ_USER}:{RMQ_PASSWORD}@{RMQ_HOST}:5672/"
-NUM_GRPC_CONNECTIONS = 200
-BUFFER_SIZE = 20
 
 logger.info(f"Configuration loaded:")
 logger.info(f"✓ BROKER_URL configured: {BROKER_URL}")
 if NODE_COMMUNICATION_PROTOCOL == "grpc":
-    logger.info(f"✓ NUM_GRPC_CONNECTIONS: {NUM_GRPC_CONNECTIONS}")
-    logger.info(f"✓ BUFFER_SIZE: {BUFFER_SIZE}")
+    logger.info(f"✓ GRPC_CHANNELS_PER_TARGET: {GRPC_CHANNELS_PER_TARGET}")
+logger.info(f"✓ WORKER_EVENT_LOOP: {WORKER_EVENT_LOOP}" + (f" ({WORKER_ASYNC_CONCURRENCY} concurrent runs)" if WORKER_EVENT_LOOP == "shared" else ""))
 
 @worker_init.connect
 def initialize_grpc_pool(**kwargs):
@@ -71,10 +71,16 @@ def initialize_grpc_pool(**kwargs):
     if NODE_COMMUNICATION_PROTOCOL == "grpc":
         logger.info("Starting GlobalGrpcPool initialization...")
         try:
-            pool = get_grpc_pool_instance(
-                max_channels=NUM_GRPC_CONNECTIONS, buffer_size=BUFFER_SIZE
-            )
-            logger.info(f"✓ gRPC pool created with {NUM_GRPC_CONNECTIONS} max channels")
+            pool = get_grpc_pool_instance()
+            logger.info(f"✓ gRPC pool created with {GRPC_CHANNELS_PER_TARGET} channels per target")
+
+            if WORKER_EVENT_LOOP == "shared":
+                # channels are bound to the loop that uses them, the tasks' shared loop
+                get_worker_loop().spawn(pool.monitor_pool())
+                logger.info("✓ Pool monitor task created on the worker event loop")
+                log_system_limits()
+                logger.info("✓ GlobalGrpcPool initialization complete")
+                return
 
             # Set up event loop
             try:
@@ -100,6 +106,17 @@ def initialize_grpc_pool(**kwargs):
 @worker_shutdown.connect
 def shutdown_grpc_pool_signal(**kwargs):
     """Shuts down the GlobalGrpcPool when a Celery worker stops."""
+    if WORKER_EVENT_LOOP == "shared":
+        if NODE_COMMUNICATION_PROTOCOL == "grpc":
+            logger.info("Closing gRPC pool connections on the worker event loop...")
+            try:
+                get_worker_loop().spawn(close_grpc_pool()).result(30)
+                logger.info("✓ GlobalGrpcPool shutdown complete")
+            except Exception as e:
+                logger.error(f"✗ Error during gRPC pool shutdown: {e}")
+        close_worker_loop()
+        return
+
     if NODE_COMMUNICATION_PROTOCOL == "grpc":
         logger.info("Starting GlobalGrpcPool shutdown...")
         try:
@@ -187,4 +204,6 @@ app.conf.update(
     broker_pool_limit=10,  # Limit connection pool size
     task_acks_late=True,
     task_reject_on_worker_lost=True,  # Requeue task if worker dies
+    # with module affinity, runs a busy worker would prefetch stay in their queue and can move to the shared one
+    worker_prefetch_multiplier=1 if MODULE_AFFINITY else 4,
 )
\ No newline at end of file
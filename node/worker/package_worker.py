@@ -9,15 +9,28 @@ import os
 import pytz
 from pathlib import Path
 import sys
+import time
 import traceback
 from datetime import datetime
 from dotenv import load_dotenv, dotenv_values
 from typing import Union
 import sys
 
-from node.module_manager import install_module_with_lock, load_and_validate_input_schema
+from node.module_manager import INSTALLED_MODULES, install_module_with_lock, load_and_validate_input_schema
 from node.schemas import AgentRun, MemoryRun, ToolRun, EnvironmentRun, OrchestratorRun, KBRun
+from node.storage.db.db import LocalDBPostgres
+from node.worker.affinity import (
+    MODULE_AFFINITY,
+    affinity_queue,
+    celery_affinity_queue,
+    dispatch_stats,
+    dispatch_stats_enabled,
+    record_dispatch_stats,
+)
+from node.worker.dispatcher import TASK_QUEUE_ENGINE
+from node.worker.event_loop import ProcessContextGate, run_async
 from node.worker.main import app
+from node.storage.cid_cache import release_ipfs_inputs
 from node.worker.utils import prepare_input_dir, update_db_with_status_sync, upload_to_ipfs
 
 logger = logging.getLogger(__name__)
@@ -40,8 +53,7 @@ if MODULES_SOURCE_DIR not in sys.path:
 def run_agent(self, agent_run, user_env_data = {}):
     try:
         agent_run = AgentRun(**agent_run)
-        loop = asyncio.get_event_loop()
-        return loop.run_until_complete(_run_module_async(agent_run, user_env_data))
+        return run_async(_run_module_async(agent_run, user_env_data, self.request))
     finally:
         # Force cleanup of channels
         app.backend.cleanup()
@@ -50,8 +62,7 @@ def run_agent(self, agent_run, user_env_data = {}):
 def run_memory(self, memory_run, user_env_data = {}):
     try:
         memory_run = MemoryRun(**memory_run)
-        loop = asyncio.get_event_loop()
-        return loop.run_until_complete(_run_module_async(memory_run, user_env_data))
+        return run_async(_run_module_async(memory_run, user_env_data, self.request))
     finally:
         # Force cleanup of channels
         app.backend.cleanup()
@@ -60,8 +71,7 @@ def run_memory(self, memory_run, user_env_data = {}):
 def run_tool(self, tool_run, user_env_data = {}):
     try:
         tool_run = ToolRun(**tool_run)
-        loop = asyncio.get_event_loop()
-        return loop.run_until_complete(_run_module_async(tool_run, user_env_data))
+        return run_async(_run_module_async(tool_run, user_env_data, self.request))
     finally:
         # Force cleanup of channels
         app.backend.cleanup()
@@ -70,8 +80,7 @@ def run_tool(self, tool_run, user_env_data = {}):
 def run_orchestrator(self, orchestrator_run, user_env_data = {}):
     try:
         orchestrator_run = OrchestratorRun(**orchestrator_run)
-        loop = asyncio.get_event_loop()
-        return loop.run_until_complete(_run_module_async(orchestrator_run, user_env_data))
+        return run_async(_run_module_async(orchestrator_run, user_env_data, self.request))
     finally:
         # Force cleanup of channels
         app.backend.cleanup()
@@ -80,8 +89,7 @@ def run_orchestrator(self, orchestrator_run, user_env_data = {}):
 def run_environment(self, environment_run, user_env_data = {}):
     try:
         environment_run = EnvironmentRun(**environment_run)
-        loop = asyncio.get_event_loop()
-        return loop.run_until_complete(_run_module_async(environment_run, user_env_data))
+        return run_async(_run_module_async(environment_run, user_env_data, self.request))
     finally:
         # Force cleanup of channels
         app.backend.cleanup()
@@ -90,17 +98,59 @@ def run_environment(self, environment_run, user_env_data = {}):
 def run_kb(self, kb_run, user_env_data = {}):
     try:
         kb_run = KBRun(**kb_run)
-        loop = asyncio.get_event_loop()
-        return loop.run_until_complete(_run_module_async(kb_run, user_env_data))
+        return run_async(_run_module_async(kb_run, user_env_data, self.request))
     finally:
         # Force cleanup of channels
         app.backend.cleanup()
 
-async def _run_module_async(module_run: Union[AgentRun, MemoryRun, ToolRun, OrchestratorRun, EnvironmentRun, KBRun], user_env_data = {}) -> None:
+# module runs sharing a worker's event loop take turns at the working directory, sys.path and os.environ
+PACKAGE_CONTEXT_GATE = ProcessContextGate()
+
+# affinity queues this worker was asked to consume, so each one is only requested once per process
+SUBSCRIBED_QUEUES = set()
+
+async def record_dispatch(module_run_engine: "ModuleRunEngine", cold_start: bool, request) -> None:
+    """Record whether the run was a cold start and how long it waited in its queue when dispatch
+    stats are on, and have a Celery worker consume the affinity queue of a module it just warmed up"""
+    module_name = module_run_engine.module_name
+    hostname = getattr(request, "hostname", None)
+    if dispatch_stats_enabled():
+        delivery_info = getattr(request, "delivery_info", None) or {}
+        stats = dispatch_stats(
+            module_name=module_name,
+            module_type=module_run_engine.module_type,
+            run_id=module_run_engine.module_run.id,
+            cold_start=cold_start,
+            queue=delivery_info.get("routing_key"),
+            enqueued_at=getattr(request, "enqueued_at", None),
+            started_at=time.time(),
+            worker=hostname,
+        )
+        try:
+            async with LocalDBPostgres() as db:
+                await record_dispatch_stats(db, stats)
+        except Exception as e:
+            logger.error(f"Failed to record dispatch of {module_name}: {e}")
+
+    queue = affinity_queue(module_name)
+    if MODULE_AFFINITY and TASK_QUEUE_ENGINE == "celery" and hostname and queue not in SUBSCRIBED_QUEUES:
+        # queue workers pick up the queues of installed modules on their own
+        SUBSCRIBED_QUEUES.add(queue)
+        celery_queue = celery_affinity_queue(queue, app.conf.task_default_queue)
+        app.control.add_consumer(
+            celery_queue.name,
+            routing_key=celery_queue.routing_key,
+            options={"queue_arguments": celery_queue.queue_arguments},
+            destination=[hostname],
+        )
+        logger.info(f"Worker {hostname} consuming affinity queue {queue} of {module_name}")
+
+async def _run_module_async(module_run: Union[AgentRun, MemoryRun, ToolRun, OrchestratorRun, EnvironmentRun, KBRun], user_env_data = {}, request = None) -> None:
     """Handles execution of agent, memory, orchestrator, and environment runs.
     
     Args:
         module_run: Either an AgentRun, MemoryRun, OrchestratorRun, or EnvironmentRun object
+        request: The Celery request of the task, for the run's queue and enqueue time
     """
     try:
         module_run_engine = ModuleRunEngine(module_run)
@@ -108,6 +158,7 @@ async def _run_module_async(module_run: Union[AgentRun, MemoryRun, ToolRun, Orch
         module_version = f"v{module_run_engine.module['module_version']}"
         module_name = module_run_engine.module["name"]
         module = module_run.deployment.module
+        cold_start = INSTALLED_MODULES.get(module_name) != module_run_engine.module["module_version"]
 
         logger.info(f"Received {module_run_engine.module_type} run: {module_run} - Checking if {module_run_engine.module_type} {module_name} version {module_version} is installed")
 
@@ -122,6 +173,7 @@ async def _run_module_async(module_run: Union[AgentRun, MemoryRun, ToolRun, Orch
             await handle_failure(error_msg=error_msg, module_run=module_run)
             return
 
+        await record_dispatch(module_run_engine, cold_start, request)
         await module_run_engine.init_run()
         await module_run_engine.start_run(user_env_data)
 
@@ -136,6 +188,38 @@ async def _run_module_async(module_run: Union[AgentRun, MemoryRun, ToolRun, Orch
         logger.error(f"Traceback: {traceback.format_exc()}")
         await handle_failure(error_msg=error_msg, module_run=module_run)
         return
+    finally:
+        # allow cached IPFS inputs of this run to be evicted again
+        release_ipfs_inputs(module_run.id)
+
+INLINE_RUN_SCHEMAS = {"tool": ToolRun, "memory": MemoryRun}
+
+def run_inline(module_run: dict, user_env_data = {}) -> dict:
+    """Run a tool or memory run in a process of the server's inline pool.
+
+    The run isn't written to the database while it executes, the finished run is returned
+    and the server inserts its record in one write.
+    """
+    module_type = module_run["deployment"]["module"]["module_type"]
+    module_run = INLINE_RUN_SCHEMAS[module_type](**module_run)
+    return run_async(_run_module_inline(module_run, user_env_data)).model_dump()
+
+async def _run_module_inline(module_run: Union[MemoryRun, ToolRun], user_env_data = {}) -> Union[MemoryRun, ToolRun]:
+    try:
+        module_run_engine = ModuleRunEngine(module_run, record_status=False)
+        await install_module_with_lock(module_run.deployment.module)
+        await module_run_engine.init_run()
+        await module_run_engine.start_run(user_env_data)
+        await module_run_engine.complete()
+        return module_run_engine.module_run
+    except Exception as e:
+        error_msg = f"Error in _run_module_inline: {str(e)}"
+        logger.error(error_msg)
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        mark_failed(error_msg, module_run)
+        return module_run
+    finally:
+        release_ipfs_inputs(module_run.id)
 
 async def handle_failure(
     error_msg: str, 
@@ -147,6 +231,14 @@ async def handle_failure(
         error_msg: Error message to store
         module_run: Module run object (AgentRun, OrchestratorRun, or EnvironmentRun)
     """
+    mark_failed(error_msg, module_run)
+    try:
+        await update_db_with_status_sync(module_run=module_run)
+    except Exception as db_error:
+        logger.error(f"Failed to update database after error: {str(db_error)}")
+
+def mark_failed(error_msg: str, module_run: Union[AgentRun, MemoryRun, ToolRun, OrchestratorRun, EnvironmentRun, KBRun]) -> None:
+    """Set the error fields of a failed module run"""
     module_run.status = "error"
     module_run.error = True 
     module_run.error_message = error_msg
@@ -161,11 +253,6 @@ async def handle_failure(
     else:
         module_run.duration = 0
 
-    try:
-        await update_db_with_status_sync(module_run=module_run)
-    except Exception as db_error:
-        logger.error(f"Failed to update database after error: {str(db_error)}")
-
 async def maybe_async_call(func, *args, **kwargs):
     if inspect.iscoroutinefunction(func):
         # If it's an async function, await it directly
@@ -240,7 +327,8 @@ class ModuleLoader:
             os.environ.update(old_env)
 
     async def load_and_run(self, module_path: Path, entrypoint: str, module_run, user_env_data = {}):
-        with self.package_context(user_env_data):
+        context_key = (self.module_name, str(self.module_dir), json.dumps(user_env_data or {}, sort_keys=True, default=str))
+        async with PACKAGE_CONTEXT_GATE.hold(context_key, lambda: self.package_context(user_env_data)):
             try:
                 # Remove any existing module references
                 for key in list(sys.modules.keys()):
@@ -282,8 +370,10 @@ class ModuleLoader:
                 raise RuntimeError(f"Module execution failed: {str(e)}") from e
 
 class ModuleRunEngine:
-    def __init__(self, module_run: Union[AgentRun, MemoryRun, ToolRun, EnvironmentRun, KBRun]):
+    def __init__(self, module_run: Union[AgentRun, MemoryRun, ToolRun, EnvironmentRun, KBRun], record_status: bool = True):
         self.module_run = module_run
+        # inline runs are written once when they finished instead of at every status change
+        self.record_status = record_status
         self.deployment = module_run.deployment
         self.module = self.deployment.module
         self.module_type = module_run.deployment.module['module_type']
@@ -297,18 +387,23 @@ class ModuleRunEngine:
             "id": module_run.consumer_id,
         }
 
+    async def save_status(self):
+        if self.record_status:
+            await update_db_with_status_sync(module_run=self.module_run)
+
     async def init_run(self):
         logger.info(f"Initializing {self.module_type} run")
         self.module_run.status = "processing"
         self.module_run.start_processing_time = datetime.now(pytz.timezone("UTC")).isoformat()
 
-        await update_db_with_status_sync(module_run=self.module_run)
+        await self.save_status()
 
         if "input_dir" in self.parameters or "input_ipfs_hash" in self.parameters:
             self.parameters = prepare_input_dir(
                 parameters=self.parameters,
                 input_dir=self.parameters.get("input_dir", None),
                 input_ipfs_hash=self.parameters.get("input_ipfs_hash", None),
+                run_id=self.module_run.id,
             )
 
         # Load the module
@@ -318,7 +413,7 @@ class ModuleRunEngine:
         """Executes the module run"""
         logger.info(f"Starting {self.module_type} run")
         self.module_run.status = "running"
-        await update_db_with_status_sync(module_run=self.module_run)
+        await self.save_status()
 
         try:
             # Setup paths
@@ -396,7 +491,7 @@ class ModuleRunEngine:
             datetime.fromisoformat(self.module_run.completed_time)
             - datetime.fromisoformat(self.module_run.start_processing_time)
         ).total_seconds()
-        await update_db_with_status_sync(module_run=self.module_run)
+        await self.save_status()
         logger.info(f"{self.module_type.title()} run completed")
 
     async def fail(self):
@@ -412,4 +507,4 @@ class ModuleRunEngine:
             datetime.fromisoformat(self.module_run.completed_time)
             - datetime.fromisoformat(self.module_run.start_processing_time)
         ).total_seconds()
-        await update_db_with_status_sync(module_run=self.module_run)
+        await self.save_status()
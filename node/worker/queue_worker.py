@@ -0,0 +1,179 @@
+"""Worker processes consuming the Postgres task queue, used when TASK_QUEUE_ENGINE=postgres.
+
+Each process claims one task at a time with FOR UPDATE SKIP LOCKED, runs the Celery task it
+names in process, and records the result. Between tasks it waits on LISTEN for new work, waking
+up at least every TASK_QUEUE_POLL_INTERVAL seconds for retries whose backoff elapsed and for
+tasks whose lease expired. While a task runs its lease is extended in the background, so only
+the tasks of a worker that died or hung become visible again.
+
+With MODULE_AFFINITY on, a worker also consumes the affinity queues of the modules it has
+installed, and when all of its queues are empty it steals runs that waited in other affinity
+queues for MODULE_AFFINITY_STEAL_AFTER seconds.
+
+    python -m node.worker.queue_worker --concurrency 8
+
+Tasks defined outside the worker modules of the Celery app are found by importing their modules
+with --include, like the -I option of a Celery worker.
+"""
+import asyncio
+from dotenv import load_dotenv
+import importlib
+import os
+import select
+import signal
+import socket
+import threading
+import time
+import traceback
+from typing import Any, Dict, List
+
+from node.module_manager import INSTALLED_MODULES
+from node.storage.db.db import LocalDBPostgres, TASK_QUEUE_CHANNEL
+from node.server.workers import WorkerSupervisor
+from node.worker.affinity import AFFINITY_QUEUE_PREFIX, MODULE_AFFINITY, MODULE_AFFINITY_STEAL_AFTER, warm_queues
+from node.utils import get_logger
+
+logger = get_logger(__name__)
+load_dotenv()
+
+# seconds a claimed task stays invisible to other workers without its lease being extended
+TASK_QUEUE_VISIBILITY_TIMEOUT = float(os.getenv("TASK_QUEUE_VISIBILITY_TIMEOUT", 300))
+# base delay before a failed task is retried, doubled on every further attempt
+TASK_QUEUE_RETRY_DELAY = float(os.getenv("TASK_QUEUE_RETRY_DELAY", 5))
+TASK_QUEUE_POLL_INTERVAL = float(os.getenv("TASK_QUEUE_POLL_INTERVAL", 1))
+TASK_QUEUE_WORKER_CONCURRENCY = int(os.getenv("TASK_QUEUE_WORKER_CONCURRENCY", os.cpu_count() or 1))
+
+
+def resolve_task(name: str):
+    """The Celery task registered under name, tasks run in this process instead of through the broker"""
+    from node.worker.main import app
+
+    app.loader.import_default_modules()
+    return app.tasks[name]
+
+
+class QueueWorker:
+    def __init__(self, queues: List[str], index: int = 0):
+        # the shared queues this worker always consumes
+        self.queues = queues
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{index}"
+        self.db = LocalDBPostgres()
+        self.stopping = threading.Event()
+        self.loop = asyncio.get_event_loop()
+
+    def consumed_queues(self) -> List[str]:
+        """The shared queues, and the affinity queues of the modules installed in this process"""
+        if not MODULE_AFFINITY:
+            return self.queues
+        return warm_queues(INSTALLED_MODULES) + self.queues
+
+    def claim(self) -> List[Dict[str, Any]]:
+        tasks = self.loop.run_until_complete(
+            self.db.claim_tasks(self.worker_id, self.consumed_queues(), 1, TASK_QUEUE_VISIBILITY_TIMEOUT)
+        )
+        if not tasks and MODULE_AFFINITY:
+            tasks = self.loop.run_until_complete(
+                self.db.steal_tasks(self.worker_id, AFFINITY_QUEUE_PREFIX, 1, TASK_QUEUE_VISIBILITY_TIMEOUT, MODULE_AFFINITY_STEAL_AFTER)
+            )
+        return tasks
+
+    def run(self):
+        listener = self.db.listen(TASK_QUEUE_CHANNEL)
+        logger.info(f"Queue worker {self.worker_id} consuming {self.queues}")
+        try:
+            while not self.stopping.is_set():
+                tasks = self.claim()
+                if tasks:
+                    self.process(tasks[0])
+                else:
+                    self.wait(listener)
+        finally:
+            listener.close()
+            logger.info(f"Queue worker {self.worker_id} stopped")
+
+    def wait(self, listener):
+        readable, _, _ = select.select([listener], [], [], TASK_QUEUE_POLL_INTERVAL)
+        if readable:
+            listener.poll()
+            listener.notifies.clear()
+
+    def process(self, task: Dict[str, Any]):
+        logger.info(f"Running {task['task']} {task['id']} (attempt {task['attempts']}/{task['max_attempts']})")
+        finished = threading.Event()
+        heartbeat = threading.Thread(target=self.extend_lease, args=(task["id"], finished), daemon=True)
+        heartbeat.start()
+        try:
+            result = self.execute(task)
+        except Exception as e:
+            logger.error(f"Task {task['id']} failed: {e}")
+            status = self.loop.run_until_complete(
+                self.db.fail_task(self.worker_id, task["id"], f"{e}\n{traceback.format_exc()}", TASK_QUEUE_RETRY_DELAY)
+            )
+            logger.info(f"Task {task['id']} is {status}")
+        else:
+            self.loop.run_until_complete(self.db.complete_task(self.worker_id, task["id"], result))
+        finally:
+            finished.set()
+            heartbeat.join()
+
+    def execute(self, task: Dict[str, Any]) -> Any:
+        """Run the task like a Celery worker would, with its id, queue and enqueue time in task.request"""
+        celery_task = resolve_task(task["task"])
+        celery_task.push_request(
+            id=task["id"],
+            args=task["args"],
+            kwargs=task["kwargs"],
+            retries=task["attempts"] - 1,
+            hostname=self.worker_id,
+            delivery_info={"routing_key": task["queue"]},
+            enqueued_at=time.time() - float(task["queue_wait"]),
+        )
+        try:
+            return celery_task.run(*task["args"], **task["kwargs"])
+        finally:
+            celery_task.pop_request()
+
+    def extend_lease(self, task_id: str, finished: threading.Event):
+        while not finished.wait(TASK_QUEUE_VISIBILITY_TIMEOUT / 3):
+            try:
+                asyncio.run(self.db.extend_task_leases(self.worker_id, [task_id], TASK_QUEUE_VISIBILITY_TIMEOUT))
+            except Exception as e:
+                logger.error(f"Failed to extend the lease of task {task_id}: {e}")
+
+
+def worker_main(queues: List[str], includes: List[str], index: int):
+    for module in includes:
+        importlib.import_module(module)
+    worker = QueueWorker(queues, index)
+    # finish the running task on SIGTERM, the supervisor kills workers still busy after the drain timeout
+    signal.signal(signal.SIGTERM, lambda sig, frame: worker.stopping.set())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker.run()
+
+
+def run_supervisor(queues: List[str], concurrency: int, includes: List[str] = []):
+    supervisor = WorkerSupervisor(worker_main, (queues, includes), concurrency, name="queue-worker")
+
+    def signal_handler(sig, frame):
+        logger.info(f"Received exit signal {signal.Signals(sig).name}...")
+        supervisor.stopping.set()
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, signal_handler)
+
+    try:
+        supervisor.start()
+        supervisor.monitor()
+    finally:
+        supervisor.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run Postgres task queue workers")
+    parser.add_argument("--concurrency", type=int, default=TASK_QUEUE_WORKER_CONCURRENCY, help="worker processes")
+    parser.add_argument("--queues", nargs="+", default=["default"], help="queues to consume")
+    parser.add_argument("--include", nargs="+", default=[], help="modules to import for their tasks")
+    args = parser.parse_args()
+    run_supervisor(args.queues, args.concurrency, args.include)
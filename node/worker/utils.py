@@ -7,7 +7,6 @@ from node.schemas import AgentRun, EnvironmentRun, OrchestratorRun, KBRun, Memor
 from node.storage.db.db import LocalDBPostgres
 import os
 from pathlib import Path
-import tempfile
 from typing import Dict, Optional, Union
 from websockets.exceptions import ConnectionClosedError
 import yaml
@@ -15,6 +14,7 @@ import zipfile
 import requests
 from node.storage.utils import get_api_url
 from node.storage.utils import to_multiaddr
+from node.storage.cid_cache import checkout_ipfs_input, fetch_ipfs_input
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -39,25 +39,19 @@ def unzip_file(zip_path: Path, extract_dir: Path) -> None:
         zip_ref.extractall(extract_dir)
 
 
-def handle_ipfs_input(ipfs_hash: str) -> str:
+def handle_ipfs_input(ipfs_hash: str, owner: Optional[str] = None, private: bool = False) -> str:
     """
-    Download input from IPFS, unzip if necessary, delete the .zip, and return the path to the input directory.
+    Get input from IPFS through the node CID cache, unzipped if necessary, and return the path to the input directory.
+    The directory is shared between runs and must only be mounted read-only, unless private is set, in which case
+    the owner gets a hardlinked copy of its own. When an owner (e.g. the module run id) is given, the input is
+    protected from cache eviction until release_ipfs_inputs(owner) is called.
     """
-    logger.info(f"Downloading from IPFS: {ipfs_hash}")
-    temp_dir = tempfile.mkdtemp()
-    downloaded_path = download_from_ipfs(ipfs_hash, temp_dir)
-
-    #  try to unzip the downloaded file
-    try:
-        unzip_file(Path(downloaded_path), Path(temp_dir))
-        os.remove(downloaded_path)
-        logger.debug(f"Unzipped file: {downloaded_path}")
-    except Exception:
-        logger.error(f"File is not a zip file: {downloaded_path}")
-    if os.path.isdir(os.path.join(temp_dir, ipfs_hash)):
-        return os.path.join(temp_dir, ipfs_hash)
-    else:
-        return temp_dir
+    logger.info(f"Fetching input from IPFS: {ipfs_hash}")
+    if private:
+        if not owner:
+            raise ValueError("A private IPFS input needs an owner")
+        return str(checkout_ipfs_input(ipfs_hash, owner))
+    return str(fetch_ipfs_input(ipfs_hash, owner=owner))
 
 
 def upload_to_ipfs(input_dir: str) -> str:
@@ -154,6 +148,7 @@ def prepare_input_dir(
     parameters: Dict,
     input_dir: Optional[str] = None,
     input_ipfs_hash: Optional[str] = None,
+    run_id: Optional[str] = None,
 ):
     """Prepare the input directory"""
     # make sure only input_dir or input_ipfs_hash is present
@@ -173,7 +168,8 @@ def prepare_input_dir(
         else:
             ipfs_hash = input_ipfs_hash
 
-        input_dir = handle_ipfs_input(ipfs_hash)
+        # package modules run in the worker process and may write to their input directory
+        input_dir = handle_ipfs_input(ipfs_hash, owner=run_id, private=True)
         parameters["input_dir"] = input_dir
 
     return parameters
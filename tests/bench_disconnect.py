@@ -0,0 +1,109 @@
+"""Measure tokens generated upstream for callers that disconnect mid-stream.
+
+Runs a mock LiteLLM that streams one token every --token-ms until its client goes away, and a
+node app with the inference router in front of it. Callers read a few tokens and disconnect,
+once with INFERENCE_CANCEL_ON_DISCONNECT disabled (upstream generation runs to completion, the
+old behaviour) and once enabled.
+
+    python -m tests.bench_disconnect --requests 20 --tokens 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+
+MOCK_PORT = 4110
+PROXY_PORT = 4111
+os.environ.setdefault("LITELLM_MASTER_KEY", "sk-bench")
+os.environ["LITELLM_URL"] = f"http://127.0.0.1:{MOCK_PORT}"
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from fastapi.responses import StreamingResponse  # noqa: E402
+
+from node.inference import cancellation, server as inference_server  # noqa: E402
+
+generated = {"tokens": 0}
+
+
+def mock_litellm_app(num_tokens: int, token_ms: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/chat/completions")
+    async def chat_completions(body: dict):
+        async def events():
+            for i in range(num_tokens):
+                await asyncio.sleep(token_ms / 1000)
+                generated["tokens"] += 1
+                chunk = {"choices": [{"index": 0, "delta": {"content": f"tok{i} "}}]}
+                yield f"data: {json.dumps(chunk)}\n\n".encode()
+            yield b"data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def proxy_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(inference_server.router)
+    return app
+
+
+def serve(app: FastAPI, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def run(num_requests: int, read_tokens: int, settle: float):
+    payload = {"model": "bench", "messages": [{"role": "user", "content": "hi"}], "stream": True}
+    url = f"http://127.0.0.1:{PROXY_PORT}/inference/chat/completions"
+
+    async def one():
+        async with httpx.AsyncClient(timeout=60) as client:
+            async with client.stream("POST", url, json=payload) as response:
+                received = 0
+                async for line in response.aiter_lines():
+                    if line.startswith("data:"):
+                        received += 1
+                        if received >= read_tokens:
+                            break
+
+    await asyncio.gather(*(one() for _ in range(num_requests)))
+    # give upstream generation that is still running time to finish or be aborted
+    await asyncio.sleep(settle)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--read-tokens", type=int, default=5)
+    parser.add_argument("--token-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    serve(mock_litellm_app(args.tokens, args.token_ms), MOCK_PORT)
+    serve(proxy_app(), PROXY_PORT)
+    settle = args.tokens * args.token_ms / 1000 + 0.5
+
+    for cancel in (False, True):
+        cancellation.INFERENCE_CANCEL_ON_DISCONNECT = cancel
+        inference_server.INFERENCE_CANCEL_ON_DISCONNECT = cancel
+        generated["tokens"] = 0
+        wasted_before = cancellation.wasted_tokens_counter.get(model="bench")
+        asyncio.run(run(args.requests, args.read_tokens, settle))
+        wasted = cancellation.wasted_tokens_counter.get(model="bench") - wasted_before
+        delivered = args.requests * args.read_tokens
+        print(
+            f"cancel_on_disconnect={str(cancel):5} generated upstream: {generated['tokens']:6d} tokens | "
+            f"read by callers: {delivered:5d} | wasted (proxy counter): {int(wasted):6d}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Micro-benchmark of ModuleRunRequest/ModuleRun serialization on the gRPC path.
+
+Compares, for a typical agent input and a ~1 MB input:
+
+- struct: inputs in the Struct field, request converted with MessageToDict (the old server path)
+- struct_direct: inputs in the Struct field, request mapped directly to the schemas
+- json / msgpack: inputs and results in the bytes payload fields
+
+Each phase is timed on its own: the client building and serializing the request, the
+server parsing it into an AgentRunInput, the server building and serializing the final
+ModuleRun and the client decoding it.
+
+    python -m tests.bench_grpc_payloads --iterations 200
+"""
+import argparse
+import json
+import time
+
+from google.protobuf.json_format import MessageToDict
+
+from node.schemas import AgentDeployment, AgentRunInput
+from node.server import grpc_server_pb2
+from node.server.payloads import MSGPACK_AVAILABLE, decode_payload, encode_payload, run_input_from_proto
+
+
+def typical_inputs():
+    return {
+        "tool_name": "chat",
+        "tool_input_data": {
+            "messages": [
+                {"role": role, "content": f"message {i} " + "lorem ipsum dolor sit amet " * 8}
+                for i, role in enumerate(["system", "user", "assistant", "user"])
+            ],
+        },
+        "temperature": 0.7,
+        "max_tokens": 1024,
+        "stream": False,
+    }
+
+
+def large_inputs(target_bytes: int = 1024 * 1024):
+    documents = []
+    size = 0
+    while size < target_bytes:
+        document = {
+            "id": len(documents),
+            "title": f"document {len(documents)}",
+            "text": "the quick brown fox jumps over the lazy dog " * 4,
+            "score": len(documents) / 7,
+            "tags": ["alpha", "beta", "gamma"],
+            "embedding": [i / 31 for i in range(8)],
+        }
+        documents.append(document)
+        size += len(json.dumps(document))
+    return {"query": "find the fox", "documents": documents}
+
+
+def sample_request(inputs, encoding=None) -> grpc_server_pb2.ModuleRunRequest:
+    deployment = grpc_server_pb2.AgentDeployment(
+        name="hello_world_agent_deployment",
+        module=grpc_server_pb2.Module(
+            id="agent:hello_world_agent",
+            name="hello_world_agent",
+            description="Hello World Agent",
+            author="naptha",
+            module_url="https://github.com/NapthaAI/hello_world_agent",
+            execution_type="package",
+        ),
+        initialized=False,
+    )
+    deployment.node_input.CopyFrom(grpc_server_pb2.NodeConfigInput(ip="localhost", user_communication_port=7001))
+    deployment.config.update({
+        "config_name": "agent_config",
+        "llm_config": {"config_name": "model_1", "client": "ollama", "model": "hermes3:8b", "max_tokens": 1000},
+    })
+    request = grpc_server_pb2.ModuleRunRequest(
+        module_type="agent",
+        consumer_id="user:bench",
+        agent_deployment=deployment,
+        signature="signature",
+    )
+    if encoding is None:
+        request.inputs.update(inputs)
+    else:
+        request.inputs_payload = encode_payload(inputs, encoding)
+        request.payload_encoding = encoding
+    return request
+
+
+def legacy_run_input(request) -> AgentRunInput:
+    """The server's conversion before the payload fields, through MessageToDict"""
+    request_dict = MessageToDict(request, preserving_proto_field_name=True)
+    deployment = request_dict["agent_deployment"]
+    if "node_input" in deployment:
+        deployment["node"] = deployment.pop("node_input")
+    elif "node_config" in deployment:
+        deployment["node"] = deployment.pop("node_config")
+    request_dict["deployment"] = deployment
+    run_input = AgentRunInput(**request_dict)
+    run_input.inputs = request_dict.get("inputs", {})
+    return run_input
+
+
+def reply(inputs, results, encoding=None) -> grpc_server_pb2.ModuleRun:
+    response = grpc_server_pb2.ModuleRun(module_type="agent", consumer_id="user:bench", status="completed", id="run")
+    if encoding is None:
+        response.inputs.update(inputs)
+        response.results.extend(results)
+    else:
+        response.payload_encoding = encoding
+        response.inputs_payload = encode_payload(inputs, encoding)
+        response.results_payload = encode_payload(results, encoding)
+    return response
+
+
+def read_reply(response):
+    if response.payload_encoding:
+        return decode_payload(response.inputs_payload, response.payload_encoding), decode_payload(response.results_payload, response.payload_encoding)
+    response_dict = MessageToDict(response, preserving_proto_field_name=True)
+    return response_dict.get("inputs", {}), response_dict.get("results", [])
+
+
+def timed(function, iterations: int) -> float:
+    function()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def bench_path(path: str, inputs, results, iterations: int):
+    encoding = path if path in ("json", "msgpack") else None
+    request_bytes = sample_request(inputs, encoding).SerializeToString()
+    reply_bytes = reply(inputs, results, encoding).SerializeToString()
+    if path == "struct":
+        to_run_input = legacy_run_input
+    else:
+        def to_run_input(request):
+            return run_input_from_proto(request, AgentRunInput, AgentDeployment)
+    return {
+        "request_bytes": len(request_bytes),
+        "reply_bytes": len(reply_bytes),
+        "client_encode_us": timed(lambda: sample_request(inputs, encoding).SerializeToString(), iterations),
+        "server_decode_us": timed(lambda: to_run_input(grpc_server_pb2.ModuleRunRequest.FromString(request_bytes)), iterations),
+        "server_encode_us": timed(lambda: reply(inputs, results, encoding).SerializeToString(), iterations),
+        "client_decode_us": timed(lambda: read_reply(grpc_server_pb2.ModuleRun.FromString(reply_bytes)), iterations),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--large-bytes", type=int, default=1024 * 1024)
+    args = parser.parse_args()
+
+    paths = ["struct", "struct_direct", "json"] + (["msgpack"] if MSGPACK_AVAILABLE else [])
+    payloads = {
+        "typical": (typical_inputs(), ["The fox is in document 3. " * 12], args.iterations),
+        "1MB": (large_inputs(args.large_bytes), [json.dumps({"answer": "document 3", "ids": list(range(500))})], max(args.iterations // 20, 5)),
+    }
+    columns = ["request_bytes", "reply_bytes", "client_encode_us", "server_decode_us", "server_encode_us", "client_decode_us"]
+    for name, (inputs, results, iterations) in payloads.items():
+        print(f"\n{name} inputs ({len(json.dumps(inputs))} bytes as JSON), {iterations} iterations")
+        print(f"{'path':<14}" + "".join(f"{column:>18}" for column in columns))
+        for path in paths:
+            row = bench_path(path, inputs, results, iterations)
+            print(f"{path:<14}" + "".join(f"{row[column]:>18.0f}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Benchmark the overhead of the /inference proxy against a local mock LiteLLM server.
+
+Runs a mock LiteLLM (fixed JSON responses and a short SSE stream) and a node app that only
+includes the inference router, then compares latency of calling the mock directly vs through
+the proxy, sequentially and with concurrency.
+
+    python -m tests.bench_inference_proxy --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import threading
+import time
+
+MOCK_PORT = 4100
+PROXY_PORT = 4101
+os.environ.setdefault("LITELLM_MASTER_KEY", "sk-bench")
+os.environ["LITELLM_URL"] = f"http://127.0.0.1:{MOCK_PORT}"
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from fastapi.responses import Response, StreamingResponse  # noqa: E402
+
+from node.inference.server import router as inference_router  # noqa: E402
+
+COMPLETION = json.dumps({
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "model": "bench",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "x" * 512}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 128, "total_tokens": 138},
+}).encode()
+
+
+def mock_litellm_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/chat/completions")
+    async def chat_completions(body: dict):
+        if body.get("stream"):
+            async def events():
+                for i in range(16):
+                    chunk = {"choices": [{"index": 0, "delta": {"content": f"tok{i} "}}]}
+                    yield f"data: {json.dumps(chunk)}\n\n".encode()
+                yield b"data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+        return Response(COMPLETION, media_type="application/json")
+
+    return app
+
+
+def proxy_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(inference_router)
+    return app
+
+
+def serve(app: FastAPI, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def run(url: str, num_requests: int, concurrency: int, stream: bool) -> list:
+    payload = {"model": "bench", "messages": [{"role": "user", "content": "hi"}], "stream": stream}
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                async with client.stream("POST", url, json=payload) as response:
+                    async for _ in response.aiter_bytes():
+                        pass
+                    response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(one() for _ in range(num_requests)))
+    return latencies
+
+
+def summarize(latencies: list) -> str:
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    return f"p50 {p50:7.2f} ms  p99 {p99:7.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    serve(mock_litellm_app(), MOCK_PORT)
+    serve(proxy_app(), PROXY_PORT)
+    direct_url = f"http://127.0.0.1:{MOCK_PORT}/chat/completions"
+    proxy_url = f"http://127.0.0.1:{PROXY_PORT}/inference/chat/completions"
+
+    for stream in (False, True):
+        for concurrency in (1, args.concurrency):
+            num_requests = args.requests if concurrency > 1 else max(args.requests // 4, 1)
+            # warm up connection pools on both sides
+            asyncio.run(run(proxy_url, concurrency, concurrency, stream))
+            direct = asyncio.run(run(direct_url, num_requests, concurrency, stream))
+            proxied = asyncio.run(run(proxy_url, num_requests, concurrency, stream))
+            overhead = (statistics.median(proxied) - statistics.median(direct)) * 1000
+            label = f"stream={str(stream):5} concurrency={concurrency:3}"
+            print(f"{label} direct: {summarize(direct)} | proxy: {summarize(proxied)} | p50 overhead {overhead:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
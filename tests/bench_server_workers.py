@@ -0,0 +1,162 @@
+"""Throughput of /agent/check on the HTTP server with 1, 2, 4 and 8 worker processes.
+
+For each worker count the benchmark starts `node.server.server` on its own port with
+--workers, waits for /health, and drives /agent/check from several client processes for a
+fixed duration, each keeping a number of requests in flight. It reports requests per
+second, latency percentiles and failed requests, then stops the server with SIGTERM so
+the workers drain.
+
+Run it on a node with its .env, database and broker up. The checked run is inserted in the
+local database first, or pass one returned by /agent/run with --agent-run.
+
+    python -m tests.bench_server_workers --duration 10 --clients 4 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+from node.schemas import AgentRunInput
+
+
+def sample_run_input() -> AgentRunInput:
+    return AgentRunInput(
+        consumer_id="user:bench",
+        inputs={"tool_name": "chat", "tool_input_data": [{"role": "user", "content": "hello " * 20}]},
+        deployment={
+            "name": "hello_world_agent_deployment",
+            "node": {"ip": "localhost", "user_communication_port": 7001, "user_communication_protocol": "http"},
+            "module": {
+                "id": "agent:hello_world_agent",
+                "name": "hello_world_agent",
+                "description": "Hello World Agent",
+                "author": "naptha",
+                "module_url": "https://github.com/NapthaAI/hello_world_agent",
+                "module_type": "agent",
+            },
+            "config": {"config_name": "agent_config", "llm_config": {"config_name": "model_1", "client": "ollama", "model": "hermes3:8b"}},
+        },
+        signature="signature",
+    )
+
+
+async def create_agent_run() -> dict:
+    from node.storage.db.db import LocalDBPostgres
+
+    async with LocalDBPostgres() as db:
+        agent_run = await db.create_agent_run(sample_run_input())
+    return agent_run.model_dump(mode="json")
+
+
+def start_server(port: int, workers: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "node.server.server", "--communication-protocol", "http", "--port", str(port), "--workers", str(workers)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_healthy(url: str, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"Server at {url} didn't become healthy")
+
+
+def stop_server(process: subprocess.Popen):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def drive(url: str, body: dict, duration: float, concurrency: int):
+    latencies = []
+    failures = 0
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        async def loop():
+            nonlocal failures
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/agent/check", json=body)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    failures += 1
+
+        await asyncio.gather(*(loop() for _ in range(concurrency)))
+    return latencies, failures
+
+
+def client_process(args):
+    return asyncio.run(drive(*args))
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--port", type=int, default=7101)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="load generating processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="requests in flight per client process")
+    parser.add_argument("--agent-run", help="JSON file with the AgentRun to check")
+    args = parser.parse_args()
+
+    if args.agent_run:
+        with open(args.agent_run) as f:
+            body = json.load(f)
+    else:
+        body = asyncio.run(create_agent_run())
+
+    print(f"{args.clients} client processes x {args.concurrency} in flight, {args.duration}s per run")
+    print(f"{'workers':>8}{'req/s':>12}{'p50_ms':>10}{'p99_ms':>10}{'failed':>10}")
+    context = multiprocessing.get_context("spawn")
+    for index, workers in enumerate(args.workers):
+        port = args.port + index
+        url = f"http://127.0.0.1:{port}"
+        server = start_server(port, workers)
+        try:
+            wait_healthy(url)
+            # warm up every worker's database pool before measuring
+            client_process((url, body, 1.0, args.concurrency))
+            with context.Pool(args.clients) as pool:
+                results = pool.map(client_process, [(url, body, args.duration, args.concurrency)] * args.clients)
+        finally:
+            stop_server(server)
+        latencies = [latency for result, _ in results for latency in result]
+        failures = sum(failed for _, failed in results)
+        print(
+            f"{workers:>8}{len(latencies) / args.duration:>12.0f}"
+            f"{percentile(latencies, 0.5) * 1000:>10.1f}{percentile(latencies, 0.99) * 1000:>10.1f}{failures:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
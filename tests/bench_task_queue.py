@@ -0,0 +1,95 @@
+"""Enqueue-to-start latency and runs per second of the Celery and Postgres task queue engines.
+
+For each engine the benchmark submits --runs probe tasks through its dispatcher, one submit
+per run like the servers do, at most --concurrency unfinished at a time. Each probe returns the
+seconds between its enqueue and its start. It reports the latency percentiles and the runs
+finished per second from the first submit to the last completion.
+
+Run it on a node with its .env, database and broker up, with Celery workers
+(`celery -A node.worker.main.app worker -I tests.bench_task_queue`) and queue workers
+(`python -m node.worker.queue_worker --include tests.bench_task_queue`) running with the same
+concurrency, both import the probe task from this module.
+
+    python -m tests.bench_task_queue --runs 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import time
+
+from node.storage.db.db import LocalDBPostgres
+from node.worker.dispatcher import CeleryDispatcher, PostgresDispatcher
+from node.worker.main import app
+
+
+@app.task
+def probe(enqueued_at: float) -> float:
+    """Seconds between enqueueing and starting"""
+    return time.time() - enqueued_at
+
+
+async def submit_probes(dispatcher, runs: int, concurrency: int):
+    handles = []
+    in_flight = asyncio.Semaphore(concurrency)
+
+    async def submit():
+        await in_flight.acquire()
+        handle = await dispatcher.submit(probe.s(time.time()))
+        handles.append(handle)
+        while not handle.ready():
+            await asyncio.sleep(0.005)
+        in_flight.release()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(submit() for _ in range(runs)))
+    return handles, time.perf_counter() - start
+
+
+async def celery_latencies(handles):
+    return [handle.get() for handle in handles]
+
+
+async def postgres_latencies(handles):
+    tasks = await LocalDBPostgres().get_tasks([handle.id for handle in handles])
+    return [task["result"] for task in tasks if task["status"] == "completed"]
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run(args):
+    engines = {
+        "celery": (CeleryDispatcher, celery_latencies),
+        "postgres": (PostgresDispatcher, postgres_latencies),
+    }
+    print(f"{args.runs} probe runs, {args.concurrency} in flight")
+    print(f"{'engine':>10}{'runs/s':>10}{'p50_ms':>10}{'p99_ms':>10}{'max_ms':>10}{'failed':>8}")
+    for name in args.engines:
+        dispatcher_class, read_latencies = engines[name]
+        dispatcher = dispatcher_class()
+        try:
+            # warm up connections and workers before measuring
+            await submit_probes(dispatcher, args.concurrency, args.concurrency)
+            handles, elapsed = await submit_probes(dispatcher, args.runs, args.concurrency)
+            latencies = await read_latencies(handles)
+        finally:
+            await dispatcher.close()
+        print(
+            f"{name:>10}{args.runs / elapsed:>10.0f}{percentile(latencies, 0.5) * 1000:>10.1f}"
+            f"{percentile(latencies, 0.99) * 1000:>10.1f}{max(latencies, default=0) * 1000:>10.1f}{args.runs - len(latencies):>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engines", nargs="+", choices=["celery", "postgres"], default=["celery", "postgres"])
+    parser.add_argument("--runs", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64, help="runs submitted and not finished at a time")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
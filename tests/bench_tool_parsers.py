@@ -0,0 +1,197 @@
+"""Benchmark the incremental tool call parsers against the approach they replaced.
+
+For each output format and size it reports the time to parse a complete output, the
+parse cost per streamed token (re-parsing everything seen so far on every delta, as the
+previous parsers did, vs. feeding only the delta) and the time spent on adversarial
+pythonic outputs. The legacy llama3 XML parser did not stream, so its baseline is the
+findall it ran on the complete output, repeated per delta.
+
+    python -m tests.bench_tool_parsers --sizes 1000 4000 16000
+"""
+import argparse
+import ast
+import importlib.util
+import multiprocessing
+import re
+import time
+from pathlib import Path
+
+from tests.tool_parser_corpus import adversarial_outputs
+
+PARSER_PATH = Path(__file__).parent.parent / "node" / "inference" / "configs" / "tool-parsers" / "incremental_tool_parser.py"
+spec = importlib.util.spec_from_file_location("incremental_tool_parser", PARSER_PATH)
+incremental_tool_parser = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(incremental_tool_parser)
+
+# the regex the pythonic parser used to gate parsing on
+LEGACY_TOOL_CALL_REGEX = re.compile(
+    r"\[([a-zA-Z]+\w*\(([a-zA-Z]+\w*=.*,\s*)*([a-zA-Z]+\w*=.*\s)?\),\s*)*([a-zA-Z]+\w*\(([a-zA-Z]+\w*=.*,\s*)*([a-zA-Z]+\w*=.*\s*)?\)\s*)+\]",
+    re.DOTALL)
+# the patterns the MiniCPM3 parser re-ran on every delta and the XML parser on the complete output
+LEGACY_MINICPM_CALL_REGEX = re.compile(r"(\w+)\(((?:[^()]*|\([^()]*\))*)\)")
+LEGACY_XML_CALL_REGEX = re.compile(r"<function=([^>]+)>(.*?)</function>")
+TOKEN_CHARS = 4
+
+
+def legacy_stream_step(text: str):
+    """What each streaming step cost before: a bracket scan and ast.parse of all text so far"""
+    stack = []
+    for char in text:
+        if char in "[({":
+            stack.append(char)
+        elif char in ")]}" and stack:
+            stack.pop()
+    closing = "".join({"[": "]", "(": ")", "{": "}"}[c] for c in reversed(stack))
+    try:
+        ast.parse(text.rstrip(",") + closing)
+    except SyntaxError:
+        pass
+
+
+def legacy_minicpm_stream_step(text: str):
+    """The MiniCPM3 streaming step: split off the thought, then match and ast.parse every call so far"""
+    useful_text = text.split("<|thought_end|>")[-1]
+    if "<|tool_call_start|>" not in useful_text:
+        return
+    for match in LEGACY_MINICPM_CALL_REGEX.finditer(useful_text):
+        try:
+            ast.parse(f"{match.group(1)}({match.group(2)})\n")
+        except SyntaxError:
+            pass
+
+
+def legacy_xml_stream_step(text: str):
+    LEGACY_XML_CALL_REGEX.findall(text)
+
+
+def python_calls(size: int):
+    calls = []
+    while sum(len(c) for c in calls) < size:
+        i = len(calls)
+        calls.append(f"tool_{i}(query='search term number {i}', limit={i}, filters={{'lang': 'en'}})")
+    return calls
+
+
+def pythonic_output(size: int) -> str:
+    return "[" + ", ".join(python_calls(size)) + "]"
+
+
+def minicpm_output(size: int) -> str:
+    calls = "\n".join(python_calls(size))
+    return f"<|thought_start|>I need to search.<|thought_end|><|tool_call_start|>```python\n{calls}\n```<|tool_call_end|>"
+
+
+def llama3_xml_output(size: int) -> str:
+    calls = []
+    while sum(len(c) for c in calls) < size:
+        i = len(calls)
+        calls.append(f'<function=tool_{i}>{{"query": "search term number {i}", "limit": {i}, "filters": {{"lang": "en"}}}}</function>')
+    return "Searching. " + "".join(calls)
+
+
+FORMATS = {
+    "pythonic": (pythonic_output, legacy_stream_step, incremental_tool_parser.PythonicToolCallParser),
+    "minicpm3": (minicpm_output, legacy_minicpm_stream_step, incremental_tool_parser.MiniCPMToolCallParser),
+    "llama3_xml": (llama3_xml_output, legacy_xml_stream_step, incremental_tool_parser.Llama3XMLToolCallParser),
+}
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def _legacy_stream_worker(legacy_step, text: str, progress):
+    start = time.perf_counter()
+    for end in range(TOKEN_CHARS, len(text) + TOKEN_CHARS, TOKEN_CHARS):
+        legacy_step(text[:end])
+        with progress.get_lock():
+            progress[0] += 1
+            progress[1] = time.perf_counter() - start
+
+
+def legacy_stream_with_budget(legacy_step, text: str, budget: float):
+    """Stream text through the legacy step in a child process, since a single step can backtrack for hours.
+
+    Returns the number of deltas it got through and the time they took.
+    """
+    context = multiprocessing.get_context("fork")
+    progress = context.Array("d", [0, 0])
+    process = context.Process(target=_legacy_stream_worker, args=(legacy_step, text, progress))
+    process.start()
+    process.join(budget)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+    return int(progress[0]), progress[1]
+
+
+def bench_size(name: str, size: int, budget: float):
+    make_output, legacy_step, parser_class = FORMATS[name]
+    text = make_output(size)
+    deltas = [text[i:i + TOKEN_CHARS] for i in range(0, len(text), TOKEN_CHARS)]
+
+    def incremental_stream():
+        parser = parser_class()
+        for delta in deltas:
+            parser.feed(delta)
+            parser.take_content()
+
+    def incremental_full():
+        parser = parser_class()
+        parser.feed(text)
+        assert parser.finish() and parser.tool_calls, parser.error
+
+    streamed, legacy = legacy_stream_with_budget(legacy_step, text, budget)
+    if streamed == len(deltas):
+        legacy_result = f"{legacy * 1000:9.2f} ms ({legacy / streamed * 1e6:7.1f} us/token)"
+    else:
+        # the step that was running when the budget ran out is what blew it, so report it as a lower bound
+        legacy_result = f"gave up after {streamed}/{len(deltas)} deltas, a single step took over {budget - legacy:.1f} s"
+    incremental = timed(incremental_stream)
+    print(
+        f"{name:10} {len(text):7d} chars {len(deltas):6d} deltas | stream legacy {legacy_result} | "
+        f"incremental {incremental * 1000:8.2f} ms "
+        f"({incremental / len(deltas) * 1e6:5.1f} us/token) | full parse {timed(incremental_full) * 1000:7.2f} ms"
+    )
+
+
+def legacy_regex_reach(text: str, budget: float) -> str:
+    """Longest prefix the legacy regex gets through within the time budget, doubling the length each try"""
+    length, reached = 16, "-"
+    while length <= 2 * len(text):
+        elapsed = timed(lambda: LEGACY_TOOL_CALL_REGEX.match(text[:length]))
+        if elapsed > budget:
+            return f"{reached}, {min(length, len(text))} chars took {elapsed * 1000:.0f} ms"
+        reached = f"{min(length, len(text))} chars in {elapsed * 1000:.2f} ms"
+        if length >= len(text):
+            break
+        length *= 2
+    return reached
+
+
+def bench_adversarial(size: int, budget: float):
+    print(f"\nadversarial outputs ({size} repetitions; legacy regex on doubling prefixes until one takes over {budget}s)")
+    for text in adversarial_outputs(size):
+        parser = incremental_tool_parser.PythonicToolCallParser()
+        incremental = timed(lambda: (parser.feed(text), parser.finish()))
+        print(f"  {text[:24]!r:32} {len(text):7d} chars | incremental {incremental * 1000:7.2f} ms | legacy regex {legacy_regex_reach(text, budget)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 4000, 16000])
+    parser.add_argument("--formats", nargs="+", choices=sorted(FORMATS), default=list(FORMATS))
+    parser.add_argument("--adversarial-size", type=int, default=20000)
+    parser.add_argument("--regex-budget", type=float, default=1.0)
+    parser.add_argument("--stream-budget", type=float, default=30.0)
+    args = parser.parse_args()
+    for name in args.formats:
+        for size in args.sizes:
+            bench_size(name, size, args.stream_budget)
+    bench_adversarial(args.adversarial_size, args.regex_budget)
+
+
+if __name__ == "__main__":
+    main()
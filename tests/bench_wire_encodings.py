@@ -0,0 +1,160 @@
+"""Micro-benchmark of the websocket and HTTP wire encodings for orchestrator run records.
+
+Compares, for a typical orchestrator run and one with large results:
+
+- json: json.dumps with the websocket server's DateTimeEncoder, the old text frames and bodies
+- orjson: the HTTP server's default response class
+- msgpack: binary websocket frames
+- the same with gzip or zstd, as sent to HTTP clients that accept them
+
+Reports bytes on the wire and the CPU time to encode on the server and decode on the client.
+
+    python -m tests.bench_wire_encodings --iterations 200
+"""
+import argparse
+from datetime import datetime, timezone
+import gzip
+import json
+import random
+import time
+
+from node.schemas import OrchestratorRun
+from node.server.compression import GZIP_LEVEL, ORJSON_AVAILABLE, ZSTD_AVAILABLE, ZSTD_LEVEL
+from node.server.payloads import MSGPACK, MSGPACK_AVAILABLE, decode_payload, encode_payload
+
+if ORJSON_AVAILABLE:
+    import orjson
+if ZSTD_AVAILABLE:
+    import zstandard
+
+
+class DateTimeEncoder(json.JSONEncoder):
+    """Same as the websocket server's encoder, which can't be imported without the node's env"""
+
+    def default(self, obj):
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        return super().default(obj)
+
+
+def agent_deployment(i: int):
+    return {
+        "name": f"agent_deployment_{i}",
+        "node": {"ip": f"node{i}.naptha.ai", "user_communication_port": 7001, "user_communication_protocol": "http"},
+        "module": {
+            "id": f"agent:debate_agent_{i}",
+            "name": "debate_agent",
+            "description": "Agent that argues one side of a debate",
+            "author": "naptha",
+            "module_url": "https://github.com/NapthaAI/debate_agent",
+            "module_type": "agent",
+            "module_version": "v0.3",
+            "execution_type": "package",
+        },
+        "config": {
+            "config_name": "agent_config",
+            "llm_config": {"config_name": "model_1", "client": "ollama", "model": "hermes3:8b", "max_tokens": 1000, "temperature": 0.7},
+            "system_prompt": {"role": "You argue for the proposition. " * 4, "persona": "economist"},
+        },
+        "initialized": True,
+    }
+
+
+WORDS = (
+    "the committee weighed inflation against employment and concluded that rates should rise "
+    "because core prices keep climbing while wages lag behind productivity in most sectors"
+).split()
+
+
+def sample_text(rng: random.Random, chars: int) -> str:
+    words = []
+    while sum(len(word) + 1 for word in words) < chars:
+        words.append(rng.choice(WORDS))
+    return " ".join(words)[:chars]
+
+
+def orchestrator_run(num_results: int, result_chars: int) -> dict:
+    rng = random.Random(0)
+    now = datetime.now(timezone.utc).isoformat()
+    run = OrchestratorRun(
+        consumer_id="user:bench",
+        inputs={"topic": "Should the central bank raise rates?", "rounds": 5},
+        deployment={
+            "name": "multiagent_debate",
+            "node": {"ip": "node.naptha.ai", "user_communication_port": 7001, "user_communication_protocol": "http"},
+            "module": {
+                "id": "orchestrator:multiagent_debate",
+                "name": "multiagent_debate",
+                "description": "Debate between agents on several nodes",
+                "author": "naptha",
+                "module_url": "https://github.com/NapthaAI/multiagent_debate",
+                "module_type": "orchestrator",
+            },
+            "config": {"max_rounds": 5},
+            "agent_deployments": [agent_deployment(i) for i in range(3)],
+        },
+        status="completed",
+        id="orchestrator_run:bench",
+        results=[f"Round {i}: " + sample_text(rng, result_chars) for i in range(num_results)],
+        created_time=now,
+        start_processing_time=now,
+        completed_time=now,
+        duration=12.5,
+        signature="signature",
+    )
+    return run.model_dump(mode="json")
+
+
+def codecs():
+    result = {
+        "json": (lambda value: json.dumps(value, cls=DateTimeEncoder).encode(), json.loads),
+    }
+    if ORJSON_AVAILABLE:
+        result["orjson"] = (orjson.dumps, orjson.loads)
+    if MSGPACK_AVAILABLE:
+        result["msgpack"] = (lambda value: encode_payload(value, MSGPACK), lambda data: decode_payload(data, MSGPACK))
+    for name, (encode, decode) in list(result.items()):
+        if name == "msgpack":
+            continue
+        result[f"{name}+gzip"] = (
+            lambda value, encode=encode: gzip.compress(encode(value), compresslevel=GZIP_LEVEL),
+            lambda data, decode=decode: decode(gzip.decompress(data)),
+        )
+        if ZSTD_AVAILABLE:
+            compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+            decompressor = zstandard.ZstdDecompressor()
+            result[f"{name}+zstd"] = (
+                lambda value, encode=encode: compressor.compress(encode(value)),
+                lambda data, decode=decode: decode(decompressor.decompress(data)),
+            )
+    return result
+
+
+def timed(function, iterations: int) -> float:
+    function()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    runs = {
+        "typical": (orchestrator_run(10, 400), args.iterations),
+        "large results": (orchestrator_run(200, 4000), max(args.iterations // 20, 5)),
+    }
+    for name, (run, iterations) in runs.items():
+        print(f"\n{name} orchestrator run, {iterations} iterations")
+        print(f"{'encoding':<14}{'bytes':>12}{'encode_us':>14}{'decode_us':>14}")
+        for codec, (encode, decode) in codecs().items():
+            data = encode(run)
+            assert decode(data) == run
+            print(f"{codec:<14}{len(data):>12}{timed(lambda: encode(run), iterations):>14.0f}{timed(lambda: decode(data), iterations):>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
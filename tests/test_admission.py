@@ -0,0 +1,75 @@
+import asyncio
+import unittest
+
+from node.inference.admission import AdmissionController, AdmissionRejected, ModelLimiter, request_priority
+
+
+class TestAdmission(unittest.TestCase):
+    def test_priority_from_headers(self):
+        self.assertEqual(request_priority({}), "interactive")
+        self.assertEqual(request_priority({"x-priority": "batch"}), "batch")
+        self.assertEqual(request_priority({"x-priority": "bogus"}), "interactive")
+
+    def test_interactive_requests_jump_the_queue(self):
+        async def run():
+            limiter = ModelLimiter("m", max_concurrency=1, max_queue=10)
+            order = []
+            await limiter.acquire()
+
+            async def worker(name, priority):
+                await limiter.acquire(priority)
+                order.append(name)
+                limiter.release()
+
+            tasks = [asyncio.create_task(worker("batch-1", "batch"))]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(worker("batch-2", "batch")))
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(worker("interactive", "interactive")))
+            await asyncio.sleep(0)
+            self.assertEqual(limiter.queue_depth, 3)
+            limiter.release()
+            await asyncio.gather(*tasks)
+            self.assertEqual(limiter.active, 0)
+            return order
+
+        self.assertEqual(asyncio.run(run()), ["interactive", "batch-1", "batch-2"])
+
+    def test_full_queue_rejects_with_retry_after(self):
+        async def run():
+            controller = AdmissionController(max_concurrency=1, max_queue=1, model_config={})
+            release = await controller.acquire("m")
+            waiter = asyncio.create_task(controller.acquire("m"))
+            await asyncio.sleep(0)
+            with self.assertRaises(AdmissionRejected) as ctx:
+                await controller.acquire("m")
+            self.assertGreaterEqual(ctx.exception.retry_after, 1)
+            release()
+            release()  # releasing twice is a no-op
+            (await waiter)()
+            return controller.get_stats()["m"]
+
+        stats = asyncio.run(run())
+        self.assertEqual(stats["rejected"], 1)
+        self.assertEqual(stats["active"], 0)
+
+    def test_timeout_and_cancelled_waiters_free_their_place(self):
+        async def run():
+            limiter = ModelLimiter("m", max_concurrency=1, max_queue=5)
+            await limiter.acquire()
+            with self.assertRaises(AdmissionRejected):
+                await limiter.acquire(timeout=0.01)
+            cancelled = asyncio.create_task(limiter.acquire())
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            await asyncio.gather(cancelled, return_exceptions=True)
+            self.assertEqual(limiter.queue_depth, 0)
+            limiter.release()
+            self.assertEqual(limiter.active, 0)
+            return limiter.stats
+
+        self.assertEqual(asyncio.run(run())["timed_out"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+from unittest import mock
+
+from node.worker import affinity
+from node.worker.affinity import (
+    affinity_queue,
+    celery_affinity_queue,
+    dispatch_stats,
+    dispatch_stats_enabled,
+    is_affinity_queue,
+    record_dispatch_stats,
+    run_module_name,
+    warm_queues,
+)
+
+
+def run_data(module_name: str) -> dict:
+    return {"id": "run-1", "deployment": {"name": "deployment", "module": {"name": module_name, "module_version": "0.1"}}}
+
+
+class TestRunModuleName(unittest.TestCase):
+    def test_package_runs(self):
+        self.assertEqual(run_module_name("node.worker.package_worker.run_tool", [run_data("tool_a"), {}]), "tool_a")
+
+    def test_other_tasks_have_no_module(self):
+        self.assertIsNone(run_module_name("node.worker.docker_worker.execute_docker_agent", [run_data("agent_a")]))
+        self.assertIsNone(run_module_name("tests.bench_task_queue.probe", [1.0]))
+
+    def test_runs_without_a_module(self):
+        self.assertIsNone(run_module_name("node.worker.package_worker.run_agent", []))
+        self.assertIsNone(run_module_name("node.worker.package_worker.run_agent", [{"deployment": None}]))
+
+
+class TestAffinityQueues(unittest.TestCase):
+    def test_queue_is_stable_and_bounded(self):
+        names = [f"module_{i}" for i in range(200)]
+        queues = [affinity_queue(name) for name in names]
+        self.assertEqual(queues, [affinity_queue(name) for name in names])
+        self.assertTrue(all(is_affinity_queue(queue) for queue in queues))
+        self.assertLessEqual(len(set(queues)), affinity.MODULE_AFFINITY_QUEUES)
+        self.assertGreater(len(set(queues)), 1)
+
+    def test_warm_queues_are_unique(self):
+        with mock.patch.object(affinity, "MODULE_AFFINITY_QUEUES", 1):
+            self.assertEqual(warm_queues(["a", "b", "c"]), ["module-0"])
+        self.assertEqual(warm_queues([]), [])
+
+    def test_shared_queue_is_not_an_affinity_queue(self):
+        self.assertFalse(is_affinity_queue("default"))
+        self.assertFalse(is_affinity_queue(None))
+
+    def test_celery_queue_dead_letters_to_the_shared_queue(self):
+        with mock.patch.object(affinity, "MODULE_AFFINITY_STEAL_AFTER", 2.5):
+            queue = celery_affinity_queue("module-3", "celery")
+        self.assertEqual(queue.name, "module-3")
+        self.assertEqual(queue.routing_key, "module-3")
+        self.assertEqual(queue.exchange.name, "")
+        self.assertEqual(queue.queue_arguments, {
+            "x-message-ttl": 2500,
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": "celery",
+        })
+
+
+class TestDispatchStats(unittest.TestCase):
+    def test_run_from_its_affinity_queue(self):
+        stats = dispatch_stats("tool_a", "tool", "run-1", False, affinity_queue("tool_a"), 100.0, 100.25, "worker-1")
+        self.assertTrue(stats["affine"])
+        self.assertFalse(stats["cold_start"])
+        self.assertAlmostEqual(stats["queue_wait"], 0.25)
+
+    def test_stolen_run(self):
+        stats = dispatch_stats("tool_a", "tool", "run-1", True, "celery", 100.0, 99.0, "worker-1")
+        self.assertFalse(stats["affine"])
+        self.assertTrue(stats["cold_start"])
+        # clocks of the server and the worker may disagree slightly
+        self.assertEqual(stats["queue_wait"], 0.0)
+
+    def test_unknown_enqueue_time(self):
+        stats = dispatch_stats("tool_a", "tool", "run-1", True, None, None, 100.0, None)
+        self.assertIsNone(stats["queue_wait"])
+        self.assertFalse(stats["affine"])
+
+
+class FakeDispatchDB:
+    def __init__(self):
+        self.records = []
+        self.prunes = []
+
+    async def record_module_dispatch(self, stats):
+        self.records.append(stats)
+
+    async def prune_module_dispatches(self, older_than):
+        self.prunes.append(older_than)
+        return 0
+
+
+class TestRecordDispatchStats(unittest.IsolatedAsyncioTestCase):
+    def test_off_unless_affinity_or_stats_are_on(self):
+        with mock.patch.object(affinity, "MODULE_AFFINITY", False), mock.patch.object(affinity, "MODULE_DISPATCH_STATS", False):
+            self.assertFalse(dispatch_stats_enabled())
+        with mock.patch.object(affinity, "MODULE_AFFINITY", True), mock.patch.object(affinity, "MODULE_DISPATCH_STATS", False):
+            self.assertTrue(dispatch_stats_enabled())
+        with mock.patch.object(affinity, "MODULE_AFFINITY", False), mock.patch.object(affinity, "MODULE_DISPATCH_STATS", True):
+            self.assertTrue(dispatch_stats_enabled())
+
+    async def test_expired_records_are_pruned_once_per_interval(self):
+        db = FakeDispatchDB()
+        with mock.patch.object(affinity, "_last_prune", None), \
+                mock.patch.object(affinity, "MODULE_DISPATCH_STATS_RETENTION", 3600.0):
+            for run_id in ("run-1", "run-2"):
+                await record_dispatch_stats(db, {"run_id": run_id})
+            self.assertEqual([record["run_id"] for record in db.records], ["run-1", "run-2"])
+            self.assertEqual(db.prunes, [3600.0])
+
+            with mock.patch.object(affinity, "DISPATCH_STATS_PRUNE_INTERVAL", 0.0):
+                await record_dispatch_stats(db, {"run_id": "run-3"})
+            self.assertEqual(db.prunes, [3600.0, 3600.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
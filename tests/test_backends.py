@@ -0,0 +1,113 @@
+import asyncio
+import unittest
+
+import httpx
+
+from node.inference.backends import INFERENCE_EJECT_AFTER_FAILURES, Backend, BackendRegistry, NoBackendAvailable
+
+
+def mock_backend(url, handler, models=None):
+    backend = Backend(url, models=models, api_key="sk-test")
+    backend.client = httpx.AsyncClient(base_url=url, transport=httpx.MockTransport(handler))
+    return backend
+
+
+def ok(request):
+    return httpx.Response(200, json={"backend": str(request.url.host)})
+
+
+class TestBackends(unittest.TestCase):
+    def test_least_outstanding_and_model_routing(self):
+        a, b, c = Backend("http://a"), Backend("http://b"), Backend("http://c", models=["only-c"])
+        registry = BackendRegistry([a, b, c], policy="least_outstanding")
+        a.outstanding = 2
+        self.assertIs(registry.pick("any"), b)
+        b.outstanding = 5
+        self.assertIs(registry.pick("any"), a)
+        c.outstanding = 1
+        self.assertIs(registry.pick("only-c"), c)
+        with self.assertRaises(NoBackendAvailable):
+            BackendRegistry([c]).pick("other")
+
+    def test_ewma_prefers_faster_backend(self):
+        a, b = Backend("http://a"), Backend("http://b")
+        a.record_success(1.0)
+        b.record_success(0.1)
+        b.outstanding = 3
+        self.assertIs(BackendRegistry([a, b], policy="ewma").pick("m"), b)
+        b.outstanding = 20
+        self.assertIs(BackendRegistry([a, b], policy="ewma").pick("m"), a)
+
+    def test_failing_backend_is_ejected_and_readmitted(self):
+        healthy = {"b": False}
+
+        def flaky(request):
+            if request.url.path == "/health/liveliness" and healthy["b"]:
+                return httpx.Response(200)
+            return httpx.Response(503)
+
+        async def run():
+            a, b = mock_backend("http://a", ok), mock_backend("http://b", flaky)
+            registry = BackendRegistry([a, b], policy="least_outstanding")
+            for _ in range(INFERENCE_EJECT_AFTER_FAILURES):
+                await registry._send(b, "POST", "/chat/completions", json={})
+            self.assertFalse(b.healthy)
+            self.assertIs(registry.pick("m"), a)
+            with self.assertRaises(NoBackendAvailable):
+                registry.pick("m", exclude=[a])
+            healthy["b"] = True
+            await registry.check_health()
+            self.assertTrue(b.healthy)
+            await registry.close()
+
+        asyncio.run(run())
+
+    def test_hedged_request_returns_first_response(self):
+        async def slow(request):
+            await asyncio.sleep(1)
+            return httpx.Response(200, json={"backend": "slow"})
+
+        async def fast(request):
+            return httpx.Response(200, json={"backend": "fast"})
+
+        async def run():
+            a, b = mock_backend("http://a", slow), mock_backend("http://b", fast)
+            registry = BackendRegistry([a, b], policy="least_outstanding", hedge_delay_ms=20)
+            response = await registry.request("m", "POST", "/chat/completions", hedge=True, json={})
+            self.assertEqual(response.json()["backend"], "fast")
+            self.assertEqual(b.stats["hedges_won"], 1)
+            # the losing request is cancelled, so it no longer counts as outstanding
+            await asyncio.sleep(0)
+            self.assertEqual(a.outstanding, 0)
+            await registry.close()
+
+        asyncio.run(run())
+
+    def test_cancelled_caller_aborts_the_request_before_hedging(self):
+        upstream_cancelled = asyncio.Event()
+
+        async def slow(request):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                upstream_cancelled.set()
+                raise
+            return httpx.Response(200)
+
+        async def run():
+            a, b = mock_backend("http://a", slow), mock_backend("http://b", ok)
+            registry = BackendRegistry([a, b], policy="least_outstanding", hedge_delay_ms=1000)
+            caller = asyncio.create_task(registry.request("m", "POST", "/embeddings", hedge=True, json={}))
+            await asyncio.sleep(0.05)
+            caller.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await caller
+            await asyncio.wait_for(upstream_cancelled.wait(), timeout=1)
+            self.assertEqual(a.outstanding, 0)
+            await registry.close()
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import unittest
+
+os.environ.setdefault("LITELLM_MASTER_KEY", "sk-test")
+
+from node.inference.cancellation import ClientDisconnected, run_until_disconnect  # noqa: E402
+from node.inference.server import ProxyStreamingResponse  # noqa: E402
+from node.inference.sse import count_delta_tokens  # noqa: E402
+
+
+class FakeRequest:
+    """Request whose receive() reports a disconnect once the event is set"""
+
+    def __init__(self):
+        self.gone = asyncio.Event()
+
+    async def receive(self):
+        await self.gone.wait()
+        return {"type": "http.disconnect"}
+
+
+class TestCancellation(unittest.TestCase):
+    def test_count_delta_tokens(self):
+        self.assertEqual(count_delta_tokens({"choices": [{"delta": {"content": "hi"}}]}), 1)
+        self.assertEqual(count_delta_tokens({"choices": [{"delta": {"role": "assistant"}}]}), 0)
+        self.assertEqual(count_delta_tokens({"choices": [{"text": "a"}, {"text": "b"}]}), 2)
+        self.assertEqual(count_delta_tokens("[DONE]"), 0)
+
+    def test_non_streaming_request_is_cancelled_on_disconnect(self):
+        async def run():
+            upstream_cancelled = asyncio.Event()
+
+            async def upstream():
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    upstream_cancelled.set()
+                    raise
+
+            request = FakeRequest()
+            asyncio.get_running_loop().call_later(0.01, request.gone.set)
+            with self.assertRaises(ClientDisconnected):
+                await run_until_disconnect(request, "m", upstream())
+            await asyncio.wait_for(upstream_cancelled.wait(), 1)
+
+        asyncio.run(run())
+
+    def test_stream_is_closed_promptly_on_disconnect(self):
+        async def run():
+            state = {"sent": 0, "closed": False, "on_close": False}
+
+            async def body():
+                try:
+                    while True:
+                        # a slow upstream, the disconnect must not wait for the next token
+                        await asyncio.sleep(0.05)
+                        yield b"data: {}\n\n"
+                finally:
+                    state["closed"] = True
+
+            def on_close():
+                state["on_close"] = True
+
+            request = FakeRequest()
+
+            async def send(message):
+                if message["type"] == "http.response.body":
+                    state["sent"] += 1
+                    if state["sent"] == 2:
+                        request.gone.set()
+
+            response = ProxyStreamingResponse(body(), media_type="text/event-stream", on_close=[on_close])
+            await asyncio.wait_for(response({"type": "http"}, request.receive, send), 1)
+            self.assertTrue(state["closed"])
+            self.assertTrue(state["on_close"])
+            self.assertTrue(response.disconnected)
+            self.assertEqual(state["sent"], 2)
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import os
+from pathlib import Path
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from node.storage import cid_cache
+from node.storage.cid_cache import CIDCache
+
+
+class TestCIDCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = CIDCache(root=Path(self.tmp.name), max_bytes=100)
+        self.fetches = 0
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def populate(self, content: bytes):
+        def _populate(dest: Path):
+            self.fetches += 1
+            dest.write_bytes(content)
+        return _populate
+
+    def test_fetch_populates_once_and_counts_hits(self):
+        path = self.cache.fetch("QmA", self.populate(b"a" * 10))
+        self.assertEqual(path.read_bytes(), b"a" * 10)
+        self.assertEqual(self.cache.fetch("QmA", self.populate(b"other")), path)
+        self.assertEqual(self.fetches, 1)
+
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["bytes_saved"], 10)
+        self.assertEqual(stats["size_bytes"], 10)
+
+    def test_variants_are_separate_entries(self):
+        self.cache.fetch("QmA", self.populate(b"raw"))
+        zip_path = self.cache.fetch("QmA", self.populate(b"zipped"), variant="zip")
+        self.assertEqual(zip_path.read_bytes(), b"zipped")
+        self.assertEqual(self.fetches, 2)
+
+    def test_failed_populate_leaves_no_entry(self):
+        def failing(dest: Path):
+            dest.write_bytes(b"partial")
+            raise IOError("connection reset")
+
+        with self.assertRaises(IOError):
+            self.cache.fetch("QmA", failing)
+        self.assertIsNone(self.cache.get("QmA"))
+        self.assertEqual(os.listdir(self.cache.tmp_dir), [])
+
+    def test_concurrent_fetches_are_single_flight(self):
+        started = threading.Event()
+
+        def slow(dest: Path):
+            self.fetches += 1
+            started.set()
+            threading.Event().wait(0.2)
+            dest.write_bytes(b"x")
+
+        threads = [threading.Thread(target=self.cache.fetch, args=("QmA", slow)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.fetches, 1)
+
+    def test_lru_eviction_skips_referenced_entries(self):
+        with mock.patch.object(cid_cache, "CID_CACHE_MIN_AGE", 0):
+            for i, cid in enumerate(["QmA", "QmB", "QmC"]):
+                self.cache.fetch(cid, self.populate(b"x" * 40))
+                os.utime(self.cache.meta_dir / cid, (i, i))
+                if cid == "QmA":
+                    self.cache.acquire("QmA", "run-1")
+
+            # QmA is oldest but referenced, so QmB is evicted instead
+            self.assertIsNotNone(self.cache.get("QmA"))
+            self.assertIsNone(self.cache.get("QmB"))
+            self.assertIsNotNone(self.cache.get("QmC"))
+
+            self.cache.release_owner("run-1")
+            os.utime(self.cache.meta_dir / "QmA", (0, 0))
+            self.cache.fetch("QmD", self.populate(b"x" * 40))
+            self.assertIsNone(self.cache.get("QmA"))
+            self.assertEqual(self.cache.stats()["evictions"], 2)
+
+    def populate_dir(self, dest: Path):
+        self.fetches += 1
+        (dest / "data").mkdir(parents=True)
+        (dest / "data" / "input.txt").write_bytes(b"input")
+
+    def test_cached_files_are_read_only(self):
+        path = self.cache.fetch("QmA", self.populate_dir)
+        self.assertFalse((path / "data" / "input.txt").stat().st_mode & 0o222)
+        self.assertTrue((path / "data").stat().st_mode & 0o200)
+
+    def test_checkouts_leave_the_entry_alone(self):
+        self.cache.fetch("QmA", self.populate_dir)
+        checkout = self.cache.checkout("QmA", "run-1")
+        self.assertEqual(checkout, self.cache.runs_dir / "run-1" / "QmA")
+        self.assertEqual(self.cache.checkout("QmA", "run-1"), checkout)
+        self.assertNotEqual(self.cache.checkout("QmA", "run-2"), checkout)
+
+        (checkout / "data" / "input.txt").unlink()
+        (checkout / "output.txt").write_bytes(b"output")
+        (checkout / "data").rename(checkout / "moved")
+
+        entry = self.cache.get("QmA")
+        self.assertEqual(sorted(p.name for p in entry.iterdir()), ["data"])
+        self.assertEqual((entry / "data" / "input.txt").read_bytes(), b"input")
+        self.assertEqual((self.cache.runs_dir / "run-2" / "QmA" / "data" / "input.txt").read_bytes(), b"input")
+
+        self.cache.release_owner("run-1")
+        self.assertFalse((self.cache.runs_dir / "run-1").exists())
+        self.assertTrue((self.cache.runs_dir / "run-2").exists())
+
+    def test_stale_checkouts_are_dropped(self):
+        self.cache.fetch("QmA", self.populate_dir)
+        checkout = self.cache.checkout("QmA", "run-1")
+        os.utime(checkout.parent, (0, 0))
+        self.cache.evict()
+        self.assertFalse(checkout.parent.exists())
+        self.assertIsNotNone(self.cache.get("QmA"))
+
+    def test_checkout_of_a_missing_entry(self):
+        with self.assertRaises(FileNotFoundError):
+            self.cache.checkout("QmA", "run-1")
+        self.assertFalse((self.cache.runs_dir / "run-1" / "QmA").exists())
+
+    def test_rejects_path_like_keys(self):
+        with self.assertRaises(ValueError):
+            self.cache.fetch("../etc", self.populate(b"x"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+from unittest import mock
+
+from node.inference import completion_cache
+from node.inference.completion_cache import (
+    CompletionCache,
+    StreamRecorder,
+    completion_cache_key,
+    completion_to_sse,
+    is_deterministic,
+    should_bypass,
+)
+from node.inference.sse import DONE, SSEDecoder
+
+COMPLETION = {
+    "id": "chatcmpl-1",
+    "object": "chat.completion",
+    "created": 1700000000,
+    "model": "m",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "hello world"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5},
+}
+
+
+class TestCompletionCache(unittest.TestCase):
+    def test_only_deterministic_requests_are_cacheable(self):
+        self.assertTrue(is_deterministic({"temperature": 0}))
+        self.assertTrue(is_deterministic({"temperature": 0.0, "n": 1}))
+        self.assertFalse(is_deterministic({}))
+        self.assertFalse(is_deterministic({"temperature": 0.7}))
+        self.assertFalse(is_deterministic({"temperature": 0, "n": 3}))
+
+    def test_key_normalization(self):
+        messages = [{"role": "user", "content": "hi"}]
+        key = completion_cache_key({"model": "m", "messages": messages, "temperature": 0})
+        self.assertEqual(key, completion_cache_key({"temperature": 0, "messages": messages, "model": "m", "stream": True}))
+        self.assertNotEqual(key, completion_cache_key({"model": "m", "messages": messages, "temperature": 0, "max_tokens": 5}))
+
+    def test_bypass_header(self):
+        self.assertTrue(should_bypass({"x-cache-bypass": "true"}))
+        self.assertTrue(should_bypass({"cache-control": "no-cache"}))
+        self.assertFalse(should_bypass({}))
+
+    def test_ttl_and_size(self):
+        cache = CompletionCache(max_entries=2, ttl=10)
+        with mock.patch.object(completion_cache.time, "monotonic", return_value=100.0):
+            cache.put("a", COMPLETION)
+            cache.put("b", COMPLETION)
+            cache.put("c", COMPLETION)
+            self.assertIsNone(cache.get("a"))
+            self.assertEqual(cache.get("b"), COMPLETION)
+        with mock.patch.object(completion_cache.time, "monotonic", return_value=111.0):
+            self.assertIsNone(cache.get("c"))
+        self.assertEqual(cache.get_stats()["expired"], 1)
+
+    def test_sse_replay_round_trip(self):
+        events = b"".join(completion_to_sse(COMPLETION, include_usage=True))
+        decoded = SSEDecoder().feed(events)
+        self.assertEqual(decoded[-1], DONE)
+        self.assertEqual(decoded[0]["choices"][0]["delta"]["content"], "hello world")
+
+        cache = CompletionCache()
+        recorder = StreamRecorder(cache, "key")
+        # feed in small pieces, as upstream chunks do not align with events
+        for i in range(0, len(events), 7):
+            recorder.feed(events[i:i + 7])
+        recorder.close(completed=True)
+        cached = cache.get("key")
+        self.assertEqual(cached["choices"], COMPLETION["choices"])
+        self.assertEqual(cached["usage"], COMPLETION["usage"])
+
+    def test_incomplete_or_tool_call_streams_are_not_cached(self):
+        cache = CompletionCache()
+        events = b"".join(completion_to_sse(COMPLETION))
+        recorder = StreamRecorder(cache, "truncated")
+        recorder.feed(events[:-10])
+        recorder.close(completed=False)
+        self.assertIsNone(cache.get("truncated"))
+
+        tool_completion = {**COMPLETION, "choices": [{"index": 0, "finish_reason": "tool_calls", "message": {
+            "role": "assistant", "content": None,
+            "tool_calls": [{"id": "1", "type": "function", "function": {"name": "f", "arguments": "{}"}}],
+        }}]}
+        recorder = StreamRecorder(cache, "tools")
+        recorder.feed(b"".join(completion_to_sse(tool_completion)))
+        recorder.close(completed=True)
+        self.assertIsNone(cache.get("tools"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import os
+import tempfile
+import unittest
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+import httpx
+
+from node.server.compression import (
+    ORJSON_AVAILABLE,
+    ZSTD_AVAILABLE,
+    CompressionMiddleware,
+    default_response_class,
+    negotiate_encoding,
+)
+from node.storage.range_response import RangeFileResponse
+
+LARGE = {"results": ["the quick brown fox jumps over the lazy dog"] * 100}
+
+
+def create_app() -> FastAPI:
+    app = FastAPI(default_response_class=default_response_class())
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+    @app.get("/large")
+    async def large():
+        return LARGE
+
+    @app.get("/small")
+    async def small():
+        return {"status": "ok"}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for _ in range(3):
+                yield b"x" * 2048
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    @app.get("/file")
+    async def file(request: Request):
+        return RangeFileResponse(app.state.file_path, request.headers, media_type="text/plain", etag='"file-v1"')
+
+    return app
+
+
+class TestCompressionMiddleware(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        app = create_app()
+        fd, app.state.file_path = tempfile.mkstemp()
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"0123456789" * 2000)
+        self.addCleanup(os.remove, app.state.file_path)
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://node")
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    async def get(self, path, accept_encoding):
+        return await self.client.get(path, headers={"Accept-Encoding": accept_encoding})
+
+    async def test_large_bodies_are_gzipped_for_gzip_clients(self):
+        response = await self.get("/large", "gzip")
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.headers["vary"])
+        self.assertEqual(response.json(), LARGE)
+        self.assertLess(int(response.headers["content-length"]), len(response.content))
+
+    @unittest.skipUnless(ZSTD_AVAILABLE, "zstandard is not installed")
+    async def test_zstd_is_preferred_when_accepted(self):
+        response = await self.get("/large", "gzip, deflate, zstd")
+        self.assertEqual(response.headers["content-encoding"], "zstd")
+        self.assertEqual(response.json(), LARGE)
+
+    async def test_old_clients_get_identity(self):
+        for accept_encoding in ("identity", "gzip;q=0"):
+            response = await self.get("/large", accept_encoding)
+            self.assertNotIn("content-encoding", response.headers)
+            self.assertEqual(response.json(), LARGE)
+
+    async def test_small_and_streamed_bodies_are_not_compressed(self):
+        self.assertNotIn("content-encoding", (await self.get("/small", "gzip")).headers)
+        response = await self.get("/stream", "gzip")
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertEqual(response.content, b"x" * 6144)
+
+    async def test_range_responses_are_not_compressed(self):
+        response = await self.client.get("/file", headers={"Accept-Encoding": "gzip", "Range": "bytes=0-4999"})
+        self.assertEqual(response.status_code, 206)
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertEqual(response.headers["content-range"], "bytes 0-4999/20000")
+        self.assertEqual(response.content, (b"0123456789" * 500))
+        self.assertEqual(response.headers["etag"], '"file-v1"')
+
+    async def test_compressed_responses_get_a_weak_etag(self):
+        response = await self.get("/file", "gzip")
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.headers["etag"], 'W/"file-v1"')
+        self.assertEqual(response.content, b"0123456789" * 2000)
+        identity = await self.get("/file", "identity")
+        self.assertEqual(identity.headers["etag"], '"file-v1"')
+
+    async def test_orjson_renders_the_same_json(self):
+        response = await self.get("/large", "identity")
+        self.assertEqual(response.content, JSONResponse(LARGE).body)
+        self.assertIs(default_response_class(), ORJSONResponse if ORJSON_AVAILABLE else JSONResponse)
+
+
+class TestExtensionMessages(unittest.IsolatedAsyncioTestCase):
+    async def test_start_is_sent_before_pathsend(self):
+        start = {"type": "http.response.start", "status": 200, "headers": [(b"content-length", b"20000")]}
+        pathsend = {"type": "http.response.pathsend", "path": "/tmp/file"}
+
+        async def app(scope, receive, send):
+            await send(start)
+            await send(pathsend)
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+        await CompressionMiddleware(app)(scope, None, send)
+        self.assertEqual(sent, [start, pathsend])
+
+
+class TestNegotiateEncoding(unittest.TestCase):
+    def test_encodings(self):
+        self.assertEqual(negotiate_encoding("gzip"), "gzip")
+        self.assertEqual(negotiate_encoding("br, gzip;q=0.5"), "gzip")
+        self.assertIsNone(negotiate_encoding(""))
+        self.assertIsNone(negotiate_encoding("gzip;q=0, br"))
+        self.assertEqual(negotiate_encoding("zstd, gzip"), "zstd" if ZSTD_AVAILABLE else "gzip")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import os
+import random
+import unittest
+
+os.environ.setdefault("NUM_NODE_COMMUNICATION_SERVERS", "1")
+os.environ.setdefault("NODE_COMMUNICATION_PORT", "7002")
+os.environ.setdefault("OLLAMA_MODELS", "hermes3:8b")
+
+import websockets  # noqa: E402
+
+from node import client as node_client  # noqa: E402
+from node.schemas import NodeConfigInput  # noqa: E402
+from node.server.connection_pool import NodeConnectionPool, http_origin  # noqa: E402
+from node.server.payloads import MSGPACK, MSGPACK_AVAILABLE, MSGPACK_SUBPROTOCOL, decode_payload, encode_payload  # noqa: E402
+
+
+class CountingServers:
+    """A websocket server answering each connection's messages in order without request ids,
+    like nodes that predate them, and a keep-alive HTTP server, both counting the connections
+    they accept"""
+
+    def __init__(self, delay: float = 0.005):
+        self.delay = delay
+        self.websocket_connections = 0
+        self.http_connections = 0
+
+    async def handle_websocket(self, websocket, path):
+        self.websocket_connections += 1
+        async for message in websocket:
+            await asyncio.sleep(self.delay)
+            data = json.loads(message)
+            data.pop("request_id")
+            if data.get("close"):
+                await websocket.close()
+                return
+            await websocket.send(json.dumps({"path": path, "echo": data}))
+
+    async def handle_http(self, reader, writer):
+        self.http_connections += 1
+        while await reader.readuntil(b"\r\n\r\n"):
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 15\r\nContent-Type: application/json\r\n\r\n{\"status\":\"ok\"}")
+            await writer.drain()
+
+    async def start(self):
+        self.websocket_server = await websockets.serve(self.handle_websocket, "127.0.0.1", 0)
+        self.http_server = await asyncio.start_server(self.handle_http, "127.0.0.1", 0)
+        self.websocket_url = f"ws://127.0.0.1:{self.websocket_server.sockets[0].getsockname()[1]}"
+        self.http_url = f"http://127.0.0.1:{self.http_server.sockets[0].getsockname()[1]}"
+
+    async def stop(self):
+        self.websocket_server.close()
+        await self.websocket_server.wait_closed()
+        self.http_server.close()
+
+
+class TestNodeConnectionPool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.pool = NodeConnectionPool()
+        self.servers = CountingServers()
+        await self.servers.start()
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+        await self.servers.stop()
+
+    async def test_replies_without_request_ids_are_matched_in_order(self):
+        websocket = await self.pool.websocket(self.servers.websocket_url, "user/check")
+        replies = await asyncio.gather(*(websocket.request({"n": i}) for i in range(30)))
+        self.assertEqual([reply["echo"] for reply in replies], [{"n": i} for i in range(30)])
+        self.assertTrue(replies[0]["path"].startswith("/ws/user/check/"))
+        self.assertFalse(websocket.binary)
+        self.assertIs(await self.pool.websocket(self.servers.websocket_url, "user/check"), websocket)
+        self.assertEqual(self.servers.websocket_connections, 1)
+
+    async def test_closed_websocket_fails_pending_requests_and_reconnects(self):
+        websocket = await self.pool.websocket(self.servers.websocket_url, "user/check")
+        closing = asyncio.gather(websocket.request({"close": True}), websocket.request({"n": 1}), return_exceptions=True)
+        self.assertTrue(all(isinstance(result, ConnectionError) for result in await closing))
+        replacement = await self.pool.websocket(self.servers.websocket_url, "user/check")
+        self.assertIsNot(replacement, websocket)
+        self.assertEqual((await replacement.request({"n": 2}))["echo"], {"n": 2})
+        self.assertEqual(self.servers.websocket_connections, 2)
+
+    async def test_http_connections_are_kept_alive(self):
+        for _ in range(10):
+            response = await self.pool.http_client(self.servers.http_url).get("/health")
+            self.assertEqual(response.json(), {"status": "ok"})
+        self.assertEqual(self.servers.http_connections, 1)
+
+    async def test_node_client_uses_the_shared_connections(self):
+        port = int(self.servers.websocket_url.rsplit(":", 1)[1])
+        node = node_client.Node(NodeConfigInput(ip="127.0.0.1", user_communication_port=port, user_communication_protocol="ws"))
+        original = node_client.get_node_connection_pool
+        node_client.get_node_connection_pool = lambda: self.pool
+        try:
+            replies = await node.send_receive_multiple([{"n": i} for i in range(5)], "user/check")
+            self.assertEqual([reply["echo"] for reply in replies], [{"n": i} for i in range(5)])
+            self.assertEqual((await node.send_receive_ws({"n": 5}, "user/check"))["echo"], {"n": 5})
+        finally:
+            node_client.get_node_connection_pool = original
+        self.assertEqual(self.servers.websocket_connections, 1)
+
+
+class TestMultiplexedWebSocket(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.pool = NodeConnectionPool()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.binary_frames = 0
+        self.echo_request_ids = True
+        self.server = await websockets.serve(self.handle, "127.0.0.1", 0, subprotocols=[MSGPACK_SUBPROTOCOL])
+        self.url = f"ws://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, websocket, path):
+        """Answers every message after a random delay, tagged with its request id unless echo_request_ids is off, and in its encoding"""
+        async def reply(message):
+            binary = isinstance(message, bytes)
+            data = decode_payload(message, MSGPACK) if binary else json.loads(message)
+            self.binary_frames += binary
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(random.uniform(0, 0.05))
+            self.in_flight -= 1
+            request_id = data.pop("request_id")
+            response = {"echo": data}
+            if self.echo_request_ids:
+                response["request_id"] = request_id
+            await websocket.send(encode_payload(response, MSGPACK) if binary else json.dumps(response))
+
+        tasks = [asyncio.create_task(reply(message)) async for message in websocket]
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def test_peers_without_request_ids_get_one_request_at_a_time(self):
+        # a relay that doesn't echo ids but would answer concurrent requests out of order
+        self.echo_request_ids = False
+        websocket = await self.pool.websocket(self.url, "tool/run")
+        replies = await asyncio.gather(*(websocket.request({"n": i}) for i in range(20)))
+        self.assertEqual([reply["echo"] for reply in replies], [{"n": i} for i in range(20)])
+        self.assertEqual(self.max_in_flight, 1)
+        self.assertFalse(websocket.echoes_request_ids)
+
+    async def test_out_of_order_replies_reach_their_callers(self):
+        websocket = await self.pool.websocket(self.url, "tool/run")
+        replies = await asyncio.gather(*(websocket.request({"n": i}) for i in range(500)))
+        self.assertEqual([reply["echo"] for reply in replies], [{"n": i} for i in range(500)])
+        self.assertGreater(self.max_in_flight, 1)
+        self.assertEqual(websocket.pending, {})
+        self.assertEqual(self.binary_frames, 500 if MSGPACK_AVAILABLE else 0)
+
+    async def test_cancelled_request_does_not_take_another_reply(self):
+        websocket = await self.pool.websocket(self.url, "tool/run")
+        abandoned = asyncio.create_task(websocket.request({"n": 0}))
+        await asyncio.sleep(0)
+        abandoned.cancel()
+        self.assertEqual(await websocket.request({"n": 1}), {"echo": {"n": 1}})
+
+
+class TestHttpOrigin(unittest.TestCase):
+    def test_websocket_urls_map_to_http(self):
+        self.assertEqual(http_origin("ws://1.2.3.4:7001"), "http://1.2.3.4:7001")
+        self.assertEqual(http_origin("wss://node.example/ws"), "https://node.example")
+        self.assertEqual(http_origin("http://localhost:7001/"), "http://localhost:7001")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+import asyncio
+import socket
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from celery import Celery
+
+from node.worker import dispatcher
+from node.worker.affinity import affinity_queue
+from node.worker.dispatcher import CeleryDispatcher, PostgresDispatcher, task_row
+
+app = Celery("test_dispatcher")
+
+
+@app.task
+def add(x, y):
+    return x + y
+
+
+@app.task(name="node.worker.package_worker.run_tool")
+def run_tool(tool_run, user_env_data={}):
+    return tool_run
+
+
+TOOL_RUN = {"id": "run-1", "deployment": {"module": {"name": "tool_a"}}}
+
+
+class FakeListener:
+    """A LISTEN connection whose notifications are written to a socket by the test"""
+
+    def __init__(self):
+        self.reader, self.writer = socket.socketpair()
+        self.reader.setblocking(False)
+        self.notifies = []
+        self.closed = False
+
+    def fileno(self):
+        return self.reader.fileno()
+
+    def notify(self, *payloads):
+        self.writer.send("\n".join(payloads).encode() + b"\n")
+
+    def poll(self):
+        data = self.reader.recv(65536).decode()
+        self.notifies.extend(SimpleNamespace(payload=payload) for payload in data.split())
+
+    def close(self):
+        self.closed = True
+        self.reader.close()
+        self.writer.close()
+
+
+class FakeQueueDB:
+    def __init__(self):
+        self.enqueued = []
+        self.statuses = {}
+        self.listener = None
+
+    async def enqueue_tasks(self, tasks, max_attempts=3):
+        ids = [f"task-{len(self.enqueued) + index}" for index in range(len(tasks))]
+        self.enqueued.extend(tasks)
+        self.statuses.update((task_id, "queued") for task_id in ids)
+        return ids
+
+    async def get_tasks(self, task_ids):
+        return [{"id": task_id, "status": self.statuses[task_id]} for task_id in task_ids]
+
+    def listen(self, *channels):
+        self.listener = FakeListener()
+        return self.listener
+
+
+class TestTaskRow(unittest.TestCase):
+    def test_signature_becomes_a_row(self):
+        row = task_row(add.s(1, y=2), "modules")
+        self.assertEqual(row, {"task": add.name, "args": [1], "kwargs": {"y": 2}, "queue": "modules"})
+
+
+class TestAffinityRouting(unittest.TestCase):
+    def test_celery_options(self):
+        celery_dispatcher = CeleryDispatcher()
+        with mock.patch.object(dispatcher, "MODULE_AFFINITY", True):
+            options = celery_dispatcher.options(run_tool.s(TOOL_RUN, {}))
+            self.assertEqual(options["queue"].name, affinity_queue("tool_a"))
+            self.assertEqual(options["queue"].queue_arguments["x-dead-letter-routing-key"], app.conf.task_default_queue)
+            self.assertNotIn("queue", celery_dispatcher.options(add.s(1, 2)))
+        with mock.patch.object(dispatcher, "MODULE_AFFINITY", False):
+            options = celery_dispatcher.options(run_tool.s(TOOL_RUN, {}))
+            self.assertNotIn("queue", options)
+        self.assertIn("enqueued_at", options["headers"])
+
+    def test_postgres_queue(self):
+        postgres_dispatcher = PostgresDispatcher(db=FakeQueueDB())
+        with mock.patch.object(dispatcher, "MODULE_AFFINITY", True):
+            self.assertEqual(postgres_dispatcher.queue_for(run_tool.s(TOOL_RUN, {})), affinity_queue("tool_a"))
+            self.assertEqual(postgres_dispatcher.queue_for(add.s(1, 2)), dispatcher.DEFAULT_QUEUE)
+        with mock.patch.object(dispatcher, "MODULE_AFFINITY", False):
+            self.assertEqual(postgres_dispatcher.queue_for(run_tool.s(TOOL_RUN, {})), dispatcher.DEFAULT_QUEUE)
+
+
+class TestPostgresDispatcher(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.db = FakeQueueDB()
+        self.dispatcher = PostgresDispatcher(db=self.db)
+
+    async def asyncTearDown(self):
+        await self.dispatcher.close()
+
+    async def wait_ready(self, handles, timeout=2.0):
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not all(handle.ready() for handle in handles):
+            if asyncio.get_running_loop().time() > deadline:
+                self.fail("handles didn't become ready")
+            await asyncio.sleep(0.01)
+
+    async def test_submit_many_enqueues_one_batch(self):
+        handles = await self.dispatcher.submit_many([add.s(1, 2), add.s(3, 4)])
+        self.assertEqual(len(self.db.enqueued), 2)
+        self.assertEqual([row["args"] for row in self.db.enqueued], [[1, 2], [3, 4]])
+        self.assertEqual(self.dispatcher.pending, {handle.id for handle in handles})
+        self.assertFalse(any(handle.ready() for handle in handles))
+
+    async def test_untracked_submit_keeps_nothing(self):
+        task_ids = await self.dispatcher.submit_many([add.s(1, 2), add.s(3, 4)], track=False)
+        self.assertEqual(task_ids, ["task-0", "task-1"])
+        self.assertEqual(self.dispatcher.pending, set())
+        self.assertIsNone(self.db.listener)
+        self.assertEqual(await self.dispatcher.submit(add.s(5, 6), track=False), "task-2")
+
+    async def test_unpolled_completions_expire(self):
+        first, second = await self.dispatcher.submit_many([add.s(1, 2), add.s(3, 4)])
+        self.dispatcher.mark_finished([first.id, second.id])
+        self.dispatcher.finished[first.id] -= dispatcher.TASK_QUEUE_FINISHED_TTL + 1
+        self.dispatcher.expire_finished()
+        self.assertEqual(list(self.dispatcher.finished), [second.id])
+        self.assertTrue(second.ready())
+        self.assertEqual(self.dispatcher.finished, {})
+
+    async def test_submit_nothing(self):
+        self.assertEqual(await self.dispatcher.submit_many([]), [])
+        self.assertIsNone(self.db.listener)
+
+    async def test_notifications_finish_tasks(self):
+        first, second = await self.dispatcher.submit_many([add.s(1, 2), add.s(3, 4)])
+        self.db.listener.notify(second.id, "task-from-another-server")
+        await self.wait_ready([second])
+        self.assertFalse(first.ready())
+        self.db.listener.notify(first.id)
+        await self.wait_ready([first])
+        # a handle stays ready once the dispatcher forgot the task
+        self.assertTrue(second.ready())
+        self.assertEqual(self.dispatcher.pending, set())
+        self.assertEqual(self.dispatcher.finished, {})
+
+    async def test_missed_notifications_are_reconciled(self):
+        with mock.patch.object(dispatcher, "TASK_QUEUE_RECONCILE_INTERVAL", 0.01):
+            handle = await self.dispatcher.submit(add.s(1, 2))
+            self.db.statuses[handle.id] = "failed"
+            await self.wait_ready([handle])
+
+    async def test_listener_is_reopened_after_failure(self):
+        await self.dispatcher.submit(add.s(1, 2))
+        broken = self.db.listener
+        broken.poll = mock.Mock(side_effect=OSError("connection closed"))
+        broken.notify("task-0")
+        await asyncio.sleep(0.05)
+        self.assertTrue(broken.closed)
+        self.assertIsNone(self.dispatcher.listener)
+        await self.dispatcher.submit(add.s(3, 4))
+        self.assertIsNot(self.db.listener, broken)
+
+
+class TestGetDispatcher(unittest.IsolatedAsyncioTestCase):
+    async def asyncTearDown(self):
+        await dispatcher.close_dispatcher()
+
+    async def test_engine_is_configurable(self):
+        with mock.patch.object(dispatcher, "TASK_QUEUE_ENGINE", "celery"):
+            self.assertIsInstance(dispatcher.get_dispatcher(), dispatcher.CeleryDispatcher)
+            self.assertIs(dispatcher.get_dispatcher(), dispatcher.get_dispatcher())
+
+    async def test_unknown_engine(self):
+        with mock.patch.object(dispatcher, "TASK_QUEUE_ENGINE", "kafka"):
+            with self.assertRaises(ValueError):
+                dispatcher.get_dispatcher()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import asyncio
+from types import SimpleNamespace
+import unittest
+
+from node.inference.batching import EmbeddingBatcher, batch_size_histogram, rejects_input
+
+
+class Rejected(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"upstream returned {status_code}")
+        self.response = SimpleNamespace(status_code=status_code)
+
+
+class TestEmbeddingBatcher(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+    async def fetch(self, texts):
+        self.calls.append(list(texts))
+        data = [{"object": "embedding", "index": i, "embedding": [float(len(text))]} for i, text in enumerate(texts)]
+        return {"object": "list", "data": data, "model": "m", "usage": {"prompt_tokens": len(texts)}}
+
+    def test_concurrent_requests_are_coalesced(self):
+        batcher = EmbeddingBatcher(window_ms=20, max_batch=100, model_config={})
+
+        async def run():
+            return await asyncio.gather(
+                batcher.embed("m", ["a"], self.fetch),
+                batcher.embed("m", ["bb", "ccc"], self.fetch),
+                batcher.embed("other", ["dddd"], self.fetch),
+            )
+
+        first, second, other = asyncio.run(run())
+        self.assertEqual(sorted(self.calls), [["a", "bb", "ccc"], ["dddd"]])
+        self.assertEqual([entry["embedding"] for entry in first["data"]], [[1.0]])
+        self.assertEqual([entry["embedding"] for entry in second["data"]], [[2.0], [3.0]])
+        self.assertEqual([entry["index"] for entry in second["data"]], [0, 1])
+        self.assertEqual([entry["embedding"] for entry in other["data"]], [[4.0]])
+
+    def test_max_batch_flushes_early(self):
+        batcher = EmbeddingBatcher(window_ms=10_000, max_batch=3, model_config={})
+
+        async def run():
+            return await asyncio.wait_for(asyncio.gather(
+                batcher.embed("m", ["a", "b"], self.fetch),
+                batcher.embed("m", ["c"], self.fetch),
+            ), timeout=1)
+
+        asyncio.run(run())
+        self.assertEqual(self.calls, [["a", "b", "c"]])
+        self.assertTrue(any(series["count"] for series in batch_size_histogram.snapshot()["series"]))
+
+    def test_per_model_config_and_errors(self):
+        batcher = EmbeddingBatcher(window_ms=5, max_batch=100, model_config={"solo": {"window_ms": 0}})
+
+        async def failing(texts):
+            raise RuntimeError("upstream down")
+
+        async def run():
+            await batcher.embed("solo", ["a"], self.fetch)
+            results = await asyncio.gather(
+                batcher.embed("m", ["a"], failing),
+                batcher.embed("m", ["b"], failing),
+                return_exceptions=True,
+            )
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual(self.calls, [["a"]])
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+    def test_rejected_batch_is_sent_one_by_one(self):
+        batcher = EmbeddingBatcher(window_ms=20, max_batch=100, model_config={})
+
+        sent = []
+
+        async def strict(texts):
+            sent.append(list(texts))
+            if "bad" in texts:
+                raise Rejected(400)
+            return await self.fetch(texts)
+
+        async def run():
+            return await asyncio.gather(
+                batcher.embed("m", ["a"], strict),
+                batcher.embed("m", ["bad"], strict),
+                batcher.embed("m", ["bb", "ccc"], strict),
+                return_exceptions=True,
+            )
+
+        first, bad, third = asyncio.run(run())
+        self.assertEqual(sent[0], ["a", "bad", "bb", "ccc"])
+        self.assertEqual(sorted(sent[1:]), [["a"], ["bad"], ["bb", "ccc"]])
+        self.assertEqual([entry["embedding"] for entry in first["data"]], [[1.0]])
+        self.assertEqual([entry["embedding"] for entry in third["data"]], [[2.0], [3.0]])
+        self.assertIsInstance(bad, Rejected)
+        self.assertEqual(batcher.tasks, set())
+
+    def test_each_request_is_retried_with_its_own_fetch(self):
+        batcher = EmbeddingBatcher(window_ms=20, max_batch=100, model_config={})
+        fetched_by = []
+
+        def fetch_as(caller):
+            async def fetch(texts):
+                fetched_by.append((caller, list(texts)))
+                if len(texts) > 1:
+                    raise Rejected(422)
+                return await self.fetch(texts)
+            return fetch
+
+        async def run():
+            return await asyncio.gather(
+                batcher.embed("m", ["a"], fetch_as("first")),
+                batcher.embed("m", ["b"], fetch_as("second")),
+            )
+
+        asyncio.run(run())
+        self.assertEqual(fetched_by[0], ("first", ["a", "b"]))
+        self.assertEqual(sorted(fetched_by[1:]), [("first", ["a"]), ("second", ["b"])])
+
+    def test_only_input_errors_are_retried(self):
+        self.assertTrue(rejects_input(Rejected(400)))
+        self.assertFalse(rejects_input(Rejected(429)))
+        self.assertFalse(rejects_input(Rejected(500)))
+        self.assertFalse(rejects_input(RuntimeError("upstream down")))
+
+        batcher = EmbeddingBatcher(window_ms=5, max_batch=100, model_config={})
+
+        async def overloaded(texts):
+            self.calls.append(list(texts))
+            raise Rejected(429)
+
+        async def run():
+            return await asyncio.gather(
+                batcher.embed("m", ["a"], overloaded),
+                batcher.embed("m", ["b"], overloaded),
+                return_exceptions=True,
+            )
+
+        results = asyncio.run(run())
+        self.assertEqual(self.calls, [["a", "b"]])
+        self.assertTrue(all(isinstance(result, Rejected) for result in results))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import asyncio
+import unittest
+
+from node.inference.embedding_cache import EmbeddingCache
+
+
+class FakeStore:
+    def __init__(self):
+        self.rows = {}
+
+    def get_many(self, keys):
+        return {key: self.rows[key] for key in keys if key in self.rows}
+
+    def put_many(self, rows):
+        for row in rows:
+            self.rows[row["key"]] = (row["embedding"], row["prompt_tokens"])
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+    async def fetch(self, texts):
+        self.calls.append(texts)
+        # return out of order to check reassembly by index
+        data = [{"object": "embedding", "index": i, "embedding": [float(len(text))]} for i, text in enumerate(texts)]
+        return {"data": list(reversed(data)), "model": "m", "usage": {"prompt_tokens": 2 * len(texts)}}
+
+    def embed(self, cache, inputs, **kwargs):
+        return asyncio.run(cache.embed("m", inputs, self.fetch, **kwargs))
+
+    def test_dedup_and_order(self):
+        cache = EmbeddingCache(max_entries=10)
+        result = self.embed(cache, ["aa", "b", "aa", "cccc"])
+        self.assertEqual(self.calls, [["aa", "b", "cccc"]])
+        self.assertEqual([item["embedding"] for item in result["data"]], [[2.0], [1.0], [2.0], [4.0]])
+        self.assertEqual([item["index"] for item in result["data"]], [0, 1, 2, 3])
+        self.assertEqual(cache.get_stats()["duplicate_inputs"], 1)
+
+    def test_only_misses_go_upstream(self):
+        cache = EmbeddingCache(max_entries=10)
+        self.embed(cache, ["aa", "b"])
+        result = self.embed(cache, ["b", "ddd", "aa"])
+        self.assertEqual(self.calls[-1], ["ddd"])
+        self.assertEqual([item["embedding"] for item in result["data"]], [[1.0], [3.0], [2.0]])
+        self.assertEqual(result["usage"]["prompt_tokens"], 2)
+
+        stats = cache.get_stats()
+        self.assertEqual(stats["memory_hits"], 2)
+        self.assertEqual(stats["misses"], 3)
+        self.assertEqual(stats["hit_ratio"], 0.4)
+        self.assertGreater(stats["saved_tokens"], 0)
+
+    def test_dimensions_are_part_of_the_key(self):
+        cache = EmbeddingCache(max_entries=10)
+        self.embed(cache, ["aa"])
+        self.embed(cache, ["aa"], dimensions=8)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_persistent_tier(self):
+        store = FakeStore()
+        self.embed(EmbeddingCache(max_entries=10, store=store), ["aa", "b"])
+        # a fresh process with an empty memory tier is served from the database tier
+        cache = EmbeddingCache(max_entries=10, store=store)
+        result = self.embed(cache, ["b", "aa"])
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual([item["embedding"] for item in result["data"]], [[1.0], [2.0]])
+        self.assertEqual(cache.get_stats()["db_hits"], 2)
+
+    def test_lru_bound(self):
+        cache = EmbeddingCache(max_entries=2)
+        self.embed(cache, ["a", "bb", "ccc"])
+        self.assertEqual(len(cache.memory), 2)
+        self.embed(cache, ["a"])
+        self.assertEqual(self.calls[-1], ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from unittest import mock
+
+from node.worker import event_loop
+from node.worker.event_loop import ProcessContextGate, WorkerEventLoop, run_async
+
+
+class TestWorkerEventLoop(unittest.TestCase):
+    def setUp(self):
+        self.worker_loop = WorkerEventLoop(concurrency=4)
+        self.addCleanup(self.worker_loop.stop)
+
+    def test_loop_persists_across_runs(self):
+        async def current_loop():
+            return asyncio.get_running_loop()
+
+        first = self.worker_loop.run(current_loop())
+        second = self.worker_loop.run(current_loop())
+        self.assertIs(first, second)
+        self.assertTrue(first.is_running())
+        self.assertIsNot(threading.current_thread(), self.worker_loop.thread)
+
+    def test_exceptions_reach_the_task(self):
+        async def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            self.worker_loop.run(fail())
+        self.assertEqual(self.worker_loop.run(asyncio.sleep(0, result=7)), 7)
+
+    def test_concurrency_is_limited(self):
+        running, peak = 0, 0
+
+        async def io_bound(value):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+            return value
+
+        # a threads pool worker blocks one thread per task on the shared loop
+        with ThreadPoolExecutor(12) as executor:
+            results = list(executor.map(lambda value: self.worker_loop.run(io_bound(value)), range(12)))
+        self.assertEqual(results, list(range(12)))
+        self.assertEqual(peak, 4)
+        self.assertEqual(self.worker_loop.in_flight, 0)
+
+    def test_timeout_cancels_the_coroutine(self):
+        cancelled = threading.Event()
+
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        with self.assertRaises(TimeoutError):
+            self.worker_loop.run(slow(), timeout=0.05)
+        self.assertTrue(cancelled.wait(2))
+
+    def test_stop_cancels_background_tasks(self):
+        cancelled = threading.Event()
+
+        async def monitor():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        self.worker_loop.spawn(monitor())
+        loop = self.worker_loop.loop
+        self.worker_loop.stop()
+        self.assertTrue(cancelled.is_set())
+        self.assertTrue(loop.is_closed())
+
+
+class TestRunAsync(unittest.TestCase):
+    def test_per_task_mode_runs_in_the_calling_thread(self):
+        async def thread_name():
+            return threading.current_thread().name
+
+        with mock.patch.object(event_loop, "WORKER_EVENT_LOOP", "per_task"):
+            with ThreadPoolExecutor(1, thread_name_prefix="celery-thread") as executor:
+                name = executor.submit(run_async, thread_name()).result()
+        self.assertTrue(name.startswith("celery-thread"))
+
+    def test_shared_mode_uses_the_worker_loop(self):
+        async def thread_name():
+            return threading.current_thread().name
+
+        self.addCleanup(event_loop.close_worker_loop)
+        with mock.patch.object(event_loop, "WORKER_EVENT_LOOP", "shared"):
+            self.assertEqual(run_async(thread_name()), "worker-event-loop")
+
+
+class TestProcessContextGate(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.gate = ProcessContextGate()
+        self.events = []
+
+    def context(self, key):
+        @contextmanager
+        def manager():
+            self.events.append(("enter", key))
+            try:
+                yield
+            finally:
+                self.events.append(("exit", key))
+        return manager
+
+    async def run_module(self, key, duration=0.02):
+        async with self.gate.hold(key, self.context(key)):
+            self.events.append(("run", key))
+            await asyncio.sleep(duration)
+
+    async def test_same_key_shares_one_context(self):
+        await asyncio.gather(*(self.run_module("a") for _ in range(3)))
+        self.assertEqual(self.events, [("enter", "a"), ("run", "a"), ("run", "a"), ("run", "a"), ("exit", "a")])
+
+    async def test_other_keys_wait_for_the_holders(self):
+        await asyncio.gather(self.run_module("a"), self.run_module("b"), self.run_module("a"))
+        # the second "a" arrived after "b" started waiting, so it waits too
+        self.assertEqual(self.events, [
+            ("enter", "a"), ("run", "a"), ("exit", "a"),
+            ("enter", "b"), ("run", "b"), ("exit", "b"),
+            ("enter", "a"), ("run", "a"), ("exit", "a"),
+        ])
+
+    async def test_consecutive_waiters_with_one_key_enter_together(self):
+        await asyncio.gather(self.run_module("a"), self.run_module("b"), self.run_module("b"))
+        self.assertEqual(self.events, [
+            ("enter", "a"), ("run", "a"), ("exit", "a"),
+            ("enter", "b"), ("run", "b"), ("run", "b"), ("exit", "b"),
+        ])
+
+    async def test_context_is_left_when_a_run_fails(self):
+        with self.assertRaises(RuntimeError):
+            async with self.gate.hold("a", self.context("a")):
+                raise RuntimeError("module failed")
+        self.assertEqual(self.events, [("enter", "a"), ("exit", "a")])
+        await self.run_module("b")
+        self.assertEqual(self.events[-1], ("exit", "b"))
+
+    async def test_cancelled_waiter_lets_the_next_one_in(self):
+        holder = asyncio.create_task(self.run_module("a", 0.05))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(self.run_module("b"))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await self.run_module("c")
+        await holder
+        self.assertNotIn(("enter", "b"), self.events)
+        self.assertEqual(self.events[-3:], [("enter", "c"), ("run", "c"), ("exit", "c")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+from node.inference.litellm.generate_litellm_config import (
+    GPU,
+    GPUAllocationError,
+    ModelRequirement,
+    allocate_gpus,
+    load_model_requirements,
+    plan_gpu_allocation,
+)
+
+
+def gpus(count, memory_gib=80):
+    return [GPU(index=i, memory_gib=memory_gib) for i in range(count)]
+
+
+class TestGPUAllocation(unittest.TestCase):
+    def test_requirements_from_compose_files(self):
+        requirements = {
+            r.model: r for r in load_model_requirements([
+                "deepseek-ai/DeepSeek-R1-Distill-Qwen-32B",
+                "Qwen/Qwen2.5-7B-Instruct",
+                "jinaai/jina-embeddings-v2-base-en",
+            ])
+        }
+        self.assertEqual(requirements["deepseek-ai/DeepSeek-R1-Distill-Qwen-32B"].tensor_parallel_size, 2)
+        self.assertLess(requirements["Qwen/Qwen2.5-7B-Instruct"].memory_gib_per_gpu, 40)
+        self.assertFalse(requirements["jinaai/jina-embeddings-v2-base-en"].vllm)
+        with self.assertRaises(GPUAllocationError):
+            load_model_requirements(["unknown/model"], manifest={})
+        custom = load_model_requirements(["unknown/model"], manifest={"unknown/model": {"memory_gib": 10}})
+        self.assertEqual(custom[0].memory_gib_per_gpu, 13)
+
+    def test_small_models_share_a_gpu(self):
+        requirements = [ModelRequirement("a/small", 20), ModelRequirement("b/small", 30), ModelRequirement("c/embed", 2, vllm=False)]
+        plan = plan_gpu_allocation(requirements, gpus(2), strategy="pack")
+        self.assertEqual({tuple(p["gpus"]) for p in plan.values()}, {(0,)})
+        # usable memory is split in proportion to need and leaves room for the embedding server
+        self.assertAlmostEqual(plan["a/small"]["gpu_memory_utilization"], round((76 - 2) * 20 / 50 / 80, 2))
+        self.assertLessEqual(plan["a/small"]["gpu_memory_utilization"] + plan["b/small"]["gpu_memory_utilization"] + 2 / 80, 0.95)
+        self.assertIsNone(plan["c/embed"]["gpu_memory_utilization"])
+
+    def test_spread_uses_idle_gpus_first(self):
+        requirements = [ModelRequirement("a/small", 20), ModelRequirement("b/small", 30)]
+        plan = plan_gpu_allocation(requirements, gpus(2), strategy="spread")
+        self.assertNotEqual(plan["a/small"]["gpus"], plan["b/small"]["gpus"])
+        self.assertEqual(plan["a/small"]["gpu_memory_utilization"], 0.98)
+
+    def test_tensor_parallel_models_and_capacity(self):
+        requirements = [ModelRequirement("big/32b", 50, tensor_parallel_size=2), ModelRequirement("a/small", 20)]
+        plan = plan_gpu_allocation(requirements, gpus(2), strategy="pack")
+        self.assertEqual(plan["big/32b"]["gpus"], [0, 1])
+        self.assertEqual(len(plan["a/small"]["gpus"]), 1)
+        with self.assertRaises(GPUAllocationError):
+            plan_gpu_allocation(requirements + [ModelRequirement("c/small", 30)], gpus(2), strategy="pack")
+
+    def test_allocate_gpus_emits_compose_variables(self):
+        assignments = allocate_gpus(
+            ["NousResearch/Hermes-3-Llama-3.1-8B", "Qwen/Qwen2.5-7B-Instruct"], gpus=gpus(1)
+        ).split()
+        self.assertIn("GPU_ID_hermes_3_llama_3_1_8b=0", assignments)
+        self.assertIn("GPU_ID_qwen2_5_7b_instruct=0", assignments)
+        self.assertTrue(any(a.startswith("GPU_MEM_UTIL_qwen2_5_7b_instruct=0.") for a in assignments))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+from node.schemas import AgentDeployment, AgentRunInput
+from node.server import grpc_server_pb2
+from node.server.payloads import (
+    MSGPACK_AVAILABLE,
+    PayloadEncodingError,
+    decode_payload,
+    encode_payload,
+    payload_encoding,
+    run_input_from_proto,
+)
+from tests.bench_grpc_payloads import legacy_run_input, sample_request, typical_inputs
+
+
+def direct_run_input(request) -> AgentRunInput:
+    return run_input_from_proto(request, AgentRunInput, AgentDeployment)
+
+
+class TestRunInputFromProto(unittest.TestCase):
+    def test_matches_message_to_dict_conversion(self):
+        request = sample_request(typical_inputs())
+        self.assertEqual(direct_run_input(request).model_dump(), legacy_run_input(request).model_dump())
+
+    def test_node_config_and_sub_deployments(self):
+        request = sample_request({"a": 1})
+        deployment = request.agent_deployment
+        deployment.node_config.CopyFrom(grpc_server_pb2.NodeConfig(
+            id="node:1", owner="o", public_key="k", ip="1.2.3.4", docker_jobs=True, models=["m"],
+            servers=[grpc_server_pb2.NodeServer(communication_protocol="ws", port=7002, node_id="node:1")],
+            ram=17179869184,
+        ))
+        self.assertEqual(direct_run_input(request).model_dump(), legacy_run_input(request).model_dump())
+
+        # sub-deployments never made it through MessageToDict, their node_input wasn't renamed
+        tool = deployment.tool_deployments.add(name="tool_deployment", module=deployment.module)
+        tool.node_input.ip = "localhost"
+        tool.data_generation_config.save_outputs = True
+        kb = deployment.kb_deployments.add(name="kb_deployment")
+        kb.node_input.ip = "localhost"
+        kb.config.update({"path": "kb", "schema": {"id": {"type": "INTEGER"}}})
+        run_input = direct_run_input(request)
+        self.assertEqual(run_input.deployment.node.ram, 17179869184)
+        self.assertTrue(run_input.deployment.tool_deployments[0].data_generation_config.save_outputs)
+        self.assertEqual(run_input.deployment.kb_deployments[0].node.ip, "localhost")
+
+    def test_payload_inputs_keep_their_types(self):
+        inputs = {"count": 3, "ratio": 0.5, "nested": [{"id": 1}], "none": None}
+        encodings = ["json", "msgpack"] if MSGPACK_AVAILABLE else ["json"]
+        for encoding in encodings:
+            with self.subTest(encoding=encoding):
+                run_input = direct_run_input(sample_request(inputs, encoding))
+                self.assertEqual(run_input.inputs, inputs)
+                self.assertIsInstance(run_input.inputs["count"], int)
+        # the Struct turns every number into a double
+        self.assertIsInstance(direct_run_input(sample_request(inputs)).inputs["count"], float)
+
+
+class TestPayloadEncoding(unittest.TestCase):
+    def test_encoding_of_a_request(self):
+        self.assertIsNone(payload_encoding(grpc_server_pb2.ModuleRunRequest()))
+        self.assertEqual(payload_encoding(grpc_server_pb2.ModuleRunRequest(inputs_payload=b"{}")), "json")
+        # Struct inputs can still ask for payload replies
+        self.assertEqual(payload_encoding(grpc_server_pb2.ModuleRunRequest(payload_encoding="json")), "json")
+        with self.assertRaises(PayloadEncodingError):
+            payload_encoding(grpc_server_pb2.ModuleRunRequest(payload_encoding="pickle"))
+
+    def test_invalid_payload(self):
+        with self.assertRaises(PayloadEncodingError):
+            decode_payload(b"{not json", "json")
+
+    def test_non_json_values_are_stringified(self):
+        self.assertEqual(decode_payload(encode_payload({"when": 1j}), "json"), {"when": "1j"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import grpc
+
+from node.server import grpc_pool_manager
+from node.server.grpc_pool_manager import GlobalGrpcPool
+
+
+async def start_echo_server(delay: float = 0.05):
+    """Server with one unary method that sleeps and echoes its request bytes"""
+    async def echo(request, context):
+        await asyncio.sleep(delay)
+        return request
+
+    server = grpc.aio.server()
+    server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler("test.Echo", {
+        "Echo": grpc.unary_unary_rpc_method_handler(echo),
+    }),))
+    port = server.add_insecure_port("127.0.0.1:0")
+    await server.start()
+    return server, f"127.0.0.1:{port}"
+
+
+async def call_echo(pool: GlobalGrpcPool, target: str, payload: bytes) -> bytes:
+    async with pool.channel_context(target) as channel:
+        return await channel.unary_unary("/test.Echo/Echo")(payload)
+
+
+class TestGlobalGrpcPool(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_calls_share_a_fixed_set_of_channels(self):
+        pool = GlobalGrpcPool(channels_per_target=2)
+        server, target = await start_echo_server()
+        try:
+            replies = await asyncio.gather(*(call_echo(pool, target, bytes([i])) for i in range(50)))
+            self.assertEqual(replies, [bytes([i]) for i in range(50)])
+            stats = pool.stats()[target]
+            self.assertEqual(stats["channels_created"], 2)
+            self.assertEqual(stats["requests"], 50)
+            self.assertEqual(stats["in_flight"], 0)
+            self.assertEqual(stats["latency_seconds"]["count"], 50)
+            self.assertEqual([channel["in_flight"] for channel in stats["channels"]], [0, 0])
+        finally:
+            await pool.close_all()
+            await server.stop(None)
+
+    async def test_least_loaded_channel_is_picked(self):
+        pool = GlobalGrpcPool(channels_per_target=2)
+        target = "127.0.0.1:1"
+        first = await pool.get_channel(target)
+        second = await pool.get_channel(target)
+        self.assertIsNot(first, second)
+        await pool.release_channel(target, first)
+        self.assertIs(await pool.get_channel(target), first)
+        # both busy and the target is full, the channels are shared
+        self.assertIn(await pool.get_channel(target), (first, second))
+        self.assertEqual(pool.stats()[target]["in_flight"], 3)
+        await pool.close_all()
+
+    async def test_failed_channels_are_evicted(self):
+        pool = GlobalGrpcPool(channels_per_target=1)
+        target = "127.0.0.1:1"
+        channel = await pool.get_channel(target)
+        with mock.patch.object(grpc_pool_manager, "MIN_CHANNEL_AGE", 0), \
+                mock.patch.object(grpc_pool_manager.PooledChannel, "state", return_value=grpc.ChannelConnectivity.TRANSIENT_FAILURE):
+            replacement = await pool.get_channel(target)
+        self.assertIsNot(replacement, channel)
+        self.assertEqual(pool.stats()[target]["evictions"], 1)
+        # the evicted channel's call still releases cleanly
+        await pool.release_channel(target, channel)
+        await pool.release_channel(target, replacement)
+        self.assertEqual(pool.stats()[target]["in_flight"], 0)
+        await pool.close_all()
+
+    async def test_failed_calls_are_counted(self):
+        pool = GlobalGrpcPool()
+        target = "127.0.0.1:1"
+        with self.assertRaises(ValueError):
+            async with pool.channel_context(target):
+                raise ValueError("call failed")
+        stats = pool.stats()[target]
+        self.assertEqual((stats["failures"], stats["in_flight"]), (1, 0))
+        await pool.close_all()
+
+
+class TestEventLoopChange(unittest.TestCase):
+    def test_new_loop_gets_new_channels(self):
+        pool = GlobalGrpcPool()
+        target = "127.0.0.1:1"
+
+        async def take():
+            return await pool.get_channel(target)
+
+        first = asyncio.run(take())
+        second = asyncio.run(take())
+        self.assertIsNot(first, second)
+        stats = pool.stats()[target]
+        self.assertEqual((stats["channels_created"], stats["in_flight"]), (2, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from node.schemas import Module, ModuleExecutionMode, ToolConfig
+from node.server.inline_runs import InlineRunPool, failed_run, inline_requested
+
+
+def deployment(module_type="tool", execution_type="package", execution_mode="inline"):
+    return {
+        "module": {"name": "module_a", "module_type": module_type, "execution_type": execution_type},
+        "config": {"execution_mode": execution_mode},
+    }
+
+
+class TestInlineRequested(unittest.TestCase):
+    def test_opted_in_tool_and_memory_deployments(self):
+        self.assertTrue(inline_requested(deployment("tool")))
+        self.assertTrue(inline_requested(deployment("memory")))
+
+    def test_other_deployments_are_queued(self):
+        self.assertFalse(inline_requested(deployment(execution_mode=None)))
+        self.assertFalse(inline_requested(deployment(execution_mode="queued")))
+        self.assertFalse(inline_requested(deployment(module_type="agent")))
+        self.assertFalse(inline_requested(deployment(execution_type="docker")))
+        self.assertFalse(inline_requested({"module": {"module_type": "tool"}, "config": None}))
+
+    def test_pydantic_deployment(self):
+        module = Module(id="tool:module_a", name="module_a", description="", author="", module_url="", module_type="tool")
+        config = ToolConfig(execution_mode=ModuleExecutionMode.inline)
+        self.assertTrue(inline_requested(type("Deployment", (), {"module": module, "config": config})))
+
+
+class TestFailedRun(unittest.TestCase):
+    def test_error_fields(self):
+        run = failed_run({"id": "run-1", "status": "pending"}, "timed out")
+        self.assertEqual(run["id"], "run-1")
+        self.assertEqual(run["status"], "error")
+        self.assertTrue(run["error"])
+        self.assertEqual(run["error_message"], "timed out")
+        self.assertIsNotNone(run["completed_time"])
+
+
+class TestInlineRunPool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.release = threading.Event()
+        self.calls = []
+
+    def pool(self, target, workers=2, timeout=2.0):
+        pool = InlineRunPool(target, workers, timeout, executor_factory=lambda: ThreadPoolExecutor(workers))
+        self.addCleanup(self.release.set)
+        self.addCleanup(pool.close)
+        return pool
+
+    def finish(self, module_run, user_env_data):
+        self.calls.append((module_run["id"], user_env_data))
+        return {**module_run, "status": "completed", "results": ["ok"]}
+
+    def block(self, module_run, user_env_data):
+        self.release.wait(5)
+        return {**module_run, "status": "completed"}
+
+    async def test_returns_the_finished_run(self):
+        pool = self.pool(self.finish)
+        run = await pool.run({"id": "run-1", "status": "pending"}, {"KEY": "value"})
+        self.assertEqual(run, {"id": "run-1", "status": "completed", "results": ["ok"]})
+        self.assertEqual(self.calls, [("run-1", {"KEY": "value"})])
+        self.assertEqual(pool.in_flight, 0)
+
+    async def test_busy_pool_sends_runs_to_the_queue(self):
+        pool = self.pool(self.block, workers=2)
+        running = [asyncio.create_task(pool.run({"id": f"run-{i}"})) for i in range(2)]
+        await asyncio.sleep(0.05)
+        self.assertIsNone(await pool.run({"id": "run-2"}))
+        self.release.set()
+        self.assertEqual([run["id"] for run in await asyncio.gather(*running)], ["run-0", "run-1"])
+        self.assertEqual(pool.in_flight, 0)
+
+    async def test_timed_out_run_keeps_its_worker(self):
+        pool = self.pool(self.block, workers=1, timeout=0.05)
+        with self.assertRaises(asyncio.TimeoutError):
+            await pool.run({"id": "run-1"})
+        # the worker is still running the module
+        self.assertIsNone(await pool.run({"id": "run-2"}))
+        self.release.set()
+        for _ in range(100):
+            if pool.in_flight == 0:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(pool.in_flight, 0)
+
+    async def test_pool_is_restarted_when_a_run_kills_its_process(self):
+        def crash(module_run, user_env_data):
+            if module_run["id"] == "run-1":
+                raise BrokenProcessPool("A process in the process pool was terminated abruptly")
+            return self.finish(module_run, user_env_data)
+
+        pool = self.pool(crash)
+        await pool.run({"id": "run-0"})
+        broken = pool.executor
+        with self.assertRaises(BrokenProcessPool):
+            await pool.run({"id": "run-1"})
+        self.assertIsNotNone(pool.executor)
+        self.assertIsNot(pool.executor, broken)
+        run = await pool.run({"id": "run-2"})
+        self.assertEqual(run["status"], "completed")
+        self.assertEqual(pool.in_flight, 0)
+
+    async def test_disabled_pool(self):
+        pool = self.pool(self.finish, workers=0)
+        self.assertIsNone(await pool.run({"id": "run-1"}))
+        self.assertIsNone(pool.executor)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import json
+import unittest
+from unittest import mock
+
+from node.inference import instrumentation
+from node.inference.instrumentation import (
+    StreamMetrics,
+    add_model_summaries,
+    completion_tokens_histogram,
+    inter_token_histogram,
+    prompt_tokens_histogram,
+    request_consumer,
+    ttft_histogram,
+)
+from node.metrics import Histogram
+
+
+def event(data) -> bytes:
+    return f"data: {json.dumps(data)}\n\n".encode()
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_stream_metrics_from_split_chunks(self):
+        model = "test-stream-model"
+        observer = StreamMetrics(model, "did:naptha:test", start=0)
+        stream = b"".join(
+            [event({"choices": [{"index": 0, "delta": {"role": "assistant"}}]})]
+            + [event({"choices": [{"index": 0, "delta": {"content": f"t{i}"}}]}) for i in range(5)]
+            + [event({"choices": [], "usage": {"prompt_tokens": 12, "completion_tokens": 5}}), b"data: [DONE]\n\n"]
+        )
+        # chunk boundaries don't line up with events
+        for i in range(0, len(stream), 7):
+            observer.feed(stream[i:i + 7])
+        observer.close(completed=True)
+
+        self.assertEqual(observer.tokens, 5)
+        self.assertEqual(ttft_histogram.summary(model=model)["count"], 1)
+        self.assertEqual(inter_token_histogram.summary(model=model)["count"], 4)
+        self.assertEqual(prompt_tokens_histogram.summary(model=model, consumer="did:naptha:test")["mean"], 12)
+        self.assertEqual(completion_tokens_histogram.summary(model=model)["mean"], 5)
+
+        models = add_model_summaries({"object": "list", "data": [{"id": model, "object": "model"}]})
+        self.assertEqual(models["data"][0]["metrics"]["completion_tokens"]["count"], 1)
+
+    def test_histogram_summary_merges_label_values(self):
+        histogram = Histogram("h", "test", (1, 2, 4), ("model", "consumer"))
+        histogram.observe(1, model="m", consumer="a")
+        histogram.observe(3, model="m", consumer="b")
+        histogram.observe(3, model="other", consumer="a")
+        summary = histogram.summary(model="m")
+        self.assertEqual(summary["count"], 2)
+        self.assertEqual(summary["mean"], 2)
+        self.assertEqual(summary["p95"], 4)
+        self.assertEqual(histogram.quantile(0.5, model="m", consumer="a"), 1)
+
+    def test_consumer_labels_are_capped(self):
+        with mock.patch.object(instrumentation, "labelled_consumers", set()), \
+                mock.patch.object(instrumentation, "INFERENCE_METRICS_MAX_CONSUMERS", 2):
+            self.assertEqual(request_consumer({}), "anonymous")
+            self.assertEqual(request_consumer({"x-consumer-id": " did:naptha:a "}), "did:naptha:a")
+            self.assertEqual(request_consumer({"x-consumer-id": "did:naptha:b"}), "did:naptha:b")
+            self.assertEqual(request_consumer({"x-consumer-id": "did:naptha:c"}), "other")
+            # consumers seen before the cap was reached keep their label
+            self.assertEqual(request_consumer({"x-consumer-id": "did:naptha:a"}), "did:naptha:a")
+            self.assertEqual(request_consumer({"x-consumer-id": 'bad"} 1\nfake_metric'}), "other")
+            self.assertEqual(request_consumer({"x-consumer-id": "x" * 129}), "other")
+
+
+if __name__ == "__main__":
+    unittest.main()
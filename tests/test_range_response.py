@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from node.storage.range_response import RangeFileResponse, RangeNotSatisfiable, parse_range_header
+
+
+class TestParseRangeHeader(unittest.TestCase):
+    def test_ranges(self):
+        self.assertIsNone(parse_range_header(None, 100))
+        self.assertEqual(parse_range_header("bytes=0-9", 100), [(0, 9)])
+        self.assertEqual(parse_range_header("bytes=90-", 100), [(90, 99)])
+        self.assertEqual(parse_range_header("bytes=-10", 100), [(90, 99)])
+        self.assertEqual(parse_range_header("bytes=95-200", 100), [(95, 99)])
+        self.assertEqual(parse_range_header("bytes=0-0, 10-19", 100), [(0, 0), (10, 19)])
+
+    def test_malformed_ranges_are_ignored(self):
+        for header in ("items=0-9", "bytes=", "bytes=9-0", "bytes=a-b", "bytes=-", "bytes=1-2-3"):
+            self.assertIsNone(parse_range_header(header, 100), header)
+
+    def test_unsatisfiable(self):
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range_header("bytes=100-", 100)
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range_header("bytes=0-", 0)
+
+
+class TestRangeFileResponse(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        self.content = bytes(range(256)) * 4
+        with os.fdopen(fd, "wb") as f:
+            f.write(self.content)
+
+        app = FastAPI()
+
+        @app.get("/file")
+        async def read_file(request: Request):
+            return RangeFileResponse(self.path, request.headers, filename="data.bin", etag='"cid"')
+
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_full_read(self):
+        response = self.client.get("/file")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.content)
+        self.assertEqual(response.headers["content-length"], str(len(self.content)))
+        self.assertEqual(response.headers["accept-ranges"], "bytes")
+        self.assertEqual(response.headers["etag"], '"cid"')
+
+    def test_single_range(self):
+        response = self.client.get("/file", headers={"Range": "bytes=10-19"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, self.content[10:20])
+        self.assertEqual(response.headers["content-range"], f"bytes 10-19/{len(self.content)}")
+        self.assertEqual(response.headers["content-length"], "10")
+
+    def test_multi_range(self):
+        response = self.client.get("/file", headers={"Range": "bytes=0-3,-4"})
+        self.assertEqual(response.status_code, 206)
+        content_type = response.headers["content-type"]
+        self.assertTrue(content_type.startswith("multipart/byteranges; boundary="))
+        self.assertEqual(response.headers["content-length"], str(len(response.content)))
+        boundary = content_type.split("boundary=")[1].encode()
+        parts = [part for part in response.content.split(b"--" + boundary) if part.strip(b"-\r\n")]
+        self.assertEqual(len(parts), 2)
+        self.assertTrue(parts[0].endswith(b"\r\n\r\n" + self.content[:4] + b"\r\n"))
+        self.assertTrue(parts[1].endswith(b"\r\n\r\n" + self.content[-4:] + b"\r\n"))
+
+    def test_conditional_requests(self):
+        self.assertEqual(self.client.get("/file", headers={"If-None-Match": '"cid"'}).status_code, 304)
+        response = self.client.get("/file", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.content)
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get("/file", headers={"Range": f"bytes={len(self.content)}-"})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response.headers["content-range"], f"bytes */{len(self.content)}")
+
+
+if __name__ == "__main__":
+    unittest.main()
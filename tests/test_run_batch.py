@@ -0,0 +1,83 @@
+import unittest
+
+from celery import Celery
+
+from node.schemas import ModuleRunBatchInput
+from node.server.run_batch import batch_rows, submit_run_batch
+
+app = Celery("test_run_batch")
+
+
+@app.task
+def run_tool(tool_run, user_env_data={}):
+    return tool_run
+
+
+class FakeRun:
+    def __init__(self, data):
+        self.data = data
+
+    def model_dump(self):
+        return self.data
+
+
+class FakeRunDB:
+    def __init__(self):
+        self.inserts = []
+
+    async def create_module_runs(self, run_inputs, run_type):
+        self.inserts.append((run_type, run_inputs))
+        return [FakeRun({**run_input, "id": f"run-{index}"}) for index, run_input in enumerate(run_inputs)]
+
+
+class FakeDispatcher:
+    def __init__(self):
+        self.batches = []
+
+    async def submit_many(self, signatures, track=True):
+        self.batches.append(signatures)
+        return [None] * len(signatures)
+
+
+class TestBatchRows(unittest.TestCase):
+    def test_rows_share_the_template(self):
+        template = {"consumer_id": "user:1", "deployment": {"name": "tool_deployment"}, "inputs": None, "signature": "sig"}
+        rows = batch_rows(template, [{"x": 1}, {"x": 2}, None])
+        self.assertEqual([row["inputs"] for row in rows], [{"x": 1}, {"x": 2}, None])
+        self.assertTrue(all(row["deployment"] is template["deployment"] for row in rows))
+        self.assertIsNone(template["inputs"])
+
+    def test_batch_input(self):
+        batch = ModuleRunBatchInput(consumer_id="user:1", deployment={"name": "d"}, inputs=[{"x": 1}, None], signature="sig")
+        self.assertEqual(batch.inputs, [{"x": 1}, None])
+
+
+class TestSubmitRunBatch(unittest.IsolatedAsyncioTestCase):
+    async def test_one_insert_and_one_dispatch(self):
+        db, dispatcher = FakeRunDB(), FakeDispatcher()
+        rows = batch_rows({"consumer_id": "user:1", "deployment": {}}, [{"x": i} for i in range(3)])
+        run_ids = await submit_run_batch(db, dispatcher, "tool", rows, lambda data: run_tool.s(data, {"KEY": "value"}))
+
+        self.assertEqual(run_ids, ["run-0", "run-1", "run-2"])
+        self.assertEqual(len(db.inserts), 1)
+        self.assertEqual(db.inserts[0][0], "tool")
+        self.assertEqual(len(dispatcher.batches), 1)
+        signatures = dispatcher.batches[0]
+        self.assertEqual([signature.args[0]["id"] for signature in signatures], run_ids)
+        self.assertEqual([signature.args[0]["inputs"] for signature in signatures], [{"x": 0}, {"x": 1}, {"x": 2}])
+        self.assertEqual(signatures[0].args[1], {"KEY": "value"})
+
+    async def test_failed_insert_dispatches_nothing(self):
+        db, dispatcher = FakeRunDB(), FakeDispatcher()
+
+        async def create_module_runs(run_inputs, run_type):
+            raise RuntimeError("insert failed")
+
+        db.create_module_runs = create_module_runs
+        with self.assertRaises(RuntimeError):
+            await submit_run_batch(db, dispatcher, "tool", [{"inputs": {}}], run_tool.s)
+        self.assertEqual(dispatcher.batches, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,227 @@
+import importlib.util
+import json
+import random
+import time
+import unittest
+from pathlib import Path
+
+from tests.tool_parser_corpus import (
+    NOT_LLAMA3_XML,
+    NOT_MINICPM,
+    NOT_TOOL_CALLS,
+    VALID_LLAMA3_XML,
+    VALID_MINICPM,
+    VALID_PYTHONIC,
+    adversarial_outputs,
+    random_llama3_xml_call,
+    random_minicpm_output,
+    random_pythonic_call,
+    random_split,
+)
+
+# the tool parser plugins live in a directory vLLM mounts, not in an importable package
+PARSER_PATH = Path(__file__).parent.parent / "node" / "inference" / "configs" / "tool-parsers" / "incremental_tool_parser.py"
+spec = importlib.util.spec_from_file_location("incremental_tool_parser", PARSER_PATH)
+incremental_tool_parser = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(incremental_tool_parser)
+PythonicToolCallParser = incremental_tool_parser.PythonicToolCallParser
+MiniCPMToolCallParser = incremental_tool_parser.MiniCPMToolCallParser
+Llama3XMLToolCallParser = incremental_tool_parser.Llama3XMLToolCallParser
+
+
+def parse(text, parser_class=PythonicToolCallParser):
+    parser = parser_class()
+    parser.feed(text)
+    if not parser.finish():
+        return None
+    return [(call.name, call.arguments) for call in parser.tool_calls]
+
+
+def stream(pieces, parser_class=PythonicToolCallParser):
+    """Feed pieces one at a time, returning the concatenated name and arguments per call index"""
+    parser = parser_class()
+    names, arguments = {}, {}
+    for piece in pieces:
+        for delta in parser.feed(piece):
+            if delta.name is not None:
+                names[delta.index] = delta.name
+            arguments[delta.index] = arguments.get(delta.index, "") + delta.arguments
+    parser.finish()
+    return parser, [(names[i], arguments[i]) for i in sorted(names)]
+
+
+def stream_content(pieces, parser_class):
+    """Feed pieces one at a time, returning the parser, its streamed calls and the content around them"""
+    parser = parser_class()
+    names, arguments, content = {}, {}, []
+    for piece in pieces:
+        for delta in parser.feed(piece):
+            if delta.name is not None:
+                names[delta.index] = delta.name
+            arguments[delta.index] = arguments.get(delta.index, "") + delta.arguments
+        content.append(parser.take_content())
+    parser.finish()
+    content.append(parser.take_content())
+    return parser, [(names[i], arguments[i]) for i in sorted(names)], "".join(content)
+
+
+class TestPythonicToolCallParser(unittest.TestCase):
+    def test_valid_outputs(self):
+        for text, expected in VALID_PYTHONIC:
+            with self.subTest(text=text):
+                self.assertEqual(parse(text), expected)
+
+    def test_not_tool_calls(self):
+        for text in NOT_TOOL_CALLS:
+            with self.subTest(text=text):
+                self.assertIsNone(parse(text))
+
+    def test_arguments_are_emitted_as_they_are_generated(self):
+        parser = PythonicToolCallParser()
+        self.assertEqual(parser.feed("[get_weather"), [])
+        [delta] = parser.feed("(city='Par")
+        self.assertEqual((delta.name, delta.arguments), ("get_weather", '{"city": "Par'))
+        self.assertEqual(parser.feed("is'")[0].arguments, "is")
+        self.assertEqual(parser.feed(", ")[0].arguments, '"')
+        self.assertEqual(parser.feed("days=3)")[0].arguments, ', "days": 3}')
+        self.assertEqual(parser.feed("]"), [])
+        self.assertTrue(parser.done)
+
+    def test_escapes_that_need_the_whole_string_are_decoded_at_the_end(self):
+        parser, streamed = stream(["[f(s='a\\n", "b\\x41", "c\\u00e9', t='x' 'y')]"])
+        self.assertTrue(parser.done)
+        self.assertEqual(parser.tool_calls[0].arguments, {"s": "a\nbAc\u00e9", "t": "xy"})
+        self.assertEqual(streamed[0][1], parser.tool_calls[0].arguments_json)
+
+    def test_value_that_stops_being_a_string_fails(self):
+        self.assertIsNone(parse("[f(s='a' * 2)]"))
+
+    def test_feed_text_only_parses_new_text(self):
+        parser = PythonicToolCallParser()
+        text = ""
+        for piece in ["[f(", "a=1", ", b=2", ")]"]:
+            text += piece
+            parser.feed_text(text)
+        self.assertTrue(parser.finish())
+        self.assertEqual(parser.tool_calls[0].arguments, {"a": 1, "b": 2})
+
+    def test_fuzz_streamed_deltas_match_complete_parse(self):
+        rng = random.Random(1234)
+        for _ in range(300):
+            calls = [random_pythonic_call(rng, i) for i in range(rng.randint(1, 3))]
+            text = "[" + ", ".join(source for source, _ in calls) + "]"
+            parser, streamed = stream(random_split(text, rng))
+            self.assertTrue(parser.done, text)
+            self.assertEqual([(name, json.loads(args)) for name, args in streamed], [expected for _, expected in calls])
+            self.assertEqual([args for _, args in streamed], [call.arguments_json for call in parser.tool_calls])
+
+    def test_fuzz_truncated_and_corrupted_outputs_never_raise(self):
+        rng = random.Random(99)
+        for _ in range(300):
+            source, _ = random_pythonic_call(rng, 0)
+            text = "[" + source + "]"
+            cut = rng.randint(0, len(text))
+            corrupted = text[:cut] + rng.choice(["", ")", "]", "'", "=", ",", "(", "x"]) + text[cut:]
+            stream(random_split(corrupted, rng))
+
+    def test_adversarial_outputs_take_linear_time(self):
+        for small, large in zip(adversarial_outputs(2000), adversarial_outputs(20000)):
+            timings = []
+            for text in (small, large):
+                start = time.perf_counter()
+                parse(text)
+                timings.append(time.perf_counter() - start)
+            # 10x the input should cost about 10x, allow plenty of slack for timer noise
+            self.assertLess(timings[1], max(timings[0], 0.001) * 40, large[:40])
+
+
+class TestMarkerMatcher(unittest.TestCase):
+    def test_overlapping_partial_matches_are_released(self):
+        matcher = incremental_tool_parser.MarkerMatcher("<<a")
+        released, found = [], []
+        for char in "x<<<ab<<a":
+            text, hit = matcher.feed(char)
+            released.append(text)
+            found.append(hit)
+        # the marker also starts one character into "<<<a"
+        self.assertEqual("".join(released), "x<b")
+        self.assertEqual([i for i, hit in enumerate(found) if hit], [4, 8])
+
+
+class TestTextAndToolCallParsers(unittest.TestCase):
+    CASES = [
+        (MiniCPMToolCallParser, VALID_MINICPM, NOT_MINICPM),
+        (Llama3XMLToolCallParser, VALID_LLAMA3_XML, NOT_LLAMA3_XML),
+    ]
+
+    def test_valid_outputs_in_any_split(self):
+        rng = random.Random(7)
+        for parser_class, valid, _ in self.CASES:
+            for text, expected, content in valid:
+                for pieces in ([text], list(text), random_split(text, rng)):
+                    with self.subTest(parser=parser_class.__name__, text=text, pieces=len(pieces)):
+                        parser, streamed, streamed_content = stream_content(pieces, parser_class)
+                        self.assertFalse(parser.failed, parser.error)
+                        self.assertEqual([(call.name, call.arguments) for call in parser.tool_calls], expected)
+                        self.assertEqual([args for _, args in streamed], [call.arguments_json for call in parser.tool_calls])
+                        self.assertEqual(streamed_content, content)
+
+    def test_invalid_outputs(self):
+        for parser_class, _, invalid in self.CASES:
+            for text in invalid:
+                with self.subTest(parser=parser_class.__name__, text=text):
+                    self.assertIsNone(parse(text, parser_class))
+
+    def test_content_is_withheld_only_while_a_marker_may_be_starting(self):
+        parser = Llama3XMLToolCallParser()
+        parser.feed("Sure <fun")
+        self.assertEqual(parser.take_content(), "Sure ")
+        [delta] = parser.feed('ction=f>{"q": "ab')
+        self.assertEqual((delta.name, delta.arguments), ("f", '{"q": "ab'))
+        self.assertEqual(parser.feed('c"}</function>ok')[0].arguments, 'c"}')
+        self.assertEqual(parser.take_content(), "ok")
+        self.assertEqual(parser.withheld_from, len("Sure "))
+
+    def test_fuzz_streamed_deltas_match_complete_parse(self):
+        rng = random.Random(4321)
+        for _ in range(200):
+            minicpm_calls = [random_pythonic_call(rng, i) for i in range(rng.randint(1, 3))]
+            xml_calls = [random_llama3_xml_call(rng, i) for i in range(rng.randint(1, 3))]
+            for parser_class, text, calls in (
+                (MiniCPMToolCallParser, random_minicpm_output(rng, [source for source, _ in minicpm_calls]), minicpm_calls),
+                (Llama3XMLToolCallParser, "Sure. " + "".join(source for source, _ in xml_calls) + " done", xml_calls),
+            ):
+                parser, streamed, content = stream_content(random_split(text, rng), parser_class)
+                self.assertFalse(parser.failed, (text, parser.error))
+                self.assertEqual([(name, json.loads(args)) for name, args in streamed], [expected for _, expected in calls])
+                self.assertEqual(content, "Sure.  done")
+
+    def test_fuzz_truncated_and_corrupted_outputs_never_raise(self):
+        rng = random.Random(100)
+        for _ in range(300):
+            source, _ = random_llama3_xml_call(rng, 0)
+            for parser_class, text in (
+                (MiniCPMToolCallParser, random_minicpm_output(rng, [random_pythonic_call(rng, 0)[0]])),
+                (Llama3XMLToolCallParser, source),
+            ):
+                cut = rng.randint(0, len(text))
+                corrupted = text[:cut] + rng.choice(["", ")", "}", '"', "<", ",", "`", "x"]) + text[cut:]
+                stream_content(random_split(corrupted, rng), parser_class)
+
+    def test_adversarial_outputs_take_linear_time(self):
+        outputs = {
+            MiniCPMToolCallParser: lambda n: ["<|tool_call_start|>" + "f(a=1)\n" * n, "<|thought_start|>" + "<|thought_" * n, "<|" * n],
+            Llama3XMLToolCallParser: lambda n: ["<function=" + "f" * n, '<function=f>{"a": ' + "[" * 60 + "1" * n, "<fun" * n],
+        }
+        for parser_class, make in outputs.items():
+            for small, large in zip(make(2000), make(20000)):
+                timings = []
+                for text in (small, large):
+                    start = time.perf_counter()
+                    parse(text, parser_class)
+                    timings.append(time.perf_counter() - start)
+                self.assertLess(timings[1], max(timings[0], 0.001) * 40, large[:40])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import os
+import signal
+import socket
+import time
+import unittest
+from unittest import mock
+
+from node.server import workers
+from node.server.workers import SO_REUSEPORT_AVAILABLE, WorkerSupervisor, reuseport_socket
+
+
+def serve_pid(port: int, index: int):
+    """Worker answering every connection with its pid, it stops accepting on SIGTERM and exits cleanly"""
+    async def serve():
+        stopping = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+
+        async def reply(reader, writer):
+            writer.write(str(os.getpid()).encode())
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(reply, sock=reuseport_socket(port, "127.0.0.1"))
+        await stopping.wait()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(serve())
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def ask_pid(port: int, timeout: float = 10.0) -> int:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1) as sock:
+                return int(sock.recv(32))
+        except (ConnectionRefusedError, ValueError):
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+@unittest.skipUnless(SO_REUSEPORT_AVAILABLE, "SO_REUSEPORT is not available")
+class TestWorkerSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.port = free_port()
+        self.supervisor = WorkerSupervisor(serve_pid, (self.port,), 2, drain_timeout=10)
+        self.supervisor.start()
+        self.addCleanup(self.supervisor.stop)
+
+    def wait_for_pids(self, count: int) -> set:
+        pids = set()
+        deadline = time.monotonic() + 20
+        while len(pids) < count and time.monotonic() < deadline:
+            pids.add(ask_pid(self.port))
+        return pids
+
+    def test_workers_share_the_port(self):
+        pids = self.wait_for_pids(2)
+        self.assertEqual(pids, {process.pid for process in self.supervisor.processes})
+
+    def test_stop_drains_every_worker(self):
+        self.wait_for_pids(2)
+        processes = list(self.supervisor.processes)
+        self.supervisor.stop()
+        self.assertEqual([process.exitcode for process in processes], [0, 0])
+        self.assertEqual(self.supervisor.alive(), 0)
+
+    def test_dead_workers_are_restarted(self):
+        self.wait_for_pids(2)
+        crashed = self.supervisor.processes[0]
+        crashed.kill()
+        crashed.join()
+        with mock.patch.object(workers, "MIN_WORKER_UPTIME", 0):
+            self.assertTrue(self.supervisor.check())
+        self.assertIsNot(self.supervisor.processes[0], crashed)
+        self.assertIn(self.supervisor.processes[0].pid, self.wait_for_pids(2))
+
+
+@unittest.skipUnless(SO_REUSEPORT_AVAILABLE, "SO_REUSEPORT is not available")
+class TestReuseportSocket(unittest.TestCase):
+    def test_sockets_bind_the_same_port(self):
+        first = reuseport_socket(0, "127.0.0.1")
+        port = first.getsockname()[1]
+        second = reuseport_socket(port, "127.0.0.1")
+        self.assertEqual(second.getsockname()[1], port)
+        first.close()
+        second.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
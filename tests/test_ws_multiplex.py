@@ -0,0 +1,101 @@
+import asyncio
+import json
+import unittest
+
+from node.server.payloads import MSGPACK, MSGPACK_AVAILABLE, MSGPACK_SUBPROTOCOL, decode_payload, encode_payload
+from node.server.ws_multiplex import MultiplexedConnection, negotiate_subprotocol
+
+
+class FakeWebSocket:
+    """Hands out queued frames and records what's sent, a None frame disconnects"""
+
+    def __init__(self, subprotocols=()):
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.incoming = asyncio.Queue()
+        self.sent = []
+        self.sent_binary = []
+
+    async def receive(self):
+        message = await self.incoming.get()
+        if message is None:
+            return {"type": "websocket.disconnect", "code": 1000}
+        if isinstance(message, bytes):
+            return {"type": "websocket.receive", "bytes": message}
+        return {"type": "websocket.receive", "text": message}
+
+    async def send_text(self, message):
+        self.sent.append(json.loads(message))
+        self.sent_binary.append(False)
+
+    async def send_bytes(self, message):
+        self.sent.append(decode_payload(message, MSGPACK))
+        self.sent_binary.append(True)
+
+
+class TestMultiplexedConnection(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.websocket = FakeWebSocket()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handle(self, data):
+        if data.get("fail"):
+            raise ValueError("bad input")
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(data["delay"])
+        self.in_flight -= 1
+        return {"status": "success", "data": data["n"]}
+
+    async def serve(self, messages, max_in_flight=256, binary=False):
+        for message in messages:
+            self.websocket.incoming.put_nowait(encode_payload(message, MSGPACK) if binary else json.dumps(message))
+        connection = MultiplexedConnection(self.websocket, "test", self.handle, max_in_flight=max_in_flight)
+        expected = len(self.websocket.sent) + len(messages)
+        serving = asyncio.create_task(connection.serve())
+        while len(self.websocket.sent) < expected:
+            await asyncio.sleep(0.001)
+        self.websocket.incoming.put_nowait(None)
+        await serving
+
+    async def test_requests_with_ids_run_concurrently_and_reply_when_done(self):
+        await self.serve([{"request_id": str(n), "n": n, "delay": 0.01 * (3 - n)} for n in range(3)])
+        self.assertEqual([reply["request_id"] for reply in self.websocket.sent], ["2", "1", "0"])
+        self.assertEqual([reply["data"] for reply in self.websocket.sent], [2, 1, 0])
+        self.assertEqual(self.max_in_flight, 3)
+
+    async def test_in_flight_requests_are_limited(self):
+        await self.serve([{"request_id": str(n), "n": n, "delay": 0.005} for n in range(10)], max_in_flight=2)
+        self.assertEqual(len(self.websocket.sent), 10)
+        self.assertEqual(self.max_in_flight, 2)
+
+    async def test_messages_without_ids_are_answered_in_order(self):
+        await self.serve([{"n": n, "delay": 0.01 * (3 - n)} for n in range(3)])
+        self.assertEqual(self.websocket.sent, [{"status": "success", "data": n} for n in range(3)])
+        self.assertEqual(self.max_in_flight, 1)
+
+    async def test_errors_are_replied_with_the_request_id(self):
+        await self.serve([{"request_id": "a", "fail": True}])
+        self.assertEqual(self.websocket.sent, [{"request_id": "a", "status": "error", "message": "bad input"}])
+
+    async def test_invalid_json_is_answered(self):
+        self.websocket.incoming.put_nowait("{")
+        await self.serve([])
+        self.assertEqual(self.websocket.sent, [{"status": "error", "message": "Invalid JSON"}])
+
+    @unittest.skipUnless(MSGPACK_AVAILABLE, "msgpack is not installed")
+    async def test_binary_requests_get_binary_replies(self):
+        await self.serve([{"request_id": "a", "n": 1, "delay": 0}, {"n": 2, "delay": 0}], binary=True)
+        await self.serve([{"request_id": "b", "n": 3, "delay": 0}])
+        self.assertEqual(self.websocket.sent_binary, [True, True, False])
+        self.assertCountEqual(self.websocket.sent[:2], [{"request_id": "a", "status": "success", "data": 1}, {"status": "success", "data": 2}])
+        self.assertEqual(self.websocket.sent[2], {"request_id": "b", "status": "success", "data": 3})
+
+    @unittest.skipUnless(MSGPACK_AVAILABLE, "msgpack is not installed")
+    def test_msgpack_subprotocol_is_accepted_when_offered(self):
+        self.assertEqual(negotiate_subprotocol(FakeWebSocket([MSGPACK_SUBPROTOCOL])), MSGPACK_SUBPROTOCOL)
+        self.assertIsNone(negotiate_subprotocol(FakeWebSocket()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+"""Model outputs for exercising the tool call parsers, shared by their tests and benchmark.
+
+``adversarial_outputs`` are shaped to trip up backtracking regexes and re-parsing: long
+almost-tool-calls that never close, deep nesting, unbalanced quotes and huge argument values.
+"""
+import json
+import random
+from typing import List, Tuple
+
+VALID_PYTHONIC: List[Tuple[str, List[Tuple[str, dict]]]] = [
+    ("[get_weather(city='Paris')]", [("get_weather", {"city": "Paris"})]),
+    ("[get_weather(city='Paris', days=3), get_time(tz=\"CET\")]",
+     [("get_weather", {"city": "Paris", "days": 3}), ("get_time", {"tz": "CET"})]),
+    ("[ping()]", [("ping", {})]),
+    ("[search(query='a, b) and [c]', filters={'lang': 'en', 'tags': ['x', 'y']}, limit=-1)]",
+     [("search", {"query": "a, b) and [c]", "filters": {"lang": "en", "tags": ["x", "y"]}, "limit": -1})]),
+    ("[f(s='it\\'s \"quoted\"', flag=True, none=None, ratio=0.5)]",
+     [("f", {"s": "it's \"quoted\"", "flag": True, "none": None, "ratio": 0.5})]),
+    ("[ f ( a = 1 , b = [1, 2] ) , g(x='ünicøde') ]", [("f", {"a": 1, "b": [1, 2]}), ("g", {"x": "ünicøde"})]),
+]
+
+NOT_TOOL_CALLS = [
+    "The weather in Paris is sunny.",
+    "[1, 2, 3]",
+    "[get_weather(city=Paris)]",
+    "[get_weather('Paris')]",
+    "[get_weather(city='Paris')] and some text",
+    "[get_weather(city='Paris'",
+    "[os.system(cmd='ls')]",
+    "[]",
+]
+
+# (output, calls, content) for the MiniCPM3 parser
+VALID_MINICPM: List[Tuple[str, List[Tuple[str, dict]], str]] = [
+    ("<|thought_start|>I should look it up<|thought_end|><|tool_call_start|>```python\nget_weather(city='Paris')\n```<|tool_call_end|>",
+     [("get_weather", {"city": "Paris"})], ""),
+    ("<|tool_call_start|>```python\nweather.get(city='Paris', days=3)\nget_time(tz=\"CET\")\n```<|tool_call_end|>Checking.",
+     [("weather.get", {"city": "Paris", "days": 3}), ("get_time", {"tz": "CET"})], "Checking."),
+    ("Let me see. <|tool_call_start|>search(query='a) <b>', from=2020); ping()<|tool_call_end|>",
+     [("search", {"query": "a) <b>", "from": 2020}), ("ping", {})], "Let me see. "),
+    ("<|thought_start|>no tools needed<|thought_end|>It is sunny <3", [], "It is sunny <3"),
+]
+
+# (output, calls, content) for the Llama 3.1 / functionary XML parser
+VALID_LLAMA3_XML: List[Tuple[str, List[Tuple[str, dict]], str]] = [
+    ('<function=get_weather>{"city": "Paris"}</function>', [("get_weather", {"city": "Paris"})], ""),
+    ('Sure. <function=get_weather>{"city": "Par\\u00eds", "days": 3}</function>\n<function=ping>{}</function>',
+     [("get_weather", {"city": "Par\u00eds", "days": 3}), ("ping", {})], "Sure. \n"),
+    ('<function=search>{"query": "</function> {\\"x\\"}", "filters": {"tags": ["a", "b"]}, "limit": null}</function> done',
+     [("search", {"query": "</function> {\"x\"}", "filters": {"tags": ["a", "b"]}, "limit": None})], " done"),
+    ("a < b <func and no calls", [], "a < b <func and no calls"),
+]
+
+NOT_MINICPM = [
+    "<|tool_call_start|>get_weather('Paris')<|tool_call_end|>",
+    "<|tool_call_start|>get_weather(city='Paris')",
+    "<|tool_call_start|>get_weather(city='Paris') x<|tool_call_end|>",
+    "<|tool_call_start|>get_weather(city='Paris')<|tool_call_en",
+]
+
+NOT_LLAMA3_XML = [
+    '<function=get_weather>["Paris"]</function>',
+    '<function=get_weather>{"city": "Paris"}',
+    '<function=get_weather>{"city": Paris}</function>',
+    '<function=get_weather>{"city": "Paris",}</function>',
+    '<function=get_weather>{"city": "Paris"}</func>',
+    '<function=>{}</function>',
+]
+
+
+def adversarial_outputs(size: int = 20000) -> List[str]:
+    return [
+        # many argument-like fragments that never close the call
+        "[f(" + "a=1, " * size,
+        # nested groups the legacy regex retries at every position
+        "[f(a=" + "x=" * size + ")",
+        "[" + "f(a=1)," * (size // 4) + "f(a=1)",
+        "[f(a='" + "\\'" * size,
+        "[f(a=" + "[" * size,
+        "[f(a=" + "(" * size,
+        "[f(a='" + "x" * size * 5 + "')]",
+        "[f(a=1) " + " " * size + "x]",
+        "[" + "a" * size + "(",
+        "[f(a=" + "1" * size + ", b=" + "{'k': " * 50 + "1" + "}" * 50 + ")]",
+    ]
+
+
+def random_split(text: str, rng: random.Random, max_piece: int = 8) -> List[str]:
+    """Split text into pieces of random length, like tokens arriving in a stream"""
+    pieces, i = [], 0
+    while i < len(text):
+        step = rng.randint(1, max_piece)
+        pieces.append(text[i:i + step])
+        i += step
+    return pieces
+
+
+def random_pythonic_call(rng: random.Random, index: int) -> Tuple[str, Tuple[str, dict]]:
+    values = [0, -3, 2.5, True, None, "plain", "with, comma", "paren ) ]", "quote ' and \"", [1, "a"], {"k": [1, {"n": None}]}]
+    arguments = {f"arg{i}": rng.choice(values) for i in range(rng.randint(0, 4))}
+    source = ", ".join(f"{key}={value!r}" for key, value in arguments.items())
+    # repr gives Python literals; JSON of the parsed value is what the parser must produce
+    return f"tool_{index}({source})", (f"tool_{index}", json.loads(json.dumps(arguments)))
+
+
+def random_minicpm_output(rng: random.Random, calls: List[str]) -> str:
+    block = "\n".join(calls)
+    if rng.random() < 0.5:
+        block = "```python\n" + block + "\n```"
+    thought = "<|thought_start|>thinking<|thought_end|>" if rng.random() < 0.5 else ""
+    return f"{thought}Sure. <|tool_call_start|>{block}<|tool_call_end|> done"
+
+
+def random_llama3_xml_call(rng: random.Random, index: int) -> Tuple[str, Tuple[str, dict]]:
+    _, (name, arguments) = random_pythonic_call(rng, index)
+    return f"<function={name}>{json.dumps(arguments)}</function>", (name, arguments)